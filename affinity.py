@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+affinity.py
+여러 복제본(replica) 배포 시 대화 친화성: 같은 대화의 후속 질문을 같은 노드로
+
+- HashRing: nginx `hash $key consistent;` 와 같은 ketama 링
+  (노드 "host:port" 마다 crc32 점 160개, 키 crc32 이상인 첫 점의 노드)
+  → 앱이 알려주는 담당 노드와 nginx 가 고르는 노드가 일치
+- 노드가 빠지면 그 노드의 키만 다음 점으로 이동, 노드가 추가되면 약 1/N 만 이동
+- Affinity: AFFINITY_NODES 의 노드를 /health 로 주기적으로 확인해 살아 있는 노드로만 링 구성.
+  nginx 없이 라운드 로빈 로드 밸런서 뒤에 있으면 AFFINITY_FORWARD=true 로 담당 노드에 전달
+"""
+
+import os
+import zlib
+import time
+import bisect
+import socket
+import struct
+import logging
+import threading
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+# nginx upstream 에 적은 그대로의 "host:port" 목록 (쉼표 구분)
+AFFINITY_NODES = os.getenv('AFFINITY_NODES', '')
+AFFINITY_SELF = os.getenv('AFFINITY_SELF', '')
+AFFINITY_FORWARD = os.getenv('AFFINITY_FORWARD', 'false').lower() == 'true'
+AFFINITY_PROBE_INTERVAL = float(os.getenv('AFFINITY_PROBE_INTERVAL', '5'))
+AFFINITY_TIMEOUT = float(os.getenv('AFFINITY_TIMEOUT', '30'))
+PROBE_TIMEOUT = 1.0
+# nginx ngx_http_upstream_hash_module 의 가중치 1 당 점 수
+POINTS_PER_NODE = 160
+FORWARDED_HEADER = 'X-Affinity-Forwarded'
+
+
+def _split_address(address):
+    """nginx 와 같은 규칙: 끝의 ":숫자" 를 포트로, "unix:" 는 포트 없음"""
+    if address[:5].lower() == 'unix:':
+        return address[5:], ''
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return host, port
+    return address, ''
+
+
+def node_points(address, weight=1):
+    """노드 하나의 링 점 (crc32(host \\0 port prev_hash) 연쇄)"""
+    host, port = _split_address(address)
+    base = f"{host}\0{port}".encode('utf-8')
+    points, previous = [], 0
+    for _ in range(POINTS_PER_NODE * weight):
+        previous = zlib.crc32(base + struct.pack('<I', previous))
+        points.append(previous)
+    return points
+
+
+def key_hash(key):
+    return zlib.crc32(key.encode('utf-8'))
+
+
+class HashRing:
+    """정렬된 (점, 노드) 배열 + 이진 탐색"""
+
+    def __init__(self, nodes=()):
+        pairs = {}
+        for node in sorted(set(nodes)):
+            for point in node_points(node):
+                # nginx 도 같은 해시의 점은 하나만 남김
+                pairs.setdefault(point, node)
+        self.nodes = sorted(set(nodes))
+        self.points = sorted(pairs)
+        self.owners = [pairs[point] for point in self.points]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect_left(self.points, key_hash(key))
+        return self.owners[index % len(self.points)]
+
+
+def default_self_address():
+    return f"{socket.gethostname()}:{os.getenv('PORT', '5000')}"
+
+
+class Affinity:
+    """살아 있는 노드로 링을 유지하고 키의 담당 노드를 알려줌 (노드 설정이 없으면 비활성)"""
+
+    def __init__(self, nodes, self_address=None, probe_interval=AFFINITY_PROBE_INTERVAL,
+                 forward=AFFINITY_FORWARD):
+        self.nodes = [node.strip() for node in nodes if node.strip()]
+        self.self_address = self_address or default_self_address()
+        self.probe_interval = probe_interval
+        self.forward_enabled = forward
+        self.healthy = set(self.nodes)
+        self.ring = HashRing(self.nodes)
+        self.stats = {'local': 0, 'remote': 0, 'forwarded': 0, 'forward_errors': 0, 'ring_changes': 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(AFFINITY_NODES.split(','), AFFINITY_SELF or None)
+
+    @property
+    def enabled(self):
+        return len(self.nodes) > 1
+
+    def owner(self, key):
+        """키의 담당 노드 주소 (비활성이면 자기 자신)"""
+        if not self.enabled or not key:
+            return self.self_address
+        owner = self.ring.owner(key) or self.self_address
+        with self._lock:
+            self.stats['local' if owner == self.self_address else 'remote'] += 1
+        return owner
+
+    def is_local(self, key):
+        return self.owner(key) == self.self_address
+
+    def set_healthy(self, healthy):
+        """살아 있는 노드 집합이 바뀌었을 때만 링 재구성 (자기 자신은 항상 포함)"""
+        healthy = {node for node in healthy if node in self.nodes}
+        if self.self_address in self.nodes:
+            healthy.add(self.self_address)
+        with self._lock:
+            if healthy == self.healthy:
+                return False
+            self.healthy = healthy
+            self.ring = HashRing(healthy)
+            self.stats['ring_changes'] += 1
+        logger.info(f"친화성 링 갱신: 노드 {len(healthy)}/{len(self.nodes)}개")
+        return True
+
+    def probe(self):
+        healthy = set()
+        for node in self.nodes:
+            if node == self.self_address:
+                continue
+            try:
+                with urllib.request.urlopen(f"http://{node}/health", timeout=PROBE_TIMEOUT) as response:
+                    response.read()
+                healthy.add(node)
+            except OSError:
+                pass
+        return self.set_healthy(healthy)
+
+    def start_prober(self):
+        if not self.enabled or self._prober or self.probe_interval <= 0:
+            return
+        self._prober = threading.Thread(target=self._probe_loop, name='affinity-prober', daemon=True)
+        self._prober.start()
+
+    def stop_prober(self):
+        self._stop.set()
+
+    def _probe_loop(self):
+        while True:
+            try:
+                self.probe()
+            except Exception as e:
+                logger.error(f"친화성 노드 확인 오류: {e}")
+            if self._stop.wait(self.probe_interval):
+                return
+
+    def forward(self, node, path, body, content_type='application/json', timeout=AFFINITY_TIMEOUT):
+        """담당 노드로 요청 전달 → (상태 코드, 본문, Content-Type), 실패 시 None (노드를 링에서 뺌)"""
+        request = urllib.request.Request(f"http://{node}{path}", data=body, method='POST',
+                                         headers={'Content-Type': content_type, FORWARDED_HEADER: self.self_address})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                result = response.status, response.read(), response.headers.get('Content-Type', content_type)
+        except urllib.error.HTTPError as e:
+            result = e.code, e.read(), e.headers.get('Content-Type', content_type)
+        except OSError as e:
+            logger.warning(f"친화성 전달 실패 ({node}, {(time.perf_counter() - started) * 1000:.0f}ms): {e}")
+            with self._lock:
+                self.stats['forward_errors'] += 1
+            self.set_healthy(self.healthy - {node})
+            return None
+        with self._lock:
+            self.stats['forwarded'] += 1
+        return result
+
+    def snapshot(self):
+        return dict(self.stats, enabled=self.enabled, self=self.self_address, forward=self.forward_enabled,
+                    nodes=len(self.nodes), healthy=sorted(self.healthy))
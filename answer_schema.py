@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+answer_schema.py
+구조화 답변: LLM 은 HTML 대신 짧은 키 JSON 으로 답하고, 서버가 검증하고, 페이지가 렌더링
+
+- 예전 프롬프트는 출력 토큰의 상당 부분이 <strong>/<br> 마크업과 고정 문구였음
+  → 모델은 내용(제목, 단계, 비율, 시간, 주의사항, 팁)만 생성
+  {"t": 제목, "s": [단계], "r": [비율], "m": [시간], "c": [주의], "p": [팁]}
+- parse_answer: 코드 블록/앞뒤 설명 제거, max_tokens 에서 잘린 JSON 은 닫을 수 있는 데까지 복원,
+  타입/항목 수/길이 검증. 내용이 없으면 ValueError
+- Answer: 로컬/폴백/스타일/파라미터/사전 답변도 같은 형태 (sections 는 자유 제목 목록)
+  저장소/사전 답변 테이블에는 to_dict JSON 을 저장. 예전 HTML 값은 html 만 있는 Answer 로 읽음
+- render_html: 예전 클라이언트(response 필드), 작업 결과용 서버 측 HTML (이미지 답변도 같은 Answer).
+  페이지는 answer 필드를 같은 규칙으로 직접 렌더링 (스트리밍 중 잘린 JSON 도)
+"""
+
+import json
+from html import escape
+
+SCHEMA_VERSION = 1
+
+# (모델 출력 짧은 키, 필드 이름, 화면 제목). 등록 순서가 출력 순서
+FIELDS = (
+    ('s', 'steps', '🎯 시술 방법'),
+    ('r', 'ratios', '📊 약제 비율'),
+    ('m', 'times', '⏱️ 시간'),
+    ('c', 'cautions', '⚠️ 주의사항'),
+    ('p', 'tips', '💡 프로 팁'),
+)
+FIELD_NAMES = tuple(name for _, name, _ in FIELDS)
+
+MAX_TITLE_CHARS = 80
+MAX_ITEMS = 8
+MAX_ITEM_CHARS = 200
+FOOTER = '⚠️ 전문 미용사 전용'
+
+# 답변 프롬프트 끝에 붙이는 출력 형식 지시
+PROMPT_FORMAT = """답변은 아래 형식의 JSON 객체 하나로만 (HTML/마크다운/이모지/코드 블록 없이, 항목은 짧은 한 줄):
+{"t":"제목","s":["시술 단계"],"r":["약제 비율"],"m":["시간"],"c":["주의사항/트러블슈팅"],"p":["현장 프로 팁"]}
+해당 없는 키는 빈 배열. "전문 미용사 전용" 문구는 화면에 자동으로 붙으므로 쓰지 마세요."""
+
+
+def _text(value, limit):
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        return ''
+    return ' '.join(str(value).split())[:limit]
+
+
+def _items(value):
+    """문자열 하나도 목록으로, 빈 항목 제거, 개수/길이 제한"""
+    if isinstance(value, (str, int, float)):
+        value = [value]
+    if not isinstance(value, (list, tuple)):
+        return ()
+    items = (_text(item, MAX_ITEM_CHARS) for item in value)
+    return tuple(item for item in items if item)[:MAX_ITEMS]
+
+
+class Answer:
+    """답변 하나 (구조화 필드, 자유 제목 섹션, 복합 질문 하위 답변, 또는 예전 HTML)"""
+
+    __slots__ = ('title', 'intro', 'steps', 'ratios', 'times', 'cautions', 'tips', 'sections', 'note', 'parts',
+                 'html')
+
+    def __init__(self, title='', intro='', steps=(), ratios=(), times=(), cautions=(), tips=(), sections=(),
+                 note='', parts=(), html=''):
+        self.title = title
+        self.intro = intro
+        self.steps = tuple(steps)
+        self.ratios = tuple(ratios)
+        self.times = tuple(times)
+        self.cautions = tuple(cautions)
+        self.tips = tuple(tips)
+        self.sections = tuple((heading, tuple(items)) for heading, items in sections)
+        self.note = note
+        self.parts = tuple(parts)
+        self.html = html
+
+    def __bool__(self):
+        return bool(self.html or self.parts or self.sections or self.intro
+                    or any(getattr(self, name) for name in FIELD_NAMES))
+
+    def to_dict(self):
+        """응답/저장용 (빈 필드 생략)"""
+        if self.html:
+            return {'v': SCHEMA_VERSION, 'html': self.html}
+        data = {'v': SCHEMA_VERSION}
+        if self.title:
+            data['title'] = self.title
+        if self.intro:
+            data['intro'] = self.intro
+        for name in FIELD_NAMES:
+            if getattr(self, name):
+                data[name] = list(getattr(self, name))
+        if self.sections:
+            data['sections'] = [{'heading': heading, 'items': list(items)} for heading, items in self.sections]
+        if self.note:
+            data['note'] = self.note
+        if self.parts:
+            data['parts'] = [part.to_dict() for part in self.parts]
+        return data
+
+    def dumps(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            title=data.get('title', ''),
+            intro=data.get('intro', ''),
+            sections=[(section['heading'], section['items']) for section in data.get('sections', ())],
+            note=data.get('note', ''),
+            parts=[cls.from_dict(part) for part in data.get('parts', ())],
+            html=data.get('html', ''),
+            **{name: data.get(name, ()) for name in FIELD_NAMES}
+        )
+
+    @classmethod
+    def load(cls, value):
+        """저장된 값 → Answer (Answer/dict/to_dict JSON 문자열, 그 외 문자열은 예전 HTML 답변)"""
+        if value is None or isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            return cls.from_dict(value)
+        if value.startswith('{"v":'):
+            try:
+                return cls.from_dict(json.loads(value))
+            except (ValueError, KeyError, TypeError):
+                pass
+        return cls(html=value)
+
+
+def close_json(text):
+    """잘린 JSON 을 닫아서 파싱 (마지막 미완성 항목은 버림). 복원할 수 없으면 None"""
+    stack, cuts = [], []
+    in_string = escaped = False
+    for position, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            cuts.append((position + 1, tuple(stack)))
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+        elif ch == ',':
+            cuts.append((position, tuple(stack)))
+
+    # 뒤에서부터 완성된 항목 경계에서 잘라 닫기 (문자열 중간에서 잘렸으면 그 항목은 버림)
+    candidates = [text[:position] + ''.join(reversed(closers)) for position, closers in reversed(cuts[-4:])]
+    closed = text + ('"' if in_string else '') + ''.join(reversed(stack))
+    candidates.insert(len(candidates) if in_string else 0, closed)
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_answer(text):
+    """모델 출력 → 검증된 Answer. JSON 객체가 아니거나 내용이 없으면 ValueError"""
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("JSON 답변이 아닙니다")
+    end = text.rfind('}')
+    try:
+        data = json.loads(text[start:end + 1]) if end > start else None
+    except ValueError:
+        data = None
+    if data is None:
+        data = close_json(text[start:])
+    if not isinstance(data, dict):
+        raise ValueError("JSON 답변을 해석하지 못했습니다")
+
+    # 짧은 키 우선, 긴 이름도 허용
+    fields = {name: _items(data.get(key, data.get(name))) for key, name, _ in FIELDS}
+    answer = Answer(title=_text(data.get('t', data.get('title')), MAX_TITLE_CHARS), **fields)
+    if not any(fields.values()):
+        raise ValueError("답변 내용이 비어있습니다")
+    return answer
+
+
+def _block(heading, items, numbered=False):
+    lines = [f"{index}. {escape(item, quote=False)}" if numbered else f"• {escape(item, quote=False)}"
+             for index, item in enumerate(items, 1)]
+    return f"<strong>{escape(heading, quote=False)}</strong><br>" + '<br>'.join(lines)
+
+
+def render_html(answer):
+    """Answer → HTML (페이지의 renderAnswer 와 같은 규칙)"""
+    if answer.html:
+        return answer.html
+    if answer.parts:
+        header = f"<strong>{escape(answer.title, quote=False)}</strong><br><br>" if answer.title else ''
+        return header + '<br><hr><br>'.join(render_html(part) for part in answer.parts)
+
+    blocks = []
+    if answer.title:
+        blocks.append(f"<strong>{escape(answer.title, quote=False)}</strong>")
+    if answer.intro:
+        blocks.append(escape(answer.intro, quote=False).replace('\n', '<br>'))
+    blocks += [_block(heading, items) for heading, items in answer.sections if items]
+    for _, name, heading in FIELDS:
+        if getattr(answer, name):
+            blocks.append(_block(heading, getattr(answer, name), numbered=name == 'steps'))
+    if answer.note:
+        blocks.append(escape(answer.note, quote=False))
+    blocks.append(f"<strong>{FOOTER}</strong>")
+    return '<br><br>'.join(blocks)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+answer_store.py
+재시작/재배포 후에도 유지되는 로컬 답변 저장소 (SQLite WAL)
+
+- 읽기: 스레드별 커넥션, WAL 모드라 gunicorn 워커 간 동시 읽기 가능
+- 쓰기: 프로세스당 단일 writer 스레드가 큐를 모아 배치 커밋
+- 만료: 저장 시 expires_at 기록, 읽기 시 무시하고 writer가 주기적으로 삭제 (쓰기가 없어도 SWEEP_INTERVAL 마다)
+- 압축: 파일 크기가 상한을 넘으면 오래된 답변부터 삭제 후 VACUUM (파일 락으로 한 워커만)
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 로컬 개발 환경
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ANSWER_STORE_PATH = os.getenv('ANSWER_STORE_PATH', 'data/answers.db')
+ANSWER_TTL_SECONDS = int(float(os.getenv('ANSWER_TTL_HOURS', '168')) * 3600)
+ANSWER_STORE_MAX_BYTES = int(float(os.getenv('ANSWER_STORE_MAX_MB', '200')) * 1024 * 1024)
+
+# 압축 시 상한의 이 비율까지 줄임
+COMPACT_TARGET_RATIO = 0.8
+SWEEP_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_expires ON answers (expires_at);
+CREATE INDEX IF NOT EXISTS idx_answers_created ON answers (created_at);
+"""
+
+
+def answer_key(*parts):
+    """모델/카테고리/정규화 질문 등으로 저장소 키 생성"""
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+class AnswerStore:
+    def __init__(self, path=ANSWER_STORE_PATH, ttl_seconds=ANSWER_TTL_SECONDS,
+                 max_bytes=ANSWER_STORE_MAX_BYTES, sweep_interval=SWEEP_INTERVAL):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        # 요청 스레드(hits/misses)와 writer 스레드(writes/expired/compactions)가 함께 갱신
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'expired': 0, 'compactions': 0}
+        self._stats_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._closed = False
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._writer_loop, name='answer-store-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._reader().execute(
+                "SELECT value FROM answers WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"답변 저장소 읽기 실패: {e}")
+            row = None
+
+        self._count('hits' if row else 'misses')
+        return row[0] if row else None
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def snapshot(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def put(self, key, value, ttl_seconds=None):
+        """writer 스레드 큐에 넣고 즉시 반환"""
+        if self._closed:
+            return
+        now = time.time()
+        self._queue.put((key, value, now, now + (ttl_seconds or self.ttl_seconds)))
+
+    def flush(self, timeout=5.0):
+        """큐에 쌓인 쓰기가 커밋될 때까지 대기"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=5.0)
+
+    def _writer_loop(self):
+        conn = self._connect()
+        last_sweep = time.monotonic()
+
+        while True:
+            # 쓰기가 없어도 만료 정리는 주기적으로
+            try:
+                item = self._queue.get(timeout=max(0.0, last_sweep + self.sweep_interval - time.monotonic()))
+            except queue.Empty:
+                self._sweep(conn)
+                last_sweep = time.monotonic()
+                continue
+            if item is None:
+                break
+
+            # 쌓인 쓰기를 한 트랜잭션으로 모음
+            rows, waiters = [], []
+            while item is not None:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if rows:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO answers (key, value, created_at, expires_at) "
+                            "VALUES (?, ?, ?, ?)", rows
+                        )
+                    self._count('writes', len(rows))
+                except sqlite3.Error as e:
+                    logger.error(f"답변 저장소 쓰기 실패: {e}")
+
+            if time.monotonic() - last_sweep > self.sweep_interval:
+                self._sweep(conn)
+                last_sweep = time.monotonic()
+
+            for waiter in waiters:
+                waiter.set()
+
+            if item is None:
+                break
+
+        conn.close()
+
+    def _sweep(self, conn):
+        """만료 삭제 + 크기 상한 초과 시 압축"""
+        try:
+            with conn:
+                cur = conn.execute("DELETE FROM answers WHERE expires_at <= ?", (time.time(),))
+            self._count('expired', cur.rowcount)
+            if self.size_bytes() > self.max_bytes:
+                self.compact(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"답변 저장소 정리 실패: {e}")
+
+    def compact(self, conn=None):
+        """오래된 답변부터 삭제해 상한의 80%까지 줄이고 VACUUM (한 워커만 수행)"""
+        own_conn = conn is None
+        conn = conn or self._connect()
+        lock_file = open(self.path + '.compact.lock', 'w')
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+
+            total = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            size = self.size_bytes()
+            if total and size > self.max_bytes:
+                keep = int(total * self.max_bytes * COMPACT_TARGET_RATIO / size)
+                with conn:
+                    conn.execute(
+                        "DELETE FROM answers WHERE key IN ("
+                        "SELECT key FROM answers ORDER BY created_at ASC LIMIT ?)",
+                        (total - keep,)
+                    )
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._count('compactions')
+            return True
+        finally:
+            lock_file.close()
+            if own_conn:
+                conn.close()
+
+    def size_bytes(self):
+        size = 0
+        for suffix in ('', '-wal'):
+            try:
+                size += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return size
+
+    def count(self):
+        return self._reader().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
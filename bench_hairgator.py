@@ -0,0 +1,1560 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_hairgator.py
+헤어게이터 성능 측정 스크립트
+
+서버 없이 각 구성 요소를 프로세스 안에서 측정합니다.
+업스트림(OpenAI)은 지연 시간을 흉내 내는 가짜 함수로 대체합니다.
+
+사용법:
+    python bench_hairgator.py
+    python bench_hairgator.py --bench store --upstream-ms 1500
+    python bench_hairgator.py --bench pwa --url http://127.0.0.1:5000 --rtt-ms 150 --mbps 1.6
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import zlib
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import urlparse
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """정렬 후 최근접 순위 백분위수"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def fake_upstream(mean_ms: float):
+    """로그정규 분포 지연의 가짜 업스트림 응답"""
+    time.sleep(random.lognormvariate(0, 0.35) * mean_ms / 1000.0)
+    return "<strong>전문 미용사 전용</strong><br>" + "가짜 업스트림 답변 " * 20
+
+
+PWA_QUESTION = "애쉬 브라운 레시피 알려주세요"
+PWA_TIMING_JS = """(() => {
+    const nav = performance.getEntriesByType('navigation')[0];
+    const paint = performance.getEntriesByName('first-contentful-paint')[0];
+    return {response: nav.responseEnd, dcl: nav.domContentLoadedEventEnd,
+            fcp: paint ? paint.startTime : null, transfer: nav.transferSize};
+})()"""
+
+
+class ShapedRelay:
+    """브라우저와 서버 사이 로컬 TCP 중계 (왕복 지연/하향 대역폭 흉내, stop() 으로 오프라인)"""
+
+    def __init__(self, host: str, port: int, rtt_ms: float = 0.0, mbps: float = 0.0):
+        self.host = host
+        self.target_port = port
+        self.half_rtt = rtt_ms / 2000.0
+        self.rate = mbps * 1e6 / 8
+        self.port = None
+        self._writers = set()
+        self._stopped = False
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait()
+
+    def _run(self, ready: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+    async def _pipe(self, reader, writer, rate: float):
+        try:
+            while data := await reader.read(65536):
+                await asyncio.sleep(self.half_rtt + (len(data) / rate if rate else 0))
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer):
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(self.host, self.target_port)
+        except OSError:
+            client_writer.close()
+            return
+        writers = (client_writer, upstream_writer)
+        self._writers.update(writers)
+        try:
+            await asyncio.gather(self._pipe(client_reader, upstream_writer, 0),
+                                 self._pipe(upstream_reader, client_writer, self.rate))
+        finally:
+            self._writers.difference_update(writers)
+
+    def stop(self):
+        """리스닝 소켓과 열린 연결(keep-alive 포함)을 모두 닫음 (여러 번 호출해도 됨)"""
+        if self._stopped:
+            return
+        self._stopped = True
+
+        async def shutdown():
+            self.server.close()
+            for writer in list(self._writers):
+                writer.close()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+
+
+class StubUpstreamServer:
+    """지연/오류율을 지정할 수 있는 로컬 OpenAI 호환 스텁 서버"""
+
+    def __init__(self, latency_ms: float, error_rate: float = 0.0, remaining: int = 1000):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.remaining = remaining
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: dict):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("x-ratelimit-remaining-requests", str(stub.remaining))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if random.random() < stub.error_rate:
+                    self._reply(500, {"error": {"message": "stub failure", "type": "server_error"}})
+                    return
+                self._reply(200, {"object": "list", "data": []})
+
+            def _stream(self, content: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("x-ratelimit-remaining-requests", str(stub.remaining))
+                self.end_headers()
+                base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": "stub"}
+                for piece in content.split(" "):
+                    chunk = dict(base, choices=[{"index": 0, "delta": {"content": piece + " "}}])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                usage = dict(base, choices=[], usage={"prompt_tokens": 120, "completion_tokens": 200,
+                                                      "total_tokens": 320})
+                self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                time.sleep(random.lognormvariate(0, 0.25) * stub.latency_ms / 1000.0)
+                if random.random() < stub.error_rate:
+                    self._reply(500, {"error": {"message": "stub failure", "type": "server_error"}})
+                    return
+                if body.get("stream"):
+                    self._stream(fake_upstream(0))
+                    return
+                self._reply(200, {
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                    "model": "stub",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": fake_upstream(0)}}],
+                    "usage": {"prompt_tokens": 120, "completion_tokens": 200, "total_tokens": 320}
+                })
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def make_fake_provider(name: str, first_token_ms: float, tail_ratio: float = 0.05,
+                       tail_factor: float = 8.0, price_in: float = 0.5, price_out: float = 1.5):
+    """첫 토큰 지연이 꼬리가 긴 분포를 따르는 가짜 LLM 제공자"""
+    from providers import Provider, Usage
+
+    class FakeProvider(Provider):
+        def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+            delay = random.lognormvariate(0, 0.3) * first_token_ms / 1000.0
+            if random.random() < tail_ratio:
+                delay *= tail_factor
+            # 응답 읽기 대기: 취소 토큰이 "응답을 닫으면" 바로 깨어남
+            closed = threading.Event()
+            if cancel is not None:
+                cancel.attach(closed.set)
+            yield Usage(len(prompt) // 2, 0)
+            if closed.wait(delay):
+                return
+            for _ in range(40):
+                if closed.wait(0.001):
+                    return
+                yield "토큰 "
+
+    provider = FakeProvider(name, price_in, price_out)
+    provider.name = name
+    return provider
+
+
+def make_phone_photo(width: int = 4032, height: int = 3024, quality: int = 95) -> bytes:
+    """EXIF 회전 태그가 붙은 휴대폰 사진 크기의 JPEG 생성"""
+    import io
+    from PIL import Image
+
+    noise = [Image.effect_noise((width, height), sigma) for sigma in (40, 55, 70)]
+    gradient = Image.linear_gradient("L").resize((width, height))
+    photo = Image.merge("RGB", [Image.blend(n, gradient, 0.5) for n in noise])
+    exif = photo.getexif()
+    exif[0x0112] = 6  # Orientation: 90도 회전
+    out = io.BytesIO()
+    photo.save(out, format="JPEG", quality=quality, exif=exif)
+    return out.getvalue()
+
+
+def make_reference_variants(seed: int):
+    """레퍼런스 사진 하나와 재저장/축소/재크롭/밝기 변형본"""
+    import io
+    from PIL import Image, ImageDraw, ImageEnhance
+
+    rng = random.Random(seed)
+    base = Image.new("RGB", (900, 1200), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(base)
+    for _ in range(12):
+        x, y = rng.randrange(900), rng.randrange(1200)
+        w, h = rng.randrange(100, 500), rng.randrange(100, 600)
+        draw.ellipse((x, y, x + w, y + h), fill=tuple(rng.randrange(256) for _ in range(3)))
+
+    def resave(image, quality):
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality)
+        return Image.open(io.BytesIO(out.getvalue()))
+
+    variants = [
+        resave(base, 60),
+        base.resize((450, 600)),
+        base.crop((18, 24, 882, 1176)),
+        ImageEnhance.Brightness(base).enhance(1.15),
+    ]
+    return base, variants
+
+
+def _warm_reads(path: str, keys: List[str], result_queue):
+    """재시작을 흉내 내기 위해 새 프로세스에서 저장소를 열고 읽기"""
+    from answer_store import AnswerStore
+
+    started = time.perf_counter()
+    store = AnswerStore(path)
+    open_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    hits = 0
+    for key in keys:
+        t0 = time.perf_counter()
+        if store.get(key):
+            hits += 1
+        timings.append((time.perf_counter() - t0) * 1000)
+    store.close()
+    result_queue.put((open_ms, hits, timings))
+
+
+def _affinity_node(port: int, nodes: List[str]):
+    """친화성 측정용 노드 프로세스: /health 와 담당 노드 조회(POST /owners) 만 제공"""
+    from affinity import Affinity
+
+    affinity = Affinity(nodes, self_address=f"127.0.0.1:{port}", probe_interval=0.2)
+    affinity.start_prober()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply({"status": "ok"})
+
+        def do_POST(self):
+            keys = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            self._reply({"owners": [affinity.owner(key) for key in keys], "healthy": sorted(affinity.healthy)})
+
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+class HairgatorBenchmark:
+    def __init__(self, upstream_ms: float = 800.0, requests: int = 50):
+        self.upstream_ms = upstream_ms
+        self.requests = requests
+        self.results = []
+
+    def log_result(self, name: str, message: str):
+        """측정 결과 기록"""
+        print(f"📊 {name}: {message}")
+        self.results.append({"bench": name, "message": message})
+
+    def bench_store(self):
+        """영구 답변 저장소: 재시작 직후 warm hit vs cold 업스트림"""
+        from answer_store import AnswerStore, answer_key
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "answers.db")
+            store = AnswerStore(path)
+            keys = [answer_key("bench", "컬러링", f"질문 {i}") for i in range(self.requests)]
+
+            cold = []
+            for key in keys:
+                t0 = time.perf_counter()
+                answer = fake_upstream(self.upstream_ms)
+                store.put(key, answer)
+                cold.append((time.perf_counter() - t0) * 1000)
+            store.close()
+
+            result_queue = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=_warm_reads, args=(path, keys, result_queue))
+            worker.start()
+            open_ms, hits, warm = result_queue.get()
+            worker.join()
+
+        self.log_result("Store cold", f"p50 {percentile(cold, 50):.1f}ms, p95 {percentile(cold, 95):.1f}ms")
+        self.log_result("Store warm (after restart)",
+                        f"open {open_ms:.1f}ms, hits {hits}/{len(keys)}, "
+                        f"p50 {percentile(warm, 50):.3f}ms, p95 {percentile(warm, 95):.3f}ms")
+        if warm and statistics.median(warm) > 0:
+            self.log_result("Store speedup", f"x{statistics.median(cold) / statistics.median(warm):,.0f} (median)")
+
+    def bench_pool(self):
+        """업스트림 풀: 지연 프로필이 다른 스텁 서버 간 분산과 장애 엔드포인트 제외"""
+        from upstream_pool import Endpoint, UpstreamPool
+
+        profiles = [("fast", self.upstream_ms * 0.25, 0.0), ("medium", self.upstream_ms * 0.5, 0.0),
+                    ("slow", self.upstream_ms, 0.0), ("broken", self.upstream_ms * 0.25, 0.9)]
+        servers = [StubUpstreamServer(latency, error_rate) for _, latency, error_rate in profiles]
+        endpoints = [Endpoint(server.base_url, "sk-bench", name=name)
+                     for server, (name, _, _) in zip(servers, profiles)]
+        pool = UpstreamPool(endpoints, probe_interval=0)
+        # 헬스 프로버 몇 회 → 장애 엔드포인트 제외
+        for _ in range(3):
+            pool.probe()
+
+        def call(_):
+            t0 = time.perf_counter()
+            try:
+                pool.chat_completion(model="stub", messages=[{"role": "user", "content": "벤치"}], max_tokens=10)
+                ok = True
+            except Exception:
+                ok = False
+            return ok, (time.perf_counter() - t0) * 1000
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(call, range(self.requests * 4)))
+
+        for server in servers:
+            server.close()
+
+        latencies = [ms for ok, ms in results if ok]
+        failures = sum(1 for ok, _ in results if not ok)
+        share = Counter({ep.name: ep.calls for ep in endpoints})
+        self.log_result("Pool latency", f"p50 {percentile(latencies, 50):.1f}ms, p95 {percentile(latencies, 95):.1f}ms, "
+                                        f"failed {failures}/{len(results)}")
+        self.log_result("Pool share", ", ".join(f"{name} {count}" for name, count in share.most_common()))
+        self.log_result("Pool ejections", ", ".join(f"{ep.name} {ep.ejections}" for ep in endpoints))
+
+    def bench_hedge(self):
+        """헤지 요청: 1차 단독 vs 헤지 시 꼬리 지연과 추가 비용 (가짜 제공자)"""
+        from providers import HedgedCompleter, percentile as p
+
+        primary = make_fake_provider("fake-openai", self.upstream_ms * 0.3)
+        secondary = make_fake_provider("fake-claude", self.upstream_ms * 0.4, price_in=3.0, price_out=15.0)
+        prompt = "애쉬 브라운 레시피 알려주세요 " * 10
+        calls = self.requests * 4
+
+        def primary_only(_):
+            t0 = time.perf_counter()
+            primary.complete("system", prompt)
+            return time.perf_counter() - t0
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            solo = list(executor.map(primary_only, range(calls)))
+
+        hedged = HedgedCompleter(primary, secondary, default_threshold=self.upstream_ms * 0.6 / 1000.0)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: hedged.complete("system", prompt), range(calls)))
+        time.sleep(self.upstream_ms * 3 / 1000.0)  # 취소된 호출 비용 집계 대기
+        report = hedged.report()
+
+        self.log_result("Hedge off", f"p50 {p(solo, 50) * 1000:.0f}ms, p95 {p(solo, 95) * 1000:.0f}ms, "
+                                     f"p99 {p(solo, 99) * 1000:.0f}ms")
+        self.log_result("Hedge on", f"p50 {report['p50_s'] * 1000:.0f}ms, p95 {report['p95_s'] * 1000:.0f}ms, "
+                                    f"p99 {report['p99_s'] * 1000:.0f}ms, threshold {report['threshold_s'] * 1000:.0f}ms")
+        self.log_result("Hedge cost", f"hedged {report['hedged']}/{report['calls']}, "
+                                      f"secondary wins {report['secondary_wins']}, "
+                                      f"extra cost {report['extra_cost_ratio'] * 100:.1f}%")
+
+        # 과부하: 호출자가 풀보다 많으면 큐 대기로 헤지하지 않고, 꽉 찬 동안은 헤지를 건너뜀
+        storm = HedgedCompleter(primary, secondary, default_threshold=self.upstream_ms * 0.6 / 1000.0)
+        with ThreadPoolExecutor(max_workers=storm.max_workers * 2) as executor:
+            list(executor.map(lambda _: storm.complete("system", prompt), range(calls)))
+        report = storm.report()
+        self.log_result("Hedge overload", f"{storm.max_workers * 2} callers / pool {storm.max_workers}: "
+                                          f"hedged {report['hedged']}/{report['calls']}, "
+                                          f"skipped {report['hedge_skipped']}, p95 {report['p95_s'] * 1000:.0f}ms")
+
+    def bench_image(self, uplink_mbps: float = 10.0):
+        """이미지 파이프라인: 업로드 페이로드 축소와 단계별 처리 시간"""
+        from image_pipeline import ImagePipeline, to_data_url
+
+        photo = make_phone_photo()
+        pipeline = ImagePipeline(workers=2)
+        pipeline.process(photo)  # 워커 프로세스 기동
+
+        stage_samples = {}
+        for _ in range(max(3, self.requests // 10)):
+            encoded, meta, timings = pipeline.process(photo)
+            for stage, ms in timings.items():
+                stage_samples.setdefault(stage, []).append(ms)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: pipeline.process(photo), range(8)))
+        pipeline.shutdown()
+
+        raw_payload = len(to_data_url(photo))
+        new_payload = len(to_data_url(encoded))
+        seconds = lambda size: size * 8 / (uplink_mbps * 1_000_000)
+        self.log_result("Image payload", f"{meta['original_size'][0]}x{meta['original_size'][1]} {raw_payload / 1e6:.2f}MB → "
+                                         f"{meta['size'][0]}x{meta['size'][1]} {new_payload / 1e6:.3f}MB "
+                                         f"(x{raw_payload / new_payload:.0f} smaller)")
+        self.log_result("Image upstream upload", f"{seconds(raw_payload) * 1000:.0f}ms → {seconds(new_payload) * 1000:.0f}ms "
+                                                 f"at {uplink_mbps:g}Mbps")
+        self.log_result("Image stages", ", ".join(f"{stage} {statistics.median(ms):.1f}ms"
+                                                  for stage, ms in stage_samples.items()))
+        self.log_result("Image pool", f"max queue depth {pipeline.stats['max_queue_depth']} "
+                                      f"with {pipeline.workers} workers")
+
+    def bench_phash(self, index_size: int = 1_000_000):
+        """지각 해시 캐시: 해시 시간, 100만 항목 조회 시간, 근접 변형 적중률"""
+        from image_cache import ImageResultCache, dhash
+        from image_pipeline import target_size
+
+        photos = [make_reference_variants(seed) for seed in range(20)]
+        hash_ms = []
+        for base, _ in photos:
+            resized = base.resize(target_size(*base.size))
+            t0 = time.perf_counter()
+            dhash(resized)
+            hash_ms.append((time.perf_counter() - t0) * 1000)
+
+        cache = ImageResultCache(max_entries=index_size + len(photos))
+        rng = random.Random(7)
+        for _ in range(index_size):
+            cache.store(rng.getrandbits(64), "무관한 분석")
+        for i, (base, _) in enumerate(photos):
+            cache.store(dhash(base), f"분석 {i}")
+
+        hits = total = 0
+        lookup_ms = []
+        for i, (_, variants) in enumerate(photos):
+            for variant in variants:
+                value = dhash(variant)
+                t0 = time.perf_counter()
+                found = cache.lookup(value)
+                lookup_ms.append((time.perf_counter() - t0) * 1000)
+                total += 1
+                hits += bool(found and found[0] == f"분석 {i}")
+
+        misses = [cache.lookup(rng.getrandbits(64)) for _ in range(1000)]
+        false_hits = sum(1 for found in misses if found)
+
+        self.log_result("pHash hash", f"median {statistics.median(hash_ms):.3f}ms (768px image)")
+        self.log_result("pHash lookup", f"{len(cache):,} entries, p50 {percentile(lookup_ms, 50):.3f}ms, "
+                                        f"p95 {percentile(lookup_ms, 95):.3f}ms")
+        self.log_result("pHash hit rate", f"variants {hits}/{total} ({hits / total * 100:.0f}%), "
+                                          f"random false hits {false_hits}/1000")
+
+    def bench_features(self, styles: int = 70, unrelated: int = 200):
+        """카탈로그 로컬 매칭: 이미지당 특징 추출+비교 시간, 변형본 로컬 적중률, 무관 사진 오판률"""
+        from image_features import FeatureIndex, extract_features
+        from image_pipeline import target_size
+        import numpy as np
+
+        references = [make_reference_variants(seed) for seed in range(styles)]
+        index = FeatureIndex([f"FAL{seed:04d}" for seed in range(styles)],
+                             np.stack([extract_features(base) for base, _ in references]))
+
+        feature_ms, confident, correct, total = [], 0, 0, 0
+        for seed, (_, variants) in enumerate(references):
+            for variant in variants:
+                image = variant.resize(target_size(*variant.size))
+                t0 = time.perf_counter()
+                result = index.match(extract_features(image))
+                feature_ms.append((time.perf_counter() - t0) * 1000)
+                total += 1
+                if result["confident"]:
+                    confident += 1
+                    correct += result["model_no"] == f"FAL{seed:04d}"
+
+        false_local = 0
+        for seed in range(10_000, 10_000 + unrelated):
+            base, _ = make_reference_variants(seed)
+            false_local += index.match(extract_features(base.resize(target_size(*base.size))))["confident"]
+
+        self.log_result("Features time", f"p50 {percentile(feature_ms, 50):.2f}ms, p99 {percentile(feature_ms, 99):.2f}ms "
+                                         f"(768px 이미지, 특징 추출 + {styles}개 스타일 비교, 1코어)")
+        self.log_result("Features local", f"변형본 {confident}/{total} 로컬 답변 ({confident / total * 100:.0f}%), "
+                                          f"그중 정답 {correct}/{confident}")
+        self.log_result("Features ambiguous", f"무관한 사진 {unrelated - false_local}/{unrelated} 비전 모델로 전달 "
+                                              f"(오판 {false_local})")
+
+    def bench_hangul(self, rounds: int = 2000):
+        """띄어쓰기/오타 허용 분류: 예시 질문 분류 결과와 메시지당 분류 시간"""
+        from functools import lru_cache
+        from hangul import JamoIndex, compact, to_jamo
+        from catalog import load_styles
+
+        # hairgator_fast_20param.CATEGORY_KEYWORDS 와 동일 (서버 모듈은 부팅 비용이 커서 직접 정의)
+        keywords = [
+            ("컬러링", ['컬러', '염색', '애쉬', '브라운', '블론드', '토닝', '탈색']),
+            ("펌", ['펌', '파마', '볼륨', '웨이브', '컬']),
+            ("트리트먼트", ['트리트먼트', '케어', '손상', '영양', '수분']),
+            ("스타일링", ['스타일링', '드라이', '세팅', '매직'])
+        ]
+        index = JamoIndex((word, category) for category, words in keywords for word in words)
+
+        def legacy(message):
+            lowered = message.lower()
+            for category, words in keywords:
+                if any(word in lowered for word in words):
+                    return category
+            return None
+
+        samples = ["애시브라운 레시피", "에쉬 톤다운", "에쉬 브라운 비율", "애쉬브라운 톤", "트리트 먼트 순서", "볼룸펌 시간",
+                   "블론두 만들기", "탈 색 후 관리", "웨이부 펌", "드라이 세팅 팁", "오늘 예약 몇 시예요",
+                   "브라온 톤 비율", "트리트면트 순서", "굿모닝", "드라마 보셨어요", "매진됐나요"]
+        for message in samples:
+            print(f"   {message!r}: 기존 {legacy(message) or '일반상담'} → 자모 {index.classify(message) or '일반상담'}")
+
+        def per_call_us(fn, messages):
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                for message in messages:
+                    fn(message)
+            return (time.perf_counter() - t0) / (rounds * len(messages)) * 1_000_000
+
+        rng = random.Random(3)
+        fresh = [f"{rng.choice(samples)} {i}" for i in range(rounds)]
+        t0 = time.perf_counter()
+        for message in fresh:
+            index.classify(message)
+        cold_us = (time.perf_counter() - t0) / len(fresh) * 1_000_000
+
+        self.log_result("Hangul legacy", f"{per_call_us(legacy, samples):.2f}µs/message")
+        self.log_result("Hangul jamo (uncached)", f"{per_call_us(index.classify, samples):.2f}µs/message")
+        # 서버와 동일하게 메시지별 분류 결과 캐시
+        self.log_result("Hangul jamo (cached)", f"{per_call_us(lru_cache(maxsize=4096)(index.classify), samples):.2f}µs/message")
+        self.log_result("Hangul jamo (new msg)", f"{cold_us:.2f}µs/message "
+                                                 f"(정규화 캐시 {compact.cache_info().currsize}/{to_jamo.cache_info().currsize})")
+
+        styles = load_styles()
+        if styles:
+            style_index = JamoIndex()
+            for style in styles:
+                style_index.add(style.model_no, style.model_no, limit=0)
+                style_index.add(style.name, style.model_no)
+            probes = ["FAL3004 레시피", "fbl 2002 섹션", "엘레강스 웨이브롱 스타일", "CS컬을 활용한 롱스타일 커트"]
+            found = {probe: style_index.classify(probe) for probe in probes}
+            self.log_result("Hangul styles", f"{len(styles)} styles, {found}")
+
+    def bench_ws(self, tokens: int = 40):
+        """WebSocket 채널 vs 메시지별 HTTP: 메시지당 지연과 전송 바이트 (로컬 서버, 새 연결 HTTP)"""
+        import socket
+        import logging
+        from flask import Flask, request as flask_request, jsonify
+        from werkzeug.serving import make_server
+        from ws_chat import ChatSocketServer, SOCK_AVAILABLE
+
+        if not SOCK_AVAILABLE:
+            print("⚠️ flask-sock 미설치: WebSocket 측정 생략")
+            return
+        from simple_websocket import Client
+
+        answer = "<strong>전문 미용사 전용</strong><br>" + "레시피 " * tokens
+
+        def handler(message, on_token=None, suggestion=None):
+            if on_token:
+                for piece in answer.split(" "):
+                    on_token(piece + " ")
+            return {"response": answer, "recipe_type": "컬러링", "source": "live"}
+
+        app = Flask("bench_ws")
+
+        @app.route("/chat", methods=["POST"])
+        def chat():
+            return jsonify(handler(flask_request.get_json()["message"]))
+
+        sockets = ChatSocketServer(handler)
+        sockets.register(app)
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        port = server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        body = json.dumps({"message": "애쉬 브라운 레시피 알려주세요", "timestamp": "2024-01-01T00:00:00.000Z"},
+                          ensure_ascii=False).encode("utf-8")
+        # 모바일 브라우저 fetch 와 비슷한 헤더
+        head = (f"POST /chat HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nAccept: */*\r\nOrigin: http://127.0.0.1:{port}\r\n"
+                "User-Agent: Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15\r\n"
+                "Accept-Language: ko-KR,ko;q=0.9\r\nAccept-Encoding: gzip, deflate, br\r\n"
+                "Connection: close\r\n\r\n").encode("ascii")
+
+        http_ms, http_bytes, http_overhead = [], [], []
+        for _ in range(self.requests):
+            t0 = time.perf_counter()
+            conn = socket.create_connection(("127.0.0.1", port))
+            conn.sendall(head + body)
+            received = b""
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                received += chunk
+            conn.close()
+            http_ms.append((time.perf_counter() - t0) * 1000)
+            http_bytes.append(len(head) + len(body) + len(received))
+            http_overhead.append(len(head) + received.index(b"\r\n\r\n") + 4)
+
+        client = Client.connect(f"ws://127.0.0.1:{port}/ws/chat")
+        ws_ms, first_token_ms = [], []
+        before = sockets.snapshot()
+        for i in range(self.requests):
+            t0 = time.perf_counter()
+            client.send(json.dumps({"type": "chat", "id": i, "message": "애쉬 브라운 레시피 알려주세요"},
+                                   ensure_ascii=False))
+            first = None
+            while True:
+                frame = json.loads(client.receive())
+                if frame["type"] == "token" and first is None:
+                    first = (time.perf_counter() - t0) * 1000
+                if frame["type"] == "done":
+                    break
+            ws_ms.append((time.perf_counter() - t0) * 1000)
+            first_token_ms.append(first)
+        after = sockets.snapshot()
+        client.close()
+        server.shutdown()
+
+        frames = (after["frames_in"] - before["frames_in"]) + (after["frames_out"] - before["frames_out"])
+        payload = (after["bytes_in"] - before["bytes_in"]) + (after["bytes_out"] - before["bytes_out"])
+        # 프레임 헤더: 서버→클라이언트 2~4바이트, 클라이언트→서버 마스킹 키 포함 6~8바이트
+        frame_headers = frames * 4 + (after["frames_in"] - before["frames_in"]) * 4
+        ws_bytes = (payload + frame_headers) / self.requests
+
+        self.log_result("WS http/message", f"p50 {percentile(http_ms, 50):.2f}ms, "
+                                           f"{statistics.mean(http_bytes):.0f} bytes, 헤더 "
+                                           f"{statistics.mean(http_overhead):.0f} bytes (새 연결, 완성 답변만)")
+        self.log_result("WS socket/message", f"p50 {percentile(ws_ms, 50):.2f}ms, first token "
+                                             f"{percentile(first_token_ms, 50):.2f}ms, {ws_bytes:.0f} bytes, 프레임 헤더 "
+                                             f"{frame_headers / self.requests:.0f} bytes "
+                                             f"({frames / self.requests:.0f} frames, 토큰 스트림 포함)")
+
+    def bench_suggest(self, calls: int = 10_000):
+        """자동완성: 색인 조회와 /suggest 엔드포인트 (WSGI 직접 호출) 호출당 시간"""
+        os.environ.setdefault("UPSTREAM_PROBE_INTERVAL", "0")
+        import hairgator_fast_20param as server
+
+        index = server.catalog.current.suggestion_index
+        rng = random.Random(11)
+        texts = [suggestion.text for suggestion in index.suggestions]
+        # 타이핑 중인 접두사 (1~6글자)
+        queries = []
+        for _ in range(calls):
+            text = rng.choice(texts).replace(" ", "")
+            queries.append(text[:rng.randint(1, min(6, len(text)))])
+
+        cold_us = []
+        for query in queries:
+            t0 = time.perf_counter()
+            index._search(query)
+            cold_us.append((time.perf_counter() - t0) * 1_000_000)
+
+        client = server.app.test_client()
+        endpoint_ms = []
+        started = time.perf_counter()
+        for query in queries:
+            t0 = time.perf_counter()
+            client.get("/suggest", query_string={"q": query})
+            endpoint_ms.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - started
+
+        self.log_result("Suggest index", f"{len(index)} suggestions, {len(index.keys)} keys, "
+                                         f"uncached p50 {percentile(cold_us, 50):.1f}µs, p99 {percentile(cold_us, 99):.1f}µs")
+        self.log_result("Suggest endpoint", f"{calls:,} calls, p50 {percentile(endpoint_ms, 50):.3f}ms, "
+                                            f"p99 {percentile(endpoint_ms, 99):.3f}ms, {calls / elapsed:,.0f} req/s (1 thread)")
+
+    def bench_ledger(self, months: int = 3, rows_per_minute: int = 6, tail: int = 20_000):
+        """원장: 기록 1건 시간, 수개월치 분 단위 롤업 + 롤업 전 꼬리에 대한 그룹별 조회 시간"""
+        import numpy as np
+        import ledger as ledger_module
+        from ledger import Ledger, GROUPS, TIERS, PROVIDERS, CHECKPOINT_PAD, name_id, _dtypes, _month
+
+        rng = np.random.default_rng(5)
+        categories = ["컬러링", "펌", "트리트먼트", "커트", "스타일링", "일반상담", "이미지분석"]
+        models = ["gpt-3.5-turbo", "gpt-4o-mini", "claude-3-haiku-20240307"]
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = Ledger(tmp)
+            ledger._remember(*categories, *models)
+            _, minute_dtype = _dtypes()
+
+            # 과거 months 개월치 분 단위 롤업 합성
+            now = time.time()
+            end_minute = int(now // 60) - 1
+            start_minute = end_minute - months * 30 * 1440
+            minutes = np.repeat(np.arange(start_minute, end_minute, dtype=np.uint32), rows_per_minute)
+            rows = np.zeros(len(minutes), dtype=minute_dtype)
+            rows["minute"] = minutes
+            rows["category"] = rng.choice([name_id(c) for c in categories], len(rows))
+            rows["model"] = rng.choice([name_id(m) for m in models], len(rows))
+            rows["tier"] = rng.integers(0, len(TIERS), len(rows))
+            rows["provider"] = rng.integers(0, len(PROVIDERS), len(rows))
+            rows["count"] = rng.integers(1, 20, len(rows))
+            rows["prompt"] = rows["count"] * 300
+            rows["completion"] = rows["count"] * 250
+            rows["cost"] = rows["count"] * 525
+            rows["latency_sum"] = rows["count"] * rng.uniform(5, 2500, len(rows))
+            rows["latency_max"] = rng.uniform(5, 5000, len(rows))
+            months_of = np.array([_month(m * 60) for m in range(start_minute, end_minute, 1440)])
+            for month in sorted(set(months_of.tolist())):
+                first = int(np.argmax(months_of == month)) * 1440 * rows_per_minute
+                last = first + int((months_of == month).sum()) * 1440 * rows_per_minute
+                # 롤업이 남기는 것과 같은 묶음 끝 체크포인트 행 (다음 분, 호출 세그먼트 오프셋 0)
+                checkpoint = np.zeros(1, dtype=minute_dtype)
+                checkpoint["minute"], checkpoint["pad"] = int(rows["minute"][last - 1]) + 1, CHECKPOINT_PAD
+                with open(os.path.join(tmp, f"minutes-{month}.bin"), "wb") as f:
+                    f.write(rows[first:last].tobytes() + checkpoint.tobytes())
+
+            # 끝난 시/일 집계 생성 (운영에서는 롤업마다 새로 끝난 시/일만)
+            t0 = time.perf_counter()
+            ledger.rollup()
+            self.log_result("Ledger derive", f"{len(rows):,} minute rows → {ledger.stats['hours_rows']:,} hour / "
+                                             f"{ledger.stats['days_rows']:,} day rows in "
+                                             f"{(time.perf_counter() - t0) * 1000:.0f}ms")
+
+            record_us = []
+            for i in range(tail):
+                t0 = time.perf_counter()
+                ledger.record("live", categories[i % len(categories)], models[i % len(models)], "openai",
+                              1.2, 0.3, 300, 250, 0.000525)
+                record_us.append((time.perf_counter() - t0) * 1_000_000)
+
+            self.log_result("Ledger record", f"{tail:,} records, p50 {percentile(record_us, 50):.1f}µs, "
+                                             f"p99 {percentile(record_us, 99):.1f}µs")
+            for group in GROUPS:
+                result = min((ledger.query(now - months * 30 * 86400, now + 60, group) for _ in range(3)),
+                             key=lambda r: r["query_ms"])
+                self.log_result(f"Ledger query/{group}", f"{result['scanned_rows']:,} rows scanned, "
+                                                         f"{len(result['rows'])} groups, {result['query_ms']:.1f}ms")
+
+            # 꼬리 레코드는 모두 지금 분이라 롤업 대상이 아님 → 끝난 분으로 취급해 롤업 시간 측정
+            grace, ledger_module.ROLLUP_GRACE_SECONDS = ledger_module.ROLLUP_GRACE_SECONDS, -60
+            t0 = time.perf_counter()
+            rolled = ledger.rollup()
+            self.log_result("Ledger rollup", f"{rolled:,} records in {(time.perf_counter() - t0) * 1000:.1f}ms")
+            ledger_module.ROLLUP_GRACE_SECONDS = grace
+
+    def bench_jobs(self, workers: int = 4):
+        """작업 큐: 제출 시간(요청 스레드 점유), 우선순위별 대기 시간, 처리량 (가짜 업스트림 처리 함수)"""
+        from jobs import JobQueue
+
+        with tempfile.TemporaryDirectory() as tmp:
+            job_queue = JobQueue(os.path.join(tmp, "jobs.db"), workers=workers)
+            job_queue.register("analysis", lambda payload, blob: fake_upstream(self.upstream_ms), priority=0)
+            job_queue.start()
+
+            # 배경 작업이 쌓인 상태에서 대화형 작업(우선순위 10)이 끼어드는 시간
+            submit_ms, interactive, background = [], [], []
+            started = time.perf_counter()
+            for i in range(self.requests * 2):
+                t0 = time.perf_counter()
+                if i % 4 == 3:
+                    interactive.append(job_queue.submit("analysis", {"i": i}, priority=10))
+                else:
+                    background.append(job_queue.submit("analysis", {"i": i}))
+                submit_ms.append((time.perf_counter() - t0) * 1000)
+
+            def waits(job_ids):
+                jobs = [job_queue.wait(job_id, 600) for job_id in job_ids]
+                return [(job["started_at"] - job["created_at"]) * 1000 for job in jobs]
+
+            background_wait = waits(background)
+            interactive_wait = waits(interactive)
+            elapsed = time.perf_counter() - started
+            job_queue.stop()
+
+            total = len(interactive) + len(background)
+            self.log_result("Jobs submit", f"p50 {percentile(submit_ms, 50):.2f}ms, p99 {percentile(submit_ms, 99):.2f}ms "
+                                           f"(동기 처리 시 요청당 ~{self.upstream_ms:.0f}ms 점유)")
+            self.log_result("Jobs wait", f"interactive p50 {percentile(interactive_wait, 50):.0f}ms / "
+                                         f"p95 {percentile(interactive_wait, 95):.0f}ms, background p50 "
+                                         f"{percentile(background_wait, 50):.0f}ms / p95 {percentile(background_wait, 95):.0f}ms")
+            self.log_result("Jobs throughput", f"{total} jobs, {workers} workers, {total / elapsed:.1f} jobs/s "
+                                               f"(이론치 {workers * 1000 / self.upstream_ms:.1f})")
+
+    def bench_edge(self, calls: int = 5_000):
+        """캐시 가능한 GET: 미리 직렬화한 200 / 재검증 304 / 요청마다 jsonify (WSGI 직접 호출)"""
+        os.environ.setdefault("UPSTREAM_PROBE_INTERVAL", "0")
+        import hairgator_fast_20param as server
+        from flask import jsonify
+
+        client = server.app.test_client()
+        paths = [path for path in server.edge_resources.resources if path.startswith("/styles/")][:20]
+
+        @server.app.route("/__bench_jsonify/<model_no>")
+        def bench_jsonify(model_no):
+            return jsonify(server.catalog.current.styles_by_model[model_no].to_dict())
+
+        def timed(make_request):
+            samples = []
+            for i in range(calls):
+                t0 = time.perf_counter()
+                make_request(paths[i % len(paths)])
+                samples.append((time.perf_counter() - t0) * 1000)
+            return samples
+
+        etags = {path: client.get(path).headers["ETag"] for path in paths}
+        fresh = timed(client.get)
+        revalidated = timed(lambda path: client.get(path, headers={"If-None-Match": etags[path]}))
+        dynamic = timed(lambda path: client.get("/__bench_jsonify/" + path.rsplit("/", 1)[1]))
+        body = sum(len(server.edge_resources.get(path).body) for path in paths) / len(paths)
+
+        self.log_result("Edge 200", f"p50 {percentile(fresh, 50):.3f}ms, {body:.0f} bytes (미리 직렬화)")
+        self.log_result("Edge 304", f"p50 {percentile(revalidated, 50):.3f}ms, 본문 0 bytes")
+        self.log_result("Edge jsonify", f"p50 {percentile(dynamic, 50):.3f}ms (요청마다 직렬화, 캐시 헤더 없음)")
+
+    def bench_compound(self, rounds: int = 2):
+        """복합 질문: 카테고리별 하위 답변을 순차로 vs 병렬로 (가짜 업스트림)"""
+        os.environ.setdefault("UPSTREAM_PROBE_INTERVAL", "0")
+        import hairgator_fast_20param as server
+
+        questions = [
+            "탈색 후 볼륨 펌 해도 되나요?",
+            "손상모발 트리트먼트 후 웨이브 펌 순서",
+            "애쉬 브라운 염색하고 드라이 스타일링 팁",
+            "펌 후 컬러 얼마나 기다려야 하나요",
+            "블론드 탈색 모발 케어 방법",
+            "매직 후 염색 가능한가요",
+            "볼륨 펌이랑 영양 트리트먼트 같이 해도 되나요",
+            "토닝 후 웨이브 펌 그리고 수분 케어",
+        ]
+        server.answer_provider = make_fake_provider("fake", self.upstream_ms)
+        server.answer_store = None
+
+        part_ms = []
+        original = server.get_openai_response
+
+        def timed_response(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = original(*args, **kwargs)
+            part_ms.append((time.perf_counter() - t0) * 1000)
+            return result
+
+        server.get_openai_response = timed_response
+        try:
+            detected = [q for q in questions if len(server.classify_categories(q)) > 1]
+            sequential, parallel, overhead = [], [], []
+            for _ in range(rounds):
+                for question in detected:
+                    t0 = time.perf_counter()
+                    for category in server.classify_categories(question):
+                        server.answer_category(question, category)
+                    sequential.append((time.perf_counter() - t0) * 1000)
+
+                    part_ms.clear()
+                    t0 = time.perf_counter()
+                    server.answer_chat(question)
+                    wall = (time.perf_counter() - t0) * 1000
+                    parallel.append(wall)
+                    overhead.append(wall / max(part_ms))
+        finally:
+            server.get_openai_response = original
+
+        parts = sum(len(server.classify_categories(q)) for q in detected) / max(1, len(detected))
+        self.log_result("Compound detect", f"{len(detected)}/{len(questions)} 질문이 복합, 평균 {parts:.1f}개 카테고리")
+        self.log_result("Compound sequential", f"p50 {percentile(sequential, 50):.0f}ms, p95 {percentile(sequential, 95):.0f}ms")
+        self.log_result("Compound parallel", f"p50 {percentile(parallel, 50):.0f}ms, p95 {percentile(parallel, 95):.0f}ms "
+                                             f"(가장 느린 하위 답변 대비 p50 {statistics.median(overhead):.2f}배)")
+
+    def bench_affinity(self, nodes: int = 4, keys: int = 20_000):
+        """대화 친화성: 노드 프로세스 여러 개가 같은 담당 노드를 고르는지, 노드 이탈/합류 시 이동 비율"""
+        import socket
+        import urllib.request
+
+        def free_port() -> int:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                return sock.getsockname()[1]
+
+        ports = [free_port() for _ in range(nodes)]
+        addresses = [f"127.0.0.1:{port}" for port in ports]
+        conversations = [f"conv-{i:06d}" for i in range(keys)]
+        context = multiprocessing.get_context("spawn")
+
+        def start(port: int):
+            process = context.Process(target=_affinity_node, args=(port, addresses), daemon=True)
+            process.start()
+            return process
+
+        def owners(address: str):
+            body = json.dumps(conversations).encode()
+            request = urllib.request.Request(f"http://{address}/", data=body, method="POST")
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return json.loads(response.read())
+
+        def settle(alive: List[str], expected: int):
+            """모든 살아 있는 노드의 링이 expected 개 노드가 될 때까지 대기 후 담당 노드 목록"""
+            deadline = time.monotonic() + 15
+            while True:
+                try:
+                    results = [owners(address) for address in alive]
+                    if all(len(result["healthy"]) == expected for result in results):
+                        return [result["owners"] for result in results]
+                except OSError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("친화성 링이 수렴하지 않았습니다")
+                time.sleep(0.1)
+
+        # 마지막 노드는 나중에 합류
+        processes = {address: start(port) for address, port in zip(addresses[:-1], ports[:-1])}
+        try:
+            before_join = settle(addresses[:-1], nodes - 1)
+            processes[addresses[-1]] = start(ports[-1])
+            full = settle(addresses, nodes)
+            leaving = addresses[0]
+            processes.pop(leaving).terminate()
+            after_leave = settle(addresses[1:], nodes - 1)
+        finally:
+            for process in processes.values():
+                process.terminate()
+
+        agree = all(result == full[0] for result in full) and all(result == after_leave[0] for result in after_leave)
+        joined = [a != b for a, b in zip(before_join[0], full[0])]
+        left = [a != b for a, b in zip(full[0], after_leave[0])]
+        joined_only_new = all(owner == addresses[-1] for owner, moved in zip(full[0], joined) if moved)
+        left_only_gone = all(owner == leaving for owner, moved in zip(full[0], left) if moved)
+        share = Counter(full[0])
+        modulo_moved = sum(zlib.crc32(key.encode()) % (nodes - 1) != zlib.crc32(key.encode()) % nodes
+                           for key in conversations)
+
+        self.log_result("Affinity agreement", f"{nodes}개 노드 프로세스가 {keys:,}개 대화 키에 같은 담당 노드: "
+                                              f"{'✅' if agree else '❌'}")
+        self.log_result("Affinity balance", f"노드별 키 비율 {min(share.values()) / keys * 100:.1f}% ~ "
+                                            f"{max(share.values()) / keys * 100:.1f}% (이상적 {100 / nodes:.1f}%)")
+        self.log_result("Affinity join", f"{sum(joined) / keys * 100:.1f}% 이동 (이상적 {100 / nodes:.1f}%), "
+                                         f"새 노드로만 이동 {'✅' if joined_only_new else '❌'}")
+        self.log_result("Affinity leave", f"{sum(left) / keys * 100:.1f}% 이동, 떠난 노드 키만 이동 "
+                                          f"{'✅' if left_only_gone else '❌'} (모듈로 해시면 {modulo_moved / keys * 100:.0f}%)")
+
+    def bench_tracing(self, calls: int = 400):
+        """분산 추적: /chat 추적 비용, 꼬리 샘플링(느린 trace 만 보관), 수집기 대역 수신과 traceparent 전파"""
+        os.environ.setdefault("UPSTREAM_PROBE_INTERVAL", "0")
+        import hairgator_fast_20param as server
+        from providers import Provider, Usage
+        from tracing import tracer, BatchExporter
+
+        received = []
+
+        class Collector(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                for resource in payload["resourceSpans"]:
+                    for scope in resource["scopeSpans"]:
+                        received.extend(scope["spans"])
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        collector = ThreadingHTTPServer(("127.0.0.1", 0), Collector)
+        threading.Thread(target=collector.serve_forever, daemon=True).start()
+
+        class InstantProvider(Provider):
+            def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+                yield Usage(len(prompt) // 2, 0)
+                for _ in range(40):
+                    yield "토큰 "
+
+        client = server.app.test_client()
+        server.answer_store = None
+        saved = (tracer.exporter, tracer.enabled, tracer.slow_ms)
+        tracer.exporter = BatchExporter(url=f"http://127.0.0.1:{collector.server_port}/v1/traces", flush_seconds=0.2)
+
+        def run(prefix: str, headers=None):
+            samples = []
+            for i in range(calls):
+                t0 = time.perf_counter()
+                client.post("/chat", json={"message": f"애쉬 브라운 {prefix} {i}"}, headers=headers)
+                samples.append((time.perf_counter() - t0) * 1000)
+            return samples
+
+        try:
+            # 1) 추적 비용: 업스트림 지연 0 으로 요청 처리 자체 시간 비교
+            server.answer_provider = InstantProvider("instant")
+            tracer.enabled = False
+            run("warm")
+            off = run("off")
+            tracer.enabled, tracer.slow_ms = True, 1e9
+            on = run("on")
+
+            # 2) 꼬리 샘플링: 가짜 업스트림 (50ms, 5% 는 8배) 중 느린 trace 만 보관
+            server.answer_provider = make_fake_provider("fake", 50.0, tail_ratio=0.05, tail_factor=8.0)
+            tracer.slow_ms = 200.0
+            before = tracer.snapshot()
+            parent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+            tail = run("tail", headers={"traceparent": parent})
+            time.sleep(0.6)
+        finally:
+            tracer.exporter, tracer.enabled, tracer.slow_ms = saved
+            collector.shutdown()
+
+        slow = sum(1 for ms in tail if ms >= 200.0)
+        kept = tracer.snapshot()["kept"] - before["kept"]
+        roots = [span for span in received if span.get("parentSpanId") == "00f067aa0ba902b7"]
+        names = Counter(span["name"] for span in received if span["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736")
+        propagated = bool(roots) and all(span["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736" for span in roots)
+
+        self.log_result("Tracing overhead", f"/chat p50 {percentile(off, 50):.3f}ms → {percentile(on, 50):.3f}ms "
+                                            f"(+{percentile(on, 50) - percentile(off, 50):.3f}ms, 모든 trace 생성/판단)")
+        self.log_result("Tracing tail sampling", f"{calls}개 중 느린 요청 {slow}개, 보관 {kept}개 trace "
+                                                 f"({kept / calls * 100:.1f}%)")
+        self.log_result("Tracing export", f"수집기 수신 {len(received)} spans, traceparent 이어받음 "
+                                          f"{'✅' if propagated else '❌'}, span 종류 {dict(names)}")
+
+    def bench_encoding(self, rounds: int = 20):
+        """응답 인코딩: Flask 기본(\\uXXXX 이스케이프) vs UTF-8 그대로(orjson), 그리고 gzip/brotli 크기와 시간 (실제 로컬 답변)"""
+        import gzip
+        import hairgator_fast_20param as server
+        from flask.json.provider import DefaultJSONProvider
+        from response_encoding import (FastJSONProvider, ResponseCompressor, compress, available_encodings,
+                                       RESPONSE_COMPRESS_MIN_BYTES, orjson)
+        from werkzeug.datastructures import Accept
+
+        # 자동완성 제안 답변 + 스타일 포뮬러/파라미터 설명 + 업스트림 없는 기본 레시피
+        messages = [f"{model_no} 파라미터" for model_no in list(server.catalog.current.styles_by_model)[:40]]
+        messages += [f"{parameter.label} 뭐야" for parameter in server.catalog.current.parameter_base.parameters]
+        messages += ["애쉬 브라운 레시피 알려줘", "레이어드 컷 방법", "볼륨 펌 약제", "손상모 트리트먼트"]
+        payloads = [server.answer_chat(message) for message in messages]
+        for suggestion in server.catalog.current.suggestion_index.suggestions:
+            picked = server.suggestion_answer(suggestion.id)
+            if picked:
+                payloads.append(dict(server.answer_payload(picked[1], picked[0], picked[2]),
+                                     timestamp='2026-10-19T12:00:00.000000'))
+
+        default = DefaultJSONProvider(server.app)
+        fast = FastJSONProvider(server.app)
+
+        def encode_ms(encode):
+            samples = []
+            for _ in range(rounds):
+                t0 = time.perf_counter()
+                for payload in payloads:
+                    encode(payload)
+                samples.append((time.perf_counter() - t0) * 1000 / len(payloads))
+            return percentile(samples, 50)
+
+        with server.app.app_context():
+            before_ms = encode_ms(lambda payload: default.response(payload).get_data())
+            after_ms = encode_ms(lambda payload: fast.response(payload).get_data())
+            before = [len(default.response(payload).get_data()) for payload in payloads]
+            after = [fast.dumps_bytes(payload) for payload in payloads]
+
+        # 프로세스 안에서 결과가 같은지 (바이트는 달라도 같은 JSON)
+        same = all(json.loads(body) == json.loads(json.dumps(payload)) for body, payload in zip(after, payloads))
+        large = [body for body in after if len(body) >= RESPONSE_COMPRESS_MIN_BYTES]
+        self.log_result("Encoding corpus", f"실제 답변 {len(payloads)}개, {RESPONSE_COMPRESS_MIN_BYTES}B 이상 "
+                                           f"{len(large)}개, 직렬화 결과 동일 {'✅' if same else '❌'}")
+        self.log_result("Encoding JSON size", f"평균 {statistics.mean(before):.0f}B → {statistics.mean([len(b) for b in after]):.0f}B "
+                                              f"({(1 - sum(map(len, after)) / sum(before)) * 100:.1f}% 감소, \\uXXXX → UTF-8)")
+        self.log_result("Encoding JSON time", f"답변당 {before_ms * 1000:.1f}µs → {after_ms * 1000:.1f}µs "
+                                              f"(Flask 기본 json → {'orjson' if orjson else 'json'})")
+
+        # 압축: 임계값 이상만, 동적 답변 수준(gzip 6 / br 5)
+        gzip_escaped = sum(len(gzip.compress(default.dumps(payload).encode(), 6, mtime=0))
+                           for payload, body in zip(payloads, after) if len(body) >= RESPONSE_COMPRESS_MIN_BYTES)
+        for encoding in available_encodings():
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                compressed = [compress(body, encoding) for body in large]
+            elapsed = (time.perf_counter() - t0) * 1000 / rounds / max(len(large), 1)
+            self.log_result(f"Encoding {encoding}", f"{RESPONSE_COMPRESS_MIN_BYTES}B 이상 답변 평균 "
+                                                    f"{statistics.mean(map(len, large)):.0f}B → "
+                                                    f"{statistics.mean(map(len, compressed)):.0f}B "
+                                                    f"(이스케이프 JSON + {encoding}: {gzip_escaped / len(large):.0f}B), "
+                                                    f"압축 {elapsed * 1000:.0f}µs/답변")
+
+        # /chat 전체 경로: Accept-Encoding 협상 후 전송 바이트
+        compressor = ResponseCompressor()
+        accept = Accept([('gzip', 1), ('br', 1)])
+        sent = 0
+        with server.app.app_context():
+            for payload in payloads:
+                sent += len(compressor.process(fast.response(payload), accept).get_data())
+        self.log_result("Encoding on the wire", f"Flask 기본 {sum(before) / 1024:.1f}KB → {sent / 1024:.1f}KB "
+                                                f"({sent / sum(before) * 100:.1f}%), 압축 {compressor.stats['compressed']}개 / "
+                                                f"작은 응답 그대로 {compressor.stats['skipped_small']}개")
+
+    def bench_answer_format(self, token_ms: float = 20.0, rounds: int = 3):
+        """답변 형식: 예전 HTML 출력 vs 구조화 JSON 출력 토큰 수와 end-to-end 지연 (같은 내용, 가짜 스트리밍 제공자)"""
+        os.environ.setdefault("UPSTREAM_PROBE_INTERVAL", "0")
+        import hairgator_fast_20param as server
+        from answer_schema import Answer, FIELDS
+        from providers import Provider, Usage
+
+        try:
+            import codecs
+            import tiktoken
+            encoding = tiktoken.get_encoding("o200k_base")
+
+            def pieces(text):
+                # 토큰 경계가 UTF-8 문자 중간일 수 있어 점진 디코딩 (빈 조각도 토큰 하나)
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                return [decoder.decode(encoding.decode_single_token_bytes(token)) for token in encoding.encode(text)]
+            counter = "tiktoken o200k_base"
+        except ImportError:
+            # providers.estimate_tokens 와 같은 근사 (약 2자당 1토큰)
+            def pieces(text):
+                return [text[i:i + 2] for i in range(0, len(text), 2)]
+            counter = "근사, 2자당 1토큰"
+
+        # 카테고리별 같은 내용을 두 형식으로: 예전 프롬프트가 요구한 HTML(제목/이모지/강조/전문가 문구 포함) vs 짧은 키 JSON
+        outputs = []
+        for recipe_type, data in server.HAIR_RECIPES.items():
+            recipes = data["recipes"]
+            answer = Answer(
+                title=f"{recipe_type} 전문 레시피",
+                steps=[f"{recipe} 기준으로 모발 진단 후 구역별 도포" for recipe in recipes[:3]],
+                ratios=["1제:2제 = 1:1.5, 손상부는 저농도로 분리"],
+                times=["도포 후 20-30분, 손상부는 10분 단축"],
+                cautions=["패치 테스트 24시간 전 실시", "모발 상태 수시 체크"],
+                tips=["뿌리-중간-끝 순서로 시차 도포하면 얼룩이 줄어듭니다"],
+            )
+            compact = {"t": answer.title}
+            compact.update({key: list(getattr(answer, name)) for key, name, _ in FIELDS})
+            outputs.append((server.render_html(answer),
+                            json.dumps(compact, ensure_ascii=False, separators=(",", ":"))))
+
+        html_tokens = [len(pieces(html)) for html, _ in outputs]
+        json_tokens = [len(pieces(compact)) for _, compact in outputs]
+        self.log_result("Answer tokens", f"HTML 평균 {statistics.mean(html_tokens):.0f} → JSON {statistics.mean(json_tokens):.0f} "
+                                         f"출력 토큰 ({(1 - sum(json_tokens) / sum(html_tokens)) * 100:.1f}% 감소, {counter})")
+
+        class ReplayProvider(Provider):
+            """정해진 출력을 토큰 단위로 token_ms 간격 스트리밍"""
+            text = ""
+
+            def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+                yield Usage(len(prompt) // 2, 0)
+                time.sleep(self.upstream_s)
+                for piece in pieces(self.text):
+                    yield piece
+                    time.sleep(token_ms / 1000.0)
+
+        provider = ReplayProvider("replay", 0.15, 0.6)
+        provider.upstream_s = self.upstream_ms / 1000.0 / 4
+        server.answer_provider = provider
+        server.answer_store = None
+
+        latency = {"html": [], "json": []}
+        parsed = 0
+        for _ in range(rounds):
+            for (recipe_type, data), (html, compact) in zip(server.HAIR_RECIPES.items(), outputs):
+                for form, text in (("html", html), ("json", compact)):
+                    provider.text = text
+                    t0 = time.perf_counter()
+                    answer = server.get_openai_response(f"{recipe_type} 방법", recipe_type, data["recipes"])
+                    latency[form].append((time.perf_counter() - t0) * 1000)
+                    if form == "json" and not answer.html:
+                        parsed += 1
+        self.log_result("Answer latency", f"HTML p50 {percentile(latency['html'], 50):.0f}ms → JSON p50 "
+                                          f"{percentile(latency['json'], 50):.0f}ms (토큰당 {token_ms:.0f}ms, "
+                                          f"첫 토큰 {provider.upstream_s * 1000:.0f}ms)")
+        self.log_result("Answer schema", f"JSON 검증 통과 {parsed}/{len(latency['json'])}, 서버 측 HTML 렌더링 "
+                                         f"{self._render_us(server, outputs):.1f}µs/답변 (예전 클라이언트용)")
+
+    def _render_us(self, server, outputs, repeat: int = 2000):
+        from answer_schema import parse_answer
+        answers = [parse_answer(compact) for _, compact in outputs]
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for answer in answers:
+                server.render_html(answer)
+        return (time.perf_counter() - t0) * 1e6 / (repeat * len(answers))
+
+    def bench_ingest(self, readers: int = 4, seconds: float = 3.0, batch: int = 20):
+        """카탈로그 온라인 반영 중 읽기 지연: 반영 없음 vs 스냅숏 교체 vs 읽기도 잠그는 방식 (같은 변경 배치)"""
+        os.environ.setdefault("UPSTREAM_PROBE_INTERVAL", "0")
+        import hairgator_fast_20param as server
+        from ingest import CatalogState
+
+        base = server.catalog.current
+        styles = list(base.styles)
+        messages = [f"{style.name} 스타일" for style in styles[:30]] + [style.model_no for style in styles[:30]]
+        messages += ["애쉬 브라운 레시피", "볼륨 펌 시간", "손상모 케어", "에쉬브라운", "헤드스파 순서"]
+        rng = random.Random(5)
+
+        def changes(round_no):
+            """기존 스타일 소개 수정 + 새 스타일 추가/삭제 + 레시피 카테고리 교체"""
+            picked = rng.sample(styles, min(batch, len(styles)))
+            batch_changes = [{"kind": "style", "op": "upsert",
+                              "record": {"model_no": style.model_no, "intro": f"{style.intro} ({round_no})"}}
+                             for style in picked]
+            batch_changes.append({"kind": "style", "op": "upsert",
+                                  "record": {"model_no": "FHL9999", "intro": f"벤치 스타일 {round_no}!"}})
+            batch_changes.append({"kind": "recipe", "op": "upsert",
+                                  "record": {"category": "헤드스파", "keywords": ["헤드스파", "두피"],
+                                             "recipes": [f"🧖 두피 스케일링 {round_no}분"]}})
+            return batch_changes
+
+        def run(mode):
+            server.catalog = CatalogState(base, server.precomputed_table, journal_path="")
+            lock = threading.Lock()
+            stop = threading.Event()
+            samples, torn, publishes = [], [0], []
+
+            def read(message):
+                snapshot = server.catalog.view()
+                server.classify_category(message)
+                server.match_styles(message)
+                snapshot.suggestion_index.search(message[:3])
+                # 게시된 스냅숏은 항상 완전해야 함 (스타일 목록과 모델 번호 사전이 같은 시점)
+                if len(snapshot.styles) != len(snapshot.styles_by_model):
+                    torn[0] += 1
+
+            def reader(seed):
+                local = random.Random(seed)
+                while not stop.is_set():
+                    message = local.choice(messages)
+                    t0 = time.perf_counter()
+                    if mode == "locked":
+                        with lock, server.catalog.pin():
+                            read(message)
+                    else:
+                        with server.catalog.pin():
+                            read(message)
+                    samples.append((time.perf_counter() - t0) * 1_000_000)
+
+            def writer():
+                round_no = 0
+                while not stop.is_set():
+                    round_no += 1
+                    t0 = time.perf_counter()
+                    if mode == "locked":
+                        with lock:
+                            server.catalog.apply(changes(round_no))
+                    else:
+                        server.catalog.apply(changes(round_no))
+                    publishes.append((time.perf_counter() - t0) * 1000)
+
+            threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(readers)]
+            if mode != "idle":
+                threads.append(threading.Thread(target=writer))
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            return samples, torn[0], publishes
+
+        original = server.catalog
+        try:
+            results = {mode: run(mode) for mode in ("idle", "snapshot", "locked")}
+        finally:
+            server.catalog = original
+
+        for mode, label in (("idle", "반영 없음"), ("snapshot", "스냅숏 교체"), ("locked", "읽기 잠금")):
+            samples, torn, publishes = results[mode]
+            detail = (f", 반영 {len(publishes)}회 p50 {percentile(publishes, 50):.1f}ms ({batch + 2}개 변경/배치)"
+                      if publishes else "")
+            self.log_result(f"Ingest {mode}", f"{label}: 읽기 {len(samples):,}회 p50 {percentile(samples, 50):.1f}µs, "
+                                              f"p99 {percentile(samples, 99):.1f}µs, max {max(samples) / 1000:.1f}ms, "
+                                              f"불완전 스냅숏 {torn}{detail}")
+
+    def bench_pwa(self, url: str = "http://127.0.0.1:5000", rtt_ms: float = 0.0, mbps: float = 0.0):
+        """오프라인 우선 셸: 헤드리스 크롬으로 첫 방문 / 재방문 / 오프라인 로드 시간 (실행 중인 서버 필요)
+
+        브라우저는 로컬 중계(ShapedRelay)를 거쳐 접속하고, 중계를 닫아 오프라인을 흉내 냅니다.
+        playwright 가 없으면 PyQt6 QtWebEngine (Chromium) 으로 같은 순서를 측정합니다.
+        """
+        drivers = []
+        try:
+            from playwright.sync_api import sync_playwright
+            drivers.append(("playwright", lambda page_url, relay: self._pwa_playwright(sync_playwright, page_url, relay)))
+        except ImportError:
+            pass
+        try:
+            # 화면 없는 서버에서도 실행되도록
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            os.environ.setdefault("QTWEBENGINE_CHROMIUM_FLAGS", "--disable-gpu")
+            from PyQt6 import QtWebEngineCore  # noqa: F401
+            drivers.append(("QtWebEngine", self._pwa_qtwebengine))
+        except ImportError:
+            pass
+        if not drivers:
+            print("⚠️ playwright/PyQt6 미설치: pip install playwright && python -m playwright install chromium "
+                  "(또는 pip install PyQt6 PyQt6-WebEngine)")
+            return
+
+        # 브라우저 실행 파일이 없는 등 실패하면 다음 드라이버로
+        target = urlparse(url)
+        for driver, measure in drivers:
+            relay = ShapedRelay(target.hostname or "127.0.0.1", target.port or 80, rtt_ms, mbps)
+            try:
+                cold, no_sw, warm, offline, cached_answer_ms = measure(f"http://127.0.0.1:{relay.port}/", relay)
+                break
+            except Exception as e:
+                print(f"⚠️ {driver} 헤드리스 측정 실패: {str(e).splitlines()[0]}")
+            finally:
+                relay.stop()
+        else:
+            return
+
+        def describe(t):
+            fcp = f"{t['fcp']:.1f}ms" if t["fcp"] is not None else "-"
+            return f"FCP {fcp}, DOMContentLoaded {t['dcl']:.1f}ms, 전송 {t['transfer']} bytes"
+
+        link = f", RTT {rtt_ms:.0f}ms / {mbps:g}Mbps" if rtt_ms or mbps else ""
+        print(f"   ({driver}{link})")
+        self.log_result("PWA cold", describe(cold))
+        self.log_result("PWA warm (no SW)", describe(no_sw))
+        self.log_result("PWA warm", describe(warm))
+        self.log_result("PWA offline", describe(offline))
+        self.log_result("PWA cached answer", f"{cached_answer_ms:.1f}ms until stored answer painted")
+
+    def _pwa_playwright(self, sync_playwright, url: str, relay: "ShapedRelay"):
+        """playwright 크로미움: (cold, no_sw, warm, offline, 저장 답변 표시 ms)"""
+        with sync_playwright() as p:
+            browser = p.chromium.launch()
+            context = browser.new_context()
+            page = context.new_page()
+
+            page.goto(url, wait_until="load")
+            cold = page.evaluate(f"() => {PWA_TIMING_JS}")
+            page.evaluate("() => navigator.serviceWorker.ready")
+
+            # 비교 기준: 서비스 워커 없이 HTTP 캐시만으로 재방문
+            plain = browser.new_context(service_workers="block")
+            plain_page = plain.new_page()
+            plain_page.goto(url, wait_until="load")
+            plain_page.reload(wait_until="load")
+            no_sw = plain_page.evaluate(f"() => {PWA_TIMING_JS}")
+            plain.close()
+
+            # 답변 하나를 IndexedDB 에 저장
+            page.fill("#userInput", PWA_QUESTION)
+            page.click("#sendBtn")
+            page.wait_for_function("() => !document.getElementById('sendBtn').disabled", timeout=60000)
+
+            page.reload(wait_until="load")
+            warm = page.evaluate(f"() => {PWA_TIMING_JS}")
+
+            shown = page.locator(".bot-message").count()
+            t0 = time.perf_counter()
+            page.fill("#userInput", PWA_QUESTION)
+            page.click("#sendBtn")
+            page.wait_for_function(f"() => document.querySelectorAll('.bot-message').length > {shown}")
+            cached_answer_ms = (time.perf_counter() - t0) * 1000
+
+            relay.stop()
+            page.reload(wait_until="load")
+            offline = page.evaluate(f"() => {PWA_TIMING_JS}")
+            browser.close()
+        return cold, no_sw, warm, offline, cached_answer_ms
+
+    def _pwa_qtwebengine(self, url: str, relay: "ShapedRelay"):
+        """PyQt6 QtWebEngine: playwright 와 같은 순서 (오프스크린에서는 FCP 가 기록되지 않음)"""
+        from PyQt6.QtCore import QUrl, QTimer, QEventLoop
+        from PyQt6.QtWidgets import QApplication
+        from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile
+
+        app = QApplication.instance() or QApplication([sys.argv[0]])
+
+        def pause(seconds):
+            loop = QEventLoop()
+            QTimer.singleShot(int(seconds * 1000), loop.quit)
+            loop.exec()
+
+        def evaluate(script):
+            box = []
+            loop = QEventLoop()
+            page.runJavaScript(script, lambda result: (box.append(result), loop.quit()))
+            loop.exec()
+            return box[0] if box else None
+
+        def wait_for(script, timeout=60.0):
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                result = evaluate(script)
+                if result:
+                    return result
+                pause(0.005)
+            raise TimeoutError(script)
+
+        def load(target=None):
+            loop = QEventLoop()
+            page.loadFinished.connect(loop.quit)
+            if target:
+                page.load(QUrl(target))
+            else:
+                page.triggerAction(QWebEnginePage.WebAction.Reload)
+            loop.exec()
+            page.loadFinished.disconnect(loop.quit)
+            return json.loads(wait_for(f"JSON.stringify({PWA_TIMING_JS})"))
+
+        def sw_ready():
+            evaluate("navigator.serviceWorker.ready.then(() => { window.__swReady = true; }), true")
+            wait_for("window.__swReady === true")
+
+        # 실행마다 빈 저장소 (이전 서비스 워커/캐시 없이 첫 방문)
+        profile = QWebEngineProfile(f"bench-pwa-{os.getpid()}-{time.time_ns()}")
+        profile.setPersistentStoragePath(tempfile.mkdtemp(prefix="bench-pwa-"))
+        profile.setCachePath(tempfile.mkdtemp(prefix="bench-pwa-cache-"))
+        page = QWebEnginePage(profile)
+        try:
+            cold = load(url)
+            sw_ready()
+
+            # 비교 기준: 워커 등록 해제 + 셸 캐시 삭제 후 재방문 (HTTP 캐시만)
+            evaluate("navigator.serviceWorker.getRegistrations()"
+                     ".then(rs => Promise.all(rs.map(r => r.unregister())))"
+                     ".then(() => caches.keys()).then(ks => Promise.all(ks.map(k => caches.delete(k))))"
+                     ".then(() => { window.__swGone = true; }), true")
+            wait_for("window.__swGone === true")
+            no_sw = load()
+            sw_ready()
+
+            # 답변 하나를 IndexedDB 에 저장
+            ask = (f"document.getElementById('userInput').value = {json.dumps(PWA_QUESTION)}; "
+                   f"sendMessage(); true")
+            evaluate(ask)
+            wait_for("document.querySelectorAll('.bot-message').length > 1 "
+                     "&& !document.getElementById('sendBtn').disabled")
+
+            warm = load()
+            shown = evaluate("document.querySelectorAll('.bot-message').length")
+            t0 = time.perf_counter()
+            evaluate(ask)
+            wait_for(f"document.querySelectorAll('.bot-message').length > {shown}")
+            cached_answer_ms = (time.perf_counter() - t0) * 1000
+
+            relay.stop()
+            offline = load()
+        finally:
+            page.deleteLater()
+            pause(0.1)
+            app.processEvents()
+        return cold, no_sw, warm, offline, cached_answer_ms
+
+    def run_all(self):
+        print("🎨 헤어게이터 성능 측정 시작")
+        print("=" * 60)
+        self.bench_store()
+        self.bench_pool()
+        self.bench_hedge()
+        self.bench_image()
+        self.bench_phash()
+        self.bench_features()
+        self.bench_hangul()
+        self.bench_ws()
+        self.bench_suggest()
+        self.bench_ledger()
+        self.bench_jobs()
+        self.bench_edge()
+        self.bench_compound()
+        self.bench_affinity()
+        self.bench_tracing()
+        self.bench_encoding()
+        self.bench_answer_format()
+        self.bench_ingest()
+        print("=" * 60)
+        print("🎉 측정 완료!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="헤어게이터 성능 측정 스크립트")
+    parser.add_argument("--bench", choices=["store", "pool", "hedge", "image", "phash", "features", "hangul", "ws", "suggest", "ledger", "jobs", "edge", "compound", "affinity", "tracing", "encoding", "answer", "ingest", "pwa", "all"], default="all", help="실행할 측정 선택")
+    parser.add_argument("--upstream-ms", type=float, default=800.0, help="가짜 업스트림 평균 지연 (ms)")
+    parser.add_argument("--requests", type=int, default=50, help="측정 요청 수")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="pwa 측정 대상 서버 (실행 중이어야 함)")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="pwa 측정 시 중계 왕복 지연 (ms)")
+    parser.add_argument("--mbps", type=float, default=0.0, help="pwa 측정 시 중계 하향 대역폭 (0이면 제한 없음)")
+    args = parser.parse_args()
+
+    bench = HairgatorBenchmark(args.upstream_ms, args.requests)
+
+    if args.bench == "all":
+        bench.run_all()
+    elif args.bench == "store":
+        bench.bench_store()
+    elif args.bench == "pool":
+        bench.bench_pool()
+    elif args.bench == "hedge":
+        bench.bench_hedge()
+    elif args.bench == "image":
+        bench.bench_image()
+    elif args.bench == "phash":
+        bench.bench_phash()
+    elif args.bench == "features":
+        bench.bench_features()
+    elif args.bench == "hangul":
+        bench.bench_hangul()
+    elif args.bench == "ws":
+        bench.bench_ws()
+    elif args.bench == "suggest":
+        bench.bench_suggest()
+    elif args.bench == "ledger":
+        bench.bench_ledger()
+    elif args.bench == "jobs":
+        bench.bench_jobs()
+    elif args.bench == "edge":
+        bench.bench_edge()
+    elif args.bench == "compound":
+        bench.bench_compound()
+    elif args.bench == "affinity":
+        bench.bench_affinity()
+    elif args.bench == "tracing":
+        bench.bench_tracing()
+    elif args.bench == "encoding":
+        bench.bench_encoding()
+    elif args.bench == "answer":
+        bench.bench_answer_format()
+    elif args.bench == "ingest":
+        bench.bench_ingest()
+    elif args.bench == "pwa":
+        bench.bench_pwa(args.url, args.rtt_ms, args.mbps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_micro.py
+헤어게이터 채팅 핫패스 마이크로벤치마크 (기준선 저장 + 유의한 성능 저하 검출)
+
+업스트림은 즉시 답하는 가짜 제공자로 대체하고, 각 항목을 여러 라운드 반복해
+라운드별 호출당 µs 를 표본으로 모읍니다. 프로세스마다 메모리 배치/해시 시드가 달라
+생기는 편차도 표본에 들어가도록 여러 자식 프로세스에서 나눠 측정합니다.
+기준선(micro_baseline.json)과 비교해
+Mann-Whitney U 검정으로 유의(p < --alpha)하면서 중앙값이 --threshold 이상 느려진
+항목이 있으면 종료 코드 1 로 실패합니다. 머신 속도 변화(CPU 클럭, 이웃 부하)는
+서버 코드와 무관한 고정 작업(_calibration)의 기준선 대비 비율로 보정합니다.
+
+사용법:
+    python bench_micro.py                    # 기준선과 비교
+    python bench_micro.py --save             # 현재 측정값을 기준선으로 저장
+    python bench_micro.py -k prompt -k home  # 이름에 포함된 항목만
+"""
+
+import os
+import sys
+import gc
+import json
+import math
+import time
+import argparse
+import subprocess
+import statistics
+from typing import Callable, Dict, List, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BASE_DIR, "micro_baseline.json")
+
+MESSAGES = [
+    "애쉬 브라운 레시피 알려주세요",
+    "볼륨 펌 시간은 얼마나 해야 하나요",
+    "손상모발 트리트먼트 순서",
+    "FAL3004 엘레강스 웨이브 컷 방법",
+    "탈색 후 그레이 애쉬 토닝",
+    "오늘 날씨 어때요",
+]
+
+STUB_TITLE = "가짜 업스트림 답변"
+STUB_ANSWER = json.dumps({"t": STUB_TITLE, "s": ["가짜 시술 단계 %d" % i for i in range(1, 5)],
+                          "r": ["1제:2제 = 1:1"], "m": ["20분"], "c": ["가짜 주의사항"], "p": ["가짜 프로 팁"]},
+                         ensure_ascii=False, separators=(",", ":"))
+CALIBRATION = "_calibration"
+
+
+def calibration(i):
+    """머신 속도 보정용 고정 작업 (문자열/딕셔너리/정수 연산)"""
+    counts = {}
+    for word in ("애쉬 브라운 레시피 " * 8).split():
+        counts[word] = counts.get(word, 0) + len(word) * i
+    return sum(counts.values())
+
+
+def prepare_env():
+    """서버 모듈 import 전 환경 (업스트림/작업 스레드/원장 없이 순수 코드 경로만)"""
+    os.environ["OPENAI_API_KEY"] = ""
+    os.environ["ANTHROPIC_API_KEY"] = ""
+    os.environ["OPENAI_FORCE_UPGRADE"] = "false"
+    os.environ["UPSTREAM_PROBE_INTERVAL"] = "0"
+    os.environ["JOB_WORKERS"] = "0"
+    os.environ["LEDGER_ROLLUP_SECONDS"] = "0"
+
+
+def stub_provider():
+    """토큰을 바로 내보내는 가짜 제공자"""
+    from providers import Provider, Usage
+
+    class StubProvider(Provider):
+        name = "stub"
+
+        def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+            for piece in STUB_ANSWER.split(" "):
+                yield piece + " "
+            yield Usage(len(prompt) // 2, len(STUB_ANSWER) // 2)
+
+    return StubProvider("stub-model")
+
+
+def build_cases(server) -> Dict[str, Callable[[int], None]]:
+    """이름 → fn(i), i 번째 호출 (입력을 돌려 가며 사용)"""
+    from flask import jsonify
+
+    recipes = server.HAIR_RECIPES["컬러링"]["recipes"]
+    counter = [0]
+
+    def analyze_cold(i):
+        # 매번 새 문장 → classify_category 캐시 미스
+        counter[0] += 1
+        server.analyze_hair_query(f"{MESSAGES[i % len(MESSAGES)]} {counter[0]}")
+
+    def analyze_cached(i):
+        server.analyze_hair_query(MESSAGES[i % len(MESSAGES)])
+
+    def prompt(i):
+        server.build_answer_prompt(MESSAGES[i % len(MESSAGES)], "컬러링", recipes)
+
+    def basic_html(i):
+        server.render_html(server.basic_recipe_answer("컬러링", recipes))
+
+    def fallback_html(i):
+        server.render_html(server.fallback_answer("컬러링", recipes, "Connection timed out while reading upstream"))
+
+    chat_result = dict(server.answer_payload(server.parse_answer(STUB_ANSWER), "컬러링", "live"),
+                       timestamp="2024-05-01T12:00:00.000000")
+
+    def jsonify_chat(i):
+        with server.app.app_context():
+            jsonify(chat_result).get_data()
+
+    def home(i):
+        with server.app.test_request_context("/"):
+            server.home()
+
+    # 가짜 제공자 답변인지 확인 (호출 오류로 폴백 답변을 재면 기준선 비교가 의미 없음)
+    def openai_response_stub(i):
+        message = MESSAGES[i % len(MESSAGES)]
+        recipe_type, recipes_for = server.analyze_hair_query(message)
+        answer = server.get_openai_response(message, recipe_type, recipes_for)
+        assert answer.title == STUB_TITLE, f"폴백 답변: {answer.title!r}"
+
+    client = server.app.test_client()
+
+    def chat_endpoint(i):
+        answer = client.post("/chat", json={"message": MESSAGES[i % len(MESSAGES)]}).get_json()["answer"]
+        assert answer.get("title") == STUB_TITLE, f"폴백 답변: {answer.get('title')!r}"
+
+    return {
+        "analyze_hair_query/cold": analyze_cold,
+        "analyze_hair_query/cached": analyze_cached,
+        "build_answer_prompt": prompt,
+        "basic_recipe_answer": basic_html,
+        "fallback_answer": fallback_html,
+        "jsonify_chat_response": jsonify_chat,
+        "home_render": home,
+        "get_openai_response/stub": openai_response_stub,
+        "post_chat/stub": chat_endpoint,
+    }
+
+
+def measure(fn: Callable[[int], None], rounds: int, min_round_seconds: float) -> List[float]:
+    """라운드별 호출당 µs (라운드 길이는 min_round_seconds 이상이 되도록 자동 보정)"""
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for i in range(number):
+            fn(i)
+        if time.perf_counter() - t0 >= min_round_seconds or number >= 1_000_000:
+            break
+        number *= 2
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            for i in range(number):
+                fn(i)
+            samples.append((time.perf_counter() - t0) / number * 1_000_000)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples
+
+
+def mann_whitney_p(a: List[float], b: List[float]) -> float:
+    """양측 Mann-Whitney U 검정 p 값 (정규 근사, 동순위 보정)"""
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 1.0
+    combined = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[k] = rank
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+
+    rank_sum_a = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum_a - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return math.erfc(max(z, 0.0) / math.sqrt(2))
+
+
+def compare(current: List[float], baseline: List[float], alpha: float, threshold: float) -> Tuple[str, float, float]:
+    """(판정, 중앙값 변화율, p 값)"""
+    change = statistics.median(current) / statistics.median(baseline) - 1
+    p = mann_whitney_p(current, baseline)
+    if p < alpha and change > threshold:
+        return "regression", change, p
+    if p < alpha and change < -threshold:
+        return "improvement", change, p
+    return "same", change, p
+
+
+def run_worker(keys: List[str], rounds: int, min_round_seconds: float) -> Dict[str, List[float]]:
+    """자식 프로세스: 서버 모듈을 불러 선택된 항목 측정"""
+    prepare_env()
+    sys.path.insert(0, BASE_DIR)
+    import logging
+    import contextlib
+    with contextlib.redirect_stdout(sys.stderr):
+        import hairgator_fast_20param as server
+    logging.disable(logging.CRITICAL)
+
+    # 가짜 제공자, 저장소/원장 없이 (매 호출이 같은 코드 경로를 타도록)
+    server.answer_provider = stub_provider()
+    server.answer_store = None
+    server.ledger = None
+    server.precomputed_table.entries = {}
+
+    cases = build_cases(server)
+    if keys:
+        cases = {name: fn for name, fn in cases.items() if any(key in name for key in keys)}
+    cases[CALIBRATION] = calibration
+    return {name: measure(fn, rounds, min_round_seconds) for name, fn in cases.items()}
+
+
+def collect(keys: List[str], processes: int, rounds: int, min_round_ms: float) -> Dict[str, List[float]]:
+    """자식 프로세스 processes 개의 표본을 합침"""
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--rounds", str(rounds),
+               "--min-round-ms", str(min_round_ms)]
+    for key in keys:
+        command += ["-k", key]
+    results: Dict[str, List[float]] = {}
+    for _ in range(processes):
+        output = subprocess.run(command, cwd=BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True, check=True).stdout
+        for name, samples in json.loads(output).items():
+            results.setdefault(name, []).extend(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="헤어게이터 채팅 핫패스 마이크로벤치마크")
+    parser.add_argument("--processes", type=int, default=3, help="측정 자식 프로세스 수")
+    parser.add_argument("--rounds", type=int, default=7, help="프로세스당 항목별 라운드 수")
+    parser.add_argument("--min-round-ms", type=float, default=20.0, help="라운드 최소 길이 (ms)")
+    parser.add_argument("--alpha", type=float, default=0.01, help="유의 수준")
+    parser.add_argument("--threshold", type=float, default=0.10, help="저하로 볼 중앙값 증가율")
+    parser.add_argument("-k", action="append", default=[], help="이름에 이 문자열이 있는 항목만")
+    parser.add_argument("--save", action="store_true", help="현재 측정값을 기준선으로 저장")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="기준선 파일 경로")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(run_worker(args.k, args.rounds, args.min_round_ms / 1000), sys.stdout)
+        return 0
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    print(f"🔬 헤어게이터 핫패스 마이크로벤치마크 (프로세스 {args.processes}개 × 라운드 {args.rounds}회)")
+    print("=" * 78)
+    results = collect(args.k, args.processes, args.rounds, args.min_round_ms)
+    speed = 1.0
+    if CALIBRATION in baseline and not args.save:
+        speed = statistics.median(baseline[CALIBRATION]) / statistics.median(results[CALIBRATION])
+        print(f"⚖️ 머신 속도 보정 ×{speed:.3f} (기준선 대비 고정 작업 시간)")
+    regressions = []
+    for name, samples in results.items():
+        if name == CALIBRATION:
+            continue
+        line = f"{name:<28} p50 {statistics.median(samples):10.2f}µs  min {min(samples):10.2f}µs"
+        if name in baseline and not args.save:
+            adjusted = [value * speed for value in samples]
+            verdict, change, p = compare(adjusted, baseline[name], args.alpha, args.threshold)
+            mark = {"regression": "❌", "improvement": "✅", "same": "  "}[verdict]
+            line += f"  {mark} {change:+7.1%} (p={p:.3g})"
+            if verdict == "regression":
+                regressions.append(f"{name}: 중앙값 {change:+.1%} (p={p:.3g})")
+        print(line)
+
+    print("=" * 78)
+    if args.save:
+        baseline.update({name: [round(value, 4) for value in samples] for name, samples in results.items()})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"💾 기준선 저장: {args.baseline}")
+        return 0
+    if not baseline:
+        print("⚠️ 기준선 없음 (--save 로 생성)")
+        return 0
+    if regressions:
+        for regression in regressions:
+            print(f"❌ {regression}")
+        return 1
+    print("🎉 유의한 성능 저하 없음")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_startup.py
+헤어게이터 부팅 시간 / 워커 메모리 예산 측정 스크립트
+
+- python -X importtime 으로 서버 모듈 import 시간과 직접 import 한 모듈별 누적 시간
+- gunicorn 기동 후 첫 요청 성공까지 시간 (--preload 유무)
+- 워커별 RSS / USS / PSS (/proc/<pid>/smaps_rollup, Linux)
+
+측정값이 startup_budget.json 의 예산을 넘으면 종료 코드 1 로 실패합니다.
+
+사용법:
+    python bench_startup.py
+    python bench_startup.py --workers 4
+    python bench_startup.py --write-budget      # 현재 측정값 × 여유율로 예산 갱신
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import statistics
+import urllib.request
+from typing import Dict, List, Optional
+
+APP_MODULE = "hairgator_fast_20param"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_PATH = os.path.join(BASE_DIR, "startup_budget.json")
+BUDGET_HEADROOM = 1.3
+
+
+def bench_env() -> Dict[str, str]:
+    """측정용 환경 (부팅 중 pip 업그레이드/업스트림 프로브 제외)"""
+    env = dict(os.environ)
+    env["OPENAI_FORCE_UPGRADE"] = "false"
+    env.setdefault("UPSTREAM_PROBE_INTERVAL", "0")
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+def measure_importtime(runs: int = 3) -> Dict:
+    """-X importtime 결과: 전체 ms 와 서버 모듈이 직접 import 한 모듈별 누적 ms (중앙값)"""
+    totals, per_module = [], {}
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {APP_MODULE}"],
+                                cwd=BASE_DIR, env=bench_env(), capture_output=True, text=True)
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            try:
+                cumulative_us = int(cumulative.strip())
+            except ValueError:
+                continue
+            if name.strip() == APP_MODULE:
+                totals.append(cumulative_us / 1000)
+            elif name.startswith("   ") and not name.startswith("    "):
+                # 서버 모듈 바로 아래 단계 (들여쓰기 2칸)
+                per_module.setdefault(name.strip(), []).append(cumulative_us / 1000)
+
+    top = sorted(((name, statistics.median(values)) for name, values in per_module.items()),
+                 key=lambda item: item[1], reverse=True)
+    return {"import_ms": statistics.median(totals) if totals else None, "top": top[:10]}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_of(pid: int) -> Optional[Dict[str, float]]:
+    """RSS / PSS / USS (MB), Linux smaps_rollup 기준"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":"):
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_mb": fields.get("Rss", 0) / 1024, "pss_mb": fields.get("Pss", 0) / 1024, "uss_mb": uss / 1024}
+
+
+def children_of(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure_server(preload: bool, workers: int, timeout: float = 120.0) -> Dict:
+    """gunicorn 기동 → 첫 요청 성공까지 시간과 워커 메모리"""
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", "-k", "gthread", "--threads", "4", "-w", str(workers),
+               "-b", f"127.0.0.1:{port}", "--log-level", "warning"]
+    if preload:
+        command.append("--preload")
+    command.append(f"{APP_MODULE}:app")
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=bench_env(),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    ttfr_ms = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn 종료 (code {process.returncode})")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        ttfr_ms = (time.perf_counter() - started) * 1000
+                        break
+            except OSError:
+                time.sleep(0.02)
+        if ttfr_ms is None:
+            raise RuntimeError("첫 요청 시간 초과")
+
+        # 모든 워커가 부팅을 마칠 때까지 잠시 대기 후 측정
+        time.sleep(2.0)
+        workers_memory = [m for m in (memory_of(pid) for pid in children_of(process.pid)) if m]
+        master = memory_of(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def worst(key):
+        return max((m[key] for m in workers_memory), default=None)
+
+    return {
+        "ttfr_ms": ttfr_ms,
+        "workers": len(workers_memory),
+        "worker_rss_mb": worst("rss_mb"),
+        "worker_pss_mb": worst("pss_mb"),
+        "worker_uss_mb": worst("uss_mb"),
+        "master_rss_mb": master["rss_mb"] if master else None
+    }
+
+
+def gunicorn_available() -> bool:
+    try:
+        import gunicorn  # noqa: F401
+        return sys.platform.startswith("linux")
+    except ImportError:
+        return False
+
+
+def check_budget(metrics: Dict[str, float], budget: Dict[str, float]) -> List[str]:
+    failures = []
+    for key, limit in budget.items():
+        value = metrics.get(key)
+        if value is not None and value > limit:
+            failures.append(f"{key}: {value:.1f} > 예산 {limit:.1f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="헤어게이터 부팅 시간/메모리 예산 측정")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn 워커 수")
+    parser.add_argument("--runs", type=int, default=3, help="importtime 반복 횟수")
+    parser.add_argument("--write-budget", action="store_true", help="현재 측정값으로 예산 파일 갱신")
+    args = parser.parse_args()
+
+    print("⏱️ 헤어게이터 부팅 예산 측정")
+    print("=" * 60)
+
+    metrics = {}
+    imports = measure_importtime(args.runs)
+    metrics["import_ms"] = imports["import_ms"]
+    print(f"📦 import {APP_MODULE}: {imports['import_ms']:.1f}ms")
+    for name, ms in imports["top"]:
+        print(f"   {name:<24} {ms:8.1f}ms")
+
+    if gunicorn_available():
+        for preload in (False, True):
+            label = "preload" if preload else "no_preload"
+            result = measure_server(preload, args.workers)
+            for key in ("ttfr_ms", "worker_rss_mb", "worker_pss_mb", "worker_uss_mb"):
+                metrics[f"{key}.{label}"] = result[key]
+            print(f"🚀 gunicorn {label}: 첫 요청 {result['ttfr_ms']:.0f}ms, 워커 {result['workers']}개 "
+                  f"RSS {result['worker_rss_mb']:.1f}MB / PSS {result['worker_pss_mb']:.1f}MB / "
+                  f"USS {result['worker_uss_mb']:.1f}MB (마스터 RSS {result['master_rss_mb']:.1f}MB)")
+    else:
+        print("⚠️ gunicorn 미설치 또는 Linux 아님: 서버/메모리 측정 생략")
+
+    if args.write_budget:
+        budget = {key: round(value * BUDGET_HEADROOM, 1) for key, value in metrics.items() if value is not None}
+        with open(BUDGET_PATH, "w", encoding="utf-8") as f:
+            json.dump(budget, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 예산 갱신: {BUDGET_PATH}")
+        return 0
+
+    try:
+        with open(BUDGET_PATH, encoding="utf-8") as f:
+            budget = json.load(f)
+    except OSError:
+        print("⚠️ 예산 파일 없음 (--write-budget 으로 생성)")
+        return 0
+
+    failures = check_budget(metrics, budget)
+    print("=" * 60)
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("🎉 모든 항목이 예산 이내입니다")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+catalog.py
+women_rag_v2 스타일 메뉴 시트 로더
+
+openpyxl 없이 표준 라이브러리(zipfile + ElementTree)로 xlsx 첫 시트를 읽어
+스타일 레코드(모델 번호, 스타일명, 소개, 42포뮬러, Ground Truth 등)로 변환합니다.
+"""
+
+import os
+import re
+import json
+import glob
+import hashlib
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# 파싱 결과 캐시 (xlsx 파싱 ~130ms → JSON 로드 수 ms, 파일 크기/수정 시각이 키)
+CATALOG_CACHE_DIR = os.getenv('CATALOG_CACHE_DIR', 'data')
+# 레코드 구성(열/스타일명 규칙)을 바꾸면 올려서 이전 캐시 무효화
+CACHE_FORMAT = 1
+
+_NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+_DEFAULT_GLOB = '*women_rag_v2.xlsx'
+
+
+def default_catalog_path():
+    path = os.getenv('CATALOG_PATH')
+    if path:
+        return path
+    base = os.path.dirname(os.path.abspath(__file__))
+    candidates = [p for p in glob.glob(os.path.join(base, _DEFAULT_GLOB))
+                  if not os.path.basename(p).startswith('~$')]
+    return candidates[0] if candidates else None
+
+
+# 시트 열 순서 (헤더: St model no., Style Introduction(KOR), ...)
+COLUMNS = ('model_no', 'intro', 'management', 'image_analysis',
+           'intro_en', 'management_en', 'image_analysis_en',
+           'subtitle', 'formula', 'session_meaning', 'ground_truth', 'image_url')
+
+MAX_NAME_CHARS = 24
+
+_MODEL_NO_RE = re.compile(r'^F[A-Z]L\d{4}$')
+_GT_TITLE_RE = re.compile(r'^(F[A-Z]L\d{4})\s*-?\s*(.+?)\s*Ground Truth', re.IGNORECASE)
+
+
+def valid_model_no(value):
+    """스타일 메뉴 모델 번호 형식 (FAL3004 등)"""
+    return bool(_MODEL_NO_RE.match(value or ''))
+
+
+class Style:
+    """스타일 메뉴 한 행"""
+
+    __slots__ = COLUMNS + ('name',)
+
+    def __init__(self, **fields):
+        for column in COLUMNS:
+            setattr(self, column, (fields.get(column) or '').strip())
+        self.name = fields.get('name') or style_name(self)
+
+    @property
+    def length_code(self):
+        """모델 번호 두 번째 글자 (A~H 길이 구분)"""
+        return self.model_no[1] if len(self.model_no) > 1 else ''
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def style_name(style):
+    """Ground Truth 제목 → 소개 첫 문장 순으로 스타일명 추출"""
+    first_line = style.ground_truth.split('\n', 1)[0].strip()
+    match = _GT_TITLE_RE.match(first_line)
+    if match and match.group(1) == style.model_no:
+        return match.group(2).strip()
+
+    headline = style.intro.split('\n', 1)[0].strip()
+    if headline.endswith('!'):
+        return headline.rstrip('!').strip()
+
+    # 제목 없이 설명 문장으로 시작하는 행: "...스타일" 까지, 길면 단어 단위로 자름
+    sentence = re.split(r'[.!]', headline, 1)[0].split(',', 1)[0].strip()
+    if '스타일' in sentence:
+        sentence = sentence[:sentence.index('스타일') + len('스타일')]
+    if len(sentence) <= MAX_NAME_CHARS:
+        return sentence
+    words = []
+    for word in sentence.split():
+        if len(' '.join(words + [word])) > MAX_NAME_CHARS:
+            break
+        words.append(word)
+    return ' '.join(words) + '…'
+
+
+def _shared_strings(archive):
+    try:
+        root = ET.fromstring(archive.read('xl/sharedStrings.xml'))
+    except KeyError:
+        return []
+    return [''.join(t.text or '' for t in si.iter(f"{{{_NS['x']}}}t")) for si in root.findall('x:si', _NS)]
+
+
+def _column_index(cell_ref):
+    letters = ''.join(ch for ch in cell_ref if ch.isalpha())
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch.upper()) - ord('A') + 1)
+    return index - 1
+
+
+def read_rows(path, sheet='xl/worksheets/sheet1.xml'):
+    """xlsx 시트의 행을 문자열 리스트로 반환"""
+    with zipfile.ZipFile(path) as archive:
+        strings = _shared_strings(archive)
+        root = ET.fromstring(archive.read(sheet))
+
+    rows = []
+    for row in root.iter(f"{{{_NS['x']}}}row"):
+        values = {}
+        for cell in row.findall('x:c', _NS):
+            kind = cell.get('t')
+            if kind == 'inlineStr':
+                text = ''.join(t.text or '' for t in cell.iter(f"{{{_NS['x']}}}t"))
+            else:
+                value = cell.find('x:v', _NS)
+                if value is None:
+                    continue
+                text = strings[int(value.text)] if kind == 's' else value.text
+            values[_column_index(cell.get('r'))] = text
+        if values:
+            rows.append([values.get(i, '') for i in range(max(values) + 1)])
+    return rows
+
+
+def _cache_path(path, cache_dir):
+    stat = os.stat(path)
+    key = f"{CACHE_FORMAT}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(cache_dir, f"catalog-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}.json")
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            return [Style(**fields) for fields in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _write_cache(cache_path, styles):
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([style.to_dict() for style in styles], f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"스타일 카탈로그 캐시 저장 실패: {e}")
+
+
+def load_styles(path=None, cache_dir=CATALOG_CACHE_DIR):
+    """스타일 레코드 목록 (시트가 없거나 읽기 실패 시 빈 목록)"""
+    path = path or default_catalog_path()
+    if not path or not os.path.exists(path):
+        logger.warning(f"스타일 카탈로그 없음: {path}")
+        return []
+
+    cache_path = _cache_path(path, cache_dir) if cache_dir else None
+    if cache_path:
+        cached = _read_cache(cache_path)
+        if cached is not None:
+            return cached
+
+    try:
+        rows = read_rows(path)
+    except (OSError, zipfile.BadZipFile, ET.ParseError) as e:
+        logger.error(f"스타일 카탈로그 읽기 실패: {e}")
+        return []
+
+    styles = []
+    for row in rows:
+        if not row or not valid_model_no((row[0] or '').strip()):
+            continue
+        styles.append(Style(**dict(zip(COLUMNS, row))))
+
+    if cache_path and styles:
+        _write_cache(cache_path, styles)
+    return styles
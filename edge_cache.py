@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+edge_cache.py
+프록시(nginx)/CDN 이 캐시할 수 있는 읽기 전용 GET 응답
+
+- 본문은 부팅 시 한 번 직렬화하고 내용 해시로 ETag 를 만듦 (요청마다 JSON 변환 없음)
+- Cache-Control: 브라우저는 짧게(max-age), 공유 캐시는 길게(s-maxage).
+  nginx 는 s-maxage 를 보지 않으므로 X-Accel-Expires 로 같은 값을 전달
+- Surrogate-Key: CDN 태그 기반 무효화용 키 (예: "styles style/FAL3004", 한글은 퍼센트 인코딩)
+- If-None-Match / If-Modified-Since 재검증 시 304
+- ETag 는 항상 약한 ETag (W/"...") — 압축한 200(response_encoding)과 304, 비압축 200 이 같은 값을 내보냄
+- 무효화: 부팅 시 이전에 내보낸 ETag(EDGE_STATE_PATH)와 비교해 바뀐 자원만
+  nginx 퍼지 경로(EDGE_PURGE_URL + 경로)와 CDN 웹훅(EDGE_PURGE_WEBHOOK, 서로게이트 키)으로 퍼지
+- 온라인 카탈로그 반영은 한 워커만 퍼지하고, 다른 워커는 기록을 따라잡기 전까지 이전 응답을 내보내
+  프록시가 다시 캐시할 수 있음. 그래서 모든 워커가 따라잡을 시간 뒤 같은 경로를 한 번 더 퍼지 (세대별 예약)
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import urllib.request
+from email.utils import formatdate
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+EDGE_BROWSER_MAX_AGE = int(os.getenv('EDGE_BROWSER_MAX_AGE', '60'))
+EDGE_SHARED_MAX_AGE = int(os.getenv('EDGE_SHARED_MAX_AGE', '86400'))
+EDGE_STALE_SECONDS = int(os.getenv('EDGE_STALE_SECONDS', '300'))
+EDGE_PURGE_URL = os.getenv('EDGE_PURGE_URL', '')
+EDGE_PURGE_WEBHOOK = os.getenv('EDGE_PURGE_WEBHOOK', '')
+EDGE_STATE_PATH = os.getenv('EDGE_STATE_PATH', 'data/edge-state.json')
+PURGE_TIMEOUT = 5.0
+
+
+def content_etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+class CachedResource:
+    """미리 직렬화한 GET 응답 하나"""
+
+    __slots__ = ('path', 'body', 'etag', 'last_modified', 'keys', 'headers')
+
+    def __init__(self, path, payload, keys, last_modified=None):
+        self.path = path
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.etag = content_etag(self.body)
+        self.last_modified = int(last_modified or time.time())
+        self.keys = tuple(keys)
+        # 응답 헤더도 미리 만들어 둠 (요청마다 날짜/ETag 포맷 생략)
+        self.headers = [
+            ('Cache-Control', f"public, max-age={EDGE_BROWSER_MAX_AGE}, s-maxage={EDGE_SHARED_MAX_AGE}, "
+                              f"stale-while-revalidate={EDGE_STALE_SECONDS}"),
+            ('X-Accel-Expires', str(EDGE_SHARED_MAX_AGE)),
+            # 헤더 값은 latin-1 만 허용되므로 한글 키는 퍼센트 인코딩
+            ('Surrogate-Key', ' '.join(quote(key, safe='/') for key in self.keys)),
+            ('Vary', 'Accept-Encoding'),
+            ('ETag', f'W/"{self.etag}"'),
+            ('Last-Modified', formatdate(self.last_modified, usegmt=True))
+        ]
+
+    def not_modified(self, request):
+        """If-None-Match 가 있으면 그것만, 없으면 If-Modified-Since 로 판단"""
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or request.if_none_match.contains_weak(self.etag)
+        since = request.if_modified_since
+        return since is not None and since.timestamp() >= self.last_modified
+
+
+class EdgeResources:
+    """경로 → CachedResource, 채운 뒤에는 읽기 전용 (카탈로그가 바뀌면 새로 만들어 통째로 교체)"""
+
+    def __init__(self):
+        self.resources = {}
+        self.stats = {'served': 0, 'not_modified': 0}
+
+    def add(self, path, payload, keys, last_modified=None):
+        self.resources[path] = CachedResource(path, payload, keys, last_modified)
+
+    def get(self, path):
+        return self.resources.get(path)
+
+    def __len__(self):
+        return len(self.resources)
+
+    def respond(self, path, request, response_class):
+        """캐시 가능한 응답 (없으면 None). 조건부 요청이면 304"""
+        resource = self.resources.get(path)
+        if resource is None:
+            return None
+        if request.method in ('GET', 'HEAD') and resource.not_modified(request):
+            self.stats['not_modified'] += 1
+            return response_class(status=304, headers=resource.headers)
+        self.stats['served'] += 1
+        return response_class(resource.body, mimetype='application/json', headers=resource.headers)
+
+    def versions(self):
+        return {path: {'etag': resource.etag, 'keys': list(resource.keys)}
+                for path, resource in self.resources.items()}
+
+    def snapshot(self):
+        return dict(self.stats, resources=len(self.resources))
+
+
+class EdgePurger:
+    """바뀐 자원만 프록시/CDN 에서 퍼지 (백그라운드 스레드)"""
+
+    def __init__(self, purge_url=EDGE_PURGE_URL, webhook=EDGE_PURGE_WEBHOOK, state_path=EDGE_STATE_PATH):
+        self.purge_url = purge_url.rstrip('/')
+        self.webhook = webhook
+        self.state_path = state_path
+        self.stats = {'purged_paths': 0, 'purged_keys': 0, 'errors': 0, 'settle_purges': 0}
+        # 세대 → 예약된 두 번째 퍼지 타이머
+        self._settling = {}
+        self._settle_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.purge_url or self.webhook)
+
+    def _request(self, url, method='GET', body=None):
+        try:
+            request = urllib.request.Request(url, data=body, method=method,
+                                             headers={'Content-Type': 'application/json'} if body else {})
+            with urllib.request.urlopen(request, timeout=PURGE_TIMEOUT) as response:
+                response.read()
+            return True
+        except OSError as e:
+            # ngx_cache_purge 는 캐시에 없는 경로에 404 를 돌려줌 (퍼지할 것이 없음)
+            if getattr(e, 'code', None) == 404:
+                return True
+            self.stats['errors'] += 1
+            logger.warning(f"엣지 퍼지 실패 ({url}): {e}")
+            return False
+
+    def purge(self, paths, keys):
+        for path in paths:
+            if self.purge_url and self._request(self.purge_url + quote(path)):
+                self.stats['purged_paths'] += 1
+        if self.webhook and keys:
+            body = json.dumps({'surrogate_keys': sorted(quote(key, safe='/') for key in keys)}).encode('utf-8')
+            if self._request(self.webhook, method='POST', body=body):
+                self.stats['purged_keys'] += len(keys)
+
+    def sync(self, edge_resources, background=True, settle_seconds=0, generation=None):
+        """이전 부팅 때 내보낸 ETag 와 비교해 바뀌거나 사라진 자원 퍼지, 퍼지 대상 경로 수 반환
+
+        여러 워커가 동시에 부팅해도 상태 파일 잠금으로 한 워커만 퍼지합니다.
+        settle_seconds > 0 이면 그 뒤에 같은 경로를 다시 퍼지 (다른 워커가 이전 세대를 내보내는 동안
+        프록시가 다시 캐시한 응답 제거). generation 별로 한 번만 예약
+        """
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.state_path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.state_path, encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = {}
+
+            current = edge_resources.versions()
+            changed = [path for path, version in previous.items()
+                       if not isinstance(version, dict) or current.get(path, {}).get('etag') != version.get('etag')]
+            if previous != current:
+                self._write_state(current)
+            if not changed:
+                return 0
+            # 사라진 자원은 이전 상태에 남은 키로 퍼지
+            keys = set()
+            for path in changed:
+                version = current.get(path) or previous[path]
+                keys.update(version.get('keys', ()) if isinstance(version, dict) else ())
+
+        if self.enabled:
+            if background:
+                threading.Thread(target=self.purge, args=(changed, keys), name='edge-purge', daemon=True).start()
+            else:
+                self.purge(changed, keys)
+            if settle_seconds > 0:
+                self._schedule_settle(changed, keys, settle_seconds, generation)
+        logger.info(f"엣지 캐시 무효화 대상 {len(changed)}개 경로, {len(keys)}개 키")
+        return len(changed)
+
+    def _schedule_settle(self, paths, keys, delay, generation):
+        def fire():
+            with self._settle_lock:
+                self._settling.pop(generation, None)
+            self.stats['settle_purges'] += 1
+            self.purge(paths, keys)
+            logger.info(f"엣지 캐시 재퍼지 (세대 {generation}): {len(paths)}개 경로")
+
+        with self._settle_lock:
+            if generation in self._settling:
+                return
+            timer = threading.Timer(delay, fire)
+            timer.name = 'edge-purge-settle'
+            timer.daemon = True
+            self._settling[generation] = timer
+        timer.start()
+
+    def _write_state(self, versions):
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(versions, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def snapshot(self):
+        return dict(self.stats, enabled=self.enabled, settling=sorted(self._settling, key=str))
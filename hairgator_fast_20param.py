@@ -1,30 +1,72 @@
-from flask import Flask, request, render_template_string, jsonify
+from flask import Flask, request, render_template_string, jsonify, redirect, Response, stream_with_context
 import os
 import json
+import hmac
 import logging
 import subprocess
 import sys
+import time
+import uuid
 from datetime import datetime
+from functools import wraps, lru_cache
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 
-# 강제 OpenAI 최신 버전 설치
-print("🔧 OpenAI 라이브러리 강제 업데이트 시작...")
-try:
-    subprocess.check_call([
-        sys.executable, "-m", "pip", "install", 
-        "--upgrade", "--no-cache-dir", "openai==1.52.2"
-    ])
-    print("✅ OpenAI 라이브러리 강제 업데이트 완료 (v1.52.2)")
-except Exception as e:
-    print(f"⚠️ 라이브러리 업데이트 실패: {e}")
-    print("🔄 기존 라이브러리로 계속 진행...")
+from precompute import QueryLogger, load_current_table, normalize_question
+from answer_store import AnswerStore, answer_key
+from upstream_pool import UpstreamPool
+from providers import OpenAIProvider, AnthropicProvider, HedgedCompleter
+from image_cache import ImageResultCache
+from image_pipeline import (ImagePipeline, ImageTooLarge, IMAGE_MAX_BYTES, IMAGE_RETRY_AFTER_SECONDS,
+                            read_stream, decode_data_url, to_data_url)
+from hangul import compact
+from catalog import load_styles, default_catalog_path
+from ingest import CatalogState, CatalogSnapshot
+from ws_chat import ChatSocketServer
+from pwa import SERVICE_WORKER_JS, ICON_SVG, asset_version, service_worker_js, manifest
+from ledger import Ledger, GROUPS as LEDGER_GROUPS
+from jobs import JobQueue, PermanentError, UnknownJobKind
+from edge_cache import EdgeResources, EdgePurger, EDGE_BROWSER_MAX_AGE
+from memwatch import MemoryWatch, MEMWATCH_ENABLED, GROUPINGS as MEMORY_GROUPINGS
+from affinity import Affinity, FORWARDED_HEADER
+from tracing import tracer
+from response_encoding import FastJSONProvider, ResponseCompressor
+from answer_schema import Answer, parse_answer, render_html, PROMPT_FORMAT
+from intent import load_model as load_intent_model, INTENT_MODEL_PATH
+
+# OpenAI 라이브러리 강제 업데이트 (선택: 부팅마다 pip 실행은 수 초가 걸리므로 기본 꺼짐)
+if os.getenv('OPENAI_FORCE_UPGRADE', 'false').lower() == 'true':
+    print("🔧 OpenAI 라이브러리 강제 업데이트 시작...")
+    try:
+        subprocess.check_call([
+            sys.executable, "-m", "pip", "install", 
+            "--upgrade", "--no-cache-dir", "openai==1.52.2"
+        ])
+        print("✅ OpenAI 라이브러리 강제 업데이트 완료 (v1.52.2)")
+    except Exception as e:
+        print(f"⚠️ 라이브러리 업데이트 실패: {e}")
+        print("🔄 기존 라이브러리로 계속 진행...")
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# 한글을 \uXXXX 로 이스케이프하지 않는 빠른 JSON 직렬화 (orjson 있으면 사용)
+app.json = FastJSONProvider(app)
+# base64/멀티파트 오버헤드를 고려한 요청 크기 상한
+app.config['MAX_CONTENT_LENGTH'] = IMAGE_MAX_BYTES * 2
+
+# 응답 압축 (크기 기준 gzip/brotli 협상, nginx 는 이미 압축된 응답을 그대로 전달)
+response_compressor = ResponseCompressor()
+
+@app.after_request
+def encode_response(response):
+    return response_compressor.process(response, request.accept_encodings)
 
 print("🚀 헤어게이터 서버 시작 중...")
+_encoding = response_compressor.snapshot()
+print(f"🗜️ 응답 인코딩: {_encoding['serializer']}, {'/'.join(_encoding['encodings'])} ({_encoding['min_bytes']}B 이상 압축)")
 print(f"🔧 환경: {os.getenv('ENVIRONMENT', 'development')}")
 print(f"🐍 Python 버전: {os.getenv('PYTHON_VERSION', 'default')}")
 
@@ -35,17 +77,13 @@ openai_model = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
 print(f"🔍 디버깅: OPENAI_API_KEY 길이 = {len(openai_api_key) if openai_api_key else 0}")
 print(f"🔍 디버깅: API 키 시작 = {openai_api_key[:10] if openai_api_key else 'None'}...")
 
-# OpenAI 라이브러리 버전 확인
-try:
-    import openai
-    print(f"📦 현재 OpenAI 라이브러리 버전: {openai.__version__}")
-except:
-    print("⚠️ OpenAI 라이브러리 버전 확인 불가")
-
 try:
-    from openai import OpenAI
-    
     if openai_api_key and len(openai_api_key) > 20 and not openai_api_key.startswith('............'):
+        # 키가 있을 때만 openai 로드 (import 만으로 약 0.4초, 수십 MB)
+        import openai
+        from openai import OpenAI
+        print(f"📦 현재 OpenAI 라이브러리 버전: {openai.__version__}")
+        
         # 구버전 호환성을 위한 안전한 초기화
         try:
             client = OpenAI(api_key=openai_api_key)
@@ -84,15 +122,85 @@ except Exception as e:
     client = None
     openai_model = None
 
+# 업스트림 풀 (여러 엔드포인트/키, 지연 시간 기반 선택)
+try:
+    upstream_pool = UpstreamPool.from_env(openai_api_key)
+except Exception as e:
+    print(f"❌ 업스트림 풀 초기화 실패: {e}")
+    upstream_pool = None
+
+if upstream_pool:
+    upstream_pool.start_prober()
+    print(f"🌐 업스트림 엔드포인트: {len(upstream_pool)}개")
+
 # Claude 설정 (현재는 비활성화)
 claude_api_key = os.getenv('ANTHROPIC_API_KEY')
 claude_model = os.getenv('CLAUDE_MODEL', 'claude-3-sonnet-20240229')
 
-if claude_api_key and claude_api_key != '............':
-    print("🔵 Claude API 키 감지됨 (현재 비활성화)")
+claude_available = bool(claude_api_key and claude_api_key != '............')
+
+if claude_available:
+    print("🔵 Claude API 키 감지됨")
 else:
     print("⚪ Claude API 미설정")
 
+# LLM 제공자 (OpenAI 1차, Claude 2차 헤지)
+openai_provider = None
+claude_provider = None
+if upstream_pool:
+    openai_provider = OpenAIProvider(
+        upstream_pool, openai_model or 'gpt-3.5-turbo',
+        price_in=float(os.getenv('OPENAI_PRICE_IN', '0.5')),
+        price_out=float(os.getenv('OPENAI_PRICE_OUT', '1.5'))
+    )
+if claude_available:
+    claude_provider = AnthropicProvider(
+        claude_api_key, claude_model,
+        price_in=float(os.getenv('CLAUDE_PRICE_IN', '3.0')),
+        price_out=float(os.getenv('CLAUDE_PRICE_OUT', '15.0'))
+    )
+
+if openai_provider and claude_provider and os.getenv('HEDGE_ENABLED', 'true').lower() == 'true':
+    answer_provider = HedgedCompleter(openai_provider, claude_provider)
+else:
+    answer_provider = openai_provider or claude_provider
+print(f"🧠 답변 제공자: {answer_provider.name if answer_provider else '기본 레시피 모드'}")
+
+# 이미지 분석 (프로세스 풀 전처리 + 비전 모델)
+vision_model = os.getenv('VISION_MODEL', 'gpt-4o-mini')
+vision_price_in = float(os.getenv('VISION_PRICE_IN', '0.15'))
+vision_price_out = float(os.getenv('VISION_PRICE_OUT', '0.6'))
+image_pipeline = ImagePipeline()
+image_cache = ImageResultCache()
+print(f"🖼️ 이미지 파이프라인: {'✅ 준비됨' if image_pipeline.available else '❌ Pillow 미설치'} (비전 모델: {vision_model})")
+
+# 사전 답변 테이블 (precompute.py 로 오프라인 생성)
+query_logger = QueryLogger()
+precomputed_table = load_current_table()
+print(f"📚 사전 답변 테이블: v{precomputed_table.version} ({len(precomputed_table)}개 질문)")
+
+# 요청별 토큰/비용/지연 원장 (/admin/ledger)
+try:
+    ledger = Ledger()
+    ledger.start_rollups()
+    print(f"🧾 원장: {ledger.directory}")
+except Exception as e:
+    logger.error(f"원장 초기화 실패: {e}")
+    ledger = None
+
+def record_call(tier, category='', **fields):
+    """원장 기록 (원장이 없으면 무시)"""
+    if ledger:
+        ledger.record(tier, category, **fields)
+
+# 영구 답변 저장소 (재시작 후에도 유지)
+try:
+    answer_store = AnswerStore()
+    print(f"💾 답변 저장소: {answer_store.path} ({answer_store.count()}개 답변)")
+except Exception as e:
+    print(f"⚠️ 답변 저장소 초기화 실패: {e}")
+    answer_store = None
+
 print("=" * 50)
 
 # 헤어 레시피 데이터 (미용사 전용)
@@ -143,6 +251,9 @@ HTML_TEMPLATE = '''
     <meta name="mobile-web-app-capable" content="yes">
     <meta name="theme-color" content="#667eea">
     <title>헤어게이터 - AI 헤어케어 진단</title>
+    <link rel="manifest" href="/manifest.webmanifest">
+    <link rel="icon" href="/icon.svg" type="image/svg+xml">
+    <link rel="apple-touch-icon" href="/icon.svg">
     <style>
         * {
             margin: 0;
@@ -362,6 +473,38 @@ HTML_TEMPLATE = '''
             padding-bottom: 70px; /* 입력창 높이만큼만 */
         }
         
+        /* 자동완성 목록 (입력창 바로 위) */
+        .suggestions {
+            display: none;
+            position: absolute;
+            bottom: 100%;
+            left: 0;
+            right: 0;
+            max-height: 240px;
+            overflow-y: auto;
+            background: white;
+            border-top: 1px solid #e9ecef;
+            box-shadow: 0 -2px 8px rgba(0,0,0,0.06);
+        }
+        
+        .suggestion-item {
+            padding: 10px 18px;
+            font-size: 0.95rem;
+            color: #333;
+            cursor: pointer;
+            border-bottom: 1px solid #f3f3f3;
+        }
+        
+        .suggestion-item:active, .suggestion-item:hover {
+            background: #f1f3ff;
+        }
+        
+        .suggestion-kind {
+            margin-left: 8px;
+            font-size: 0.75rem;
+            color: #667eea;
+        }
+        
         .input-group {
             display: flex;
             gap: 10px;
@@ -477,6 +620,7 @@ HTML_TEMPLATE = '''
         </div>
         
         <div class="input-container">
+            <div class="suggestions" id="suggestions"></div>
             <div class="input-group">
                 <input type="text" id="userInput" class="input-field" 
                        placeholder="헤어 레시피나 시술 방법을 물어보세요..." 
@@ -573,6 +717,92 @@ HTML_TEMPLATE = '''
             messageDiv.innerHTML = message;
             chatContainer.appendChild(messageDiv);
             chatContainer.scrollTop = chatContainer.scrollHeight;
+            return messageDiv;
+        }
+        
+        // 구조화 답변 렌더링 (서버 answer_schema.render_html 과 같은 규칙)
+        const ANSWER_FIELDS = [['steps', '🎯 시술 방법'], ['ratios', '📊 약제 비율'], ['times', '⏱️ 시간'],
+                               ['cautions', '⚠️ 주의사항'], ['tips', '💡 프로 팁']];
+        const ANSWER_SHORT_KEYS = { t: 'title', s: 'steps', r: 'ratios', m: 'times', c: 'cautions', p: 'tips' };
+        
+        function escapeHtml(text) {
+            return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        }
+        
+        function answerBlock(heading, items, numbered) {
+            return `<strong>${escapeHtml(heading)}</strong><br>` + items.map(function(item, index) {
+                return (numbered ? `${index + 1}. ` : '• ') + escapeHtml(item);
+            }).join('<br>');
+        }
+        
+        function renderAnswer(answer) {
+            if (answer.html) return answer.html;
+            if (answer.parts) {
+                const header = answer.title ? `<strong>${escapeHtml(answer.title)}</strong><br><br>` : '';
+                return header + answer.parts.map(renderAnswer).join('<br><hr><br>');
+            }
+            const blocks = [];
+            if (answer.title) blocks.push(`<strong>${escapeHtml(answer.title)}</strong>`);
+            if (answer.intro) blocks.push(escapeHtml(answer.intro).split(String.fromCharCode(10)).join('<br>'));
+            (answer.sections || []).forEach(function(section) {
+                if (section.items.length) blocks.push(answerBlock(section.heading, section.items, false));
+            });
+            ANSWER_FIELDS.forEach(function(field) {
+                const items = answer[field[0]];
+                if (items && items.length) blocks.push(answerBlock(field[1], items, field[0] === 'steps'));
+            });
+            if (answer.note) blocks.push(escapeHtml(answer.note));
+            blocks.push('<strong>⚠️ 전문 미용사 전용</strong>');
+            return blocks.join('<br><br>');
+        }
+        
+        function answerHtml(data) {
+            return data.answer ? renderAnswer(data.answer) : data.response;
+        }
+        
+        // 스트리밍 중인 모델 출력(잘린 JSON)을 닫아서 지금까지의 답변으로 (서버 close_json 과 달리 쓰는 중인 항목도 표시)
+        function partialAnswer(text) {
+            const start = text.indexOf('{');
+            if (start < 0) return null;
+            text = text.slice(start);
+            const stack = [];
+            const cuts = [];
+            let inString = false;
+            let escaped = false;
+            for (let i = 0; i < text.length; i++) {
+                const ch = text[i];
+                if (inString) {
+                    if (escaped) escaped = false;
+                    else if (ch === String.fromCharCode(92)) escaped = true;
+                    else if (ch === '"') inString = false;
+                } else if (ch === '"') {
+                    inString = true;
+                } else if (ch === '{' || ch === '[') {
+                    stack.push(ch === '{' ? '}' : ']');
+                    cuts.push([i + 1, stack.slice()]);
+                } else if (ch === '}' || ch === ']') {
+                    stack.pop();
+                } else if (ch === ',') {
+                    cuts.push([i, stack.slice()]);
+                }
+            }
+            const candidates = [text + (inString ? '"' : '') + stack.slice().reverse().join('')];
+            cuts.slice(-4).reverse().forEach(function(cut) {
+                candidates.push(text.slice(0, cut[0]) + cut[1].reverse().join(''));
+            });
+            for (const candidate of candidates) {
+                try {
+                    const data = JSON.parse(candidate);
+                    const answer = {};
+                    Object.keys(data).forEach(function(key) {
+                        const value = data[key];
+                        const name = ANSWER_SHORT_KEYS[key] || key;
+                        answer[name] = name === 'title' || Array.isArray(value) ? value : [value];
+                    });
+                    return answer;
+                } catch (error) {}
+            }
+            return null;
         }
 
         function handleKeyPress(e) {
@@ -622,22 +852,243 @@ HTML_TEMPLATE = '''
         // 브라우저 크기 변경 시에도 대응
         window.addEventListener('resize', handleViewportChange);
 
-        async function sendMessage() {
-            const input = document.getElementById('userInput');
-            const sendBtn = document.getElementById('sendBtn');
-            const loading = document.getElementById('loading');
+        // 최근 답변 저장소 (IndexedDB) - 재방문 시 즉시 표시, 백그라운드에서 새 답변으로 갱신
+        const answerCache = (function() {
+            const DB_NAME = 'hairgator';
+            const STORE = 'answers';
+            const LIMIT = 50;
+            let dbPromise = null;
             
-            const message = input.value.trim();
-            if (!message) return;
+            function keyOf(message) {
+                return message.toLowerCase().replace(/[^0-9a-z가-힣]/g, '');
+            }
             
-            // 사용자 메시지 표시
-            addMessage(message, true);
-            input.value = '';
+            function open() {
+                if (!('indexedDB' in window)) return Promise.reject(new Error('IndexedDB 미지원'));
+                if (!dbPromise) {
+                    dbPromise = new Promise(function(resolve, reject) {
+                        const req = indexedDB.open(DB_NAME, 1);
+                        req.onupgradeneeded = function() {
+                            req.result.createObjectStore(STORE, { keyPath: 'key' }).createIndex('ts', 'ts');
+                        };
+                        req.onsuccess = function() { resolve(req.result); };
+                        req.onerror = function() { reject(req.error); };
+                    });
+                }
+                return dbPromise;
+            }
             
-            // 로딩 표시
-            sendBtn.disabled = true;
-            loading.style.display = 'block';
+            function run(mode, action) {
+                return open().then(function(db) {
+                    return new Promise(function(resolve, reject) {
+                        const req = action(db.transaction(STORE, mode).objectStore(STORE));
+                        req.onsuccess = function() { resolve(req.result); };
+                        req.onerror = function() { reject(req.error); };
+                    });
+                });
+            }
             
+            function prune() {
+                return run('readonly', function(store) { return store.index('ts').getAllKeys(); })
+                    .then(function(keys) {
+                        keys.slice(0, Math.max(0, keys.length - LIMIT)).forEach(function(key) {
+                            run('readwrite', function(store) { return store.delete(key); });
+                        });
+                    });
+            }
+            
+            return {
+                get: function(message) {
+                    return run('readonly', function(store) { return store.get(keyOf(message)); })
+                        .catch(function() { return null; });
+                },
+                put: function(message, data) {
+                    return run('readwrite', function(store) {
+                        return store.put({ key: keyOf(message), message: message, response: data.response,
+                                           answer: data.answer, recipe_type: data.recipe_type, ts: Date.now() });
+                    }).then(prune).catch(function() {});
+                },
+                recent: function(count) {
+                    return run('readonly', function(store) { return store.index('ts').getAll(); })
+                        .then(function(items) { return items.slice(-count); })
+                        .catch(function() { return []; });
+                },
+                keyOf: keyOf
+            };
+        })();
+        
+        // 기본 레시피 (서비스 워커 캐시) - 오프라인일 때 키워드로 바로 표시
+        let recipeBook = null;
+        fetch('/recipes').then(function(r) { return r.json(); })
+            .then(function(data) { recipeBook = data; })
+            .catch(function() {});
+        
+        function offlineRecipe(message) {
+            if (!recipeBook) return null;
+            const key = answerCache.keyOf(message);
+            for (const category of Object.keys(recipeBook)) {
+                const entry = recipeBook[category];
+                if (entry.keywords.some(function(word) { return key.includes(word); })) {
+                    return `<strong>H ${category} 기본 레시피</strong> (오프라인)<br><br>` + entry.recipes.join('<br>');
+                }
+            }
+            return null;
+        }
+        
+        // 자동완성 (입력이 멈춘 뒤 150ms, 고르면 저장된/로컬 답변으로 바로 응답)
+        const SUGGEST_KIND_LABELS = { question: '자주 묻는 질문', recipe: '레시피', keyword: '키워드', style: '스타일' };
+        let suggestTimer = null;
+        let suggestSeq = 0;
+        let pickedSuggestion = null;
+        
+        function hideSuggestions() {
+            const box = document.getElementById('suggestions');
+            box.style.display = 'none';
+            box.innerHTML = '';
+        }
+        
+        function renderSuggestions(items) {
+            const box = document.getElementById('suggestions');
+            box.innerHTML = '';
+            items.forEach(function(item) {
+                const row = document.createElement('div');
+                row.className = 'suggestion-item';
+                row.textContent = item.text;
+                const kind = document.createElement('span');
+                kind.className = 'suggestion-kind';
+                kind.textContent = SUGGEST_KIND_LABELS[item.kind] || '';
+                row.appendChild(kind);
+                // mousedown: 입력창 blur 전에 선택 처리
+                row.addEventListener('mousedown', function(e) {
+                    e.preventDefault();
+                    pickSuggestion(item);
+                });
+                box.appendChild(row);
+            });
+            box.style.display = items.length ? 'block' : 'none';
+        }
+        
+        function pickSuggestion(item) {
+            inputField.value = item.text;
+            pickedSuggestion = item;
+            hideSuggestions();
+            sendMessage();
+        }
+        
+        inputField.addEventListener('input', function() {
+            pickedSuggestion = null;
+            clearTimeout(suggestTimer);
+            const query = inputField.value.trim();
+            if (!query) {
+                hideSuggestions();
+                return;
+            }
+            suggestTimer = setTimeout(function() {
+                const seq = ++suggestSeq;
+                fetch('/suggest?q=' + encodeURIComponent(query))
+                    .then(function(r) { return r.json(); })
+                    .then(function(data) {
+                        // 늦게 도착한 이전 입력의 결과는 무시
+                        if (seq === suggestSeq && inputField.value.trim() === query) {
+                            renderSuggestions(data.suggestions);
+                        }
+                    })
+                    .catch(hideSuggestions);
+            }, 150);
+        });
+        
+        // WebSocket 채널 (연결 하나로 질문/토큰 스트리밍, 실패 시 HTTP 폴백)
+        let chatSocket = null;
+        let socketRetryMs = 1000;
+        let socketFailures = 0;
+        let nextRequestId = 1;
+        const pendingRequests = {};
+        
+        function connectSocket() {
+            if (!('WebSocket' in window) || socketFailures >= 5) return;
+            const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+            let socket;
+            try {
+                socket = new WebSocket(`${protocol}//${location.host}/ws/chat`);
+            } catch (error) {
+                return;
+            }
+            socket.onopen = function() {
+                chatSocket = socket;
+                socketRetryMs = 1000;
+                socketFailures = 0;
+            };
+            socket.onmessage = function(event) {
+                handleSocketFrame(JSON.parse(event.data));
+            };
+            socket.onclose = function() {
+                if (chatSocket !== socket) socketFailures++;
+                chatSocket = null;
+                // 답을 못 받은 질문은 HTTP 로 다시 보냄
+                Object.keys(pendingRequests).forEach(function(id) {
+                    const pending = pendingRequests[id];
+                    delete pendingRequests[id];
+                    retryViaHttp(pending);
+                });
+                setTimeout(connectSocket, socketRetryMs);
+                socketRetryMs = Math.min(socketRetryMs * 2, 30000);
+            };
+        }
+        
+        function handleSocketFrame(frame) {
+            if (frame.type === 'ping') {
+                chatSocket && chatSocket.send(JSON.stringify({ type: 'pong' }));
+                return;
+            }
+            const pending = pendingRequests[frame.id];
+            if (!pending) return;
+            
+            if (frame.type === 'token') {
+                // 저장된 답변을 보여주는 중이면 완료 시에만 교체
+                if (pending.cached) return;
+                // 스트리밍 중에는 지금까지 온 JSON 을 닫아서 렌더링 (JSON 이 아니면 텍스트로)
+                pending.text += frame.text;
+                if (!pending.div) {
+                    pending.div = addMessage('', false);
+                    document.getElementById('loading').style.display = 'none';
+                }
+                const partial = partialAnswer(pending.text);
+                if (partial) {
+                    pending.div.innerHTML = renderAnswer(partial);
+                } else {
+                    pending.div.textContent = pending.text;
+                }
+                const chatContainer = document.getElementById('chatContainer');
+                chatContainer.scrollTop = chatContainer.scrollHeight;
+            } else if (frame.type === 'done') {
+                delete pendingRequests[frame.id];
+                if (pending.div) {
+                    pending.div.innerHTML = answerHtml(frame);
+                } else {
+                    addMessage(answerHtml(frame), false);
+                }
+                answerCache.put(pending.message, frame);
+                finishRequest();
+            } else if (frame.type === 'error') {
+                delete pendingRequests[frame.id];
+                retryViaHttp(pending);
+            }
+        }
+        
+        function retryViaHttp(pending) {
+            if (pending.div && !pending.cached) {
+                pending.div.remove();
+                pending.div = null;
+            }
+            sendViaHttp(pending.message, pending.div, pending.suggestion);
+        }
+        
+        function finishRequest() {
+            document.getElementById('sendBtn').disabled = false;
+            document.getElementById('loading').style.display = 'none';
+        }
+        
+        async function sendViaHttp(message, cachedDiv, suggestion) {
             try {
                 const response = await fetch('/chat', {
                     method: 'POST',
@@ -646,6 +1097,8 @@ HTML_TEMPLATE = '''
                     },
                     body: JSON.stringify({
                         message: message,
+                        suggestion: suggestion || null,
+                        format: 'answer',
                         timestamp: new Date().toISOString()
                     })
                 });
@@ -655,144 +1108,876 @@ HTML_TEMPLATE = '''
                 }
                 
                 const data = await response.json();
-                addMessage(data.response, false);
+                if (cachedDiv) {
+                    cachedDiv.innerHTML = answerHtml(data);
+                } else {
+                    addMessage(answerHtml(data), false);
+                }
+                answerCache.put(message, data);
                 
             } catch (error) {
                 console.error('Error:', error);
-                addMessage('죄송합니다. 일시적인 오류가 발생했습니다. 다시 시도해주세요. 🙏', false);
+                // 저장된 답변이 이미 보이면 그대로 두고, 없으면 기본 레시피로 대체
+                if (!cachedDiv) {
+                    addMessage(offlineRecipe(message) || '죄송합니다. 일시적인 오류가 발생했습니다. 다시 시도해주세요. 🙏', false);
+                }
             } finally {
-                sendBtn.disabled = false;
-                loading.style.display = 'none';
+                finishRequest();
             }
         }
+        
+        async function sendMessage() {
+            const input = document.getElementById('userInput');
+            const sendBtn = document.getElementById('sendBtn');
+            const loading = document.getElementById('loading');
+            
+            const message = input.value.trim();
+            if (!message) return;
+            
+            const suggestion = pickedSuggestion && pickedSuggestion.text === message ? pickedSuggestion.id : null;
+            pickedSuggestion = null;
+            clearTimeout(suggestTimer);
+            suggestSeq++;
+            hideSuggestions();
+            
+            // 사용자 메시지 표시
+            addMessage(message, true);
+            input.value = '';
+            
+            // 로딩 표시
+            sendBtn.disabled = true;
+            loading.style.display = 'block';
+            
+            // 저장된 답변이 있으면 즉시 표시 (응답이 오면 교체)
+            const cached = await answerCache.get(message);
+            const cachedDiv = cached ? addMessage(answerHtml(cached), false) : null;
+            if (cachedDiv) loading.style.display = 'none';
+            
+            if (chatSocket && chatSocket.readyState === WebSocket.OPEN) {
+                const id = nextRequestId++;
+                pendingRequests[id] = { message: message, div: cachedDiv, text: '', cached: !!cachedDiv,
+                                        suggestion: suggestion };
+                chatSocket.send(JSON.stringify({ type: 'chat', id: id, message: message, suggestion: suggestion }));
+                return;
+            }
+            sendViaHttp(message, cachedDiv, suggestion);
+        }
+        
+        // 재방문 시 최근 대화 복원
+        answerCache.recent(3).then(function(items) {
+            items.forEach(function(item) {
+                addMessage(item.message, true);
+                addMessage(answerHtml(item), false);
+            });
+        });
+        
+        if ('serviceWorker' in navigator) {
+            window.addEventListener('load', function() {
+                navigator.serviceWorker.register('/sw.js').catch(function(error) {
+                    console.warn('서비스 워커 등록 실패:', error);
+                });
+            });
+        }
+        
+        connectSocket();
     </script>
 </body>
 </html>
 '''
 
+# 카테고리 키워드 (등록 순서 = 우선순위)
+CATEGORY_KEYWORDS = [
+    ("컬러링", ['컬러', '염색', '애쉬', '브라운', '블론드', '토닝', '탈색']),
+    ("펌", ['펌', '파마', '볼륨', '웨이브', '컬']),
+    ("트리트먼트", ['트리트먼트', '케어', '손상', '영양', '수분']),
+    ("스타일링", ['스타일링', '드라이', '세팅', '매직'])
+]
+
+# 스타일 메뉴 (women_rag_v2), 레시피와 검색 구조(띄어쓰기/오타 허용 자모 색인, 42포뮬러 파라미터 지식 베이스,
+# 자동완성 색인) 스냅숏. /admin/catalog 변경은 새 스냅숏을 만들어 교체하고, 요청은 시작 시 고정한 스냅숏만 읽음
+catalog = CatalogState(CatalogSnapshot.build(load_styles(), HAIR_RECIPES, CATEGORY_KEYWORDS, precomputed_table),
+                       precomputed_table)
+catalog.refresh()
+print(f"📒 스타일 카탈로그: {len(catalog.current.styles)}개 스타일 (v{catalog.current.version})")
+print(f"📐 파라미터: {len(catalog.current.parameter_base)}개, "
+      f"허용 값 {catalog.current.parameter_base.snapshot()['values']}개")
+print(f"🔎 자동완성 색인: {len(catalog.current.suggestion_index)}개 제안")
+
+def classify_category(message):
+    """띄어쓰기/오타 허용 카테고리 ("에쉬 브라운" → 컬러링)"""
+    return catalog.view().classify_category(message)
+
+# 복합 질문 ("탈색 후 볼륨 펌") 최대 카테고리 수
+COMPOUND_MAX_CATEGORIES = 3
+
+def classify_categories(message):
+    """질문에 등장하는 카테고리 전부 (등장 순서)
+
+    오타 허용 일치는 단일 분류에만 사용 (복합 판정 오탐 방지)
+    """
+    return catalog.view().categories_in(message)[:COMPOUND_MAX_CATEGORIES]
+
+def match_styles(message):
+    """메시지가 가리키는 스타일 목록 (없으면 빈 튜플)"""
+    return catalog.view().match_styles(message)
+
+def classify_intent(message):
+    """키워드에 걸리지 않은 질문의 학습 분류 (모델이 없거나 확신이 낮으면 None)
+
+    python intent.py train 으로 만든 모델, 카탈로그에서 빠진 카테고리는 무시
+    """
+    model = load_intent_model(INTENT_MODEL_PATH)
+    if model is None:
+        return None
+    category = model.classify(message)
+    return category if category in catalog.view().recipes else None
+
 def analyze_hair_query(message):
-    """미용사 전용 헤어 레시피 분석"""
-    message_lower = message.lower()
-    
-    if any(word in message_lower for word in ['컬러', '염색', '애쉬', '브라운', '블론드', '토닝', '탈색']):
-        return "컬러링", HAIR_RECIPES["컬러링"]["recipes"]
-    elif any(word in message_lower for word in ['펌', '파마', '볼륨', '웨이브', '컬']):
-        return "펌", HAIR_RECIPES["펌"]["recipes"]
-    elif any(word in message_lower for word in ['트리트먼트', '케어', '손상', '영양', '수분']):
-        return "트리트먼트", HAIR_RECIPES["트리트먼트"]["recipes"]
-    elif any(word in message_lower for word in ['스타일링', '드라이', '세팅', '매직']):
-        return "스타일링", HAIR_RECIPES["스타일링"]["recipes"]
-    else:
-        return "일반상담", [
-            "🎨 컬러링 레시피를 원하시면 '애쉬 브라운' 등을 말씀해주세요",
-            "💫 펜 레시피는 '볼륨 펌' 등으로 문의하세요",
-            "💧 트리트먼트는 '손상모발 케어' 등으로 질문해주세요"
-        ]
+    """미용사 전용 헤어 레시피 분석 (키워드 → 학습 분류 → 일반상담)"""
+    category = classify_category(message) or classify_intent(message)
+    if category:
+        return category, catalog.view().recipes[category]["recipes"]
+    return "일반상담", [
+        "🎨 컬러링 레시피를 원하시면 '애쉬 브라운' 등을 말씀해주세요",
+        "💫 펜 레시피는 '볼륨 펌' 등으로 문의하세요",
+        "💧 트리트먼트는 '손상모발 케어' 등으로 질문해주세요"
+    ]
 
-def get_openai_response(message, recipe_type, recipes):
-    """OpenAI API를 통한 미용사 전용 응답 생성 (구/신버전 호환)"""
-    # API 키 체크
-    if not client and not openai_api_key:
-        return f"""
-        <strong>H {recipe_type} 기본 레시피</strong><br><br>
-        
-        <strong>📋 추천 레시피:</strong><br>
-        {'<br>'.join([f'{recipe}' for recipe in recipes])}<br><br>
-        
-        <strong>⚠️ 주의사항:</strong><br>
-        • 패치 테스트 필수<br>
-        • 모발 상태 확인 후 시술<br>
-        • 시술 시간 준수<br><br>
-        
-        <strong>💡 AI 기능:</strong><br>
-        OpenAI API 연결 시 더 상세한 조언을 받을 수 있어요!
-        """
+SYSTEM_PROMPT = "당신은 전문 미용사를 위한 헤어 기술 전문가입니다."
+
+def build_answer_prompt(message, recipe_type, recipes):
+    """카테고리/기본 레시피/참고 스타일로 답변 프롬프트 구성"""
+    # 스타일 메뉴에서 언급된 스타일 참고 정보
+    styles = match_styles(message)
+    style_line = ""
+    if styles:
+        numbers = ', '.join(style.model_no for style in styles[:3])
+        style_line = (f"참고 스타일: {styles[0].name} ({numbers}) / 섹션: {styles[0].formula}"
+                      f" / 시술 요약: {styles[0].subtitle[:150]}\n")
     
-    try:
-        # 모델 설정
-        model_to_use = openai_model or 'gpt-3.5-turbo'
-        
-        # 전문적인 프롬프트
-        prompt = f"""
+    # 복합 질문이면 이 카테고리 부분만 답하도록 (나머지는 병렬로 따로 답변)
+    related = [category for category in classify_categories(message) if category != recipe_type]
+    if related:
+        style_line += (f"함께 묻는 주제: {', '.join(related)} (별도 답변됨, "
+                       f"{recipe_type} 관점에서 두 시술의 순서/간격만 짧게 언급)\n")
+    
+    # 전문적인 프롬프트
+    return f"""
 당신은 20년 경력의 전문 헤어 디자이너이자 컬러리스트입니다.
 
 미용사 질문: "{message}"
 카테고리: {recipe_type}
 기본 레시피: {', '.join(recipes)}
-
+{style_line}
 다음 조건으로 전문적인 답변을 해주세요:
 
-1. 🎯 구체적인 시술 방법 (단계별)
-2. 📊 정확한 약제 비율과 시간
-3. ⚠️ 주의사항과 트러블슈팅
-4. 💡 프로 팁 (현장에서만 알 수 있는)
-5. 🚫 일반인 사용 금지 명시
+1. 구체적인 시술 방법 (단계별)
+2. 정확한 약제 비율과 시간
+3. 주의사항과 트러블슈팅
+4. 프로 팁 (현장에서만 알 수 있는)
 
-답변은 HTML 형식으로 200자 내외, 이모지 적절히 사용.
-반드시 "전문 미용사 전용" 강조하세요.
+{PROMPT_FORMAT}
         """
+
+def basic_recipe_answer(recipe_type, recipes):
+    """제공자 미설정 시 기본 레시피"""
+    return Answer(
+        title=f"H {recipe_type} 기본 레시피",
+        sections=[('📋 추천 레시피', recipes)],
+        cautions=['패치 테스트 필수', '모발 상태 확인 후 시술', '시술 시간 준수'],
+        note='💡 OpenAI API 연결 시 더 상세한 조언을 받을 수 있어요!'
+    )
+
+class UpstreamError(Exception):
+    """업스트림(텍스트/비전 모델) 호출 실패 (raise_errors=True 일 때, 작업 큐가 재시도)"""
+
+def fallback_answer(recipe_type, recipes, error):
+    """업스트림 오류 시 폴백 응답 (더 전문적으로)"""
+    return Answer(
+        title=f"H {recipe_type} 전문 레시피",
+        sections=[('📋 시술 가이드', recipes)],
+        cautions=['고객 모발 진단 후 시술 진행', '패치 테스트 24시간 전 실시', '시술 중 모발 상태 지속 체크'],
+        note=f"🔧 API 연결 오류: {str(error)[:50]}... 기본 레시피로 제공됩니다."
+    )
+
+def get_openai_response(message, recipe_type, recipes, allow_fallback=True, on_token=None, raise_errors=False):
+    """OpenAI API를 통한 미용사 전용 응답 생성 (구/신버전 호환) → Answer
+
+    allow_fallback=False 이면 업스트림 실패 시 기본 레시피 대신 None 반환 (사전 생성용)
+    raise_errors=True 이면 업스트림 실패 시 UpstreamError (백그라운드 작업: 폴백을 완료로 저장하지 않고 재시도)
+    on_token 이 있으면 스트리밍 조각(JSON 텍스트)을 순서대로 전달 (WebSocket 채널)
+    """
+    started = time.perf_counter()
+    
+    # API 키 체크
+    if not answer_provider:
+        if not allow_fallback:
+            return None
+        record_call('fallback', recipe_type, reason='no_provider')
+        return basic_recipe_answer(recipe_type, recipes)
+    
+    # 모델 설정
+    model_to_use = openai_model or 'gpt-3.5-turbo'
+    
+    # 영구 저장소 확인
+    # 카탈로그 세대 포함 (레시피/스타일이 바뀌면 이전 답변을 쓰지 않음)
+    store_key = answer_key(model_to_use, recipe_type, normalize_question(message), catalog.view().generation)
+    if answer_store:
+        with tracer.span('store lookup') as span:
+            stored = Answer.load(answer_store.get(store_key))
+            span.set(hit=bool(stored))
+        if stored:
+            record_call('store', recipe_type, model=model_to_use,
+                        latency_s=time.perf_counter() - started)
+            return stored
+    
+    try:
+        with tracer.span('prompt build'):
+            prompt = build_answer_prompt(message, recipe_type, recipes)
         
-        # 신버전 API 호출
-        if client:
-            response = client.chat.completions.create(
-                model=model_to_use,
-                messages=[
-                    {"role": "system", "content": "당신은 전문 미용사를 위한 헤어 기술 전문가입니다."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=400,
-                temperature=0.7,
-                top_p=0.9
-            )
-            ai_response = response.choices[0].message.content
-            
-        # 구버전 API 호출 (폴백) - 신버전 방식으로 수정
-        else:
-            # 신버전이지만 client가 None인 경우 - 직접 생성
-            temp_client = OpenAI(api_key=openai_api_key)
-            response = temp_client.chat.completions.create(
-                model=model_to_use,
-                messages=[
-                    {"role": "system", "content": "당신은 전문 미용사를 위한 헤어 기술 전문가입니다."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=400,
-                temperature=0.7
-            )
-            ai_response = response.choices[0].message.content
-        
-        # 응답 검증 및 포맷팅
-        if len(ai_response.strip()) < 50:
-            raise Exception("응답이 너무 짧습니다")
-            
-        return ai_response
-        
-    except Exception as e:
-        logger.error(f"OpenAI API 오류: {e}")
+        # 제공자 호출 (OpenAI 업스트림 풀, Claude 헤지)
+        with tracer.span('upstream', model=model_to_use) as span:
+            result = answer_provider.complete(SYSTEM_PROMPT, prompt, max_tokens=400, temperature=0.7,
+                                              on_token=on_token)
+            span.set(provider=result.provider.name, hedged=result.hedged,
+                     first_token_ms=round(result.first_token_s * 1000, 1) if result.first_token_s is not None else None)
         
-        # 폴백 응답 (더 전문적으로)
-        return f"""
-        <strong>H {recipe_type} 전문 레시피</strong><br><br>
+        # 응답 검증 (JSON 스키마, 지시를 따르지 않은 예전 형식 HTML 은 길이만 확인)
+        try:
+            answer = parse_answer(result.text)
+        except ValueError:
+            if len(result.text.strip()) < 50:
+                raise Exception("응답이 너무 짧습니다")
+            answer = Answer(html=result.text)
         
-        <strong>📋 시술 가이드:</strong><br>
-        {'<br>'.join([f'• {recipe}' for recipe in recipes])}<br><br>
+        if answer_store:
+            answer_store.put(store_key, answer.dumps())
         
-        <strong>⚠️ 전문 미용사 전용 정보:</strong><br>
-        • 고객 모발 진단 후 시술 진행<br>
-        • 패치 테스트 24시간 전 실시<br>
-        • 시술 중 모발 상태 지속 체크<br><br>
+        record_call('live', recipe_type, model=result.provider.model, provider=result.provider.name,
+                    latency_s=time.perf_counter() - started, first_token_s=result.first_token_s,
+                    prompt_tokens=result.usage.input_tokens, completion_tokens=result.usage.output_tokens,
+                    cost_usd=result.cost, hedged=result.hedged)
+        return answer
         
-        <strong>🔧 시스템 정보:</strong><br>
-        API 연결 오류: {str(e)[:50]}...<br>
-        기본 레시피로 제공됩니다.
-        """
+    except Exception as e:
+        logger.error(f"OpenAI API 오류: {e}")
+        tracer.current().fail(e)
+        if raise_errors:
+            raise UpstreamError(str(e)) from e
+        if not allow_fallback:
+            return None
+        record_call('fallback', recipe_type, model=model_to_use, latency_s=time.perf_counter() - started,
+                    reason='too_short' if str(e) == "응답이 너무 짧습니다" else 'upstream_error')
+        return fallback_answer(recipe_type, recipes, e)
+
+def build_image_prompt(message):
+    """사진 분석 프롬프트 (텍스트 답변과 같은 JSON 형식)"""
+    return f"""
+당신은 20년 경력의 전문 헤어 디자이너입니다.
+
+미용사 질문: "{message}"
+
+사진 속 헤어스타일을 42포뮬러 관점에서 분석해주세요:
+
+1. 컷 형태 (One-Length / Graduation / Layer)와 셰이프 (Round / Square / Triangular)
+2. 섹션, 천체축 각도, 디자인 라인 추정
+3. 볼륨 존, 질감, 프린지
+4. 재현을 위한 시술 포인트
+
+t 는 스타일 한 줄 요약, s 는 위 1-3 분석 항목, p 는 4 재현 포인트, 사진으로 알 수 없는 비율/시간은 빈 배열.
+{PROMPT_FORMAT}
+"""
+
+def get_image_analysis(image_bytes, message, raise_errors=False):
+    """이미지 전처리(프로세스 풀) 후 비전 모델 분석, (Answer, source, 이미지 메타, 단계별 ms) 반환
+
+    raise_errors=True 이면 비전 모델 실패 시 오류 안내 답변 대신 UpstreamError
+    """
+    encoded, meta, timings = image_pipeline.process(image_bytes)
+    
+    # 근접 이미지(재저장/재크롭) + 같은 질문의 분석 결과 재사용 (질문이 프롬프트에 들어가므로 키에 포함)
+    image_hash = int(meta['dhash'], 16) if meta.get('dhash') else None
+    question = normalize_question(message)
+    if image_hash is not None:
+        started = time.perf_counter()
+        cached = image_cache.lookup(image_hash, question)
+        timings['cache_lookup_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        if cached:
+            meta['cache_distance'] = cached[1]
+            record_call('image_cache', '이미지분석', model=vision_model, image=True,
+                        latency_s=timings['cache_lookup_ms'] / 1000)
+            return cached[0], 'image_cache', meta, timings
+    
+    # 카탈로그 스타일과 확실히 같은 사진이면 비전 모델 없이 로컬 답변
+    style_match = meta.get('style_match')
+    styles_by_model = catalog.view().styles_by_model
+    if style_match and style_match['confident'] and style_match['model_no'] in styles_by_model:
+        record_call('local', '이미지분석', image=True, latency_s=timings.get('features_ms', 0) / 1000)
+        return local_image_answer(styles_by_model[style_match['model_no']], style_match), 'local', meta, timings
+    
+    if not upstream_pool:
+        record_call('fallback', '이미지분석', reason='no_provider', image=True)
+        return Answer(
+            title='H 이미지 분석',
+            intro=f"이미지 수신 완료 ({meta['size'][0]}×{meta['size'][1]})",
+            note='💡 OpenAI API 연결 시 헤어스타일 분석을 받을 수 있어요!'
+        ), 'fallback', meta, timings
+    
+    started = time.perf_counter()
+    try:
+        response = upstream_pool.chat_completion(
+            model=vision_model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": [
+                    {"type": "text", "text": build_image_prompt(message)},
+                    {"type": "image_url", "image_url": {"url": to_data_url(encoded), "detail": "high"}}
+                ]}
+            ],
+            max_tokens=600,
+            temperature=0.5
+        )
+        ai_response = response.choices[0].message.content or ''
+        # 텍스트 답변과 같은 검증 (지시를 따르지 않은 HTML 은 길이만 확인)
+        try:
+            answer = parse_answer(ai_response)
+        except ValueError:
+            if len(ai_response.strip()) < 50:
+                raise Exception("응답이 너무 짧습니다")
+            answer = Answer(html=ai_response)
+        if image_hash is not None:
+            image_cache.store(image_hash, answer, question)
+        usage = response.usage
+        prompt_tokens = usage.prompt_tokens if usage else 0
+        completion_tokens = usage.completion_tokens if usage else 0
+        record_call('live', '이미지분석', model=vision_model, provider='openai', image=True,
+                    latency_s=time.perf_counter() - started,
+                    prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                    cost_usd=(prompt_tokens * vision_price_in + completion_tokens * vision_price_out) / 1_000_000)
+    except Exception as e:
+        logger.error(f"비전 모델 오류: {e}")
+        if raise_errors:
+            raise UpstreamError(str(e)) from e
+        record_call('fallback', '이미지분석', model=vision_model, reason='upstream_error', image=True,
+                    latency_s=time.perf_counter() - started)
+        timings['upstream_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return Answer(
+            title='H 이미지 분석',
+            intro='이미지 분석 중 오류가 발생했습니다.',
+            note=f"🔧 API 연결 오류: {str(e)[:50]}..."
+        ), 'fallback', meta, timings
+    timings['upstream_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return answer, 'live', meta, timings
+
+def image_analysis_response(load_image, message):
+    """이미지 엔드포인트 공통 처리 및 오류 응답"""
+    started = time.perf_counter()
+    try:
+        image_bytes = load_image()
+        read_ms = round((time.perf_counter() - started) * 1000, 2)
+        answer, source, meta, timings = get_image_analysis(image_bytes, message)
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except TimeoutError as e:
+        # TimeoutError 는 OSError 하위 클래스: 서버 과부하를 이미지 오류(400)로 돌려주지 않도록 먼저 처리
+        logger.warning(f"이미지 처리 시간 초과: {e}")
+        return jsonify({'error': '이미지 처리 대기열이 밀려 있습니다. 잠시 후 다시 시도해주세요.'}), 503, \
+            {'Retry-After': str(IMAGE_RETRY_AFTER_SECONDS)}
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    except (ValueError, OSError) as e:
+        logger.warning(f"이미지 읽기 실패: {e}")
+        return jsonify({'error': '이미지를 읽을 수 없습니다.'}), 400
+    
+    timings['read_ms'] = read_ms
+    timings['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(f"이미지 분석 완료: {meta['original_bytes']}B → {meta['bytes']}B, {timings}")
+    
+    return jsonify(answer_payload(answer, '이미지분석', source, message_type='image_analysis', image=meta,
+                                  timings=timings, queue_depth=image_pipeline.queue_depth))
+
+@app.route('/analyze-image', methods=['POST'])
+def analyze_image():
+    """Base64 이미지 분석"""
+    data = request.get_json(silent=True) or {}
+    image_data = data.get('image_data')
+    if not image_data:
+        return jsonify({'error': 'image_data가 비어있습니다.'}), 400
+    message = data.get('message', '').strip() or '이 헤어스타일을 분석해주세요.'
+    return image_analysis_response(lambda: decode_data_url(image_data), message)
+
+@app.route('/upload-image', methods=['POST'])
+def upload_image():
+    """파일 업로드(멀티파트) 또는 이미지 본문 직접 업로드 분석"""
+    if request.mimetype and request.mimetype.startswith('image/'):
+        message = request.args.get('message', '').strip()
+        stream, length = request.stream, request.content_length
+    else:
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': 'file이 비어있습니다.'}), 400
+        message = request.form.get('message', '').strip()
+        stream, length = upload.stream, upload.content_length
+    return image_analysis_response(lambda: read_stream(stream, length=length), message or '이 헤어스타일을 분석해주세요.')
+
+# 대화 친화성 (여러 복제본: 같은 대화는 같은 노드로, nginx hash consistent 와 같은 링)
+CONVERSATION_COOKIE = 'hg_cid'
+affinity = Affinity.from_env()
+affinity.start_prober()
+if affinity.enabled:
+    print(f"🧭 대화 친화성: {affinity.self_address} (노드 {len(affinity.nodes)}개, "
+          f"{'전달' if affinity.forward_enabled else 'nginx 라우팅'})")
+if tracer.enabled:
+    print(f"🛰️ 분산 추적: 느린 요청 {tracer.slow_ms:.0f}ms 이상/오류 보관, 샘플 {tracer.sample_rate:.0%}")
+
+def conversation_key(data=None):
+    """대화 키: X-Conversation-Id 헤더 → 본문 conversation_id/user_id → 쿠키"""
+    data = data or {}
+    return (request.headers.get('X-Conversation-Id') or data.get('conversation_id') or data.get('user_id')
+            or request.cookies.get(CONVERSATION_COOKIE) or '')[:100]
 
 @app.route('/')
 def home():
-    return render_template_string(HTML_TEMPLATE)
+    response = Response(render_template_string(HTML_TEMPLATE), mimetype='text/html')
+    if not request.cookies.get(CONVERSATION_COOKIE):
+        response.set_cookie(CONVERSATION_COOKIE, uuid.uuid4().hex, max_age=365 * 24 * 3600, samesite='Lax')
+    return response
+
+# 오프라인 우선 셸 (서비스 워커, 매니페스트, 기본 레시피)
+@lru_cache(maxsize=8)
+def shell_version(generation):
+    """셸 캐시 버전: 템플릿/워커 소스 + 카탈로그 세대 (반영으로 /recipes 가 바뀌면 셸 캐시도 교체)"""
+    return asset_version(HTML_TEMPLATE, SERVICE_WORKER_JS, generation)
+
+@app.route('/sw.js')
+def service_worker():
+    version = shell_version(catalog.view().generation)
+    response = Response(service_worker_js(version), mimetype='application/javascript')
+    # 브라우저가 매 방문마다 워커 갱신 여부를 확인하도록
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Service-Worker-Allowed'] = '/'
+    return response
+
+@app.route('/manifest.webmanifest')
+def web_manifest():
+    response = Response(json.dumps(manifest(), ensure_ascii=False), mimetype='application/manifest+json')
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+@app.route('/icon.svg')
+def app_icon():
+    response = Response(ICON_SVG, mimetype='image/svg+xml')
+    response.headers['Cache-Control'] = 'public, max-age=604800'
+    return response
+
+# 프록시/CDN 캐시용 읽기 전용 GET 자원 (레시피, 스타일, 사전 답변)
+def build_edge_resources(snapshot):
+    resources = EdgeResources()
+    app_mtime = os.path.getmtime(__file__)
+    catalog_path = default_catalog_path()
+    catalog_mtime = os.path.getmtime(catalog_path) if catalog_path and os.path.exists(catalog_path) else app_mtime
+    # 온라인 반영이 있었으면 그 시각
+    if snapshot.version:
+        app_mtime = catalog_mtime = max(catalog_mtime, snapshot.updated_at)
+    try:
+        table_mtime = datetime.fromisoformat(precomputed_table.created_at).timestamp()
+    except (TypeError, ValueError):
+        table_mtime = app_mtime
+    
+    resources.add('/recipes', snapshot.recipes, ['recipes'], app_mtime)
+    for category, data in snapshot.recipes.items():
+        resources.add(f'/recipes/{category}', dict(data, category=category),
+                      ['recipes', f'recipes/{category}'], app_mtime)
+    
+    resources.add('/styles', [
+        {'model_no': style.model_no, 'name': style.name, 'length': style.length_code, 'formula': style.formula}
+        for style in snapshot.styles
+    ], ['styles'], catalog_mtime)
+    for style in snapshot.styles:
+        resources.add(f'/styles/{style.model_no}', style.to_dict(),
+                      ['styles', f'style/{style.model_no}'], catalog_mtime)
+    
+    resources.add('/parameters', [
+        {'parameter': parameter.name, 'key': parameter.key, 'label': parameter.label,
+         'group': parameter.group, 'values': len(parameter.values)}
+        for parameter in snapshot.parameter_base.parameters
+    ], ['parameters'], catalog_mtime)
+    for parameter in snapshot.parameter_base.parameters:
+        resources.add(f'/parameters/{parameter.key}', parameter.to_dict(),
+                      ['parameters', f'parameter/{parameter.key}'], catalog_mtime)
+    
+    for category, questions in precomputed_table.entries.items():
+        resources.add(f'/answers/{category}', {
+            'category': category,
+            'version': precomputed_table.version,
+            'answers': [{'key': key, 'question': entry.get('question') or key, 'answer': Answer.load(entry['answer']).to_dict()}
+                        for key, entry in questions.items()]
+        }, ['answers', f'answers/{category}'], table_mtime)
+    return resources
+
+edge_resources = build_edge_resources(catalog.current)
+edge_purger = EdgePurger()
+try:
+    edge_purger.sync(edge_resources)
+except OSError as e:
+    logger.warning(f"엣지 캐시 상태 확인 실패: {e}")
+print(f"🌍 캐시 가능 GET 자원: {len(edge_resources)}개 (퍼지: {'✅' if edge_purger.enabled else '미설정'})")
+
+def publish_edge_resources(snapshot):
+    """카탈로그 스냅숏이 바뀌면 GET 자원도 새로 직렬화해 교체하고 바뀐 경로 퍼지"""
+    global edge_resources
+    resources = build_edge_resources(snapshot)
+    resources.stats = edge_resources.stats
+    edge_resources = resources
+    try:
+        # 다른 워커가 따라잡는 동안 프록시가 다시 캐시한 이전 응답은 그 뒤 한 번 더 퍼지
+        edge_purger.sync(resources, settle_seconds=catalog.settle_seconds, generation=snapshot.generation)
+    except OSError as e:
+        logger.warning(f"엣지 캐시 상태 확인 실패: {e}")
+
+catalog.subscribe(publish_edge_resources)
+if catalog.start_watcher():
+    print(f"📒 카탈로그 변경 기록: {catalog.journal_path}")
+
+def edge_response(path):
+    """캐시 가능한 GET 자원 응답
+
+    요청 경로가 정규 경로와 다르면(소문자 모델 번호, 파라미터 별칭, 쿼리 문자열) 정규 경로로 301.
+    변형 경로를 프록시가 따로 캐시하면 정규 경로만 퍼지하는 무효화에서 빠지므로 본문은 정규 경로로만 내보냄
+    """
+    if (request.path != path or request.query_string) and edge_resources.get(path) is not None:
+        response = redirect(quote(path), 301)
+        response.headers['Cache-Control'] = f'public, max-age={EDGE_BROWSER_MAX_AGE}'
+        return response
+    response = edge_resources.respond(path, request, Response)
+    if response is None:
+        return jsonify({'error': '찾을 수 없습니다.'}), 404
+    return response
+
+@app.route('/recipes')
+def recipes():
+    """기본 레시피 (페이지 오프라인 표시용)"""
+    return edge_response('/recipes')
+
+@app.route('/recipes/<category>')
+def category_recipes(category):
+    return edge_response(f'/recipes/{category}')
+
+@app.route('/styles')
+def styles_menu():
+    """스타일 메뉴 요약 (모델 번호, 스타일명, 길이, 섹션)"""
+    return edge_response('/styles')
+
+@app.route('/styles/<model_no>')
+def style_record(model_no):
+    return edge_response(f'/styles/{model_no.upper()}')
+
+@app.route('/answers/<category>')
+def category_answers(category):
+    """사전 답변 테이블의 카테고리별 질문/답변"""
+    return edge_response(f'/answers/{category}')
+
+@app.route('/parameters')
+def parameters_list():
+    """42포뮬러 파라미터 목록"""
+    return edge_response('/parameters')
+
+@app.route('/parameters/<path:name>')
+def parameter_info(name):
+    """파라미터 하나 (키/영문 이름/한글 별칭, 띄어쓰기/오타 허용)"""
+    parameter_base = catalog.view().parameter_base
+    parameter = parameter_base.get(name)
+    if parameter is None:
+        return jsonify({'error': f"알 수 없는 파라미터: {name[:50]}",
+                        'parameters': [p.key for p in parameter_base.parameters]}), 404
+    return edge_response(f'/parameters/{parameter.key}')
+
+PARAMETER_PROMPT = """
+미용사 질문: "{message}"
+
+질문이 설명하는 헤어스타일의 42포뮬러 파라미터를 추정해 JSON 객체 하나로만 답하세요.
+형식: {{"parameters": {{"<키>": "<값>", ...}}}}
+확실하지 않은 파라미터는 생략하고, 값은 아래 허용 값 중에서만 고르세요.
+
+{schema}
+"""
+
+def extract_parameters(message):
+    """질문 → 검증된 파라미터 (ParameterSet, 거부 항목, source)
+
+    스타일 메뉴에 있는 스타일이면 카탈로그 값, 아니면 저장소 → LLM JSON 모드.
+    LLM 출력은 허용 값으로 검증한 결과만 저장해 재사용 (재생성 없음)
+    """
+    parameter_base = catalog.view().parameter_base
+    styles = match_styles(message)
+    if styles and parameter_base.style_sets.get(styles[0].model_no):
+        record_call('local', '파라미터')
+        return parameter_base.style_sets[styles[0].model_no][0], {}, 'catalog'
+    if not upstream_pool:
+        return None, {}, 'unavailable'
+    
+    started = time.perf_counter()
+    store_key = answer_key(openai_model, '파라미터', normalize_question(message), catalog.view().generation)
+    stored = answer_store.get(store_key) if answer_store else None
+    if stored:
+        record_call('store', '파라미터', model=openai_model, latency_s=time.perf_counter() - started)
+        parameter_set, _ = parameter_base.from_values(json.loads(stored))
+        return parameter_set, {}, 'store'
+    
+    response = upstream_pool.chat_completion(
+        model=openai_model,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": PARAMETER_PROMPT.format(message=message, schema=parameter_base.schema_prompt())}
+        ],
+        response_format={"type": "json_object"},
+        max_tokens=500,
+        temperature=0.2
+    )
+    usage = response.usage
+    record_call('live', '파라미터', model=openai_model, provider='openai', latency_s=time.perf_counter() - started,
+                prompt_tokens=usage.prompt_tokens if usage else 0,
+                completion_tokens=usage.completion_tokens if usage else 0)
+    parameter_set, rejected = parameter_base.parse_json(response.choices[0].message.content)
+    if rejected:
+        logger.info(f"허용 값이 아닌 파라미터 {len(rejected)}개 제외: {list(rejected)[:5]}")
+    if answer_store and len(parameter_set):
+        answer_store.put(store_key, json.dumps(parameter_set.to_dict(), ensure_ascii=False, separators=(',', ':')))
+    return parameter_set, rejected, 'live'
+
+@app.route('/parameters/extract', methods=['POST'])
+def parameters_extract():
+    """질문이 설명하는 스타일의 파라미터 (검증된 값만)"""
+    data = request.get_json(silent=True) or {}
+    message = str(data.get('message', '')).strip()[:CHAT_MAX_CHARS]
+    if not message:
+        return jsonify({'error': '메시지가 비어있습니다.'}), 400
+    try:
+        parameter_set, rejected, source = extract_parameters(message)
+    except ValueError as e:
+        logger.error(f"파라미터 JSON 파싱 실패: {e}")
+        return jsonify({'error': '파라미터 응답을 해석하지 못했습니다.'}), 502
+    except Exception as e:
+        logger.error(f"파라미터 추출 오류: {e}")
+        return jsonify({'error': str(e)}), 502
+    if parameter_set is None:
+        return jsonify({'error': 'AI 제공자가 설정되지 않았습니다.'}), 503
+    return jsonify({
+        'parameters': parameter_set.to_dict(),
+        'formula': parameter_set.title,
+        'rejected': rejected,
+        'source': source
+    })
+
+def parameter_section(parameter_set):
+    """포뮬러 하나 → (제목, 파라미터 줄 목록)"""
+    return (f"📐 {parameter_set.title}",
+            [f"{parameter.label} ({parameter.name}): {value}" for parameter, value in parameter_set.items()])
+
+def parameter_answer(message, describe=True):
+    """파라미터/포뮬러 질문이면 지식 베이스로 바로 만든 답변 (아니면 None)
+
+    스타일 + "포뮬러/파라미터" 는 항상, 파라미터 설명은 describe 일 때만
+    """
+    parameter_base = catalog.view().parameter_base
+    styles = match_styles(message)
+    text = compact(message)
+    if styles and any(word in text for word in ('파라미터', '포뮬러', 'formula', 'parameter')):
+        style = styles[0]
+        formulas = parameter_base.style_sets.get(style.model_no)
+        if formulas:
+            return Answer(title=f"✂️ {style.model_no} {style.name} 42포뮬러",
+                          sections=[parameter_section(parameter_set) for parameter_set in formulas])
+    
+    mentioned = parameter_base.mentioned(message)[:3] if describe else []
+    if not mentioned:
+        return None
+    sections = []
+    for parameter in mentioned:
+        values = [f"{value} ({count}회) - 예: {', '.join(examples[:3])}"
+                  for value, count, examples in zip(parameter.values[:6], parameter.counts, parameter.examples)]
+        sections.append((f"📐 {parameter.label} ({parameter.name})", values))
+    return Answer(sections=sections, note='스타일 메뉴 포뮬러에서 자주 쓰인 값 순서')
+
+def local_recipe_answer(recipe_type, recipes):
+    """업스트림 호출 없이 바로 보여주는 기본 레시피"""
+    return Answer(title=f"H {recipe_type} 레시피", sections=[('📋 추천 레시피', recipes)],
+                  cautions=['패치 테스트 필수', '모발 상태 확인 후 시술'])
+
+def style_answer(style, title=None):
+    """스타일 메뉴 한 행 요약"""
+    return Answer(
+        title=title or f"✂️ {style.model_no} {style.name}",
+        intro=style.intro.split('\n\n', 1)[0],
+        sections=[('📐 섹션', [style.formula]), ('📋 시술 요약', [style.subtitle])]
+    )
+
+def local_image_answer(style, style_match):
+    """사진이 스타일 메뉴 스타일과 일치할 때의 로컬 분석 답변 (요약 + 첫 포뮬러 파라미터)"""
+    answer = style_answer(style, title=f"🔍 스타일 메뉴 일치: {style.model_no} {style.name} "
+                                       f"(유사도 {style_match['score']:.2f})")
+    formulas = catalog.view().parameter_base.style_sets.get(style.model_no)
+    if formulas:
+        answer.sections += (parameter_section(formulas[0]),)
+    return answer
+
+def suggestion_answer(suggestion_id):
+    """자동완성 선택 시 저장된/로컬 답변 (recipe_type, response, source) 또는 None"""
+    snapshot = catalog.view()
+    suggestion = snapshot.suggestion_index.get(suggestion_id)
+    if suggestion is None:
+        return None
+    if suggestion.kind == 'question':
+        entry = precomputed_table.entries.get(suggestion.category, {}).get(suggestion.ref)
+        return (suggestion.category, Answer.load(entry['answer']), 'precomputed') if entry else None
+    if suggestion.kind == 'recipe':
+        recipe = snapshot.recipes[suggestion.category]["recipes"][suggestion.ref]
+        return suggestion.category, local_recipe_answer(suggestion.category, [recipe]), 'suggestion'
+    if suggestion.kind == 'keyword':
+        recipes = snapshot.recipes[suggestion.category]["recipes"]
+        return suggestion.category, local_recipe_answer(suggestion.category, recipes), 'suggestion'
+    if suggestion.kind == 'style' and suggestion.ref in snapshot.styles_by_model:
+        return "스타일", style_answer(snapshot.styles_by_model[suggestion.ref]), 'suggestion'
+    return None
+
+@app.route('/suggest')
+def suggest():
+    """입력 중 자동완성 (?q=)"""
+    query = request.args.get('q', '')[:50]
+    return jsonify({
+        'query': query,
+        'suggestions': [suggestion.to_dict() for suggestion in catalog.view().suggestion_index.search(query)]
+    })
+
+# 질문 길이 상한 (캐시 키/로그/프롬프트가 요청 크기만큼 커지지 않도록)
+CHAT_MAX_CHARS = 2000
+LOG_MESSAGE_CHARS = 100
+
+# 복합 질문의 카테고리별 답변을 동시에 생성 (업스트림 대기 시간이 대부분이라 스레드)
+compound_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='compound')
+
+def answer_payload(answer, recipe_type, source, **extra):
+    """HTTP/WebSocket/작업 결과 공용 응답 (answer: 구조화 답변, response: 예전 클라이언트용 HTML)"""
+    return dict({
+        'response': render_html(answer),
+        'answer': answer.to_dict(),
+        'recipe_type': recipe_type,
+        'source': source,
+        'timestamp': datetime.now().isoformat()
+    }, **extra)
+
+def precomputed_answer(message, recipe_type):
+    return Answer.load(precomputed_table.lookup(message, recipe_type))
+
+def answer_category(message, recipe_type, raise_errors=False):
+    """카테고리 하나 답변: 사전 답변 → 저장소/업스트림 (Answer, source)"""
+    with tracer.span('compound part', category=recipe_type):
+        answer = precomputed_answer(message, recipe_type)
+        if answer:
+            record_call('precomputed', recipe_type)
+            return answer, 'precomputed'
+        return get_openai_response(message, recipe_type, catalog.view().recipes[recipe_type]["recipes"],
+                                   raise_errors=raise_errors), 'live'
+
+def answer_compound(message, categories, conversation=None, raise_errors=False):
+    """여러 카테고리에 걸친 질문: 카테고리별 하위 질문을 병렬로 답하고 하나로 합침
+
+    전체 시간은 합이 아니라 가장 느린 하위 답변에 가까움.
+    조각 스트리밍(on_token)은 섞이므로 하지 않고 완성된 답변만 반환.
+    하위 답변 하나가 실패하면 그 카테고리만 기본 레시피 (raise_errors=True 면 작업 재시도를 위해 그대로 올림)
+    """
+    started = time.perf_counter()
+    futures = [compound_executor.submit(tracer.bind(answer_category), message, category, raise_errors)
+               for category in categories]
+    answers, parts = [], []
+    for category, future in zip(categories, futures):
+        query_logger.log(message, category, conversation)
+        try:
+            answer, source = future.result()
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"복합 질문 하위 답변 실패 ({category}): {e}")
+            record_call('fallback', category, reason='compound_part_error')
+            answer, source = fallback_answer(category, catalog.view().recipes[category]["recipes"], e), 'fallback'
+        answers.append(answer)
+        parts.append({'recipe_type': category, 'source': source})
+    
+    merged = Answer(title=f"🧩 복합 질문: {' + '.join(categories)}", parts=answers)
+    logger.info(f"복합 질문 답변 완료: {' + '.join(categories)} ({(time.perf_counter() - started) * 1000:.0f}ms)")
+    
+    return answer_payload(merged, ' + '.join(categories), 'compound', categories=list(categories), parts=parts)
+
+def answer_chat(message, on_token=None, suggestion=None, conversation=None, raise_errors=False):
+    """질문 하나 처리 (HTTP /chat 과 WebSocket 채널 공용)
+
+    suggestion: 자동완성에서 고른 제안 ID (로컬/사전 답변으로 바로 응답)
+    conversation: 대화 키 (질의 로그에 남겨 일반상담 뒤 다시 물은 질문을 의도 분류 학습에 사용)
+    raise_errors: 업스트림 실패 시 폴백 답변 대신 UpstreamError (백그라운드 작업)
+    처리 중 카탈로그가 바뀌어도 시작 시점 스냅숏으로 끝까지 답변 (복합 질문 스레드에도 전달)
+    """
+    with catalog.pin():
+        return _answer_chat(message, on_token, suggestion, conversation, raise_errors)
+
+def _answer_chat(message, on_token, suggestion, conversation, raise_errors):
+    message = message[:CHAT_MAX_CHARS]
+    logger.info(f"미용사 질문: {message[:LOG_MESSAGE_CHARS]}")
+    
+    if suggestion:
+        picked = suggestion_answer(suggestion)
+        if picked:
+            recipe_type, answer, source = picked
+            query_logger.log(message, recipe_type, conversation)
+            record_call('suggestion', recipe_type)
+            return answer_payload(answer, recipe_type, source)
+    
+    # 스타일 포뮬러/파라미터 질문은 지식 베이스로 바로 답변 (파라미터 설명은 레시피 카테고리가 아닐 때만)
+    with tracer.span('classify') as span:
+        categories = classify_categories(message)
+        answer = parameter_answer(message, describe=not categories and classify_category(message) is None)
+        span.set(categories=', '.join(categories), parameters=bool(answer))
+    if answer:
+        query_logger.log(message, '파라미터', conversation)
+        record_call('local', '파라미터')
+        return answer_payload(answer, '파라미터', 'parameters')
+    
+    # 여러 카테고리에 걸친 질문은 카테고리별 병렬 답변
+    if len(categories) > 1:
+        return answer_compound(message, categories, conversation, raise_errors)
+    
+    # 헤어 레시피 분석
+    recipe_type, recipes = analyze_hair_query(message)
+    query_logger.log(message, recipe_type, conversation)
+    
+    # 사전 답변 우선, 없으면 AI 응답 생성
+    with tracer.span('precomputed lookup') as span:
+        answer = precomputed_answer(message, recipe_type)
+        span.set(hit=bool(answer))
+    source = 'precomputed' if answer else 'live'
+    if answer:
+        record_call('precomputed', recipe_type)
+    else:
+        answer = get_openai_response(message, recipe_type, recipes, on_token=on_token, raise_errors=raise_errors)
+    
+    logger.info(f"레시피 제공 완료: {recipe_type} ({source})")
+    
+    return answer_payload(answer, recipe_type, source)
 
 @app.route('/chat', methods=['POST'])
 def chat():
+    # nginx/클라이언트의 traceparent 를 이어받아 추적 (느리거나 실패한 trace 만 내보냄)
+    with tracer.start_trace('POST /chat', request.headers.get('traceparent'), **{'http.route': '/chat'}) as span:
+        response = _chat()
+        if isinstance(response, tuple):
+            span.set(**{'http.status_code': response[1]})
+            if response[1] >= 500:
+                span.fail(f"HTTP {response[1]}")
+        if span.trace_id:
+            response = app.make_response(response)
+            response.headers['X-Trace-Id'] = span.trace_id
+        return response
+
+def _chat():
     try:
         data = request.get_json()
         message = data.get('message', '').strip()
@@ -800,21 +1985,26 @@ def chat():
         if not message:
             return jsonify({'error': '메시지가 비어있습니다.'}), 400
         
-        logger.info(f"미용사 질문: {message}")
-        
-        # 헤어 레시피 분석
-        recipe_type, recipes = analyze_hair_query(message)
-        
-        # AI 응답 생성
-        response = get_openai_response(message, recipe_type, recipes)
+        # 다른 노드 담당 대화는 그 노드로 전달 (nginx 가 라우팅하지 못한 경우만)
+        key = conversation_key(data)
+        owner = affinity.owner(key)
+        if owner != affinity.self_address and affinity.forward_enabled and not request.headers.get(FORWARDED_HEADER):
+            forwarded = affinity.forward(owner, '/chat', request.get_data())
+            if forwarded:
+                status, body, content_type = forwarded
+                return Response(body, status=status, content_type=content_type,
+                                headers={'X-Affinity-Node': owner})
+            # 전달 실패 시 담당 노드가 링에서 빠졌으므로 다시 계산
+            owner = affinity.owner(key)
         
-        logger.info(f"레시피 제공 완료: {recipe_type}")
-        
-        return jsonify({
-            'response': response,
-            'recipe_type': recipe_type,
-            'timestamp': datetime.now().isoformat()
-        })
+        result = answer_chat(message, suggestion=data.get('suggestion'), conversation=key)
+        # 페이지는 구조화 답변만 받아 직접 렌더링 (HTML 중복 전송 생략)
+        if data.get('format') == 'answer':
+            result.pop('response')
+        response = jsonify(result)
+        if affinity.enabled:
+            response.headers['X-Affinity-Node'] = owner
+        return response
         
     except Exception as e:
         logger.error(f"채팅 처리 오류: {e}")
@@ -823,29 +2013,260 @@ def chat():
             'error': str(e)
         }), 500
 
+# WebSocket 채팅 채널 (flask-sock 설치 시, 미설치면 페이지가 /chat 으로 폴백)
+chat_sockets = ChatSocketServer(answer_chat)
+print(f"🔌 WebSocket 채널: {'✅ /ws/chat' if chat_sockets.register(app) else '❌ flask-sock 미설치 (HTTP 폴백)'}")
+
+# 백그라운드 작업 (이미지 분석/긴 답변: 제출 즉시 작업 ID, 결과는 롱 폴링 또는 SSE)
+JOB_WAIT_MAX_SECONDS = 25
+JOB_EVENTS_MAX_SECONDS = 300
+
+# 업스트림 실패는 UpstreamError 로 올려 작업 큐가 백오프 후 재시도 (폴백 답변을 완료로 저장하지 않음)
+def chat_job(payload, blob):
+    return answer_chat(payload['message'], suggestion=payload.get('suggestion'), raise_errors=True)
+
+def image_job(payload, blob):
+    try:
+        answer, source, meta, timings = get_image_analysis(blob, payload['message'], raise_errors=True)
+    except (UpstreamError, TimeoutError):
+        # 시간 초과는 과부하: 백오프 후 재시도
+        raise
+    except (ImageTooLarge, RuntimeError, ValueError, OSError) as e:
+        raise PermanentError(str(e))
+    return answer_payload(answer, '이미지분석', source, message_type='image_analysis', image=meta, timings=timings)
+
+try:
+    job_queue = JobQueue()
+    job_queue.register('chat', chat_job, priority=10)
+    job_queue.register('image', image_job, priority=5)
+    job_queue.start()
+    print(f"🧵 작업 큐: {job_queue.path} (워커 스레드 {job_queue.workers}개)")
+except Exception as e:
+    logger.error(f"작업 큐 초기화 실패: {e}")
+    job_queue = None
+
+def job_urls(job_id):
+    return {'poll_url': f"/jobs/{job_id}?wait={JOB_WAIT_MAX_SECONDS}", 'events_url': f"/jobs/{job_id}/events"}
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """작업 제출: JSON {kind: chat|image, message, image_data, priority} 또는 멀티파트 이미지(file)"""
+    if not job_queue:
+        return jsonify({'error': '작업 큐가 비활성 상태입니다.'}), 503
+    
+    blob = None
+    try:
+        if request.files.get('file'):
+            kind = 'image'
+            data = request.form
+            blob = read_stream(request.files['file'].stream)
+        else:
+            data = request.get_json(silent=True) or {}
+            kind = data.get('kind', 'chat')
+            if kind == 'image':
+                if not data.get('image_data'):
+                    return jsonify({'error': 'image_data가 비어있습니다.'}), 400
+                blob = decode_data_url(data['image_data'])
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except (ValueError, OSError) as e:
+        logger.warning(f"이미지 읽기 실패: {e}")
+        return jsonify({'error': '이미지를 읽을 수 없습니다.'}), 400
+    
+    message = (data.get('message') or '').strip()
+    if kind == 'image':
+        message = message or '이 헤어스타일을 분석해주세요.'
+    elif not message:
+        return jsonify({'error': '메시지가 비어있습니다.'}), 400
+    
+    priority = data.get('priority')
+    try:
+        priority = max(0, min(20, int(priority))) if priority is not None else None
+        job_id = job_queue.submit(kind, {'message': message[:2000], 'suggestion': data.get('suggestion')},
+                                  blob=blob, priority=priority)
+    except UnknownJobKind:
+        return jsonify({'error': f"알 수 없는 작업 종류입니다: {kind}"}), 400
+    except ValueError:
+        return jsonify({'error': 'priority는 숫자여야 합니다.'}), 400
+    
+    return jsonify(dict(job_urls(job_id), job_id=job_id, status='queued')), 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """작업 상태/결과 (?wait=초: 완료될 때까지 최대 25초 롱 폴링)"""
+    if not job_queue:
+        return jsonify({'error': '작업 큐가 비활성 상태입니다.'}), 503
+    try:
+        wait = max(0.0, min(float(request.args.get('wait', 0)), JOB_WAIT_MAX_SECONDS))
+    except ValueError:
+        wait = 0.0
+    job = job_queue.wait(job_id, wait) if wait else job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '작업을 찾을 수 없습니다.'}), 404
+    return jsonify(dict(job, **job_urls(job_id)))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """작업 상태 변화를 Server-Sent Events 로 전송 (완료 시 done 이벤트 후 종료)"""
+    if not job_queue:
+        return jsonify({'error': '작업 큐가 비활성 상태입니다.'}), 503
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': '작업을 찾을 수 없습니다.'}), 404
+    
+    def stream():
+        yield "retry: 2000\n\n"
+        for job in job_queue.watch(job_id, JOB_EVENTS_MAX_SECONDS):
+            if job is None:
+                yield ": keepalive\n\n"
+                continue
+            event = job['status'] if job['status'] in ('done', 'failed') else 'status'
+            yield f"event: {event}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/health')
 def health():
     """서버 상태 및 환경변수 체크"""
+    intent_model = load_intent_model(INTENT_MODEL_PATH)
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'environment': os.getenv('ENVIRONMENT', 'development'),
-        'openai_available': bool(client or openai_api_key),
+        'openai_available': bool(upstream_pool),
+        'answer_provider': answer_provider.name if answer_provider else None,
+        'hedge': answer_provider.report() if isinstance(answer_provider, HedgedCompleter) else None,
         'openai_model': openai_model,
-        'claude_available': bool(claude_api_key and claude_api_key != '............'),
+        'claude_available': claude_available,
         'claude_model': claude_model if claude_api_key else None,
+        'precomputed_version': precomputed_table.version,
+        'precomputed_entries': len(precomputed_table),
+        'answer_store': answer_store.snapshot() if answer_store else None,
+        'upstream': upstream_pool.snapshot() if upstream_pool else [],
+        'image_pipeline': image_pipeline.snapshot(),
+        'image_cache': image_cache.snapshot(),
+        'websocket': chat_sockets.snapshot(),
+        'ledger': ledger.snapshot() if ledger else None,
+        'jobs': job_queue.snapshot() if job_queue else None,
+        'edge': dict(edge_resources.snapshot(), purge=edge_purger.snapshot()),
+        'memory': memory_watch.snapshot(),
+        'parameters': catalog.current.parameter_base.snapshot(),
+        'catalog': catalog.snapshot(),
+        'intent': intent_model.snapshot() if intent_model else None,
+        'affinity': affinity.snapshot(),
+        'tracing': tracer.snapshot(),
+        'encoding': response_compressor.snapshot(),
         'python_version': os.getenv('PYTHON_VERSION', 'default'),
         'port': os.getenv('PORT', '5000')
     })
 
+# 관리자 엔드포인트 (ADMIN_TOKEN 미설정 시 비활성)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+def admin_required(view):
+    """X-Admin-Token 헤더로만 인증 (쿼리 문자열 토큰은 접근 로그/리퍼러에 남으므로 받지 않음)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token', '')
+        # 상수 시간 비교 (응답 시간으로 토큰 앞부분을 추측하지 못하도록)
+        if not ADMIN_TOKEN or not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'error': '관리자 인증이 필요합니다.'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def parse_time_arg(value, default):
+    """'2024-05-01' / '2024-05-01T09:00' / 유닉스 시각 → 초"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/admin/ledger')
+@admin_required
+def admin_ledger():
+    """원장 집계 조회 (?from=&to=&group=category|model|tier|provider|minute|hour|day)"""
+    if not ledger:
+        return jsonify({'error': '원장이 비활성 상태입니다.'}), 503
+    group = request.args.get('group', 'category')
+    if group not in LEDGER_GROUPS:
+        return jsonify({'error': f"group 은 {', '.join(LEDGER_GROUPS)} 중 하나여야 합니다."}), 400
+    try:
+        end = parse_time_arg(request.args.get('to'), time.time())
+        start = parse_time_arg(request.args.get('from'), end - 30 * 86400)
+    except ValueError:
+        return jsonify({'error': '잘못된 날짜 형식입니다.'}), 400
+    result = ledger.query(start, end, group)
+    result.update({'from': start, 'to': end})
+    return jsonify(result)
+
+@app.route('/admin/catalog', methods=['GET', 'POST'])
+@admin_required
+def admin_catalog():
+    """스타일/레시피 온라인 반영
+
+    POST {"changes": [{"kind": "style"|"recipe", "op": "upsert"|"delete", "record": {...} | "key": "..."}]}
+    검증 실패 시 아무것도 반영하지 않고 400
+    """
+    if request.method == 'POST':
+        changes = (request.get_json(silent=True) or {}).get('changes')
+        try:
+            snapshot = catalog.apply(changes)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        logger.info(f"카탈로그 반영: v{snapshot.version} ({len(changes)}개 변경, {catalog.stats['publish_ms']}ms)")
+    else:
+        catalog.refresh()
+    return jsonify(dict(catalog.snapshot(), pid=os.getpid()))
+
+# 메모리 증가 추적 (MEMWATCH_ENABLED=true 면 부팅 시점부터, 아니면 /admin/memory 로 시작)
+memory_watch = MemoryWatch()
+if MEMWATCH_ENABLED:
+    memory_watch.start()
+    print("🧠 메모리 추적: ✅ tracemalloc 시작")
+
+@app.route('/affinity')
+def affinity_owner():
+    """대화 키의 담당 노드 (?key=, 없으면 헤더/쿠키의 대화 키)"""
+    key = request.args.get('key') or conversation_key()
+    owner = affinity.owner(key)
+    return jsonify({
+        'key': key,
+        'node': owner,
+        'local': owner == affinity.self_address,
+        'enabled': affinity.enabled,
+        'healthy': sorted(affinity.healthy)
+    })
+
+@app.route('/admin/memory', methods=['GET', 'POST'])
+@admin_required
+def admin_memory():
+    """기준 스냅숏 대비 할당 위치별 증가량 (?group=lineno|filename|traceback&limit=20)
+
+    POST {"action": "start" | "reset" | "stop"} 으로 추적 시작/기준 갱신/중지
+    """
+    if request.method == 'POST':
+        action = (request.get_json(silent=True) or {}).get('action')
+        if action not in ('start', 'reset', 'stop'):
+            return jsonify({'error': 'action 은 start, reset, stop 중 하나여야 합니다.'}), 400
+        getattr(memory_watch, action)()
+        return jsonify(memory_watch.snapshot())
+    
+    group = request.args.get('group', 'lineno')
+    if group not in MEMORY_GROUPINGS:
+        return jsonify({'error': f"group 은 {', '.join(MEMORY_GROUPINGS)} 중 하나여야 합니다."}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    return jsonify(dict(memory_watch.diff(group, limit), pid=os.getpid()))
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     
     print(f"🚀 헤어게이터 서버 최종 시작!")
     print(f"📍 포트: {port}")
-    print(f"🔑 OpenAI: {'✅ 연결됨' if (client or openai_api_key) else '❌ 미연결'}")
+    print(f"🔑 OpenAI: {'✅ 연결됨' if upstream_pool else '❌ 미연결'}")
     print(f"🤖 모델: {openai_model or '기본 레시피 모드'}")
-    print(f"🔵 Claude: {'✅ 준비됨' if claude_api_key and claude_api_key != '............' else '❌ 미설정'}")
+    print(f"🔵 Claude: {'✅ 준비됨' if claude_available else '❌ 미설정'}")
     print(f"🌐 환경: {os.getenv('ENVIRONMENT', 'development')}")
     print("=" * 50)
     print("💡 테스트 질문: '애쉬 브라운 레시피 알려주세요'")
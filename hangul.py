@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+hangul.py
+띄어쓰기/오타에 강한 한국어 키워드 매칭
+
+- 정규화: 소문자 + 공백/문장부호 제거 ("애쉬 브라운" == "애쉬브라운")
+- 자모 분해: 한글 음절을 초성/중성/종성으로 분해 (자동완성 접두사 일치용)
+- 오타 허용: 역할(초/중/종성)을 구분한 자모 2-gram 색인으로 후보를 좁힌 뒤, 음절 경계에 맞춘
+  메시지 구간과의 자모 편집 거리를 제한적으로 검증 ("에쉬"/"애시" → 애쉬, "트리먼트" → 트리트먼트,
+  "스타일닝" → 스타일링). 비용: 비슷한 모음(ㅐ/ㅔ, ㅟ/ㅣ, ㅜ/ㅡ ...) 치환 1, 그 밖의 치환 2,
+  초성/중성 삽입·삭제 1, 받침 삽입·삭제 2 (받침 하나로 다른 단어가 되는 "매지" ↔ 매직 같은 경우를 비싸게)
+- 키워드마다 음절 수로 허용 비용을 정함: 한 음절 0, 두/세 음절 1 (비슷한 모음 오타 하나),
+  네 음절 이상 2. "굿모닝" 의 "모닝" ↔ 토닝, "영향" ↔ 영양, "케이크" ↔ 케어 는 거리 2 라 일반상담
+- 짧은 문자열(용어, 자동완성 접두사)의 정규화 결과는 lru_cache 로 재사용.
+  긴 메시지는 캐시하지 않음 (항목 수만 제한된 캐시가 긴 문자열로 메모리를 차지하지 않도록)
+"""
+
+from functools import lru_cache
+
+CHOSEONG = 'ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ'
+JUNGSEONG = 'ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ'
+JONGSEONG = ('', 'ㄱ', 'ㄲ', 'ㄳ', 'ㄴ', 'ㄵ', 'ㄶ', 'ㄷ', 'ㄹ', 'ㄺ', 'ㄻ', 'ㄼ', 'ㄽ', 'ㄾ',
+             'ㄿ', 'ㅀ', 'ㅁ', 'ㅂ', 'ㅄ', 'ㅅ', 'ㅆ', 'ㅇ', 'ㅈ', 'ㅊ', 'ㅋ', 'ㅌ', 'ㅍ', 'ㅎ')
+
+SYLLABLE_BASE = 0xAC00
+SYLLABLE_LAST = 0xD7A3
+CACHE_MAX_CHARS = 64
+
+NGRAM = 2
+
+# 편집 비용 (자모 단위)
+SIMILAR_VOWEL_SUBSTITUTION = 1
+SUBSTITUTION = 2    # 그 밖의 모음/자음 치환
+INITIAL_INDEL = 1   # 초성/중성 삽입·삭제 (음절 하나를 빠뜨리면 초성 + 중성 두 번)
+FINAL_INDEL = 2     # 받침, 한글 밖 글자 삽입·삭제
+
+# 역할 구분 자모 (조합형): 초성 U+1100.., 중성 U+1161.., 종성 U+11A8..
+_LEAD, _VOWEL, _TAIL = 0x1100, 0x1161, 0x11A7
+_VOWEL_LAST = _VOWEL + len(JUNGSEONG) - 1
+
+# 소리/자판이 비슷해 자주 섞이는 모음
+SIMILAR_VOWELS = ('ㅐㅔ', 'ㅒㅖ', 'ㅓㅕ', 'ㅗㅜ', 'ㅜㅡ', 'ㅟㅣ', 'ㅢㅣ', 'ㅚㅙㅞ', 'ㅘㅝ', 'ㅏㅑ', 'ㅗㅛ', 'ㅜㅠ')
+_SIMILAR = {(chr(_VOWEL + JUNGSEONG.index(a)), chr(_VOWEL + JUNGSEONG.index(b)))
+            for group in SIMILAR_VOWELS for a in group for b in group if a != b}
+
+
+def _compact(text):
+    return ''.join(ch for ch in text.lower() if ch.isalnum())
+
+
+def _to_jamo(text):
+    out = []
+    for ch in compact(text):
+        code = ord(ch)
+        if SYLLABLE_BASE <= code <= SYLLABLE_LAST:
+            index = code - SYLLABLE_BASE
+            out.append(CHOSEONG[index // 588])
+            out.append(JUNGSEONG[(index % 588) // 28])
+            out.append(JONGSEONG[index % 28])
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def _decompose(text):
+    out = []
+    for ch in compact(text):
+        code = ord(ch)
+        if SYLLABLE_BASE <= code <= SYLLABLE_LAST:
+            index = code - SYLLABLE_BASE
+            out.append(chr(_LEAD + index // 588))
+            out.append(chr(_VOWEL + (index % 588) // 28))
+            if index % 28:
+                out.append(chr(_TAIL + index % 28))
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+_compact_cached = lru_cache(maxsize=8192)(_compact)
+_to_jamo_cached = lru_cache(maxsize=8192)(_to_jamo)
+_decompose_cached = lru_cache(maxsize=8192)(_decompose)
+
+
+def compact(text):
+    """소문자 + 글자/숫자만 남김 (띄어쓰기, 문장부호 무시)"""
+    return _compact_cached(text) if len(text) <= CACHE_MAX_CHARS else _compact(text)
+
+
+def to_jamo(text):
+    """정규화 후 한글 음절을 자모로 분해"""
+    return _to_jamo_cached(text) if len(text) <= CACHE_MAX_CHARS else _to_jamo(text)
+
+
+def decompose(text):
+    """정규화 후 역할 구분 자모로 분해 (받침 ㅇ 과 초성 ㅇ 이 다른 글자, 빈 받침은 생략)"""
+    return _decompose_cached(text) if len(text) <= CACHE_MAX_CHARS else _decompose(text)
+
+
+compact.cache_info = _compact_cached.cache_info
+to_jamo.cache_info = _to_jamo_cached.cache_info
+decompose.cache_info = _decompose_cached.cache_info
+
+
+def max_edits(syllables):
+    """키워드 음절 수별 허용 편집 비용
+
+    한 음절은 자모 하나만 바뀌어도 다른 단어 ("펌" ↔ "폼") 라 정확 일치만,
+    두/세 음절은 비슷한 모음 오타 하나 ("에쉬", "애시"), 네 음절 이상은 자음 오타나 빠진 음절 하나까지
+    """
+    if syllables < 2:
+        return 0
+    if syllables < 4:
+        return 1
+    return 2
+
+
+def _role(ch):
+    code = ord(ch)
+    if _LEAD <= code < _VOWEL:
+        return 0
+    if _VOWEL <= code <= _VOWEL_LAST:
+        return 1
+    if _TAIL < code < _TAIL + 28:
+        return 2
+    return 3
+
+
+def _indel(ch):
+    return INITIAL_INDEL if _role(ch) < 2 else FINAL_INDEL
+
+
+@lru_cache(maxsize=4096)
+def _substitution(a, b):
+    if a == b:
+        return 0
+    if _role(a) != _role(b):
+        return _indel(a) + _indel(b)
+    return SIMILAR_VOWEL_SUBSTITUTION if (a, b) in _SIMILAR else SUBSTITUTION
+
+
+def _starts(jamo):
+    """음절이 시작하는 위치 (초성/한글 밖 글자 앞, 끝)"""
+    return [j == len(jamo) or _role(jamo[j]) in (0, 3) for j in range(len(jamo) + 1)]
+
+
+def _grams(jamo):
+    grams = {}
+    for i in range(len(jamo) - NGRAM + 1):
+        gram = jamo[i:i + NGRAM]
+        grams[gram] = grams.get(gram, 0) + 1
+    return grams
+
+
+def _windows(hits, reach, length):
+    """n-gram 위치마다 [위치 - reach, 위치 + reach] 창, 겹치면 합침"""
+    windows = []
+    for hit in sorted(hits):
+        lo, hi = max(0, hit - reach), min(length, hit + reach)
+        if windows and lo <= windows[-1][1]:
+            windows[-1][1] = hi
+        else:
+            windows.append([lo, hi])
+    return windows
+
+
+def span_distance(pattern, text, limit, starts=None):
+    """음절 경계에서 시작/끝나는 text 구간과 pattern 의 최소 편집 비용 (limit 초과 시 limit + 1)"""
+    starts = starts or _starts(text)
+    text_indels = [_indel(t) for t in text]
+    over = limit + 1
+    previous = [0 if start else over for start in starts]
+    for p in pattern:
+        indel = _indel(p)
+        current = [min(previous[0] + indel, over)]
+        row_min = current[0]
+        for j, t in enumerate(text, 1):
+            cost = min(previous[j - 1] + _substitution(p, t), previous[j] + indel, current[j - 1] + text_indels[j - 1], over)
+            current.append(cost)
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return over
+        previous = current
+    return min(cost for cost, end in zip(previous, starts) if end)
+
+
+class JamoIndex:
+    """키워드/스타일명 → payload 자모 n-gram 색인 (띄어쓰기 무시 정확 일치 + 편집 거리 제한 오타 허용)
+
+    등록 순서가 우선순위: 정확 일치가 여러 개면 먼저 등록된 항목을 반환
+    """
+
+    def __init__(self, terms=()):
+        self.entries = []
+        self.grams = {}
+        for term, payload in terms:
+            self.add(term, payload)
+
+    def add(self, term, payload, limit=None):
+        """limit: 허용 편집 비용 (기본은 음절 수로, 0 이면 모델 번호처럼 정확 일치만)"""
+        text = compact(term)
+        if not text:
+            return
+        entry_id = len(self.entries)
+        jamo = decompose(text)
+        limit = max_edits(len(text)) if limit is None else limit
+        self.entries.append((text, jamo, limit, payload))
+        if limit:
+            for gram, count in _grams(jamo).items():
+                self.grams.setdefault(gram, []).append((entry_id, count))
+
+    def exact(self, message):
+        """띄어쓰기 무시 정확 일치 (등록 순서대로)"""
+        text = compact(message)
+        return [payload for term, _, _, payload in self.entries if term in text]
+
+    def exact_all(self, message):
+        """띄어쓰기 무시 정확 일치 payload 전부 (메시지 안 등장 순서, 중복 제거)
+
+        더 긴 일치 안에 포함된 짧은 일치는 버림 ("컬러" 안의 "컬")
+        """
+        text = compact(message)
+        spans = []
+        for term, _, _, payload in self.entries:
+            start = text.find(term)
+            while start != -1:
+                spans.append((start, start + len(term), payload))
+                start = text.find(term, start + 1)
+        spans.sort(key=lambda span: (span[0] - span[1], span[0]))
+
+        kept = []
+        for start, end, payload in spans:
+            if not any(kept_start <= start and end <= kept_end for kept_start, kept_end, _ in kept):
+                kept.append((start, end, payload))
+        kept.sort(key=lambda span: span[0])
+
+        payloads = []
+        for _, _, payload in kept:
+            if payload not in payloads:
+                payloads.append(payload)
+        return payloads
+
+    def fuzzy(self, message):
+        """편집 거리 허용 일치: [(distance, entry_id, payload)] 거리/우선순위 순
+
+        n-gram 후보 → 음절 경계 구간 편집 거리 검증
+        """
+        jamo = decompose(message)
+        positions = {}
+        for i in range(len(jamo) - NGRAM + 1):
+            positions.setdefault(jamo[i:i + NGRAM], []).append(i)
+
+        shared, hits = {}, {}
+        for gram, found in positions.items():
+            for entry_id, term_count in self.grams.get(gram, ()):
+                shared[entry_id] = shared.get(entry_id, 0) + min(len(found), term_count)
+                hits.setdefault(entry_id, []).extend(found)
+
+        matches = []
+        starts = None
+        for entry_id, (_, term_jamo, limit, payload) in enumerate(self.entries):
+            if not limit:
+                continue
+            # q-gram 보조정리: 편집 k 번(비용 1 이상씩)이면 키워드 n-gram 중 최소 (L - q + 1) - k*q 개가 남음
+            required = len(term_jamo) - NGRAM + 1 - limit * NGRAM
+            if shared.get(entry_id, 0) < required:
+                continue
+            starts = starts or _starts(jamo)
+            if required > 0:
+                # 일치 구간은 공유 n-gram 하나를 품고 길이가 L + limit 이하 → 그 주변 창만 검증
+                distance = min(span_distance(term_jamo, jamo[lo:hi], limit, starts[lo:hi + 1])
+                               for lo, hi in _windows(hits[entry_id], len(term_jamo) + limit, len(jamo)))
+            else:
+                distance = span_distance(term_jamo, jamo, limit, starts)
+            if distance <= limit:
+                matches.append((distance, entry_id, payload))
+        matches.sort(key=lambda match: match[:2])
+        return matches
+
+    def classify(self, message):
+        """정확 일치 우선, 없으면 가장 가까운 오타 허용 일치 payload (없으면 None)"""
+        exact = self.exact(message)
+        if exact:
+            return exact[0]
+        fuzzy = self.fuzzy(message)
+        return fuzzy[0][2] if fuzzy else None
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+image_cache.py
+지각 해시(dHash) 기반 이미지 분석 결과 캐시
+
+같은 인스타그램/핀터레스트 레퍼런스 사진을 다시 저장하거나 살짝 잘라 올려도
+dHash 해밍 거리가 작으므로, 가까운 해시의 기존 분석 결과를 재사용합니다.
+
+분석 결과는 미용사 질문에 따라 달라지므로 (정규화한) 질문별로 따로 색인합니다.
+같은 사진이라도 다른 질문이면 캐시를 쓰지 않습니다.
+
+검색은 다중 인덱스 해싱: 64비트 해시를 16비트 4조각으로 나눠 조각별 사전에 넣고,
+조각당 1비트 이내 변형까지 조회합니다. 전체 거리가 7 이하이면 비둘기집 원리로
+어느 한 조각은 1비트 이내로 일치하므로 누락 없이 후보를 찾습니다.
+"""
+
+import os
+import time
+import threading
+import importlib.util
+from collections import OrderedDict
+
+# numpy 는 해시 계산 시(이미지 워커 프로세스)에만 로드 (웹 워커 부팅 시간/메모리 절약)
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv('IMAGE_CACHE_MAX_DISTANCE', '6'))
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', '100000'))
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+CHUNKS = HASH_BITS // CHUNK_BITS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# 조각당 1비트 변형까지 조회 → 보장되는 최대 거리
+MAX_SUPPORTED_DISTANCE = 2 * CHUNKS - 1
+
+
+def dhash(image, hash_size=8):
+    """PIL 이미지의 64비트 difference hash (NumPy)"""
+    import numpy as np
+    from PIL import Image
+
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class HammingIndex:
+    """64비트 해시의 해밍 거리 근접 검색 (다중 인덱스 해싱)"""
+
+    def __init__(self):
+        self.tables = [{} for _ in range(CHUNKS)]
+        self.values = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    @staticmethod
+    def _chunks(value):
+        return [(value >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, value, payload):
+        if value not in self.values:
+            for table, chunk in zip(self.tables, self._chunks(value)):
+                table.setdefault(chunk, []).append(value)
+        self.values[value] = payload
+
+    def remove(self, value):
+        if value not in self.values:
+            return
+        del self.values[value]
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            bucket = table.get(chunk)
+            if bucket:
+                bucket.remove(value)
+                if not bucket:
+                    del table[chunk]
+
+    def nearest(self, value, max_distance=IMAGE_CACHE_MAX_DISTANCE):
+        """max_distance 이내 가장 가까운 (해시, 거리, payload) 또는 None"""
+        if max_distance > MAX_SUPPORTED_DISTANCE:
+            raise ValueError(f"max_distance는 {MAX_SUPPORTED_DISTANCE} 이하여야 합니다")
+
+        if value in self.values:
+            return value, 0, self.values[value]
+
+        best, best_distance = None, max_distance + 1
+        seen = set()
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            probes = [chunk] + [chunk ^ (1 << bit) for bit in range(CHUNK_BITS)]
+            for probe in probes:
+                for candidate in table.get(probe, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = hamming(candidate, value)
+                    if distance < best_distance:
+                        best, best_distance = candidate, distance
+
+        if best is None:
+            return None
+        return best, best_distance, self.values[best]
+
+
+class ImageResultCache:
+    """근접 이미지 + 같은 질문의 분석 결과 재사용 (오래된 항목부터 제거)"""
+
+    def __init__(self, max_distance=IMAGE_CACHE_MAX_DISTANCE, max_entries=IMAGE_CACHE_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        # 정규화 질문 → 해시 색인
+        self.indexes = {}
+        self._order = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'stores': 0, 'evictions': 0, 'lookup_ms_total': 0.0}
+
+    def __len__(self):
+        return len(self._order)
+
+    def lookup(self, image_hash, question=''):
+        """(분석 결과, 거리) 또는 None. question: 정규화한 미용사 질문"""
+        started = time.perf_counter()
+        with self._lock:
+            index = self.indexes.get(question)
+            found = index.nearest(image_hash, self.max_distance) if index else None
+            if found:
+                self._order.move_to_end((question, found[0]))
+            self.stats['lookups'] += 1
+            self.stats['lookup_ms_total'] += (time.perf_counter() - started) * 1000
+            if not found:
+                return None
+            self.stats['hits'] += 1
+        return found[2], found[1]
+
+    def store(self, image_hash, result, question=''):
+        with self._lock:
+            self.indexes.setdefault(question, HammingIndex()).add(image_hash, result)
+            self._order[(question, image_hash)] = True
+            self._order.move_to_end((question, image_hash))
+            self.stats['stores'] += 1
+            while len(self._order) > self.max_entries:
+                (oldest_question, oldest), _ = self._order.popitem(last=False)
+                index = self.indexes[oldest_question]
+                index.remove(oldest)
+                if not len(index):
+                    del self.indexes[oldest_question]
+                self.stats['evictions'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['lookups']
+        lookup_ms_total = stats.pop('lookup_ms_total')
+        stats.update({
+            'entries': len(self),
+            'questions': len(self.indexes),
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else 0.0,
+            'avg_lookup_ms': round(lookup_ms_total / lookups, 4) if lookups else 0.0
+        })
+        return stats
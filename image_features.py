@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+image_features.py
+카탈로그 스타일 로컬 매칭 (비전 모델 호출 전 NumPy 특징 비교)
+
+축소 이미지(64×64)에서 세 가지 특징을 뽑아 스타일 메뉴 대표 사진의 특징과 코사인 유사도로 비교합니다.
+- 색: 배경을 뺀 전경 픽셀의 Lab 색 히스토그램 (4×4×4, Hellinger)
+- 실루엣: 행/열별 전경 비율 + 가장 아래 전경 행 (기장 대용)
+- 질감: 밝기 기울기 방향 히스토그램, 기울기/라플라시안 통계 (직모 ↔ 컬)
+유사도와 2위와의 차이가 모두 기준 이상이면 로컬 답변, 애매하면 비전 모델로 보냄.
+
+카탈로그 특징은 오프라인으로 만듦 (스타일 사진 폴더 또는 시트의 이미지 URL):
+    python image_features.py build --images style_images/
+    python image_features.py build --download
+이미지 워커 프로세스에서만 numpy 를 불러옴 (image_cache 와 같은 이유)
+"""
+
+import os
+import io
+import re
+import sys
+import time
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+STYLE_FEATURES_PATH = os.getenv('STYLE_FEATURES_PATH', 'data/style-features.npz')
+IMAGE_LOCAL_MIN_SCORE = float(os.getenv('IMAGE_LOCAL_MIN_SCORE', '0.93'))
+IMAGE_LOCAL_MIN_MARGIN = float(os.getenv('IMAGE_LOCAL_MIN_MARGIN', '0.03'))
+
+FEATURE_SIZE = 64
+FEATURE_VERSION = 1
+BORDER = 3
+# 배경과의 Lab 거리 (ΔE) 가 이 이상이면 전경
+FOREGROUND_DELTA_E = 12.0
+BANDS = 16
+ORIENTATION_BINS = 8
+# 블록별 가중치 (내적 = 블록별 코사인의 가중합)
+BLOCK_WEIGHTS = {'color': 0.4, 'shape': 0.35, 'texture': 0.25}
+
+_SRGB_TO_XYZ = ((0.4124, 0.3576, 0.1805),
+                (0.2126, 0.7152, 0.0722),
+                (0.0193, 0.1192, 0.9505))
+_WHITE_D65 = (0.95047, 1.0, 1.08883)
+
+# 워커 프로세스별로 한 번 읽는 카탈로그 특징 (경로, 수정 시각, FeatureIndex)
+_index_cache = [None, None, None]
+
+
+def to_lab(rgb):
+    """(H, W, 3) uint8 sRGB → float32 Lab"""
+    import numpy as np
+
+    srgb = rgb.astype(np.float32) / 255.0
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.asarray(_SRGB_TO_XYZ, dtype=np.float32).T / np.asarray(_WHITE_D65, dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([116.0 * f[..., 1] - 16.0,
+                     500.0 * (f[..., 0] - f[..., 1]),
+                     200.0 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def foreground_mask(lab):
+    """테두리 픽셀 중앙값을 배경색으로 보고 ΔE 로 전경 분리 (분리가 안 되면 전체)"""
+    import numpy as np
+
+    border = np.concatenate([lab[:BORDER].reshape(-1, 3), lab[-BORDER:].reshape(-1, 3),
+                             lab[:, :BORDER].reshape(-1, 3), lab[:, -BORDER:].reshape(-1, 3)])
+    background = np.median(border, axis=0)
+    mask = np.linalg.norm(lab - background, axis=-1) > FOREGROUND_DELTA_E
+    coverage = mask.mean()
+    if coverage < 0.05 or coverage > 0.95:
+        return np.ones(mask.shape, dtype=bool)
+    return mask
+
+
+def _normalized(vector):
+    import numpy as np
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def extract_features(image):
+    """PIL 이미지 → 특징 벡터 (float32, 블록별 정규화 후 가중치 반영, 길이 1)"""
+    import numpy as np
+    from PIL import Image
+
+    small = image.convert('RGB').resize((FEATURE_SIZE, FEATURE_SIZE), Image.BILINEAR, reducing_gap=2.0)
+    lab = to_lab(np.asarray(small))
+    mask = foreground_mask(lab)
+
+    # 색: 전경 Lab 4×4×4 히스토그램
+    pixels = lab[mask]
+    l_bin = np.clip(pixels[:, 0] / 25.0, 0, 3.999).astype(np.int32)
+    a_bin = np.clip((pixels[:, 1] + 60.0) / 30.0, 0, 3.999).astype(np.int32)
+    b_bin = np.clip((pixels[:, 2] + 60.0) / 30.0, 0, 3.999).astype(np.int32)
+    histogram = np.bincount(l_bin * 16 + a_bin * 4 + b_bin, minlength=64).astype(np.float32)
+    color = np.sqrt(histogram / max(1, len(pixels)))
+
+    # 실루엣: 행/열 띠별 전경 비율 + 가장 아래 전경 행 (기장)
+    band = FEATURE_SIZE // BANDS
+    rows = mask.reshape(BANDS, band, FEATURE_SIZE).mean(axis=(1, 2))
+    columns = mask.reshape(FEATURE_SIZE, BANDS, band).mean(axis=(0, 2))
+    filled = np.nonzero(rows > 0.2)[0]
+    length = (filled[-1] + 1) / BANDS if len(filled) else 0.0
+    shape = np.concatenate([rows, columns, [length]]).astype(np.float32)
+
+    # 질감: 밝기 기울기 방향(크기 가중) + 기울기/라플라시안 통계
+    lightness = lab[..., 0]
+    gy, gx = np.gradient(lightness)
+    magnitude = np.hypot(gx, gy)[mask]
+    angle = (np.arctan2(gy, gx)[mask] % np.pi) / np.pi
+    orientation = np.bincount(np.minimum((angle * ORIENTATION_BINS).astype(np.int32), ORIENTATION_BINS - 1),
+                              weights=magnitude, minlength=ORIENTATION_BINS)
+    orientation = orientation / max(1e-6, orientation.sum())
+    laplacian = np.abs(lightness[1:-1, 1:-1] * 4 - lightness[:-2, 1:-1] - lightness[2:, 1:-1]
+                       - lightness[1:-1, :-2] - lightness[1:-1, 2:])[mask[1:-1, 1:-1]]
+    texture = np.concatenate([orientation, [magnitude.mean() / 50.0 if len(magnitude) else 0.0,
+                                            magnitude.std() / 50.0 if len(magnitude) else 0.0,
+                                            laplacian.mean() / 100.0 if len(laplacian) else 0.0]]).astype(np.float32)
+
+    return np.concatenate([
+        _normalized(color) * np.sqrt(BLOCK_WEIGHTS['color']),
+        _normalized(shape) * np.sqrt(BLOCK_WEIGHTS['shape']),
+        _normalized(texture) * np.sqrt(BLOCK_WEIGHTS['texture'])
+    ]).astype(np.float32)
+
+
+class FeatureIndex:
+    """스타일 대표 사진 특징 행렬 (행 = 사진, 한 스타일에 여러 장 가능)"""
+
+    def __init__(self, model_nos, features):
+        import numpy as np
+
+        self.model_nos = [str(model_no) for model_no in model_nos]
+        self.features = np.asarray(features, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.model_nos)
+
+    @classmethod
+    def load(cls, path=STYLE_FEATURES_PATH):
+        import numpy as np
+
+        with np.load(path) as data:
+            if int(data['version']) != FEATURE_VERSION:
+                raise ValueError(f"특징 버전 불일치: {int(data['version'])} != {FEATURE_VERSION} (다시 build 필요)")
+            return cls(data['model_nos'], data['features'])
+
+    def save(self, path=STYLE_FEATURES_PATH):
+        import numpy as np
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, model_nos=np.asarray(self.model_nos), features=self.features,
+                 version=np.asarray(FEATURE_VERSION))
+        os.replace(tmp_path, path)
+
+    def match(self, vector, min_score=IMAGE_LOCAL_MIN_SCORE, min_margin=IMAGE_LOCAL_MIN_MARGIN):
+        """가장 가까운 스타일 {model_no, score, margin, confident} (스타일별 최고 점수 기준)"""
+        if not self.model_nos:
+            return None
+        scores = self.features @ vector
+        best = {}
+        for model_no, score in zip(self.model_nos, scores.tolist()):
+            if score > best.get(model_no, -1.0):
+                best[model_no] = score
+        ranked = sorted(best.items(), key=lambda item: -item[1])
+        model_no, score = ranked[0]
+        margin = score - ranked[1][1] if len(ranked) > 1 else score
+        return {
+            'model_no': model_no,
+            'score': round(score, 4),
+            'margin': round(margin, 4),
+            'confident': score >= min_score and margin >= min_margin
+        }
+
+
+def load_index(path=STYLE_FEATURES_PATH):
+    """프로세스별 캐시 (파일이 바뀌면 다시 읽음), 파일이 없으면 None"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _index_cache[0] != path or _index_cache[1] != mtime:
+        try:
+            index = FeatureIndex.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"스타일 특징 로드 실패 ({path}): {e}")
+            index = None
+        _index_cache[:] = [path, mtime, index]
+    return _index_cache[2]
+
+
+def match_style(image, path=STYLE_FEATURES_PATH):
+    """이미지 워커용: (매칭 결과 또는 None, 특징 추출+비교 ms)"""
+    index = load_index(path)
+    if index is None:
+        return None, 0.0
+    started = time.perf_counter()
+    result = index.match(extract_features(image))
+    return result, round((time.perf_counter() - started) * 1000, 3)
+
+
+_DRIVE_ID_RE = re.compile(r'/file/d/([\w-]+)|[?&]id=([\w-]+)')
+
+
+def download_url(url):
+    """구글 드라이브 공유 링크 → 직접 다운로드 링크 (그 외는 그대로)"""
+    match = _DRIVE_ID_RE.search(url or '')
+    if 'drive.google.com' in (url or '') and match:
+        return f"https://drive.google.com/uc?export=download&id={match.group(1) or match.group(2)}"
+    return url
+
+
+def style_images(styles, image_dir=None, download=False):
+    """(model_no, PIL 이미지) 생성: 폴더의 <model_no>*.jpg|png|webp, 없으면 (download 시) 시트 URL"""
+    import urllib.request
+    from PIL import Image
+
+    for style in styles:
+        paths = []
+        if image_dir and os.path.isdir(image_dir):
+            paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                           if name.upper().startswith(style.model_no)
+                           and name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')))
+        for path in paths:
+            try:
+                yield style.model_no, Image.open(path)
+            except OSError as e:
+                logger.warning(f"{path} 열기 실패: {e}")
+        if paths or not download or not style.image_url:
+            continue
+        try:
+            with urllib.request.urlopen(download_url(style.image_url), timeout=30) as response:
+                yield style.model_no, Image.open(io.BytesIO(response.read()))
+        except OSError as e:
+            logger.warning(f"{style.model_no} 이미지 다운로드 실패: {e}")
+
+
+def build_index(styles, image_dir=None, download=False):
+    import numpy as np
+
+    model_nos, features = [], []
+    for model_no, image in style_images(styles, image_dir, download):
+        model_nos.append(model_no)
+        features.append(extract_features(image))
+    return FeatureIndex(model_nos, np.stack(features) if features else np.zeros((0, 1), dtype=np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="카탈로그 스타일 이미지 특징 생성")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--images", help="스타일 사진 폴더 (<model_no>*.jpg)")
+    parser.add_argument("--download", action="store_true", help="폴더에 없는 스타일은 시트의 이미지 URL 에서 받기")
+    parser.add_argument("--output", default=STYLE_FEATURES_PATH)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        index = load_index(args.output)
+        if index is None:
+            print(f"❌ {args.output} 없음")
+            return 1
+        print(f"📐 {args.output}: 사진 {len(index)}장, 스타일 {len(set(index.model_nos))}개, 차원 {index.features.shape[1]}")
+        return 0
+
+    from catalog import load_styles
+
+    styles = load_styles()
+    started = time.perf_counter()
+    index = build_index(styles, args.images, args.download)
+    if not len(index):
+        print("❌ 특징을 만들 스타일 사진이 없습니다 (--images 또는 --download)")
+        return 1
+    index.save(args.output)
+    print(f"✅ {args.output}: 사진 {len(index)}장, 스타일 {len(set(index.model_nos))}/{len(styles)}개 "
+          f"({time.perf_counter() - started:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+image_pipeline.py
+헤어스타일 이미지 전처리 파이프라인
+
+업로드는 선언된 크기(Content-Length, base64 길이)로 먼저 거르고, 청크 단위로 읽다가
+상한을 넘으면 바로 중단합니다. 디코더가 파일 전체를 필요로 하므로 본문은 메모리에 모읍니다
+(상한 IMAGE_MAX_MB 까지). 디코딩 → EXIF 회전 → 축소 → JPEG 재인코딩은
+프로세스 풀에서 수행해 요청 스레드를 막지 않고, 풀이 밀려 시간 안에 끝나지 않으면 TimeoutError.
+비전 모델(high detail)은 짧은 변 768px 기준으로 이미지를 다시 줄이므로
+그 해상도로 미리 줄여 업로드 크기와 지연을 줄입니다.
+같은 워커에서 카탈로그 스타일 특징 매칭(image_features)도 수행합니다.
+"""
+
+import os
+import io
+import time
+import base64
+import logging
+import threading
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from image_cache import dhash, NUMPY_AVAILABLE
+from image_features import match_style
+
+logger = logging.getLogger(__name__)
+
+# Pillow 는 전처리 워커 프로세스에서만 로드
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+IMAGE_MAX_BYTES = int(float(os.getenv('IMAGE_MAX_MB', '15')) * 1024 * 1024)
+# OpenAI high detail: 2048 안으로 맞춘 뒤 짧은 변 768
+IMAGE_SHORT_SIDE = int(os.getenv('IMAGE_SHORT_SIDE', '768'))
+IMAGE_LONG_SIDE = int(os.getenv('IMAGE_LONG_SIDE', '2048'))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+READ_CHUNK_SIZE = 64 * 1024
+# 처리 시간 초과(풀 포화) 503 응답의 재시도 안내
+IMAGE_RETRY_AFTER_SECONDS = int(os.getenv('IMAGE_RETRY_AFTER_SECONDS', '5'))
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def too_large(max_bytes=IMAGE_MAX_BYTES):
+    return ImageTooLarge(f"이미지가 너무 큽니다 (최대 {max_bytes // (1024 * 1024)}MB)")
+
+
+def read_stream(stream, max_bytes=IMAGE_MAX_BYTES, chunk_size=READ_CHUNK_SIZE, length=None):
+    """업로드 스트림을 청크 단위로 읽고 크기 상한 초과 시 즉시 중단
+
+    length: 선언된 본문 크기 (Content-Length), 상한을 넘으면 읽기 전에 거절
+    """
+    if length is not None and length > max_bytes:
+        raise too_large(max_bytes)
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise too_large(max_bytes)
+    return bytes(buffer)
+
+
+def decode_data_url(image_data, max_bytes=IMAGE_MAX_BYTES):
+    """'data:image/png;base64,...' 또는 순수 base64 문자열 디코딩 (디코딩 전 길이로 상한 확인)"""
+    if image_data.startswith('data:'):
+        image_data = image_data.split(',', 1)[1]
+    if len(image_data) // 4 * 3 > max_bytes + 3:
+        raise too_large(max_bytes)
+    data = base64.b64decode(image_data)
+    if len(data) > max_bytes:
+        raise too_large(max_bytes)
+    return data
+
+
+def target_size(width, height, short_side=IMAGE_SHORT_SIDE, long_side=IMAGE_LONG_SIDE):
+    """비전 모델이 실제로 쓰는 해상도 (확대는 하지 않음)"""
+    scale = min(1.0, long_side / max(width, height))
+    scale = min(scale, short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(data, submitted_at=None, short_side=IMAGE_SHORT_SIDE, long_side=IMAGE_LONG_SIDE,
+                  quality=IMAGE_JPEG_QUALITY):
+    """프로세스 풀 작업: 디코딩/회전/축소/해시/재인코딩 후 (jpeg bytes, 메타, 단계별 ms) 반환"""
+    from PIL import Image, ImageOps
+
+    timings = {}
+    started = time.time()
+    if submitted_at is not None:
+        timings['queue_wait_ms'] = round((started - submitted_at) * 1000, 2)
+
+    t0 = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    original_format = image.format
+    # JPEG은 디코딩 단계에서 1/2~1/8 축소 (DCT 스케일링) → 대형 사진 디코딩 시간 대폭 감소
+    draft_target = target_size(*original_size, short_side=short_side, long_side=long_side)
+    if image.format == 'JPEG':
+        image.draft('RGB', draft_target)
+    image.load()
+    timings['decode_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+
+    t0 = time.perf_counter()
+    image = ImageOps.exif_transpose(image)
+    timings['orient_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+
+    t0 = time.perf_counter()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    size = target_size(*image.size, short_side=short_side, long_side=long_side)
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+    timings['resize_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+
+    # 지각 해시 (축소된 이미지 기준, 결과 캐시 키)
+    image_hash = None
+    if NUMPY_AVAILABLE:
+        t0 = time.perf_counter()
+        image_hash = dhash(image)
+        timings['hash_ms'] = round((time.perf_counter() - t0) * 1000, 3)
+
+    # 카탈로그 스타일 로컬 매칭 (특징 파일이 있을 때만)
+    style_match = None
+    if NUMPY_AVAILABLE:
+        style_match, features_ms = match_style(image)
+        if style_match:
+            timings['features_ms'] = features_ms
+
+    t0 = time.perf_counter()
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=quality, optimize=True)
+    encoded = out.getvalue()
+    timings['encode_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+
+    meta = {
+        'original_format': original_format,
+        'original_size': list(original_size),
+        'original_bytes': len(data),
+        'size': list(image.size),
+        'bytes': len(encoded),
+        'dhash': f"{image_hash:016x}" if image_hash is not None else None,
+        'style_match': style_match
+    }
+    return encoded, meta, timings
+
+
+class ImagePipeline:
+    """워커별 프로세스 풀 (gunicorn fork 이후 첫 사용 시 생성)"""
+
+    def __init__(self, workers=IMAGE_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.stats = {'processed': 0, 'failed': 0, 'timeouts': 0, 'bytes_in': 0, 'bytes_out': 0,
+                      'max_queue_depth': 0}
+        self.last_timings = {}
+
+    @property
+    def available(self):
+        return PIL_AVAILABLE
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def process(self, data, timeout=30.0):
+        """전처리 결과 (jpeg bytes, 메타, 단계별 ms)
+
+        timeout 안에 끝나지 않으면 (풀 대기 포함) TimeoutError: 이미지 문제가 아니라 서버 과부하
+        """
+        if not PIL_AVAILABLE:
+            raise RuntimeError("Pillow가 설치되지 않아 이미지 처리를 할 수 없습니다")
+
+        with self._lock:
+            self.queue_depth += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue_depth)
+        future = None
+        try:
+            future = self._get_executor().submit(prepare_image, data, time.time())
+            encoded, meta, timings = future.result(timeout=timeout)
+        except FutureTimeout:
+            # 아직 대기 중이면 취소 (실행 중인 작업은 끝까지 돌고 결과는 버림)
+            future.cancel()
+            with self._lock:
+                self.stats['timeouts'] += 1
+            # 3.10 의 concurrent.futures.TimeoutError 는 내장 TimeoutError 가 아님
+            raise TimeoutError(f"이미지 처리가 {timeout:g}초 안에 끝나지 않았습니다") from None
+        except Exception:
+            with self._lock:
+                self.stats['failed'] += 1
+            raise
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+
+        with self._lock:
+            self.stats['processed'] += 1
+            self.stats['bytes_in'] += meta['original_bytes']
+            self.stats['bytes_out'] += meta['bytes']
+            self.last_timings = timings
+        return encoded, meta, timings
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, available=self.available, workers=self.workers,
+                        queue_depth=self.queue_depth, last_timings=self.last_timings)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+
+def to_data_url(jpeg_bytes):
+    return "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode('ascii')
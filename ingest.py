@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+ingest.py
+스타일 메뉴/레시피 온라인 반영 (재배포/콜드 스타트 없이)
+
+- CatalogSnapshot: 스타일, 레시피와 검색 구조(스타일명/카테고리 자모 색인, 파라미터 지식 베이스,
+  자동완성 색인)를 묶은 읽기 전용 스냅숏. 질의별 캐시도 스냅숏마다 따로 두어 교체 시 함께 버려짐
+- CatalogState.apply: 현재 스냅숏 + 변경으로 새 스냅숏을 옆에서 만든 뒤 current 참조 하나만 바꿔 게시.
+  읽는 쪽은 잠금 없이 current 를 한 번 읽고, 요청 중에는 pin() 으로 고정한 같은 스냅숏만 봄
+- 바뀐 종류의 구조만 다시 만들고 나머지는 이전 스냅숏과 공유
+  (레시피만 바뀌면 스타일 색인/파라미터 지식 베이스 재사용, 스타일만 바뀌면 카테고리 색인 재사용)
+- 변경은 기록 파일(CATALOG_JOURNAL_PATH, JSONL)에 배치 단위로 추가. 부팅 시 재생하고,
+  다른 워커는 파일 크기 변화를 주기적으로 확인해 같은 순서로 따라옴.
+  따라잡을 배치가 여러 개면 한 번에 합쳐 반영 (파라미터 지식 베이스 등 재구성 한 번)
+- 배치가 CATALOG_COMPACT_BATCHES 개를 넘으면 기록을 "부팅 카탈로그 → 현재" 순변경 한 배치로 압축해
+  새 파일로 교체. 다른 워커는 파일(inode)이 바뀐 것을 보고 부팅 스냅숏부터 다시 재생
+
+변경 형식:
+    {"kind": "style", "op": "upsert", "record": {"model_no": "FAL3004", "intro": "...", ...}}
+    {"kind": "style", "op": "delete", "key": "FAL3004"}
+    {"kind": "recipe", "op": "upsert", "record": {"category": "헤드스파", "keywords": [...], "recipes": [...]}}
+    {"kind": "recipe", "op": "delete", "key": "헤드스파"}
+기존 스타일 upsert 는 보낸 필드만 덮어씀 (스타일명은 name 을 보내지 않으면 다시 추출)
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+
+from catalog import Style, COLUMNS, valid_model_no
+from hangul import JamoIndex
+from parameters import ParameterBase
+from suggest import PrefixIndex, build_suggestions
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CATALOG_JOURNAL_PATH = os.getenv('CATALOG_JOURNAL_PATH', 'data/catalog-journal.jsonl')
+CATALOG_POLL_SECONDS = float(os.getenv('CATALOG_POLL_SECONDS', '5'))
+CATALOG_COMPACT_BATCHES = int(os.getenv('CATALOG_COMPACT_BATCHES', '50'))
+# 요청 하나에 받는 변경 수 상한
+MAX_CHANGES = 500
+MAX_RECIPES = 20
+MAX_KEYWORDS = 20
+
+KINDS = ('style', 'recipe')
+OPS = ('upsert', 'delete')
+
+
+def build_style_index(styles):
+    """스타일 메뉴 (women_rag_v2) 스타일명/모델 번호 색인"""
+    index = JamoIndex()
+    by_name = {}
+    for style in styles:
+        by_name.setdefault(style.name, []).append(style)
+        index.add(style.model_no, [style], limit=0)
+    for name, named in by_name.items():
+        index.add(name, named)
+    return index
+
+
+def _strings(value, limit, field):
+    if not isinstance(value, list) or not value or not all(isinstance(item, str) and item.strip() for item in value):
+        raise ValueError(f"{field} 는 비어있지 않은 문자열 목록이어야 합니다")
+    if len(value) > limit:
+        raise ValueError(f"{field} 는 {limit}개까지입니다")
+    return tuple(item.strip() for item in value)
+
+
+def normalize_change(change):
+    """변경 하나 검증 → (kind, op, key, record). 잘못된 형식이면 ValueError"""
+    if not isinstance(change, dict):
+        raise ValueError("변경은 JSON 객체여야 합니다")
+    kind, op = change.get('kind'), change.get('op')
+    if kind not in KINDS:
+        raise ValueError(f"kind 는 {', '.join(KINDS)} 중 하나여야 합니다")
+    if op not in OPS:
+        raise ValueError(f"op 는 {', '.join(OPS)} 중 하나여야 합니다")
+
+    if op == 'delete':
+        key = change.get('key')
+        if not isinstance(key, str) or not key.strip():
+            raise ValueError("delete 에는 key 가 필요합니다")
+        return kind, op, key.strip(), None
+
+    record = change.get('record')
+    if not isinstance(record, dict):
+        raise ValueError("upsert 에는 record 객체가 필요합니다")
+    if kind == 'style':
+        model_no = str(record.get('model_no', '')).strip()
+        if not valid_model_no(model_no):
+            raise ValueError(f"잘못된 모델 번호입니다: {model_no or '(없음)'}")
+        unknown = set(record) - set(COLUMNS) - {'name'}
+        if unknown:
+            raise ValueError(f"알 수 없는 스타일 필드: {', '.join(sorted(unknown))}")
+        if not all(isinstance(value, str) for value in record.values()):
+            raise ValueError("스타일 필드 값은 문자열이어야 합니다")
+        return kind, op, model_no, dict(record, model_no=model_no)
+
+    category = str(record.get('category', '')).strip()
+    if not category:
+        raise ValueError("레시피 record 에는 category 가 필요합니다")
+    return kind, op, category, {
+        'keywords': _strings(record.get('keywords'), MAX_KEYWORDS, 'keywords'),
+        'recipes': _strings(record.get('recipes'), MAX_RECIPES, 'recipes'),
+    }
+
+
+class CatalogSnapshot:
+    """한 시점의 스타일/레시피와 검색 구조 (게시 후 변경하지 않음)"""
+
+    def __init__(self, version, styles, style_index, parameter_base, recipes, category_keywords,
+                 category_index, suggestion_index, updated_at=None):
+        self.version = version
+        self.updated_at = updated_at or time.time()
+        self.styles = styles
+        self.styles_by_model = {style.model_no: style for style in styles}
+        self.style_index = style_index
+        self.parameter_base = parameter_base
+        self.recipes = recipes
+        self.category_keywords = category_keywords
+        self.category_index = category_index
+        self.suggestion_index = suggestion_index
+        self._generation = None
+        # 질의별 결과 캐시 (스냅숏이 바뀌면 캐시도 새로 시작)
+        self.classify_category = lru_cache(maxsize=4096)(category_index.classify)
+        self.categories_in = lru_cache(maxsize=4096)(self._categories_in)
+        self.match_styles = lru_cache(maxsize=4096)(self._match_styles)
+
+    @property
+    def generation(self):
+        """스타일/레시피 내용 해시 (답변 저장소 키용: 내용이 같으면 워커/재시작과 무관하게 같은 값)"""
+        if self._generation is None:
+            content = json.dumps([self.recipes, list(self.category_keywords),
+                                  [style.to_dict() for style in self.styles]],
+                                 ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+            self._generation = hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+        return self._generation
+
+    def _categories_in(self, message):
+        return tuple(self.category_index.exact_all(message))
+
+    def _match_styles(self, message):
+        return tuple(self.style_index.classify(message) or ())
+
+    @classmethod
+    def build(cls, styles, hair_recipes, category_keywords, precomputed_table=None, version=0):
+        """부팅 시 전체 구성 (hair_recipes: {카테고리: {"keywords", "recipes"}})"""
+        styles = tuple(styles)
+        recipes = {category: {'keywords': list(data['keywords']), 'recipes': list(data['recipes'])}
+                   for category, data in hair_recipes.items()}
+        category_keywords = tuple((category, tuple(words)) for category, words in category_keywords)
+        return cls(version, styles, build_style_index(styles), ParameterBase(styles), recipes, category_keywords,
+                   _category_index(category_keywords),
+                   PrefixIndex(build_suggestions(recipes, category_keywords, styles, precomputed_table)))
+
+    def with_changes(self, changes, precomputed_table=None, version=None, updated_at=None):
+        """검증된 변경 목록을 반영한 새 스냅숏 (self 는 그대로, 바뀌지 않은 구조는 공유)"""
+        styles = dict(self.styles_by_model)
+        recipes = dict(self.recipes)
+        category_keywords = dict(self.category_keywords)
+        styles_changed = recipes_changed = ground_truth_changed = False
+
+        for kind, op, key, record in changes:
+            if kind == 'style':
+                previous = styles.get(key)
+                if op == 'delete':
+                    if previous is None:
+                        raise ValueError(f"없는 스타일입니다: {key}")
+                    del styles[key]
+                    ground_truth_changed = ground_truth_changed or bool(previous.ground_truth)
+                else:
+                    fields = previous.to_dict() if previous else {}
+                    if 'name' not in record:
+                        fields.pop('name', None)
+                    fields.update(record)
+                    styles[key] = Style(**fields)
+                    ground_truth_changed = (ground_truth_changed or
+                                            styles[key].ground_truth != (previous.ground_truth if previous else ''))
+                styles_changed = True
+            else:
+                if op == 'delete':
+                    if recipes.pop(key, None) is None:
+                        raise ValueError(f"없는 레시피 카테고리입니다: {key}")
+                    category_keywords.pop(key, None)
+                else:
+                    recipes[key] = {'keywords': list(record['keywords']), 'recipes': list(record['recipes'])}
+                    category_keywords[key] = record['keywords']
+                recipes_changed = True
+
+        if styles_changed:
+            # 기존 순서 유지, 새 스타일은 뒤에 (dict 는 삽입 순서 보존). 색인 payload 가 Style 이라 색인은 새로,
+            # 파라미터 지식 베이스(Ground Truth 집계, 가장 비쌈)는 Ground Truth 가 바뀐 경우만 새로
+            style_tuple = tuple(styles.values())
+            style_index = build_style_index(style_tuple)
+            parameter_base = ParameterBase(style_tuple) if ground_truth_changed else self.parameter_base
+        else:
+            style_tuple, style_index, parameter_base = self.styles, self.style_index, self.parameter_base
+        if recipes_changed:
+            category_keywords = tuple(category_keywords.items())
+            category_index = _category_index(category_keywords)
+        else:
+            recipes, category_keywords, category_index = self.recipes, self.category_keywords, self.category_index
+        suggestion_index = PrefixIndex(build_suggestions(recipes, category_keywords, style_tuple, precomputed_table))
+
+        return CatalogSnapshot(self.version + 1 if version is None else version, style_tuple, style_index,
+                               parameter_base, recipes, category_keywords, category_index, suggestion_index,
+                               updated_at)
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'generation': self.generation,
+            'updated_at': self.updated_at,
+            'styles': len(self.styles),
+            'categories': list(self.recipes),
+            'suggestions': len(self.suggestion_index),
+            'parameters': self.parameter_base.snapshot()
+        }
+
+
+def _category_index(category_keywords):
+    """띄어쓰기/오타 허용 카테고리 색인 (등록 순서 = 우선순위)"""
+    return JamoIndex((word, category) for category, words in category_keywords for word in words)
+
+
+def net_changes(base, snapshot):
+    """base 에 반영하면 snapshot 과 같은 내용이 되는 변경 목록 (기록 압축용, 원본 변경 형식)"""
+    changes = [{'kind': 'style', 'op': 'delete', 'key': model_no}
+               for model_no in base.styles_by_model if model_no not in snapshot.styles_by_model]
+    for style in snapshot.styles:
+        previous = base.styles_by_model.get(style.model_no)
+        if previous is None or previous.to_dict() != style.to_dict():
+            changes.append({'kind': 'style', 'op': 'upsert', 'record': style.to_dict()})
+
+    keywords, base_keywords = dict(snapshot.category_keywords), dict(base.category_keywords)
+    changes += [{'kind': 'recipe', 'op': 'delete', 'key': category}
+                for category in base.recipes if category not in snapshot.recipes]
+    for category, data in snapshot.recipes.items():
+        if base.recipes.get(category) != data or tuple(base_keywords.get(category, ())) != tuple(keywords[category]):
+            changes.append({'kind': 'recipe', 'op': 'upsert',
+                            'record': {'category': category, 'keywords': list(keywords[category]),
+                                       'recipes': list(data['recipes'])}})
+    return changes
+
+
+class CatalogState:
+    """게시된 스냅숏 포인터 + 변경 기록
+
+    읽기: view() (요청 중이면 pin() 때 고정한 스냅숏), 잠금 없음.
+    쓰기: apply() / refresh(), 워커 안에서는 스레드 잠금, 워커 사이에서는 기록 파일 잠금으로 직렬화
+    """
+
+    def __init__(self, snapshot, precomputed_table=None, journal_path=CATALOG_JOURNAL_PATH,
+                 compact_batches=CATALOG_COMPACT_BATCHES):
+        self.current = snapshot
+        # 부팅 카탈로그 (기록은 항상 이 스냅숏 기준, 압축된 기록을 다시 재생할 때 사용)
+        self.base = snapshot
+        self.precomputed_table = precomputed_table
+        self.journal_path = journal_path
+        self.compact_batches = compact_batches
+        self.offset = 0
+        self.inode = None
+        self.journal_batches = 0
+        self.poll_interval = 0
+        self.listeners = []
+        self.stats = {'batches': 0, 'changes': 0, 'replayed': 0, 'publish_ms': 0.0, 'journal_errors': 0,
+                      'compactions': 0}
+        self._lock = threading.Lock()
+        self._pinned = contextvars.ContextVar('hairgator_catalog', default=None)
+        self._watcher = None
+
+    def view(self):
+        pinned = self._pinned.get()
+        return self.current if pinned is None else pinned
+
+    @contextmanager
+    def pin(self):
+        """블록 안에서는 같은 스냅숏만 보이도록 고정 (스레드 풀로 넘길 때는 contextvars 복사)"""
+        token = self._pinned.set(self.current)
+        try:
+            yield self._pinned.get()
+        finally:
+            self._pinned.reset(token)
+
+    def subscribe(self, listener):
+        """게시될 때마다 listener(snapshot) 호출 (쓰기 잠금 안, 게시 순서대로)"""
+        self.listeners.append(listener)
+
+    def _publish(self, snapshot, started):
+        self.current = snapshot
+        self.stats['publish_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"카탈로그 게시 후 처리 실패: {e}")
+
+    @contextmanager
+    def _journal(self):
+        """워커 사이 기록 파일 잠금 (기록이 없으면 아무것도 하지 않음)"""
+        if not self.journal_path:
+            yield None
+            return
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            f = open(self.journal_path, 'a+', encoding='utf-8')
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                replaced = os.fstat(f.fileno()).st_ino != os.stat(self.journal_path).st_ino
+            except OSError:
+                replaced = True
+            if not replaced:
+                break
+            # 잠금을 기다리는 동안 다른 워커가 압축해 파일을 교체함: 새 파일로 다시
+            f.close()
+        with f:
+            yield f
+
+    def _read_batches(self, f):
+        """offset 이후 기록된 배치 [(seq, 기록 시각, 변경 목록)]"""
+        f.seek(self.offset)
+        batches = []
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            self.offset += len(line.encode('utf-8'))
+            try:
+                entry = json.loads(line)
+                batches.append((entry['seq'], entry.get('ts'), [normalize_change(change) for change in entry['changes']]))
+            except (ValueError, KeyError, TypeError) as e:
+                self.stats['journal_errors'] += 1
+                logger.error(f"카탈로그 기록 항목 무시: {e}")
+        return batches
+
+    def _catch_up(self, f):
+        """다른 워커(또는 이전 실행)가 기록한 변경 반영, 새 스냅숏 또는 None"""
+        if f is None:
+            return None
+        snapshot = self.current
+        inode = os.fstat(f.fileno()).st_ino
+        if inode != self.inode:
+            if self.inode is not None:
+                # 압축으로 교체된 기록: 부팅 스냅숏부터 처음부터 재생
+                logger.info("카탈로그 기록 압축됨: 처음부터 다시 재생")
+                snapshot = self.base
+            self.inode, self.offset, self.journal_batches = inode, 0, 0
+        batches = self._read_batches(f)
+        if not batches:
+            return snapshot if snapshot is not self.current else None
+        self.journal_batches += len(batches)
+        self.stats['replayed'] += len(batches)
+
+        if len(batches) > 1:
+            # 여러 배치는 합쳐서 한 번에 (재구성 한 번), 실패하는 배치가 있으면 배치별로
+            try:
+                return snapshot.with_changes([change for _, _, changes in batches for change in changes],
+                                             self.precomputed_table, version=batches[-1][0],
+                                             updated_at=batches[-1][1])
+            except ValueError:
+                pass
+        for seq, ts, changes in batches:
+            try:
+                snapshot = snapshot.with_changes(changes, self.precomputed_table, version=seq, updated_at=ts)
+            except ValueError as e:
+                # 이미 반영된 삭제 등: 건너뛰어도 다음 배치는 이어서 적용
+                self.stats['journal_errors'] += 1
+                logger.error(f"카탈로그 기록 배치 {seq} 건너뜀: {e}")
+                snapshot = _renumbered(snapshot, seq)
+        return snapshot
+
+    def _compact(self, f):
+        """배치가 많으면 "부팅 카탈로그 → 현재" 순변경 한 배치로 기록 교체 (쓰기 잠금 안에서 호출)"""
+        if f is None or self.journal_batches <= self.compact_batches:
+            return False
+        snapshot = self.current
+        line = json.dumps({'seq': snapshot.version, 'ts': snapshot.updated_at,
+                           'changes': net_changes(self.base, snapshot), 'compacted': self.journal_batches},
+                          ensure_ascii=False, separators=(',', ':')) + '\n'
+        tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as tmp:
+            tmp.write(line)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, self.journal_path)
+        stat = os.stat(self.journal_path)
+        self.inode, self.offset, self.journal_batches = stat.st_ino, stat.st_size, 1
+        self.stats['compactions'] += 1
+        logger.info(f"카탈로그 기록 압축: v{snapshot.version}")
+        return True
+
+    def refresh(self):
+        """기록 파일을 따라잡아 필요하면 게시, 반영한 버전 반환"""
+        if not self.journal_path:
+            return self.current.version
+        try:
+            stat = os.stat(self.journal_path)
+            if stat.st_ino == self.inode and stat.st_size <= self.offset:
+                return self.current.version
+        except OSError:
+            return self.current.version
+        started = time.perf_counter()
+        with self._lock, self._journal() as f:
+            snapshot = self._catch_up(f)
+            if snapshot is not None:
+                self._publish(snapshot, started)
+                logger.info(f"카탈로그 기록 따라잡음: v{snapshot.version}")
+            self._compact(f)
+        return self.current.version
+
+    def apply(self, changes):
+        """변경 배치 검증 → 새 스냅숏 구성 → 기록 → 게시. 게시된 스냅숏 반환, 잘못된 변경이면 ValueError"""
+        if not isinstance(changes, list) or not changes:
+            raise ValueError("changes 는 비어있지 않은 목록이어야 합니다")
+        if len(changes) > MAX_CHANGES:
+            raise ValueError(f"한 번에 {MAX_CHANGES}개까지 반영할 수 있습니다")
+        normalized = [normalize_change(change) for change in changes]
+
+        started = time.perf_counter()
+        with self._lock, self._journal() as f:
+            caught_up = self._catch_up(f)
+            if caught_up is not None:
+                self._publish(caught_up, started)
+            # 옆에서 새 스냅숏을 끝까지 만든 뒤에만 기록/게시 (실패하면 이 배치는 아무것도 바꾸지 않음)
+            snapshot = self.current.with_changes(normalized, self.precomputed_table)
+            if f is not None:
+                f.seek(0, os.SEEK_END)
+                line = json.dumps({'seq': snapshot.version, 'ts': snapshot.updated_at, 'changes': changes},
+                                  ensure_ascii=False, separators=(',', ':')) + '\n'
+                f.write(line)
+                f.flush()
+                self.offset = f.tell()
+                self.journal_batches += 1
+            self.stats['batches'] += 1
+            self.stats['changes'] += len(normalized)
+            self._publish(snapshot, started)
+            self._compact(f)
+        return snapshot
+
+    def start_watcher(self, interval=CATALOG_POLL_SECONDS):
+        """다른 워커의 변경을 따라잡는 데몬 스레드 (interval <= 0 또는 기록 없음이면 시작 안 함)"""
+        if interval <= 0 or not self.journal_path or self._watcher:
+            return False
+        self.poll_interval = interval
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"카탈로그 기록 확인 실패: {e}")
+
+        self._watcher = threading.Thread(target=loop, name='catalog-watch', daemon=True)
+        self._watcher.start()
+        return True
+
+    @property
+    def settle_seconds(self):
+        """게시 후 모든 워커가 따라잡는 데 걸리는 최대 시간 (확인 주기 두 번 + 재구성 여유, 감시 없으면 0)"""
+        return 2 * self.poll_interval + 1 if self.poll_interval else 0
+
+    def snapshot(self):
+        return dict(self.current.to_dict(), journal=self.journal_path or None,
+                    journal_batches=self.journal_batches, **self.stats)
+
+
+def _renumbered(snapshot, version):
+    """내용은 같고 버전만 다른 스냅숏 (건너뛴 기록 배치용)"""
+    return CatalogSnapshot(version, snapshot.styles, snapshot.style_index, snapshot.parameter_base,
+                           snapshot.recipes, snapshot.category_keywords, snapshot.category_index,
+                           snapshot.suggestion_index, snapshot.updated_at)
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+intent.py
+키워드에 걸리지 않아 "일반상담" 으로 떨어지는 질문의 카테고리 추정 (로컬 NumPy 분류기)
+
+- 특징: 띄어쓰기/문장부호를 뺀 질문의 글자 1~3-gram 을 crc32 로 INTENT_DIM 차원에 해싱한 빈도 벡터
+- 모델: 다항 나이브 베이즈 (클래스별 로그 확률 행렬 W, 로그 사전확률 b).
+  질문 여러 개를 행렬 X 로 만들어 X @ W + b 한 번으로 분류하고,
+  최대 사후확률이 INTENT_MIN_CONFIDENCE 미만이거나 일반상담이면 None (기존대로 일반상담)
+- 학습 데이터 (약한 라벨, 키워드 문구는 지우고 학습 → 키워드 없는 질문에서 쓰일 문맥을 배움):
+  · 질의 로그: 키워드 정확 일치가 기록된 카테고리 하나뿐인 질문 (분류기/오타 허용 라벨은 빠지므로 되먹임 없음).
+    일반상담 뒤 REPHRASE_SECONDS 안에 같은 대화에서 키워드로 다시 물었으면 앞 질문도 그 카테고리,
+    다시 묻지 않은 일반상담은 일반상담
+  · 레시피 문구 → 그 카테고리
+  · women_rag_v2 시트 문장: 한 카테고리 키워드만 걸리면 그 카테고리, 키워드가 없으면 일반상담
+- 오프라인 재학습 (보류 세트 정확도, 처리량, 로그 일반상담 중 분류되는 비율 보고):
+    python intent.py train --log logs/chat_queries.jsonl
+    python intent.py info
+웹 워커는 첫 분류 때 numpy 와 모델을 불러옴 (부팅 시간/메모리 예산 유지), 파일이 바뀌면 다시 읽음
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import logging
+import argparse
+import importlib.util
+from functools import lru_cache
+
+from hangul import compact
+
+logger = logging.getLogger(__name__)
+
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+INTENT_MODEL_PATH = os.getenv('INTENT_MODEL_PATH', 'data/intent-model.npz')
+INTENT_MIN_CONFIDENCE = float(os.getenv('INTENT_MIN_CONFIDENCE', '0.8'))
+
+GENERAL = '일반상담'
+INTENT_DIM = 1 << 14
+NGRAM_MAX = 3
+MODEL_VERSION = 1
+# 라플라스 평활 (보지 못한 n-gram 확률)
+ALPHA = 0.5
+# X 행렬 한 번에 만드는 질문 수 (INTENT_DIM × 4바이트 × BATCH 만큼 메모리)
+BATCH = 256
+# 일반상담 뒤 같은 대화에서 이 시간 안의 키워드 질문은 다시 물은 것으로 봄
+REPHRASE_SECONDS = 180
+# 보류 세트 비율 (문장 crc32 로 고정 분할)
+HOLDOUT_PERCENT = 20
+MIN_SENTENCE_CHARS = 6
+
+# 카탈로그에는 없는 일상 상담 문장 (로그가 쌓이기 전 인사/예약/가격 질문이 시술 카테고리로 가지 않도록, 학습 쪽에만 추가)
+GENERAL_SEEDS = (
+    "안녕하세요", "감사합니다", "예약 가능한가요", "가격이 어떻게 되나요", "영업시간 알려주세요",
+    "상담 받고 싶어요", "주차 되나요", "시간이 얼마나 걸리나요", "추천해주세요", "질문 있어요",
+    "도와주세요", "네 알겠습니다"
+)
+
+_SENTENCE_RE = re.compile(r'[.!?\n]+')
+
+# 프로세스별로 한 번 읽는 모델 (경로, 수정 시각, IntentModel)
+_model_cache = [None, None, None]
+
+
+def ngram_ids(text):
+    """질문 → 해시된 글자 n-gram 번호 목록 (중복 포함 = 빈도)"""
+    text = compact(text)
+    ids = []
+    for n in range(1, NGRAM_MAX + 1):
+        for start in range(len(text) - n + 1):
+            ids.append(zlib.crc32(text[start:start + n].encode('utf-8')) % INTENT_DIM)
+    return ids
+
+
+def featurize(texts):
+    """질문 목록 → 빈도 행렬 X (len(texts) × INTENT_DIM, float32)"""
+    import numpy as np
+
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        ids = ngram_ids(text)
+        rows.extend([row] * len(ids))
+        cols.extend(ids)
+    # (행, 열) → 평탄화한 위치별 빈도를 0 행렬에 한 번에 기록 (np.add.at/bincount 보다 빠름)
+    flat, counts = np.unique(np.asarray(rows, dtype=np.intp) * INTENT_DIM + np.asarray(cols, dtype=np.intp),
+                             return_counts=True)
+    X = np.zeros(len(texts) * INTENT_DIM, dtype=np.float32)
+    X[flat] = counts
+    return X.reshape(len(texts), INTENT_DIM)
+
+
+class IntentModel:
+    """다항 나이브 베이즈 (W: INTENT_DIM × 클래스 로그 확률, bias: 로그 사전확률)"""
+
+    def __init__(self, labels, weights, bias, metrics=None, min_confidence=INTENT_MIN_CONFIDENCE):
+        import numpy as np
+
+        self.labels = [str(label) for label in labels]
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.metrics = metrics or {}
+        self.min_confidence = min_confidence
+        self.stats = {'classified': 0, 'routed': 0}
+        self._label = lru_cache(maxsize=4096)(self._predict_one)
+
+    @classmethod
+    def train(cls, texts, labels, alpha=ALPHA):
+        import numpy as np
+
+        classes = sorted(set(labels))
+        index = {label: position for position, label in enumerate(classes)}
+        counts = np.zeros((INTENT_DIM, len(classes)), dtype=np.float64)
+        for start in range(0, len(texts), BATCH):
+            X = featurize(texts[start:start + BATCH])
+            Y = np.zeros((len(X), len(classes)), dtype=np.float32)
+            Y[np.arange(len(X)), [index[label] for label in labels[start:start + BATCH]]] = 1.0
+            counts += X.T @ Y
+        weights = np.log((counts + alpha) / (counts.sum(axis=0) + alpha * INTENT_DIM))
+        # 학습에 없던 n-gram 은 무시 (평활 확률이 예시 적은 클래스로 쏠려 인사말도 확신하게 되는 문제)
+        weights[counts.sum(axis=1) == 0] = 0.0
+        prior = np.bincount([index[label] for label in labels], minlength=len(classes)) / len(labels)
+        return cls(classes, weights, np.log(prior))
+
+    def probabilities(self, texts):
+        """질문 목록 → 사후확률 행렬 (질문 × 클래스). BATCH 개씩 X @ W 한 번"""
+        import numpy as np
+
+        blocks = []
+        for start in range(0, len(texts), BATCH):
+            scores = featurize(texts[start:start + BATCH]) @ self.weights + self.bias
+            scores -= scores.max(axis=1, keepdims=True)
+            exp = np.exp(scores)
+            blocks.append(exp / exp.sum(axis=1, keepdims=True))
+        return np.concatenate(blocks) if blocks else np.zeros((0, len(self.labels)), dtype=np.float32)
+
+    def predict(self, texts, min_confidence=None):
+        """질문 목록 → [(라벨 또는 None, 확률)] (확신이 낮거나 일반상담이면 None)"""
+        threshold = self.min_confidence if min_confidence is None else min_confidence
+        probabilities = self.probabilities(texts)
+        results = []
+        for row, position in zip(probabilities, probabilities.argmax(axis=1).tolist()):
+            label, confidence = self.labels[position], float(row[position])
+            results.append((label if label != GENERAL and confidence >= threshold else None, confidence))
+        return results
+
+    def _predict_one(self, message):
+        return self.predict([message])[0][0]
+
+    def classify(self, message):
+        """질문 하나 → 라벨 또는 None (결과는 캐시, 통계는 반복 질문도 매번 집계)"""
+        label = self._label(message)
+        self.stats['classified'] += 1
+        if label:
+            self.stats['routed'] += 1
+        return label
+
+    def save(self, path=INTENT_MODEL_PATH):
+        import numpy as np
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, labels=np.asarray(self.labels), weights=self.weights, bias=self.bias,
+                 dim=np.asarray(INTENT_DIM), ngram_max=np.asarray(NGRAM_MAX), version=np.asarray(MODEL_VERSION),
+                 metrics=np.asarray(json.dumps(self.metrics, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=INTENT_MODEL_PATH):
+        import numpy as np
+
+        with np.load(path) as data:
+            if (int(data['version']), int(data['dim']), int(data['ngram_max'])) != (MODEL_VERSION, INTENT_DIM, NGRAM_MAX):
+                raise ValueError("모델 형식 불일치 (다시 train 필요)")
+            return cls(data['labels'], data['weights'], data['bias'], json.loads(str(data['metrics'])))
+
+    def snapshot(self):
+        return dict(self.stats, labels=self.labels, min_confidence=self.min_confidence,
+                    holdout_accuracy=self.metrics.get('holdout_accuracy'), trained_at=self.metrics.get('trained_at'))
+
+
+def load_model(path=INTENT_MODEL_PATH):
+    """프로세스별 캐시 (파일이 바뀌면 다시 읽음), 모델 파일이나 numpy 가 없으면 None"""
+    if not NUMPY_AVAILABLE:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _model_cache[0] != path or _model_cache[1] != mtime:
+        try:
+            model = IntentModel.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"의도 분류 모델 로드 실패 ({path}): {e}")
+            model = None
+        _model_cache[:] = [path, mtime, model]
+    return _model_cache[2]
+
+
+def mask_keywords(text, category_keywords):
+    """키워드 문구 제거 (긴 키워드부터, "컬러" 안의 "컬"이 남지 않도록)
+
+    분류와 같이 띄어쓰기/문장부호를 무시하고 찾음 ("트리트 먼트")
+    """
+    words = sorted({compact(word) for _, words in category_keywords for word in words}, key=len, reverse=True)
+    for word in filter(None, words):
+        pattern = r'[\W_]*'.join(re.escape(ch) for ch in word)
+        text = re.sub(pattern, ' ', text, flags=re.IGNORECASE)
+    return ' '.join(text.split())
+
+
+def log_examples(log_paths, category_index, categories):
+    """질의 로그 → [(질문, 라벨)]: 키워드로 분류된 질문 + 다시 물은 일반상담 + 다시 묻지 않은 일반상담"""
+    records = []
+    for path in log_paths:
+        if not os.path.exists(path):
+            logger.warning(f"질의 로그 없음: {path}")
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('message') and record.get('recipe_type'):
+                    records.append(record)
+    records.sort(key=lambda record: record.get('ts', 0.0))
+
+    examples, pending = [], {}
+    for record in records:
+        message, recipe_type = record['message'].strip(), record['recipe_type']
+        conversation = record.get('conversation')
+        if recipe_type == GENERAL:
+            if conversation:
+                # 같은 대화의 다음 질문을 볼 때까지 보류
+                if conversation in pending:
+                    examples.append((pending[conversation][0], GENERAL))
+                pending[conversation] = (message, record.get('ts', 0.0))
+            else:
+                examples.append((message, GENERAL))
+            continue
+        # 키워드 정확 일치가 이 카테고리 하나인 질문만 (분류기/오타 허용으로 붙은 라벨은 제외)
+        if recipe_type not in categories or category_index.exact_all(message) != [recipe_type]:
+            continue
+        examples.append((message, recipe_type))
+        previous = pending.pop(conversation, None) if conversation else None
+        if previous and record.get('ts', 0.0) - previous[1] <= REPHRASE_SECONDS:
+            examples.append((previous[0], recipe_type))
+        elif previous:
+            examples.append((previous[0], GENERAL))
+    examples.extend((message, GENERAL) for message, _ in pending.values())
+    return examples
+
+
+def catalog_examples(snapshot):
+    """레시피 문구 + 스타일 메뉴 문장 → [(문장, 라벨)]"""
+    examples = [(recipe, category) for category, data in snapshot.recipes.items() for recipe in data['recipes']]
+    for style in snapshot.styles:
+        for field in (style.intro, style.management, style.image_analysis, style.subtitle):
+            for sentence in _SENTENCE_RE.split(field or ''):
+                sentence = sentence.strip()
+                if len(sentence) < MIN_SENTENCE_CHARS:
+                    continue
+                found = snapshot.category_index.exact_all(sentence)
+                if len(found) <= 1:
+                    examples.append((sentence, found[0] if found else GENERAL))
+    return examples
+
+
+def build_dataset(snapshot, log_paths=()):
+    """학습 예시 [(키워드 지운 문장, 라벨)] (중복 제거, 지우고 남은 내용이 없으면 제외)"""
+    categories = set(snapshot.recipes)
+    examples = catalog_examples(snapshot) + log_examples(log_paths, snapshot.category_index, categories)
+    seen, dataset = set(), []
+    for text, label in examples:
+        masked = mask_keywords(text, snapshot.category_keywords)
+        key = (compact(masked), label)
+        if len(key[0]) < 2 or key in seen:
+            continue
+        seen.add(key)
+        dataset.append((masked, label))
+    return dataset
+
+
+def split(dataset, holdout_percent=HOLDOUT_PERCENT):
+    """문장 crc32 로 고정 분할 (재학습해도 같은 문장은 같은 쪽)"""
+    train, holdout = [], []
+    for text, label in dataset:
+        bucket = zlib.crc32(compact(text).encode('utf-8')) % 100
+        (holdout if bucket < holdout_percent else train).append((text, label))
+    return train, holdout
+
+
+def evaluate(model, holdout, min_confidence=INTENT_MIN_CONFIDENCE):
+    """보류 세트: 전체 정확도, 클래스별 정확도, 임계값 적용 시 라우팅 정밀도/재현율"""
+    texts = [text for text, _ in holdout]
+    labels = [label for _, label in holdout]
+    probabilities = model.probabilities(texts)
+    predicted = [model.labels[position] for position in probabilities.argmax(axis=1).tolist()]
+    routed = [label for label, _ in model.predict(texts, min_confidence)]
+
+    per_class = {}
+    for label in sorted(set(labels)):
+        pairs = [(truth, guess) for truth, guess in zip(labels, predicted) if truth == label]
+        per_class[label] = {'count': len(pairs), 'accuracy': round(sum(t == g for t, g in pairs) / len(pairs), 4)}
+    targets = [truth != GENERAL for truth in labels]
+    hits = [guess is not None and guess == truth for truth, guess in zip(labels, routed)]
+    routed_count = sum(guess is not None for guess in routed)
+    return {
+        'holdout': len(holdout),
+        'holdout_accuracy': round(sum(t == g for t, g in zip(labels, predicted)) / max(1, len(labels)), 4),
+        'per_class': per_class,
+        'min_confidence': min_confidence,
+        'routed': routed_count,
+        'routed_precision': round(sum(hits) / max(1, routed_count), 4),
+        'routed_recall': round(sum(hits) / max(1, sum(targets)), 4),
+        'general_misrouted': sum(guess is not None for truth, guess in zip(labels, routed) if truth == GENERAL)
+    }
+
+
+def throughput(model, texts, repeat_until=2000):
+    """질문/초: 배치 분류 (X @ W 한 번) vs 한 개씩"""
+    texts = (texts * (repeat_until // max(1, len(texts)) + 1))[:repeat_until]
+    started = time.perf_counter()
+    model.predict(texts)
+    batch = len(texts) / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for text in texts[:500]:
+        model.predict([text])
+    single = min(500, len(texts)) / (time.perf_counter() - started)
+    return {'batch_per_s': round(batch), 'single_per_s': round(single), 'single_us': round(1e6 / single, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="일반상담 질문 의도 분류기 학습/확인")
+    parser.add_argument("command", choices=["train", "info"])
+    parser.add_argument("--log", action="append", default=[], help="질의 로그 JSONL (여러 번 지정 가능)")
+    parser.add_argument("--min-confidence", type=float, default=INTENT_MIN_CONFIDENCE)
+    parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        model = load_model(args.output)
+        if model is None:
+            print(f"❌ {args.output} 없음")
+            return 1
+        print(json.dumps(model.metrics, ensure_ascii=False, indent=1))
+        return 0
+
+    logging.basicConfig(level=logging.INFO)
+    # 서버의 현재 카탈로그 (온라인 반영 기록 포함) 를 그대로 사용
+    import hairgator_fast_20param as server
+
+    snapshot = server.catalog.current
+    log_paths = args.log or server.query_logger.files()
+    started = time.perf_counter()
+    dataset = build_dataset(snapshot, log_paths)
+    train, holdout = split(dataset)
+    train += [(text, GENERAL) for text in GENERAL_SEEDS]
+    if not train or not holdout:
+        print("❌ 학습 예시가 부족합니다")
+        return 1
+    model = IntentModel.train([text for text, _ in train], [label for _, label in train])
+    train_s = time.perf_counter() - started
+
+    metrics = evaluate(model, holdout, args.min_confidence)
+    metrics.update(throughput(model, [text for text, _ in holdout]))
+    # 로그의 일반상담 질문 (키워드 그대로) 중 카테고리로 보내게 되는 비율
+    general = [message for message, label in log_examples(log_paths, snapshot.category_index, set(snapshot.recipes))
+               if label == GENERAL]
+    if general:
+        metrics['log_general'] = len(general)
+        metrics['log_general_routed'] = sum(label is not None for label, _ in model.predict(general, args.min_confidence))
+    metrics.update({'train': len(train), 'labels': dict(sorted((label, sum(l == label for _, l in dataset))
+                                                              for label in model.labels)),
+                    'train_s': round(train_s, 2), 'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S')})
+    model.metrics = metrics
+    model.save(args.output)
+
+    print(f"✅ {args.output}: 학습 {len(train)}개 / 보류 {len(holdout)}개, 라벨 {metrics['labels']} ({train_s:.1f}s)")
+    print(f"🎯 보류 정확도 {metrics['holdout_accuracy']:.1%}, 클래스별 "
+          + ', '.join(f"{label} {value['accuracy']:.0%}({value['count']})" for label, value in metrics['per_class'].items()))
+    print(f"🧭 확신 {args.min_confidence:.2f} 이상만 라우팅: {metrics['routed']}개, 정밀도 {metrics['routed_precision']:.1%}, "
+          f"재현율 {metrics['routed_recall']:.1%}, 일반상담 오분류 {metrics['general_misrouted']}개")
+    print(f"⚡ 처리량: 배치 {metrics['batch_per_s']:,}개/s, 한 개씩 {metrics['single_per_s']:,}개/s "
+          f"({metrics['single_us']}µs)")
+    if general:
+        print(f"📨 로그 일반상담 {len(general)}개 중 {metrics['log_general_routed']}개를 카테고리로 분류")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
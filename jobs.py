@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+jobs.py
+오래 걸리는 분석(이미지, 여러 질문 답변)을 위한 백그라운드 작업 큐 (SQLite WAL)
+
+- 제출: 작업을 jobs 테이블에 넣고 즉시 작업 ID 반환 (요청 스레드를 붙잡지 않음)
+- 실행: 워커 프로세스마다 스레드 풀이 우선순위(높은 순) → 제출 순으로 작업을 가져감.
+  가져가기는 BEGIN IMMEDIATE 트랜잭션이라 여러 gunicorn 워커가 같은 작업을 두 번 잡지 않음
+- 재시도: 처리 함수가 예외를 내면 지수 백오프 후 다시 대기열로 (PermanentError 는 즉시 실패)
+- 복구: 실행 중인 워커는 작업 임대(lease_until)를 주기적으로 연장. 임대가 끝난 실행 중 작업(죽은 워커)만
+  다시 대기열로 (오래 걸리는 이미지 분석이 살아 있는 워커에서 두 번 실행되지 않도록).
+  완료/실패 기록은 가져간 시도(attempts)와 같을 때만 반영
+- 결과 조회: wait() 가 완료 시까지 대기 (같은 프로세스면 즉시 깨우고, 다른 프로세스면 짧게 폴링)
+- 계측: 상태별 대기열 깊이, 대기 시간(제출→시작), 실행 시간 p50/p95
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'data/jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '30'))
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_HOURS', '24')) * 3600
+
+# 다른 프로세스가 넣은 작업/끝낸 작업을 확인하는 간격
+POLL_SECONDS = 0.25
+RETRY_BASE_SECONDS = 1.0
+SWEEP_INTERVAL = 30.0
+SAMPLE_WINDOW = 1000
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    blob BLOB,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    run_after REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner INTEGER,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, priority DESC, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+"""
+
+
+class PermanentError(Exception):
+    """재시도해도 소용없는 실패 (잘못된 입력 등)"""
+
+
+class UnknownJobKind(ValueError):
+    """등록되지 않은 작업 종류"""
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return round(ordered[index], 1)
+
+
+class JobQueue:
+    def __init__(self, path=JOB_DB_PATH, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS,
+                 lease_seconds=JOB_LEASE_SECONDS, retention_seconds=JOB_RETENTION_SECONDS):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.handlers = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._fork_hook = False
+        self._stats_lock = threading.Lock()
+        # 이 프로세스에서 실행 중인 작업 ID (임대 연장 대상)
+        self._running = set()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'retried': 0, 'recovered': 0}
+        self.wait_ms = deque(maxlen=SAMPLE_WINDOW)
+        self.run_ms = deque(maxlen=SAMPLE_WINDOW)
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if 'lease_until' not in columns:
+            # 이전 스키마 파일
+            conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    # --- 등록 / 제출 ---
+
+    def register(self, kind, handler, priority=0):
+        """handler(payload, blob) → JSON 직렬화 가능한 결과"""
+        self.handlers[kind] = (handler, priority)
+
+    def submit(self, kind, payload=None, blob=None, priority=None):
+        if kind not in self.handlers:
+            raise UnknownJobKind(kind)
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        if priority is None:
+            priority = self.handlers[kind][1]
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, priority, status, payload, blob, max_attempts, created_at, run_after) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, int(priority), QUEUED, json.dumps(payload or {}, ensure_ascii=False),
+             blob, self.max_attempts, now, now))
+        self._count('submitted')
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    # --- 조회 ---
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, kind, priority, status, result, error, attempts, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        if job['status'] == QUEUED:
+            job['position'] = self._conn().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority > ? OR (priority = ? AND created_at < ?))",
+                (QUEUED, job['priority'], job['priority'], job['created_at'])).fetchone()[0]
+        return job
+
+    def wait(self, job_id, timeout):
+        """완료(또는 timeout)까지 대기 후 작업 상태 반환 (롱 폴링)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in FINISHED or remaining <= 0:
+                return job
+            with self._finished:
+                self._finished.wait(min(POLL_SECONDS, remaining))
+
+    def watch(self, job_id, timeout, interval=POLL_SECONDS, heartbeat=15.0):
+        """상태가 바뀔 때마다 작업을 내보내는 제너레이터 (SSE)
+
+        heartbeat 초 동안 변화가 없으면 None 을 내보냄 (프록시 유휴 타임아웃 방지)
+        """
+        deadline = time.monotonic() + timeout
+        last, last_sent = None, time.monotonic()
+        while time.monotonic() < deadline:
+            job = self.get(job_id)
+            if job is None:
+                return
+            state = (job['status'], job['attempts'], job.get('position'))
+            if state != last:
+                last, last_sent = state, time.monotonic()
+                yield job
+            elif time.monotonic() - last_sent >= heartbeat:
+                last_sent = time.monotonic()
+                yield None
+            if job['status'] in FINISHED:
+                return
+            with self._finished:
+                self._finished.wait(interval)
+
+    # --- 실행 ---
+
+    def start(self):
+        if self._threads or self.workers <= 0:
+            return
+        if not self._fork_hook and hasattr(os, 'register_at_fork'):
+            # gunicorn --preload: 마스터에서 시작한 스레드는 fork 후 사라지므로 워커마다 다시 시작
+            os.register_at_fork(after_in_child=self._after_fork)
+            self._fork_hook = True
+        self._recover()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        for target, name in ((self._sweep_loop, 'job-sweeper'), (self._lease_loop, 'job-lease')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._threads = []
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._running = set()
+        if not self._stop.is_set():
+            self.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, blob, attempts, max_attempts, created_at FROM jobs "
+                "WHERE status = ? AND run_after <= ? ORDER BY priority DESC, created_at LIMIT 1",
+                (QUEUED, now)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, owner = ?, lease_until = ? "
+                    "WHERE id = ?",
+                    (RUNNING, now, os.getpid(), now + self.lease_seconds, row['id']))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except sqlite3.Error as e:
+                logger.warning(f"작업 가져오기 실패: {e}")
+                row = None
+            if row is None:
+                with self._wakeup:
+                    self._wakeup.wait(POLL_SECONDS)
+                continue
+            self._run(row)
+
+    def _run(self, row):
+        started = time.time()
+        if row['attempts'] == 0:
+            self.wait_ms.append((started - row['created_at']) * 1000)
+        handler, _ = self.handlers.get(row['kind'], (None, 0))
+        conn = self._conn()
+        attempts = row['attempts'] + 1
+        # 이 시도가 아직 작업을 가지고 있을 때만 기록 (임대가 끝나 다른 워커가 가져갔으면 무시)
+        owned = f"WHERE id = ? AND status = '{RUNNING}' AND attempts = ?"
+        with self._stats_lock:
+            self._running.add(row['id'])
+        try:
+            if handler is None:
+                raise PermanentError(f"알 수 없는 작업 종류: {row['kind']}")
+            result = handler(json.loads(row['payload']), row['blob'])
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, blob = NULL, finished_at = ?, lease_until = NULL "
+                + owned, (DONE, json.dumps(result, ensure_ascii=False), time.time(), row['id'], attempts))
+            self._count('completed')
+        except Exception as e:
+            if isinstance(e, PermanentError) or attempts >= row['max_attempts']:
+                logger.error(f"작업 실패 ({row['kind']} {row['id']}): {e}")
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, blob = NULL, finished_at = ?, lease_until = NULL " + owned,
+                    (FAILED, str(e)[:500], time.time(), row['id'], attempts))
+                self._count('failed')
+            else:
+                delay = RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                logger.warning(f"작업 재시도 예정 ({row['kind']} {row['id']}, {attempts}회 실패): {e}")
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, run_after = ?, owner = NULL, lease_until = NULL " + owned,
+                    (QUEUED, str(e)[:500], time.time() + delay, row['id'], attempts))
+                self._count('retried')
+        finally:
+            with self._stats_lock:
+                self._running.discard(row['id'])
+        self.run_ms.append((time.time() - started) * 1000)
+        with self._finished:
+            self._finished.notify_all()
+
+    def _renew_leases(self):
+        """이 프로세스에서 실행 중인 작업의 임대 연장"""
+        with self._stats_lock:
+            running = list(self._running)
+        if running:
+            self._conn().execute(
+                f"UPDATE jobs SET lease_until = ? WHERE status = ? AND owner = ? "
+                f"AND id IN ({', '.join('?' * len(running))})",
+                [time.time() + self.lease_seconds, RUNNING, os.getpid()] + running)
+
+    def _lease_loop(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self._renew_leases()
+            except sqlite3.Error as e:
+                logger.warning(f"작업 임대 연장 실패: {e}")
+
+    def _recover(self):
+        """임대가 끝난 실행 중 작업을 대기열로 되돌림 (워커가 죽은 경우)"""
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, owner = NULL, run_after = ?, lease_until = NULL "
+            "WHERE status = ? AND COALESCE(lease_until, started_at + ?) < ?",
+            (QUEUED, now, RUNNING, self.lease_seconds, now))
+        if cursor.rowcount:
+            logger.warning(f"중단된 작업 {cursor.rowcount}개 재등록")
+            self._count('recovered', cursor.rowcount)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(SWEEP_INTERVAL):
+            try:
+                self._recover()
+                self._conn().execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                                     (DONE, FAILED, time.time() - self.retention_seconds))
+            except sqlite3.Error as e:
+                logger.warning(f"작업 정리 실패: {e}")
+
+    # --- 계측 ---
+
+    def depth(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        wait_ms, run_ms = list(self.wait_ms), list(self.run_ms)
+        return dict(stats, path=self.path, workers=len([t for t in self._threads if t.name.startswith('job-worker')]),
+                    depth=self.depth(),
+                    wait_ms={'p50': _percentile(wait_ms, 50), 'p95': _percentile(wait_ms, 95)},
+                    run_ms={'p50': _percentile(run_ms, 50), 'p95': _percentile(run_ms, 95)})
@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+"""
+ledger.py
+요청별 토큰/비용/지연 원장 (고정 길이 바이너리, 추가 전용)
+
+- 답변 하나마다 40바이트 레코드 한 개를 월별 세그먼트(calls-YYYYMM.bin)에 O_APPEND 로 기록
+  (한 번의 write 라서 여러 gunicorn 워커가 동시에 써도 레코드가 섞이지 않음)
+- 모델/카테고리 이름은 crc32 로 저장하고 이름표(names.json)로 되돌림
+- 백그라운드 롤업: 끝난 분의 레코드를 분 × 카테고리 × 모델 × 티어 × 제공자 단위로 합산해
+  minutes-YYYYMM.bin 에 추가 (fcntl 잠금으로 워커 중 하나만 수행).
+  처리 위치는 묶음 끝의 체크포인트 행에 같이 기록 (한 번의 write: 중간에 죽어도 두 번 합산되지 않음,
+  체크포인트 뒤 잔여물은 다음 롤업이 잘라냄)
+- 끝난 시/일은 hours-/days-YYYYMM.bin 으로 한 번 더 합산. 세 파일 모두 minute 순 정렬
+- 조회: 구간을 일/시/분 경계로 나눠 온전한 날은 일 집계, 나머지는 시/분 집계에서 이진 탐색으로
+  필요한 범위만 읽고, 아직 롤업되지 않은 꼬리 레코드와 함께 NumPy 로 집계
+"""
+
+import os
+import json
+import time
+import struct
+import zlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LEDGER_DIR = os.getenv('LEDGER_DIR', 'data/ledger')
+LEDGER_ROLLUP_SECONDS = float(os.getenv('LEDGER_ROLLUP_SECONDS', '60'))
+
+# ts, latency_ms, first_token_ms, prompt, completion, cost(µUSD), model, category, provider, tier, reason, flags
+CALL_FORMAT = '<dffIIIIIBBBB'
+CALL_SIZE = struct.calcsize(CALL_FORMAT)
+# minute, category, model, tier, provider, pad, count, prompt, completion, cost(µUSD), latency_sum, latency_max
+MINUTE_FORMAT = '<IIIBBHIQQQdf'
+MINUTE_SIZE = struct.calcsize(MINUTE_FORMAT)
+
+# 기록된 번호가 바뀌지 않도록 새 단계는 뒤에 추가
+TIERS = ('live', 'store', 'precomputed', 'suggestion', 'image_cache', 'fallback', 'local')
+PROVIDERS = ('', 'openai', 'anthropic', 'other')
+REASONS = ('', 'no_provider', 'upstream_error', 'too_short')
+FLAG_HEDGED = 1
+FLAG_IMAGE = 2
+
+GROUPS = ('category', 'model', 'tier', 'provider', 'minute', 'hour', 'day')
+
+# 롤업 파일(minutes/hours/days-YYYYMM.bin)의 집계 단위(분)
+LEVEL_SPANS = {'minutes': 1, 'hours': 60, 'days': 1440}
+# 묶음마다 마지막에 붙는 체크포인트 행: minute=다음 분(정렬 유지), pad=0xFFFF, count=0, prompt=호출 세그먼트 오프셋
+CHECKPOINT_PAD = 0xFFFF
+_CHECKPOINT_MARK = struct.pack('<HI', CHECKPOINT_PAD, 0)
+_CHECKPOINT_MARK_OFFSET = struct.calcsize('<IIIBB')
+CHECKPOINT_SCAN_ROWS = 16384
+# 분이 끝난 뒤 이만큼 지나야 롤업 (시각을 잰 뒤 쓰기까지의 지연 여유)
+ROLLUP_GRACE_SECONDS = 5
+
+
+def name_id(name):
+    return zlib.crc32((name or '').encode('utf-8'))
+
+
+def _month(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y%m')
+
+
+def _months_between(start, end):
+    months = []
+    current = datetime.fromtimestamp(start, timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while current.timestamp() <= end:
+        months.append(current.strftime('%Y%m'))
+        current = current.replace(year=current.year + (current.month == 12), month=current.month % 12 + 1)
+    return months
+
+
+def _month_minutes(month):
+    """'YYYYMM' → [시작 분, 다음 달 시작 분) (UTC, epoch 기준 분)"""
+    start = datetime.strptime(month, '%Y%m').replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + (start.month == 12), month=start.month % 12 + 1)
+    return int(start.timestamp()) // 60, int(end.timestamp()) // 60
+
+
+def _bisect(column, minute):
+    """정렬된 minute 열(memmap)에서 minute 이상인 첫 위치 (필요한 행만 읽음)"""
+    low, high = 0, len(column)
+    while low < high:
+        middle = (low + high) // 2
+        if column[middle] < minute:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _plan(low, high, levels):
+    """[low, high) 분 구간 → [(롤업 파일, 시작 분, 끝 분)], 굵은 집계부터 경계에 맞는 부분을 차지
+
+    levels: [(파일, 단위 분, 그 파일이 집계를 마친 분)] 굵은 것부터, 마지막은 분 단위
+    """
+    if low >= high:
+        return []
+    (level, span, covered), rest = levels[0], levels[1:]
+    if not rest:
+        return [(level, low, high)]
+    first = -(-low // span) * span
+    last = min(high, covered if covered is not None else low) // span * span
+    if first >= last:
+        return _plan(low, high, rest)
+    return _plan(low, first, rest) + [(level, first, last)] + _plan(last, high, rest)
+
+
+def _aggregate(rows, span, dtype):
+    """집계 행 → span 분 단위 집계 행 (minute 순 정렬, 체크포인트 행 제외)"""
+    import numpy as np
+
+    rows = rows[rows['count'] > 0]
+    result = np.zeros(0, dtype=dtype)
+    if not len(rows):
+        return result
+    period = rows['minute'] // span
+    categories, category_index = np.unique(rows['category'], return_inverse=True)
+    models, model_index = np.unique(rows['model'], return_inverse=True)
+    combined = (((period.astype(np.int64) - int(period.min())) * len(categories) + category_index)
+                * len(models) + model_index) * 65536 + rows['tier'].astype(np.int64) * 256 + rows['provider']
+    unique, first, inverse = np.unique(combined, return_index=True, return_inverse=True)
+    result = np.zeros(len(unique), dtype=dtype)
+    result['minute'] = period[first] * span
+    for column in ('category', 'model', 'tier', 'provider'):
+        result[column] = rows[column][first]
+    for column in ('count', 'prompt', 'completion', 'cost'):
+        totals = np.zeros(len(unique), dtype=np.uint64)
+        np.add.at(totals, inverse, rows[column].astype(np.uint64))
+        result[column] = totals
+    result['latency_sum'] = np.bincount(inverse, weights=rows['latency_sum'], minlength=len(unique))
+    latency_max = np.zeros(len(unique), dtype=np.float32)
+    np.maximum.at(latency_max, inverse, rows['latency_max'])
+    result['latency_max'] = latency_max
+    return result
+
+
+def _dtypes():
+    import numpy as np
+    calls = np.dtype([('ts', '<f8'), ('latency', '<f4'), ('first_token', '<f4'), ('prompt', '<u4'),
+                      ('completion', '<u4'), ('cost', '<u4'), ('model', '<u4'), ('category', '<u4'),
+                      ('provider', 'u1'), ('tier', 'u1'), ('reason', 'u1'), ('flags', 'u1')])
+    minutes = np.dtype([('minute', '<u4'), ('category', '<u4'), ('model', '<u4'), ('tier', 'u1'),
+                        ('provider', 'u1'), ('pad', '<u2'), ('count', '<u4'), ('prompt', '<u8'),
+                        ('completion', '<u8'), ('cost', '<u8'), ('latency_sum', '<f8'), ('latency_max', '<f4')])
+    return calls, minutes
+
+
+class Ledger:
+    """원장 기록/롤업/조회"""
+
+    def __init__(self, directory=LEDGER_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.names_path = os.path.join(directory, 'names.json')
+        self.state_path = os.path.join(directory, 'rollup-state.json')
+        self.lock_path = os.path.join(directory, 'rollup.lock')
+        self._known = set()
+        self._lock = threading.Lock()
+        self._rollup_thread = None
+        self._stop = threading.Event()
+        self.stats = {'records': 0, 'write_errors': 0, 'rollups': 0, 'rolled_records': 0,
+                      'hours_rows': 0, 'days_rows': 0}
+
+    # --- 기록 ---
+
+    def _remember(self, *names):
+        new = [name for name in names if name and name not in self._known]
+        if not new:
+            return
+        with self._lock:
+            try:
+                with open(self.names_path, encoding='utf-8') as f:
+                    table = json.load(f)
+            except (OSError, ValueError):
+                table = {}
+            table.update({str(name_id(name)): name for name in new})
+            tmp_path = f"{self.names_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(table, f, ensure_ascii=False)
+                os.replace(tmp_path, self.names_path)
+                self._known.update(new)
+            except OSError as e:
+                logger.warning(f"원장 이름표 저장 실패: {e}")
+
+    def names(self):
+        try:
+            with open(self.names_path, encoding='utf-8') as f:
+                return {int(key): name for key, name in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, tier, category='', model='', provider='', latency_s=0.0, first_token_s=None,
+               prompt_tokens=0, completion_tokens=0, cost_usd=0.0, reason='', hedged=False, image=False):
+        """답변 한 건 기록 (실패해도 요청 처리에는 영향 없음)"""
+        try:
+            self._remember(category, model)
+            now = time.time()
+            flags = (FLAG_HEDGED if hedged else 0) | (FLAG_IMAGE if image else 0)
+            data = struct.pack(
+                CALL_FORMAT, now, latency_s * 1000,
+                first_token_s * 1000 if first_token_s is not None else -1.0,
+                min(prompt_tokens or 0, 0xFFFFFFFF), min(completion_tokens or 0, 0xFFFFFFFF),
+                min(int(round(cost_usd * 1_000_000)), 0xFFFFFFFF),
+                name_id(model), name_id(category),
+                PROVIDERS.index(provider) if provider in PROVIDERS else len(PROVIDERS) - 1,
+                TIERS.index(tier), REASONS.index(reason), flags)
+            fd = os.open(os.path.join(self.directory, f"calls-{_month(now)}.bin"),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            self.stats['records'] += 1
+        except Exception as e:
+            self.stats['write_errors'] += 1
+            logger.warning(f"원장 기록 실패: {e}")
+
+    # --- 롤업 ---
+
+    def _read_state(self):
+        """예전 형식의 처리 위치 (체크포인트 행이 없는 롤업 파일 이어받기용)"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _segments(self, prefix):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith(prefix) and name.endswith('.bin'))
+
+    def _path(self, level, month):
+        return os.path.join(self.directory, f"{level}-{month}.bin")
+
+    def _checkpoint(self, level, month, legacy=None):
+        """마지막 체크포인트 → (유효 행 수, 호출 세그먼트 오프셋, 다음 분)
+
+        체크포인트 뒤의 행은 쓰는 중이거나 중단된 묶음이라 읽지 않음. 체크포인트가 없으면
+        예전 형식(legacy: rollup-state.json 의 오프셋)으로 전체 행을 인정, 그것도 없으면 (0, 0, None)
+        """
+        path = self._path(level, month)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return 0, 0, None
+        rows = size // MINUTE_SIZE
+        # 뒤에서부터 행 단위로 읽으며 표시(pad=0xFFFF, count=0) 검색 — 보통 마지막 행이 체크포인트
+        with open(path, 'rb') as f:
+            end = rows
+            while end > 0:
+                first = max(0, end - CHECKPOINT_SCAN_ROWS)
+                f.seek(first * MINUTE_SIZE)
+                chunk = f.read((end - first) * MINUTE_SIZE)
+                position = len(chunk)
+                while True:
+                    found = chunk.rfind(_CHECKPOINT_MARK, 0, position)
+                    if found < 0:
+                        break
+                    if (found - _CHECKPOINT_MARK_OFFSET) % MINUTE_SIZE == 0:
+                        row = struct.unpack_from(MINUTE_FORMAT, chunk, found - _CHECKPOINT_MARK_OFFSET)
+                        return first + (found - _CHECKPOINT_MARK_OFFSET) // MINUTE_SIZE + 1, row[7], row[0]
+                    position = found + len(_CHECKPOINT_MARK) - 1
+                end = first
+        if legacy is not None:
+            return rows, legacy, None
+        return 0, 0, None
+
+    def _append(self, level, month, rows, valid_rows, checkpoint):
+        """집계 행 + 체크포인트 행을 한 번의 write 로 추가 (이전 체크포인트 뒤 잔여물은 먼저 잘라냄)"""
+        path = self._path(level, month)
+        if os.path.exists(path) and os.path.getsize(path) > valid_rows * MINUTE_SIZE:
+            os.truncate(path, valid_rows * MINUTE_SIZE)
+        next_minute, offset = checkpoint
+        data = rows + struct.pack(MINUTE_FORMAT, next_minute, 0, 0, 0, 0, CHECKPOINT_PAD, 0, offset, 0, 0, 0.0, 0.0)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.write(fd, data) != len(data):
+                raise OSError(f"원장 롤업 쓰기 중단: {path}")
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def rollup(self):
+        """새 레코드를 분 단위 집계로 합산하고 끝난 시/일 집계를 만듦 (다른 워커가 수행 중이면 건너뜀)
+
+        처리한 레코드 수 반환
+        """
+        lock_file = open(self.lock_path, 'a')
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return 0
+            processed = self._rollup_locked()
+            self._derive_locked()
+            return processed
+        finally:
+            lock_file.close()
+
+    def _rollup_locked(self):
+        legacy = self._read_state()
+        # 끝난 분만 롤업 → 분 집계 파일의 minute 열이 정렬된 상태로 유지 (조회는 이진 탐색)
+        cutoff = int((time.time() - ROLLUP_GRACE_SECONDS) // 60)
+        processed = 0
+        for segment in self._segments('calls-'):
+            month = segment[len('calls-'):-len('.bin')]
+            month_start, month_end = _month_minutes(month)
+            valid_rows, offset, next_minute = self._checkpoint('minutes', month, legacy.get(segment))
+            # 예전 형식 파일은 마지막 행 다음 분부터 이어감 (첫 롤업에서 체크포인트를 붙여 변환)
+            converting = next_minute is None and valid_rows > 0
+            if converting:
+                with open(self._path('minutes', month), 'rb') as f:
+                    f.seek((valid_rows - 1) * MINUTE_SIZE)
+                    next_minute = struct.unpack(MINUTE_FORMAT, f.read(MINUTE_SIZE))[0] + 1
+            elif next_minute is None:
+                next_minute = month_start
+            limit = min(cutoff, month_end)
+
+            path = os.path.join(self.directory, segment)
+            size = os.path.getsize(path)
+            end = size - (size - offset) % CALL_SIZE
+            chunk = b''
+            if end > offset:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    chunk = f.read(end - offset)
+
+            groups = {}
+            count = 0
+            for (ts, latency, _, prompt, completion, cost, model, category,
+                 provider, tier, _, _) in struct.iter_unpack(CALL_FORMAT, chunk):
+                minute = int(ts // 60)
+                if minute >= limit:
+                    # 아직 끝나지 않은 분: 여기서 멈추고 다음 롤업에서 이어감 (오프셋이 연속이도록)
+                    break
+                count += 1
+                # 이미 닫은 분에 늦게 도착한 레코드는 열린 첫 분으로 (정렬 유지, 한 번만 집계)
+                key = (max(minute, next_minute), category, model, tier, provider)
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = [1, prompt, completion, cost, latency, latency]
+                else:
+                    group[0] += 1
+                    group[1] += prompt
+                    group[2] += completion
+                    group[3] += cost
+                    group[4] += latency
+                    group[5] = max(group[5], latency)
+
+            new_next = max(next_minute, limit)
+            # 레코드가 없어도 시 경계를 넘으면 체크포인트를 남겨 시/일 집계가 진행되게 함
+            if not count and not converting and new_next // 60 == next_minute // 60:
+                continue
+
+            rows = b''.join(
+                struct.pack(MINUTE_FORMAT, minute, category, model, tier, provider, 0,
+                            count, prompt, completion, cost, latency_sum, latency_max)
+                for (minute, category, model, tier, provider), (count, prompt, completion, cost, latency_sum, latency_max)
+                in sorted(groups.items()))
+            # 집계 행과 처리 위치(체크포인트)를 한 번에 기록: 중간에 죽어도 두 번 합산되지 않음
+            self._append('minutes', month, rows, valid_rows, (new_next, offset + count * CALL_SIZE))
+            processed += count
+
+        if processed:
+            self.stats['rollups'] += 1
+            self.stats['rolled_records'] += processed
+        return processed
+
+    def _derive_locked(self):
+        """분 집계 → 끝난 시 집계 → 끝난 일 집계 (조회가 긴 구간을 적은 행으로 읽도록)"""
+        try:
+            import numpy as np
+        except ImportError:
+            return
+        _, minute_dtype = _dtypes()
+        for segment in self._segments('minutes-'):
+            month = segment[len('minutes-'):-len('.bin')]
+            month_start, _ = _month_minutes(month)
+            source_level, source_rows, source_next = 'minutes', None, None
+            for level, span in (('hours', 60), ('days', 1440)):
+                if source_rows is None:
+                    source_rows, _, source_next = self._checkpoint(source_level, month)
+                if source_next is None:
+                    break
+                valid_rows, _, covered = self._checkpoint(level, month)
+                covered = month_start if covered is None else covered
+                target = source_next // span * span
+                if target > covered:
+                    rows = np.memmap(self._path(source_level, month), dtype=minute_dtype, mode='r',
+                                     shape=(source_rows,))
+                    column = rows['minute']
+                    part = np.array(rows[_bisect(column, covered):_bisect(column, target)])
+                    del rows, column
+                    aggregated = _aggregate(part, span, minute_dtype)
+                    self._append(level, month, aggregated.tobytes(), valid_rows, (target, 0))
+                    self.stats[f'{level}_rows'] += len(aggregated)
+                    valid_rows, covered = valid_rows + len(aggregated) + 1, target
+                source_level, source_rows, source_next = level, valid_rows, covered
+
+    def start_rollups(self, interval=LEDGER_ROLLUP_SECONDS):
+        if interval <= 0 or self._rollup_thread:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.rollup()
+                except Exception as e:
+                    logger.warning(f"원장 롤업 실패: {e}")
+
+        self._rollup_thread = threading.Thread(target=loop, name='ledger-rollup', daemon=True)
+        self._rollup_thread.start()
+
+    def stop_rollups(self):
+        self._stop.set()
+
+    # --- 조회 ---
+
+    def query(self, start, end, group='category'):
+        """[start, end) 구간 집계 (NumPy)
+
+        구간을 일/시/분 경계로 나눠 가운데 온전한 날은 일 집계, 남은 시간은 시 집계, 가장자리 분은
+        분 집계에서 읽고 (각 파일은 minute 정렬이라 이진 탐색으로 범위만 꺼냄), 롤업 전 꼬리 레코드를 더함
+        """
+        import numpy as np
+
+        if group not in GROUPS:
+            raise ValueError(f"group 은 {', '.join(GROUPS)} 중 하나여야 합니다")
+        started = time.perf_counter()
+        call_dtype, minute_dtype = _dtypes()
+        legacy = self._read_state()
+        start_minute, end_minute = int(start // 60), int(end // 60)
+        # 집계 단위보다 굵은 집계는 쓰지 않음 (시별 조회에 일 집계 불가)
+        levels = {'minute': ('minutes',), 'hour': ('hours', 'minutes')}.get(group, ('days', 'hours', 'minutes'))
+        key_column = 'minute' if group in ('minute', 'hour', 'day') else group
+
+        def take(column, mask):
+            return column if mask is None else column[mask]
+
+        # 그룹 키 + 합산 열만 꺼냄 (레코드 전체 복사 없이)
+        parts = []
+        scanned = 0
+        for month in _months_between(start, end):
+            month_start, month_end = _month_minutes(month)
+            lo, hi = max(start_minute, month_start), min(end_minute, month_end)
+            checkpoints = {level: self._checkpoint(level, month, legacy.get(f"calls-{month}.bin")
+                                                   if level == 'minutes' else None)
+                           for level in levels}
+            plan = _plan(lo, hi, [(level, LEVEL_SPANS[level], checkpoints[level][2]) for level in levels])
+            maps = {}
+            for level, a, b in plan:
+                valid_rows = checkpoints[level][0]
+                if not valid_rows:
+                    continue
+                if level not in maps:
+                    maps[level] = np.memmap(self._path(level, month), dtype=minute_dtype, mode='r',
+                                            shape=(valid_rows,))
+                rows = maps[level]
+                column = rows['minute']
+                rows = rows[_bisect(column, a):_bisect(column, b)]
+                scanned += len(rows)
+                # 체크포인트 행(count 0) 제외
+                mask = None if not len(rows) or rows['count'].min() > 0 else rows['count'] > 0
+                parts.append((
+                    take(rows[key_column], mask),
+                    take(rows['count'], mask), take(rows['prompt'], mask), take(rows['completion'], mask),
+                    take(rows['cost'], mask), take(rows['latency_sum'], mask), take(rows['latency_max'], mask)
+                ))
+
+            # 아직 롤업되지 않은 꼬리
+            segment = f"calls-{month}.bin"
+            path = os.path.join(self.directory, segment)
+            offset = checkpoints['minutes'][1] // CALL_SIZE
+            records = os.path.getsize(path) // CALL_SIZE if os.path.exists(path) else 0
+            if records > offset:
+                # 쓰는 중인 마지막 레코드는 제외하고 레코드 단위로 매핑
+                tail = np.memmap(path, dtype=call_dtype, mode='r', shape=(records,))[offset:]
+                scanned += len(tail)
+                ts = tail['ts']
+                mask = None if ts.min() >= start and ts.max() < end else (ts >= start) & (ts < end)
+                if group in ('minute', 'hour', 'day'):
+                    keys = take(ts, mask) // 60
+                else:
+                    keys = take(tail[group], mask)
+                latency = take(tail['latency'], mask)
+                parts.append((keys, np.ones(len(keys)), take(tail['prompt'], mask),
+                              take(tail['completion'], mask), take(tail['cost'], mask), latency, latency))
+
+        names = self.names()
+        result = []
+        parts = [part for part in parts if len(part[0])]
+        if parts:
+            keys, count, prompt, completion, cost, latency_sum, latency_max = (
+                np.concatenate([np.asarray(part[column]) for part in parts]) for column in range(7))
+            if group in ('minute', 'hour', 'day'):
+                keys = keys.astype(np.int64) // {'minute': 1, 'hour': 60, 'day': 1440}[group]
+            unique, inverse = np.unique(keys, return_inverse=True)
+            sums = {name: np.bincount(inverse, weights=values, minlength=len(unique))
+                    for name, values in (('count', count), ('prompt', prompt), ('completion', completion),
+                                         ('cost', cost), ('latency_sum', latency_sum))}
+            latency_max_by_key = np.zeros(len(unique))
+            np.maximum.at(latency_max_by_key, inverse, latency_max.astype(np.float64))
+
+            for i, key in enumerate(unique.tolist()):
+                count = sums['count'][i]
+                result.append({
+                    'key': self._label(group, key, names),
+                    'count': int(count),
+                    'prompt_tokens': int(sums['prompt'][i]),
+                    'completion_tokens': int(sums['completion'][i]),
+                    'cost_usd': round(float(sums['cost'][i]) / 1_000_000, 6),
+                    'avg_latency_ms': round(float(sums['latency_sum'][i] / count), 1) if count else 0.0,
+                    'max_latency_ms': round(float(latency_max_by_key[i]), 1)
+                })
+            result.sort(key=lambda row: row['key'] if group in ('minute', 'hour', 'day') else -row['count'])
+
+        return {
+            'group': group,
+            'rows': result,
+            'scanned_rows': scanned,
+            'query_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    @staticmethod
+    def _label(group, key, names):
+        if group == 'tier':
+            return TIERS[key] if key < len(TIERS) else str(key)
+        if group == 'provider':
+            return (PROVIDERS[key] or 'none') if key < len(PROVIDERS) else str(key)
+        if group in ('category', 'model'):
+            return names.get(key, str(key))
+        scale = {'minute': 60, 'hour': 3600, 'day': 86400}[group]
+        return datetime.fromtimestamp(key * scale, timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+
+    def snapshot(self):
+        return dict(self.stats, directory=self.directory)
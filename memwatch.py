@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+memwatch.py
+메모리 증가 추적 (tracemalloc 스냅숏 비교 + RSS)
+
+- start() 이후 할당만 추적하므로 운영 중 켜고 일정 시간 뒤 diff() 로 증가 위치를 확인
+- diff(): 기준 스냅숏 대비 할당 위치별 증가량 상위 N 개 (tracemalloc/importlib 내부 제외)
+- 추적 비용(메모리 ~2배 메타데이터, CPU 수십 %)이 있어 기본은 꺼져 있음 (MEMWATCH_ENABLED)
+- RSS 는 /proc/self/statm (Linux), 없으면 resource 의 최대 RSS
+"""
+
+import os
+import gc
+import time
+import threading
+import tracemalloc
+
+MEMWATCH_ENABLED = os.getenv('MEMWATCH_ENABLED', 'false').lower() == 'true'
+MEMWATCH_FRAMES = int(os.getenv('MEMWATCH_FRAMES', '1'))
+
+GROUPINGS = ('lineno', 'filename', 'traceback')
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except ImportError:
+            return None
+
+
+def take_snapshot():
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+def compare(before, after, group='lineno', limit=20):
+    """두 스냅숏의 할당 위치별 증가량 (증가량 큰 순)"""
+    stats = after.compare_to(before, group)
+    stats.sort(key=lambda stat: stat.size_diff, reverse=True)
+    return {
+        'traced_diff_kb': round(sum(stat.size_diff for stat in stats) / 1024, 1),
+        'top': [{
+            'site': str(stat.traceback) if group != 'traceback' else stat.traceback.format(),
+            'size_diff_kb': round(stat.size_diff / 1024, 1),
+            'count_diff': stat.count_diff,
+            'size_kb': round(stat.size / 1024, 1)
+        } for stat in stats[:limit]]
+    }
+
+
+class MemoryWatch:
+    """운영용: 기준 스냅숏을 잡아 두고 요청 시 증가분 보고"""
+
+    def __init__(self, frames=MEMWATCH_FRAMES):
+        self.frames = frames
+        self.baseline = None
+        self.baseline_at = None
+        self.baseline_rss = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self._reset()
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self.baseline = None
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.baseline = take_snapshot()
+        self.baseline_at = time.time()
+        self.baseline_rss = rss_mb()
+
+    def diff(self, group='lineno', limit=20):
+        rss = rss_mb()
+        report = {'tracing': self.tracing, 'rss_mb': round(rss, 2) if rss is not None else None,
+                  'gc_objects': len(gc.get_objects())}
+        with self._lock:
+            if not self.tracing or self.baseline is None:
+                return report
+            current = take_snapshot()
+            report.update(compare(self.baseline, current, group, limit))
+            traced, peak = tracemalloc.get_traced_memory()
+            report.update({
+                'since': self.baseline_at,
+                'seconds': round(time.time() - self.baseline_at, 1),
+                'rss_diff_mb': round(rss - self.baseline_rss, 2)
+                if rss is not None and self.baseline_rss is not None else None,
+                'traced_mb': round(traced / (1024 * 1024), 2),
+                'traced_peak_mb': round(peak / (1024 * 1024), 2),
+                'tracemalloc_overhead_mb': round(tracemalloc.get_tracemalloc_memory() / (1024 * 1024), 2)
+            })
+        return report
+
+    def snapshot(self):
+        rss = rss_mb()
+        return {'tracing': self.tracing, 'rss_mb': round(rss, 2) if rss is not None else None}
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+parameters.py
+42포뮬러 파라미터 지식 베이스 (스타일 메뉴 Ground Truth 에서 구성)
+
+- Ground Truth 의 "→ Section: Horizontal" 줄을 모아 파라미터별 허용 값/빈도/예시 스타일 집계
+- Parameter: 파라미터 하나 (__slots__), 이름/키/한글 별칭 색인으로 조회 (띄어쓰기/오타 허용)
+- ParameterSet: 포뮬러 하나의 파라미터 값 (파라미터 순서대로 값 번호를 담은 array, 없음 = -1)
+- LLM 의 JSON 모드 출력도 같은 ParameterSet 으로 파싱하고 허용 값으로 검증
+  (표기 차이 "O (One-length)" == "O", "Stationary Design Line" == "Stationary" 는 같은 값)
+"""
+
+import re
+import json
+from array import array
+
+from hangul import JamoIndex, compact
+
+# Ground Truth 파라미터 줄과 포뮬러 제목 줄
+_LINE_RE = re.compile(r'^\s*(?:→|->)\s*([A-Za-z][A-Za-z &/]*?)\s*[:：]\s*(.+?)\s*$')
+_FORMULA_RE = re.compile(r'^\s*\[(.+?)\]')
+_PAREN_RE = re.compile(r'\s*\([^)]*\)')
+
+# 시트 표기 오타 → 정식 이름
+NAME_FIXES = {'Over Director': 'Over Direction'}
+
+# 정식 이름 → (키, 한글 이름, 그룹, 별칭). 등록 순서가 출력/프롬프트 순서
+PARAMETER_INFO = [
+    ('Section', 'section', '섹션', 'cut', ('섹션', '섹셔닝', '파팅 섹션')),
+    ('Celestial Axis', 'celestial_axis', '천체축', 'cut', ('천체축', '천체축 각도', '시술 각도')),
+    ('Elevation', 'elevation', '엘리베이션', 'cut', ('엘리베이션', '들어올림 각도')),
+    ('Direction', 'direction', '디렉션', 'cut', ('디렉션', '빗질 방향')),
+    ('Over Direction', 'over_direction', '오버 디렉션', 'cut', ('오버 디렉션', '오버디렉션')),
+    ('Lifting', 'lifting', '리프팅', 'cut', ('리프팅',)),
+    ('Design Line', 'design_line', '디자인 라인', 'cut', ('디자인 라인', '가이드 라인')),
+    ('Length', 'length', '기장', 'cut', ('기장', '모발 길이')),
+    ('Cut Form', 'cut_form', '컷 형태', 'cut', ('컷 형태', '커트 형태', '컷 폼')),
+    ('Cut Shape', 'cut_shape', '컷 셰이프', 'cut', ('컷 셰이프', '커트 셰이프')),
+    ('Outline Shape', 'outline_shape', '아웃라인', 'cut', ('아웃라인', '아웃라인 셰이프')),
+    ('Weight Flow', 'weight_flow', '무게 흐름', 'cut', ('무게 흐름', '웨이트 플로우')),
+    ('Volume Zone', 'volume_zone', '볼륨 존', 'cut', ('볼륨 존', '볼륨존 위치')),
+    ('Transition Zone', 'transition_zone', '트랜지션 존', 'cut', ('트랜지션 존', '연결 구간')),
+    ('Interior Design', 'interior_design', '인테리어 디자인', 'cut', ('인테리어 디자인', '내부 연결')),
+    ('Distribution', 'distribution', '분배', 'cut', ('분배', '디스트리뷰션')),
+    ('Section & Cut Line', 'section_cut_line', '섹션/컷 라인', 'cut', ('컷 라인', '섹션 컷 라인')),
+    ('Cut Method', 'cut_method', '커트 기법', 'cut', ('커트 기법', '컷 기법', '커팅 방법')),
+    ('Styling Direction', 'styling_direction', '스타일링 방향', 'styling', ('스타일링 방향',)),
+    ('Finish Look', 'finish_look', '마무리 룩', 'styling', ('마무리 룩', '피니시 룩')),
+    ('Texture Finish', 'texture_finish', '질감 마무리', 'styling', ('질감 마무리', '텍스처')),
+    ('Design Emphasis', 'design_emphasis', '디자인 강조', 'styling', ('디자인 강조',)),
+    ('Natural Parting', 'natural_parting', '가르마', 'styling', ('가르마', '내추럴 파팅')),
+    ('Styling Product', 'styling_product', '스타일링 제품', 'styling', ('스타일링 제품', '제품 추천')),
+    ('Fringe Type', 'fringe_type', '앞머리 종류', 'styling', ('앞머리 종류', '뱅 종류')),
+    ('Fringe Length', 'fringe_length', '앞머리 길이', 'styling', ('앞머리 길이', '뱅 길이')),
+    ('Fringe Shape', 'fringe_shape', '앞머리 모양', 'styling', ('앞머리 모양', '뱅 모양')),
+    ('Structure Layer', 'structure_layer', '구조 레이어', 'styling', ('구조 레이어', '레이어 구조')),
+    ('Cut Categories', 'cut_categories', '컷 카테고리', 'styling', ('컷 카테고리', '기장 카테고리')),
+]
+
+# 스타일별 예시 개수, 값이 없을 때의 배열 값
+EXAMPLES_PER_VALUE = 5
+MISSING = -1
+
+
+def value_key(name, value):
+    """값 비교 키: 괄호 설명/파라미터 이름 접미사/띄어쓰기/대소문자 무시"""
+    value = _PAREN_RE.sub('', value).strip()
+    if value.lower().endswith(' ' + name.lower()):
+        value = value[:-len(name) - 1]
+    return compact(value)
+
+
+def parse_ground_truth(text):
+    """Ground Truth → [(포뮬러 제목, {파라미터 이름: 값})]
+
+    공통 스타일링 파라미터 블록은 별도 항목 (제목 '공통 스타일링 파라미터')
+    """
+    formulas = []
+    title, values = None, None
+    for line in (text or '').split('\n'):
+        header = _FORMULA_RE.match(line)
+        if header:
+            title, values = header.group(1).strip(), {}
+            formulas.append((title, values))
+            continue
+        match = _LINE_RE.match(line)
+        if match and values is not None:
+            name = match.group(1).strip()
+            values[NAME_FIXES.get(name, name)] = match.group(2).strip()
+    return [(title, values) for title, values in formulas if values]
+
+
+class Parameter:
+    """파라미터 하나: 허용 값(빈도순), 값별 사용 횟수와 예시 스타일"""
+
+    __slots__ = ('name', 'key', 'label', 'group', 'aliases', 'values', 'counts', 'examples', '_keys')
+
+    def __init__(self, name, key, label, group, aliases):
+        self.name = name
+        self.key = key
+        self.label = label
+        self.group = group
+        self.aliases = tuple(aliases)
+        self.values = ()
+        self.counts = ()
+        self.examples = ()
+        self._keys = {}
+
+    def freeze(self, observed):
+        """observed: {값 키: [대표 표기별 횟수 dict, 모델 번호 목록]} → 빈도순 튜플"""
+        ranked = sorted(observed.values(), key=lambda item: -sum(item[0].values()))
+        self.values = tuple(max(spellings, key=spellings.get) for spellings, _ in ranked)
+        self.counts = tuple(sum(spellings.values()) for spellings, _ in ranked)
+        self.examples = tuple(tuple(models[:EXAMPLES_PER_VALUE]) for _, models in ranked)
+        self._keys = {value_key(self.name, value): index for index, value in enumerate(self.values)}
+        for index, (spellings, _) in enumerate(ranked):
+            for spelling in spellings:
+                self._keys.setdefault(value_key(self.name, spelling), index)
+
+    def value_index(self, value):
+        """허용 값이면 번호, 아니면 None ("L2→L6" 처럼 허용 값 조합이 아닌 새 값도 None)"""
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return self._keys.get(value_key(self.name, value))
+
+    def to_dict(self):
+        return {
+            'parameter': self.name,
+            'key': self.key,
+            'label': self.label,
+            'group': self.group,
+            'aliases': list(self.aliases),
+            'values': [{'value': value, 'count': count, 'styles': list(examples)}
+                       for value, count, examples in zip(self.values, self.counts, self.examples)]
+        }
+
+
+class ParameterSet:
+    """포뮬러 하나의 파라미터 값 (파라미터 순서대로 값 번호, 없으면 -1)"""
+
+    __slots__ = ('base', 'indexes', 'title')
+
+    def __init__(self, base, indexes, title=''):
+        self.base = base
+        self.indexes = indexes
+        self.title = title
+
+    def items(self):
+        for parameter, index in zip(self.base.parameters, self.indexes):
+            if index != MISSING:
+                yield parameter, parameter.values[index]
+
+    def __len__(self):
+        return sum(1 for index in self.indexes if index != MISSING)
+
+    def to_dict(self):
+        return {parameter.key: value for parameter, value in self.items()}
+
+
+class ParameterBase:
+    """파라미터 지식 베이스: 이름/별칭 색인, 스타일별 ParameterSet, LLM 출력 검증"""
+
+    def __init__(self, styles=()):
+        self.parameters = []
+        self.by_key = {}
+        self.index = JamoIndex()
+        self.style_sets = {}
+
+        for position, (name, key, label, group, aliases) in enumerate(PARAMETER_INFO):
+            parameter = Parameter(name, key, label, group, aliases)
+            self.parameters.append(parameter)
+            for term in (key, name, label) + parameter.aliases:
+                self.by_key.setdefault(compact(term), parameter)
+                self.index.add(term, parameter)
+        self.position = {parameter.name: position for position, parameter in enumerate(self.parameters)}
+
+        parsed = [(style.model_no, parse_ground_truth(style.ground_truth)) for style in styles]
+        observed = [{} for _ in self.parameters]
+        for model_no, formulas in parsed:
+            for _, values in formulas:
+                for name, value in values.items():
+                    position = self.position.get(name)
+                    if position is None:
+                        continue
+                    parameter = self.parameters[position]
+                    spellings, models = observed[position].setdefault(value_key(parameter.name, value), ({}, []))
+                    spellings[value] = spellings.get(value, 0) + 1
+                    if model_no not in models:
+                        models.append(model_no)
+        for parameter, seen in zip(self.parameters, observed):
+            parameter.freeze(seen)
+
+        for model_no, formulas in parsed:
+            self.style_sets[model_no] = [self.from_values(values, title)[0] for title, values in formulas]
+
+    def __len__(self):
+        return len(self.parameters)
+
+    def get(self, name):
+        """키/영문 이름/한글 별칭 (띄어쓰기/오타 허용) → Parameter 또는 None"""
+        return self.by_key.get(compact(name)) or self.index.classify(name)
+
+    def mentioned(self, message):
+        """질문에 등장하는 파라미터 (정확 일치만, 등장 순서)"""
+        return self.index.exact_all(message)
+
+    def from_values(self, values, title=''):
+        """{파라미터 이름 또는 키: 값} → (ParameterSet, {거부된 이름: 값})"""
+        indexes = array('h', [MISSING] * len(self.parameters))
+        rejected = {}
+        for name, value in values.items():
+            parameter = self.by_key.get(compact(str(name)))
+            index = parameter.value_index(value) if parameter else None
+            if index is None:
+                rejected[str(name)] = value
+                continue
+            indexes[self.position[parameter.name]] = index
+        return ParameterSet(self, indexes, title), rejected
+
+    def parse_json(self, text):
+        """LLM JSON 모드 출력 → (ParameterSet, 거부된 항목). JSON 이 아니면 ValueError"""
+        data = json.loads(text)
+        if isinstance(data, dict) and isinstance(data.get('parameters'), dict):
+            data = data['parameters']
+        if not isinstance(data, dict):
+            raise ValueError("파라미터 JSON 객체가 아닙니다")
+        return self.from_values(data)
+
+    def schema_prompt(self, group=None, max_values=12):
+        """JSON 모드 프롬프트용 허용 값 목록 (키: 값1 | 값2 ...)"""
+        lines = []
+        for parameter in self.parameters:
+            if group and parameter.group != group:
+                continue
+            values = ' | '.join(_PAREN_RE.sub('', value) for value in parameter.values[:max_values])
+            lines.append(f'"{parameter.key}": {values}')
+        return '\n'.join(lines)
+
+    def snapshot(self):
+        return {
+            'parameters': len(self.parameters),
+            'values': sum(len(parameter.values) for parameter in self.parameters),
+            'styles': len(self.style_sets)
+        }
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+precompute.py
+헤어게이터 자주 묻는 질문 사전 답변 파이프라인
+
+/chat 질의 로그(JSONL)에서 recipe_type 별 상위 질문을 추출하고,
+답변을 오프라인으로 생성해 버전이 붙은 사전 답변 테이블로 게시합니다.
+서버 워커는 부팅 시 현재 테이블을 읽어 상위 질문은 업스트림 호출 없이 응답합니다.
+
+사용법:
+    python precompute.py --log logs/chat_queries.jsonl
+    python precompute.py --log logs/chat_queries.jsonl --top 30 --rpm 20
+    python precompute.py --log logs/chat_queries.jsonl --replay recorded_answers.jsonl
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows 로컬 개발 환경
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH', 'logs/chat_queries.jsonl')
+QUERY_LOG_MAX_BYTES = int(float(os.getenv('QUERY_LOG_MAX_MB', '50')) * 1024 * 1024)
+QUERY_LOG_BACKUPS = int(os.getenv('QUERY_LOG_BACKUPS', '5'))
+QUERY_LOG_RETENTION_SECONDS = float(os.getenv('QUERY_LOG_RETENTION_DAYS', '30')) * 86400
+PRECOMPUTED_DIR = os.getenv('PRECOMPUTED_DIR', 'precomputed')
+CURRENT_POINTER = 'CURRENT'
+
+# 이전 테이블 빈도에 곱하는 감쇠율 (오래된 인기 질문이 서서히 빠지도록)
+COUNT_DECAY = 0.5
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(message):
+    """질문 정규화 (소문자, 문장부호 제거, 공백 정리)"""
+    text = _PUNCT_RE.sub(" ", message.lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class QueryLogger:
+    """/chat 질의를 JSONL로 기록 (워커 간 O_APPEND 한 줄 쓰기)
+
+    현재 파일이 max_bytes 를 넘으면 path.1, path.2 ... 로 밀어내고 backups 개까지만 보관,
+    retention_seconds 보다 오래된 회전 파일은 삭제 (파일 락으로 한 워커만 회전)
+    """
+
+    def __init__(self, path=QUERY_LOG_PATH, max_bytes=QUERY_LOG_MAX_BYTES, backups=QUERY_LOG_BACKUPS,
+                 retention_seconds=QUERY_LOG_RETENTION_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+
+    def log(self, message, recipe_type, conversation=None):
+        record = {
+            'ts': time.time(),
+            'message': message,
+            'recipe_type': recipe_type
+        }
+        # 대화 키 (같은 대화에서 다시 물은 질문 추적용, 있을 때만)
+        if conversation:
+            record['conversation'] = conversation
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    size = os.fstat(f.fileno()).st_size
+                if self.max_bytes and size > self.max_bytes:
+                    self.rotate()
+        except OSError as e:
+            logger.warning(f"질의 로그 기록 실패: {e}")
+
+    def files(self):
+        """남아 있는 로그 파일 (오래된 회전 파일부터, 현재 파일 마지막)"""
+        paths = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        return [path for path in paths if os.path.exists(path)]
+
+    def rotate(self):
+        """현재 파일을 path.1 로 밀어내고 개수/기간 상한을 넘는 회전 파일 삭제"""
+        lock_file = open(self.path + '.rotate.lock', 'w')
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+            # 다른 워커가 이미 회전했으면 새 파일은 아직 작음
+            try:
+                if os.path.getsize(self.path) <= self.max_bytes:
+                    return False
+            except FileNotFoundError:
+                return False
+
+            if self.backups > 0:
+                for i in range(self.backups - 1, 0, -1):
+                    if os.path.exists(f"{self.path}.{i}"):
+                        os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+
+            cutoff = time.time() - self.retention_seconds
+            for i in range(1, self.backups + 1):
+                rotated = f"{self.path}.{i}"
+                try:
+                    if self.retention_seconds and os.path.getmtime(rotated) < cutoff:
+                        os.remove(rotated)
+                except FileNotFoundError:
+                    pass
+            return True
+        finally:
+            lock_file.close()
+
+
+def mine_queries(log_paths, since=0.0):
+    """질의 로그에서 recipe_type 별 정규화 질문 빈도 집계
+
+    반환값: ({recipe_type: Counter}, 원문 예시 {(recipe_type, 정규화 질문): 원문}, 마지막 ts)
+    """
+    counts = defaultdict(Counter)
+    samples = {}
+    mined_until = since
+
+    for path in log_paths:
+        if not os.path.exists(path):
+            logger.warning(f"질의 로그 없음: {path}")
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                ts = record.get('ts', 0.0)
+                if ts <= since:
+                    continue
+                message = (record.get('message') or '').strip()
+                recipe_type = record.get('recipe_type')
+                if not message or not recipe_type:
+                    continue
+                key = normalize_question(message)
+                counts[recipe_type][key] += 1
+                samples.setdefault((recipe_type, key), message)
+                mined_until = max(mined_until, ts)
+
+    return counts, samples, mined_until
+
+
+class PrecomputedTable:
+    """부팅 시 로드되는 읽기 전용 사전 답변 테이블"""
+
+    def __init__(self, version=0, entries=None, mined_until=0.0, created_at=None):
+        self.version = version
+        self.entries = entries or {}
+        self.mined_until = mined_until
+        self.created_at = created_at
+
+    def lookup(self, message, recipe_type):
+        entry = self.entries.get(recipe_type, {}).get(normalize_question(message))
+        return entry['answer'] if entry else None
+
+    def __len__(self):
+        return sum(len(questions) for questions in self.entries.values())
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'created_at': self.created_at,
+            'mined_until': self.mined_until,
+            'entries': self.entries
+        }
+
+
+def load_current_table(directory=PRECOMPUTED_DIR):
+    """CURRENT 포인터가 가리키는 테이블 로드 (없으면 빈 테이블)"""
+    pointer = os.path.join(directory, CURRENT_POINTER)
+    try:
+        with open(pointer, encoding='utf-8') as f:
+            filename = f.read().strip()
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.info(f"사전 답변 테이블 없음: {e}")
+        return PrecomputedTable()
+
+    return PrecomputedTable(
+        version=data.get('version', 0),
+        entries=data.get('entries', {}),
+        mined_until=data.get('mined_until', 0.0),
+        created_at=data.get('created_at')
+    )
+
+
+def publish_table(table, directory=PRECOMPUTED_DIR):
+    """새 버전 파일을 쓰고 CURRENT 포인터를 원자적으로 교체"""
+    os.makedirs(directory, exist_ok=True)
+    filename = f"answers-v{table.version:04d}.json"
+    path = os.path.join(directory, filename)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(table.to_dict(), f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+    pointer_tmp = os.path.join(directory, CURRENT_POINTER + '.tmp')
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(filename)
+    os.replace(pointer_tmp, os.path.join(directory, CURRENT_POINTER))
+    return path
+
+
+class ThrottledGenerator:
+    """분당 요청 수를 제한하며 답변 생성 함수를 호출"""
+
+    def __init__(self, generate, requests_per_minute=30):
+        self.generate = generate
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._last_call = 0.0
+
+    def __call__(self, question, recipe_type):
+        wait = self._last_call + self.interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_call = time.monotonic()
+        return self.generate(question, recipe_type)
+
+
+class ReplayGenerator:
+    """기록된 답변(JSONL)을 재생하는 업스트림 대체 생성기 (테스트/드라이런용)"""
+
+    def __init__(self, path):
+        self.answers = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = (record['recipe_type'], normalize_question(record['question']))
+                self.answers[key] = record['answer']
+
+    def __call__(self, question, recipe_type):
+        return self.answers.get((recipe_type, normalize_question(question)))
+
+
+def refresh_table(previous, log_paths, generate, top_n=20, max_age_days=30):
+    """이전 테이블 기준 증분 갱신
+
+    - 이전 테이블 이후(mined_until) 로그만 집계하고 이전 빈도는 감쇠해 합산
+    - 상위 top_n 질문 중 기존 답변이 유효하면 재사용, 새 질문만 생성
+    """
+    new_counts, samples, mined_until = mine_queries(log_paths, since=previous.mined_until)
+
+    merged = defaultdict(Counter)
+    for recipe_type, questions in previous.entries.items():
+        for key, entry in questions.items():
+            merged[recipe_type][key] += entry.get('count', 0) * COUNT_DECAY
+    for recipe_type, counter in new_counts.items():
+        merged[recipe_type].update(counter)
+
+    now = time.time()
+    max_age = max_age_days * 86400
+    entries = {}
+    stats = {'reused': 0, 'generated': 0, 'failed': 0}
+
+    for recipe_type, counter in merged.items():
+        entries[recipe_type] = {}
+        for key, count in counter.most_common(top_n):
+            old = previous.entries.get(recipe_type, {}).get(key)
+            if old and now - old.get('generated_at', 0) < max_age:
+                entries[recipe_type][key] = dict(old, count=count)
+                stats['reused'] += 1
+                continue
+
+            question = samples.get((recipe_type, key)) or (old or {}).get('question') or key
+            try:
+                answer = generate(question, recipe_type)
+            except Exception as e:
+                logger.error(f"사전 답변 생성 실패 ({recipe_type}/{key}): {e}")
+                answer = None
+
+            if not answer:
+                if old:
+                    entries[recipe_type][key] = dict(old, count=count)
+                stats['failed'] += 1
+                continue
+
+            entries[recipe_type][key] = {
+                'question': question,
+                'answer': answer,
+                'count': count,
+                'generated_at': now
+            }
+            stats['generated'] += 1
+
+    table = PrecomputedTable(
+        version=previous.version + 1,
+        entries=entries,
+        mined_until=mined_until,
+        created_at=datetime.now().isoformat()
+    )
+    return table, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="헤어게이터 사전 답변 테이블 생성")
+    parser.add_argument("--log", nargs="+", help="질의 로그 경로 (JSONL, 기본: 회전 파일 포함 QUERY_LOG_PATH)")
+    parser.add_argument("--out", default=PRECOMPUTED_DIR, help="테이블 디렉토리")
+    parser.add_argument("--top", type=int, default=20, help="recipe_type 별 상위 질문 수")
+    parser.add_argument("--rpm", type=int, default=20, help="업스트림 분당 요청 수 제한")
+    parser.add_argument("--max-age-days", type=int, default=30, help="기존 답변 재사용 기간")
+    parser.add_argument("--replay", help="기록된 답변 JSONL (업스트림 대신 재생)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.replay:
+        generate = ReplayGenerator(args.replay)
+    else:
+        # 서버 모듈의 프롬프트/클라이언트를 그대로 사용
+        import hairgator_fast_20param as server
+
+        def generate(question, recipe_type):
+            # 온라인 반영된 레시피 포함 (부팅 시 카탈로그 변경 기록 재생)
+            recipes = server.catalog.current.recipes.get(recipe_type, {}).get('recipes', [])
+            answer = server.get_openai_response(question, recipe_type, recipes, allow_fallback=False)
+            # 테이블에는 구조화 답변(dict)으로 저장
+            return answer.to_dict() if answer else None
+
+        generate = ThrottledGenerator(generate, args.rpm)
+
+    previous = load_current_table(args.out)
+    table, stats = refresh_table(previous, args.log or QueryLogger().files(), generate, args.top, args.max_age_days)
+    path = publish_table(table, args.out)
+
+    print(f"✅ 사전 답변 테이블 게시: {path}")
+    print(f"📊 질문 {len(table)}개 (재사용 {stats['reused']}, 생성 {stats['generated']}, 실패 {stats['failed']})")
+
+
+if __name__ == "__main__":
+    main()
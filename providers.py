@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+"""
+providers.py
+LLM 제공자 추상화 (OpenAI / Anthropic) 와 헤지 요청
+
+- Provider.complete(): 스트리밍으로 받아 첫 토큰 시각, 토큰 사용량, 취소 여부를 기록
+- HedgedCompleter: 1차 제공자가 p95 기반 임계 시간 안에 첫 토큰을 못 내면
+  2차 제공자를 추가로 호출하고 먼저 끝난 쪽을 채택, 진 쪽은 취소
+  (CancelToken 이 진 쪽 HTTP 응답을 바로 닫아 다음 조각을 기다리지 않음)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tracing import tracer, KIND_CLIENT
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_API_URL = os.getenv('ANTHROPIC_API_URL', 'https://api.anthropic.com/v1/messages')
+ANTHROPIC_VERSION = '2023-06-01'
+
+HEDGE_DEFAULT_SECONDS = float(os.getenv('HEDGE_DEFAULT_SECONDS', '3.0'))
+HEDGE_MIN_SECONDS = float(os.getenv('HEDGE_MIN_SECONDS', '0.5'))
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+# 동시에 진행할 수 있는 업스트림 호출 수 (헤지 포함). 꽉 차면 헤지하지 않고 1차 결과를 기다림
+HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', '16'))
+# p95 계산에 필요한 최소 표본 수
+HEDGE_MIN_SAMPLES = 20
+
+
+class Cancelled(Exception):
+    """헤지 경쟁에서 져서 취소된 호출"""
+
+
+class CancelToken:
+    """취소 신호 + 진행 중인 응답 닫기
+
+    제공자 stream() 이 응답/스트림을 attach 해 두면 set() 시 다른 스레드에서 바로 닫아
+    읽기 중인 쪽이 다음 조각을 기다리지 않고 끝남 (이미 취소됐으면 attach 즉시 닫음)
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._closers = []
+        self._lock = threading.Lock()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def attach(self, close):
+        with self._lock:
+            if not self._event.is_set():
+                self._closers.append(close)
+                return
+        _close_quietly(close)
+
+    def set(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            closers, self._closers = self._closers, []
+        for close in closers:
+            _close_quietly(close)
+
+
+def _close_quietly(close):
+    try:
+        close()
+    except Exception as e:
+        logger.debug(f"취소된 응답 닫기 실패: {e}")
+
+
+class Usage:
+    __slots__ = ('input_tokens', 'output_tokens')
+
+    def __init__(self, input_tokens=0, output_tokens=0):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class Completion:
+    """제공자 호출 결과"""
+
+    def __init__(self, provider, text, first_token_s, total_s, usage, cancelled=False):
+        self.provider = provider
+        self.text = text
+        self.first_token_s = first_token_s
+        self.total_s = total_s
+        self.usage = usage
+        self.cancelled = cancelled
+        self.hedged = False
+
+    @property
+    def cost(self):
+        return self.provider.cost(self.usage)
+
+
+def estimate_tokens(text):
+    """사용량 보고가 없을 때(취소 등) 대략적인 토큰 수 (한국어 약 2자당 1토큰)"""
+    return max(1, len(text) // 2) if text else 0
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Provider:
+    """LLM 제공자 공통 인터페이스
+
+    하위 클래스는 stream() 에서 텍스트 조각(str)과 사용량(Usage)을 yield 하고,
+    cancel(CancelToken) 이 있으면 연 응답을 cancel.attach(response.close) 로 등록합니다.
+    가격은 100만 토큰당 USD.
+    """
+
+    name = 'base'
+
+    def __init__(self, model, price_in=0.0, price_out=0.0):
+        self.model = model
+        self.price_in = price_in
+        self.price_out = price_out
+
+    def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+        raise NotImplementedError
+
+    def cost(self, usage):
+        return (usage.input_tokens * self.price_in + usage.output_tokens * self.price_out) / 1_000_000
+
+    def complete(self, system, prompt, max_tokens=400, temperature=0.7,
+                 cancel_event=None, first_token_event=None, on_token=None):
+        """스트리밍 호출 결과 (추적 중이면 제공자별 span: 첫 토큰 시간, 토큰 수, 취소 여부)"""
+        with tracer.span(f"llm {self.name}", KIND_CLIENT, model=self.model) as span:
+            result = self._complete(system, prompt, max_tokens, temperature, cancel_event, first_token_event, on_token)
+            span.set(first_token_ms=round(result.first_token_s * 1000, 1) if result.first_token_s is not None else None,
+                     prompt_tokens=result.usage.input_tokens, completion_tokens=result.usage.output_tokens,
+                     cancelled=result.cancelled)
+            return result
+
+    def _complete(self, system, prompt, max_tokens, temperature, cancel_event, first_token_event, on_token):
+        started = time.perf_counter()
+        first_token_s = None
+        parts = []
+        usage = Usage()
+        reported_output = False
+
+        cancelled = (lambda: False) if cancel_event is None else cancel_event.is_set
+        events = self.stream(system, prompt, max_tokens, temperature, cancel=cancel_event)
+        try:
+            for item in events:
+                if cancelled():
+                    raise Cancelled()
+                if isinstance(item, Usage):
+                    usage.input_tokens = item.input_tokens or usage.input_tokens
+                    if item.output_tokens:
+                        usage.output_tokens = item.output_tokens
+                        reported_output = True
+                    continue
+                if not item:
+                    continue
+                if first_token_s is None:
+                    first_token_s = time.perf_counter() - started
+                    if first_token_event is not None:
+                        first_token_event.set()
+                parts.append(item)
+                if on_token is not None:
+                    on_token(item)
+            if cancelled():
+                # 닫힌 응답이 오류 없이 끝난 경우
+                raise Cancelled()
+        except Exception as e:
+            # 취소로 응답이 닫히면 읽던 쪽에서 연결 오류가 날 수 있음 → 취소로 처리
+            if not (isinstance(e, Cancelled) or cancelled()):
+                raise
+            events.close()
+            text = ''.join(parts)
+            usage.output_tokens = usage.output_tokens or estimate_tokens(text)
+            return Completion(self, text, first_token_s, time.perf_counter() - started, usage, cancelled=True)
+
+        text = ''.join(parts)
+        if not reported_output:
+            usage.output_tokens = estimate_tokens(text)
+        return Completion(self, text, first_token_s, time.perf_counter() - started, usage)
+
+
+class OpenAIProvider(Provider):
+    """OpenAI 호환 엔드포인트 (upstream_pool 경유)"""
+
+    name = 'openai'
+
+    def __init__(self, pool, model, price_in=0.5, price_out=1.5):
+        super().__init__(model, price_in, price_out)
+        self.pool = pool
+
+    def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+        chunks = self.pool.stream_chat_completion(
+            cancel=cancel,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=0.9,
+            stream_options={"include_usage": True}
+        )
+        try:
+            for chunk in chunks:
+                if chunk.usage:
+                    yield Usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ''
+        finally:
+            chunks.close()
+
+
+class AnthropicProvider(Provider):
+    """Anthropic Messages API (SSE 스트리밍, requests 사용)"""
+
+    name = 'anthropic'
+
+    def __init__(self, api_key, model, price_in=3.0, price_out=15.0, timeout=30.0):
+        super().__init__(model, price_in, price_out)
+        self.api_key = api_key
+        self.timeout = timeout
+        import requests
+        self.session = requests.Session()
+
+    def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+        headers = {
+            'x-api-key': self.api_key,
+            'anthropic-version': ANTHROPIC_VERSION,
+            'content-type': 'application/json'
+        }
+        traceparent = tracer.current().traceparent
+        if traceparent:
+            headers['traceparent'] = traceparent
+        response = self.session.post(
+            ANTHROPIC_API_URL,
+            headers=headers,
+            json={
+                'model': self.model,
+                'system': system,
+                'messages': [{'role': 'user', 'content': prompt}],
+                'max_tokens': max_tokens,
+                'temperature': temperature,
+                'stream': True
+            },
+            stream=True,
+            timeout=self.timeout
+        )
+        if cancel is not None:
+            cancel.attach(response.close)
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[5:])
+                kind = event.get('type')
+                if kind == 'message_start':
+                    usage = event.get('message', {}).get('usage', {})
+                    yield Usage(usage.get('input_tokens', 0), usage.get('output_tokens', 0))
+                elif kind == 'content_block_delta':
+                    yield event.get('delta', {}).get('text', '')
+                elif kind == 'message_delta':
+                    yield Usage(0, event.get('usage', {}).get('output_tokens', 0))
+                elif kind == 'error':
+                    raise RuntimeError(event.get('error', {}).get('message', 'Anthropic 스트림 오류'))
+        finally:
+            response.close()
+
+
+class _TokenRelay:
+    """헤지 중 첫 토큰을 낸 제공자 하나로 확정하고 그쪽 조각만 전달 (최종 텍스트도 같은 제공자)"""
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.owner = None
+        self.claimed = threading.Event()
+        self._lock = threading.Lock()
+
+    def for_provider(self, provider):
+        def emit(text):
+            with self._lock:
+                if self.owner is None:
+                    self.owner = provider
+                    self.claimed.set()
+            if self.owner is provider:
+                self.on_token(text)
+        return emit
+
+
+class HedgedCompleter:
+    """1차 제공자 첫 토큰이 늦으면 2차 제공자로 헤지
+
+    - 헤지 타이머는 1차 호출이 풀에서 실제로 시작된 시점부터 (큐 대기 시간으로 헤지하지 않음)
+    - 풀이 꽉 차 있으면 헤지를 건너뜀 (부하가 몰릴 때 호출 수가 두 배로 늘지 않도록)
+    - on_token 이 있으면 먼저 토큰을 낸 쪽으로 확정하고 다른 쪽은 바로 취소
+    """
+
+    def __init__(self, primary, secondary, default_threshold=HEDGE_DEFAULT_SECONDS,
+                 min_threshold=HEDGE_MIN_SECONDS, hedge_percentile=HEDGE_PERCENTILE, window=500,
+                 max_workers=HEDGE_MAX_WORKERS):
+        self.primary = primary
+        self.secondary = secondary
+        self.default_threshold = default_threshold
+        self.min_threshold = min_threshold
+        self.hedge_percentile = hedge_percentile
+        self.max_workers = max_workers
+        self.first_token_samples = deque(maxlen=window)
+        self.latency_samples = deque(maxlen=window)
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_skipped': 0, 'secondary_wins': 0, 'failovers': 0,
+                      'cost_usd': 0.0, 'extra_cost_usd': 0.0}
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    @property
+    def name(self):
+        return f"{self.primary.name}+{self.secondary.name}"
+
+    def threshold(self):
+        """1차 제공자 첫 토큰 지연의 p95 (표본 부족 시 기본값)"""
+        with self._lock:
+            samples = list(self.first_token_samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.default_threshold
+        return max(self.min_threshold, percentile(samples, self.hedge_percentile))
+
+    def _submit(self, provider, system, prompt, max_tokens, temperature, cancel, first_token, on_token, started=None):
+        """풀에 제출 (진행 중 호출 수 집계, started: 실제 실행이 시작되면 set)"""
+        complete = tracer.bind(provider.complete)
+
+        def run():
+            if started is not None:
+                started.set()
+            return complete(system, prompt, max_tokens, temperature, cancel, first_token, on_token)
+
+        with self._lock:
+            self._inflight += 1
+        future = self._executor.submit(run)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._inflight -= 1
+
+    def saturated(self):
+        with self._lock:
+            return self._inflight >= self.max_workers
+
+    def complete(self, system, prompt, max_tokens=400, temperature=0.7, on_token=None):
+        """on_token: 먼저 토큰을 낸 제공자의 조각만 전달, 반환값도 그 제공자의 결과"""
+        started = time.perf_counter()
+        threshold = self.threshold()
+        relay = _TokenRelay(on_token) if on_token is not None else None
+
+        primary_cancel, primary_first, primary_started = CancelToken(), threading.Event(), threading.Event()
+        primary = self._submit(self.primary, system, prompt, max_tokens, temperature, primary_cancel, primary_first,
+                               relay.for_provider(self.primary) if relay else None, started=primary_started)
+
+        # 1차 호출이 실제로 시작된 뒤 첫 토큰 또는 완료/실패를 임계 시간까지 기다림
+        deadline = None
+        while not primary_first.is_set() and not primary.done():
+            if deadline is None:
+                if primary_started.wait(0.05):
+                    deadline = time.perf_counter() + threshold
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            primary_first.wait(min(remaining, 0.05))
+
+        if not primary_first.is_set() and not primary.done() and self.saturated():
+            # 풀이 꽉 참: 헤지 호출은 큐에서 기다릴 뿐이고 다른 요청의 자리를 뺏음 (실패하면 아래에서 장애 조치)
+            with self._lock:
+                self.stats['hedge_skipped'] += 1
+            wait([primary])
+
+        failover = primary.done() and primary.exception() is not None
+        if primary_first.is_set() or (primary.done() and not failover):
+            result = primary.result()
+            self._record(result, started, extra=None)
+            return result
+
+        tracer.current().event('failover' if failover else 'hedge', threshold_ms=round(threshold * 1000, 1))
+        secondary_cancel = CancelToken()
+        secondary = self._submit(self.secondary, system, prompt, max_tokens, temperature, secondary_cancel, None,
+                                 relay.for_provider(self.secondary) if relay else None)
+        with self._lock:
+            self.stats['failovers' if failover else 'hedged'] += 1
+
+        cancels = {primary: primary_cancel, secondary: secondary_cancel}
+        providers = {primary: self.primary, secondary: self.secondary}
+        pending = set(cancels) - ({primary} if failover else set())
+        winner, last_error = None, primary.exception() if failover else None
+        while pending and winner is None:
+            if relay is not None and relay.claimed.is_set():
+                # 토큰을 이미 내보낸 쪽으로 확정: 다른 쪽은 바로 취소하고 확정된 쪽 결과만 기다림
+                owner = next(future for future, provider in providers.items() if provider is relay.owner)
+                for future in pending - {owner}:
+                    cancels[future].set()
+                wait([owner])
+                if owner.exception() is not None:
+                    raise owner.exception()
+                winner = owner
+                break
+            done, _ = wait(pending, timeout=0.05 if relay is not None else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                if future.exception() is not None:
+                    last_error = future.exception()
+                elif winner is None and (relay is None or relay.owner in (None, providers[future])):
+                    winner = future
+
+        if winner is None:
+            raise last_error
+
+        # 진 쪽 취소 (응답을 닫아 스트림이 바로 끝남)
+        loser = next((future for future in cancels if future is not winner and not (failover and future is primary)),
+                     None)
+        if loser is not None:
+            cancels[loser].set()
+
+        result = winner.result()
+        result.hedged = True
+        self._record(result, started, extra=loser)
+        if winner is secondary:
+            with self._lock:
+                self.stats['secondary_wins'] += 1
+        return result
+
+    def _record(self, result, started, extra):
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['cost_usd'] += result.cost
+            self.latency_samples.append(time.perf_counter() - started)
+            if result.provider is self.primary and result.first_token_s is not None:
+                self.first_token_samples.append(result.first_token_s)
+
+        if extra is not None:
+            # 취소된 쪽 비용은 끝난 뒤 합산
+            extra.add_done_callback(self._record_extra)
+
+    def _record_extra(self, future):
+        if future.exception() is not None:
+            return
+        loser = future.result()
+        with self._lock:
+            self.stats['extra_cost_usd'] += loser.cost
+            self.stats['cost_usd'] += loser.cost
+            if loser.provider is self.primary:
+                # 첫 토큰 전에 취소되면 취소 시점까지를 하한값으로 기록 (p95 과소추정 방지)
+                self.first_token_samples.append(
+                    loser.first_token_s if loser.first_token_s is not None else loser.total_s)
+
+    def report(self):
+        """꼬리 지연과 헤지 추가 비용 요약"""
+        with self._lock:
+            latencies = list(self.latency_samples)
+            stats = dict(self.stats)
+        stats.update({
+            'threshold_s': round(self.threshold(), 3),
+            'p50_s': round(percentile(latencies, 50), 3) if latencies else None,
+            'p95_s': round(percentile(latencies, 95), 3) if latencies else None,
+            'p99_s': round(percentile(latencies, 99), 3) if latencies else None,
+            'extra_cost_ratio': round(stats['extra_cost_usd'] / stats['cost_usd'], 3) if stats['cost_usd'] else 0.0
+        })
+        return stats
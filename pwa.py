@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+pwa.py
+채팅 페이지 오프라인 우선 자원 (서비스 워커, 웹 매니페스트, 아이콘)
+
+- 서비스 워커: 앱 셸(/)과 기본 레시피(/recipes)를 설치 시 미리 캐시하고,
+  이후 요청은 캐시로 즉시 응답한 뒤 백그라운드에서 갱신 (stale-while-revalidate)
+- 캐시 이름에 버전(템플릿/워커 소스/카탈로그 세대 해시)이 들어가므로 배포나 카탈로그 반영 시 자동 교체
+- 최근 답변은 페이지 쪽에서 IndexedDB 에 저장 (HTML_TEMPLATE 스크립트)
+"""
+
+import json
+import hashlib
+
+SHELL_CACHE_PREFIX = 'hairgator-shell-'
+SHELL_URLS = ['/', '/recipes', '/manifest.webmanifest', '/icon.svg']
+
+SERVICE_WORKER_JS = """
+const CACHE_NAME = '__CACHE_NAME__';
+const SHELL_URLS = __SHELL_URLS__;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.addAll(SHELL_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    // 이전 버전 셸 캐시 정리
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys
+                .filter(key => key.startsWith('__PREFIX__') && key !== CACHE_NAME)
+                .map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin || !SHELL_URLS.includes(url.pathname)) return;
+
+    // 캐시로 즉시 응답, 네트워크 응답으로 캐시 갱신
+    event.respondWith(caches.open(CACHE_NAME).then(cache =>
+        cache.match(url.pathname).then(cached => {
+            const refresh = fetch(request)
+                .then(response => {
+                    if (response.ok) cache.put(url.pathname, response.clone());
+                    return response;
+                })
+                .catch(() => cached);
+            if (cached) {
+                event.waitUntil(refresh);
+                return cached;
+            }
+            return refresh;
+        })
+    ));
+});
+"""
+
+ICON_SVG = """<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 512 512">
+<defs><linearGradient id="g" x1="0" y1="0" x2="1" y2="1">
+<stop offset="0" stop-color="#ff6b9d"/><stop offset="1" stop-color="#c44569"/></linearGradient></defs>
+<rect width="512" height="512" rx="112" fill="url(#g)"/>
+<text x="256" y="340" font-family="Arial, sans-serif" font-size="280" font-weight="800"
+ text-anchor="middle" fill="#fff">H</text>
+</svg>
+"""
+
+
+def asset_version(*parts):
+    """셸 구성 요소 내용 해시 (배포/카탈로그 반영마다 캐시 교체)"""
+    digest = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, ensure_ascii=False, sort_keys=True)
+        digest.update(part.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def service_worker_js(version):
+    return (SERVICE_WORKER_JS
+            .replace('__CACHE_NAME__', SHELL_CACHE_PREFIX + version)
+            .replace('__PREFIX__', SHELL_CACHE_PREFIX)
+            .replace('__SHELL_URLS__', json.dumps(SHELL_URLS)))
+
+
+def manifest():
+    return {
+        'name': '헤어게이터 - 미용사 전용 헤어 레시피',
+        'short_name': '헤어게이터',
+        'start_url': '/',
+        'scope': '/',
+        'display': 'standalone',
+        'background_color': '#f8f9ff',
+        'theme_color': '#667eea',
+        'lang': 'ko',
+        'icons': [
+            {'src': '/icon.svg', 'sizes': 'any', 'type': 'image/svg+xml', 'purpose': 'any maskable'}
+        ]
+    }
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+response_encoding.py
+JSON 응답 인코딩: UTF-8 그대로 + 빠른 직렬화 + 크기 기준 gzip/brotli 협상
+
+- Flask 기본 JSON 제공자는 한글을 \\uXXXX (6바이트) 로 이스케이프 → UTF-8 (3바이트) 그대로 출력
+- orjson 이 설치되어 있으면 orjson 으로 바로 bytes 직렬화, 없으면 json (ensure_ascii=False, 공백 없는 구분자).
+  orjson 이 처리하지 못하는 값(64비트 초과 정수 등)은 json 으로 다시 직렬화
+- RESPONSE_COMPRESS_MIN_BYTES 이상인 응답만 압축 (작은 응답은 헤더/CPU 비용이 이득보다 큼)
+  Accept-Encoding 의 q 값 기준, 같으면 br > gzip. brotli 모듈이 없으면 gzip 만
+- 스트리밍(SSE/청크) 응답, 이미 인코딩된 응답, 200 이 아닌 응답은 건드리지 않음
+- 압축하면 ETag 를 약한 ETag 로 (nginx gzip 과 같은 방식) + Vary: Accept-Encoding
+- ETag 가 있는 응답(엣지 자원)은 내용이 고정이므로 높은 압축 수준으로 한 번만 압축해 캐시
+"""
+
+import os
+import gzip
+import json
+import threading
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 선택 의존성
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # 선택 의존성
+    brotli = None
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))
+# 고정 응답(ETag 있음)은 한 번만 압축하므로 최고 수준
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+STATIC_CACHE_MAX = 512
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/manifest+json', 'application/javascript',
+                      'text/html', 'text/plain', 'text/css', 'image/svg+xml')
+
+# datetime 은 Flask 기본 제공자와 같은 형식(HTTP 날짜)을 유지하도록 default 로 넘김
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify/get_json 용 JSON 제공자 (app.json = FastJSONProvider(app))"""
+
+    ensure_ascii = False
+    sort_keys = False
+    compact = True
+
+    def dumps_bytes(self, obj):
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+            except TypeError:
+                pass
+        return json.dumps(obj, default=self.default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs or set(kwargs) <= {'separators'}:
+            return self.dumps_bytes(obj).decode('utf-8')
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', False)
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """jsonify: str 로 되돌리지 않고 bytes 를 그대로 본문으로"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def negotiate(accept_encodings, size):
+    """Accept-Encoding(werkzeug Accept) 과 본문 크기 → 'br' | 'gzip' | None"""
+    if size < RESPONSE_COMPRESS_MIN_BYTES or not accept_encodings:
+        return None
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=STATIC_BROTLI_QUALITY if static else RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL if static else RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+class ResponseCompressor:
+    """after_request 훅에서 응답 본문 압축"""
+
+    def __init__(self):
+        self.stats = {'compressed': 0, 'skipped_small': 0, 'bytes_in': 0, 'bytes_out': 0,
+                      'static_hits': 0, 'br': 0, 'gzip': 0}
+        self._static = {}
+        self._lock = threading.Lock()
+
+    def compressible(self, response):
+        return (response.status_code == 200
+                and not response.direct_passthrough
+                and not response.is_streamed
+                and 'Content-Encoding' not in response.headers
+                and response.mimetype in COMPRESSIBLE_TYPES)
+
+    def process(self, response, accept_encodings):
+        if not self.compressible(response):
+            return response
+        # 압축 여부와 관계없이 캐시는 인코딩별로 구분해야 함
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = negotiate(accept_encodings, len(body))
+        if encoding is None:
+            if len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+                with self._lock:
+                    self.stats['skipped_small'] += 1
+            return response
+
+        etag, weak = response.get_etag()
+        if etag:
+            key = (etag, encoding)
+            compressed = self._static.get(key)
+            if compressed is None:
+                compressed = compress(body, encoding, static=True)
+                with self._lock:
+                    if len(self._static) >= STATIC_CACHE_MAX:
+                        self._static.clear()
+                    self._static[key] = compressed
+            else:
+                with self._lock:
+                    self.stats['static_hits'] += 1
+            response.set_etag(etag, weak=True)
+        else:
+            compressed = compress(body, encoding)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        with self._lock:
+            self.stats['compressed'] += 1
+            self.stats[encoding] += 1
+            self.stats['bytes_in'] += len(body)
+            self.stats['bytes_out'] += len(compressed)
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        ratio = stats['bytes_out'] / stats['bytes_in'] if stats['bytes_in'] else None
+        return dict(stats, serializer='orjson' if orjson else 'json', encodings=list(available_encodings()),
+                    min_bytes=RESPONSE_COMPRESS_MIN_BYTES, ratio=round(ratio, 3) if ratio else None,
+                    static_cached=len(self._static))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+soak_test.py
+헤어게이터 장시간 부하(soak) 테스트 + 메모리 누수 검출
+
+서버 모듈을 프로세스 안에서 불러 가짜 업스트림으로 요청을 계속 보내고,
+체크포인트마다 tracemalloc 스냅숏과 RSS 를 기록합니다.
+워밍업(첫 체크포인트) 이후 구간의 1만 요청당 증가량(최소제곱 기울기)이
+한도를 넘으면 종료 코드 1 로 실패하고, 증가가 큰 할당 위치 상위 목록을 출력합니다.
+
+사용법:
+    python soak_test.py                          # 12만 요청
+    python soak_test.py --duration 7200          # 2시간
+    python soak_test.py --threads 8 --upstream-ms 50
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from typing import Dict, List, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUESTIONS = [
+    "애쉬 브라운 레시피 알려주세요",
+    "볼륨 펌 시간은 얼마나 해야 하나요",
+    "손상모발 트리트먼트 순서",
+    "FAL3004 엘레강스 웨이브 컷 방법",
+    "탈색 후 그레이 애쉬 토닝",
+    "셋팅펌 온도",
+    "앞머리 스타일링 팁",
+]
+
+
+def prepare_env(tmp: str):
+    """임시 디렉터리에 저장소/로그를 두고 업스트림 없이 부팅"""
+    os.environ.update({
+        "OPENAI_API_KEY": "",
+        "ANTHROPIC_API_KEY": "",
+        "OPENAI_FORCE_UPGRADE": "false",
+        "UPSTREAM_PROBE_INTERVAL": "0",
+        "ANSWER_STORE_PATH": os.path.join(tmp, "answers.db"),
+        "LEDGER_DIR": os.path.join(tmp, "ledger"),
+        "JOB_DB_PATH": os.path.join(tmp, "jobs.db"),
+        "QUERY_LOG_PATH": os.path.join(tmp, "queries.jsonl"),
+        "EDGE_STATE_PATH": os.path.join(tmp, "edge-state.json"),
+    })
+
+
+def slow_stub_provider(upstream_ms: float):
+    from providers import Provider, Usage
+
+    answer = json.dumps({"t": "가짜 업스트림 답변", "s": ["가짜 시술 단계 %d" % i for i in range(1, 5)],
+                         "r": ["1제:2제 = 1:1"], "m": ["20분"], "c": ["가짜 주의사항 " * 5], "p": ["가짜 프로 팁"]},
+                        ensure_ascii=False, separators=(",", ":"))
+    lock = threading.Lock()
+
+    class SoakProvider(Provider):
+        name = "stub"
+        calls = 0
+
+        def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+            with lock:
+                SoakProvider.calls += 1
+            if upstream_ms:
+                time.sleep(random.lognormvariate(0, 0.35) * upstream_ms / 1000)
+            for piece in answer.split(" "):
+                yield piece + " "
+            yield Usage(len(prompt) // 2, len(answer) // 2)
+
+    return SoakProvider("stub-model")
+
+
+def request_mix(client, rng: random.Random, n: int, style_paths: List[str]):
+    """실제 트래픽 비슷한 요청 한 건 (반복 질문 + 새 질문 + 자동완성 + GET)"""
+    roll = rng.random()
+    if roll < 0.45:
+        client.post("/chat", json={"message": rng.choice(QUESTIONS)})
+    elif roll < 0.65:
+        # 매번 다른 질문 (캐시/저장소 미스, 로그 문자열)
+        client.post("/chat", json={"message": f"{rng.choice(QUESTIONS)} {n} " + "추가 설명 " * rng.randint(0, 40)})
+    elif roll < 0.85:
+        text = rng.choice(QUESTIONS).replace(" ", "")
+        client.get("/suggest", query_string={"q": text[:rng.randint(1, 6)] + (str(n) if roll < 0.7 else "")})
+    elif roll < 0.97:
+        client.get(rng.choice(style_paths))
+    else:
+        client.get("/health")
+
+
+def slope_per_10k(points: List[Tuple[int, float]]) -> float:
+    """(요청 수, 값) 최소제곱 기울기 × 10000"""
+    if len(points) < 2:
+        return 0.0
+    xs, ys = [x for x, _ in points], [y for _, y in points]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    denominator = sum((x - mx) ** 2 for x in xs)
+    if not denominator:
+        return 0.0
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / denominator * 10_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="헤어게이터 soak 테스트 (메모리 누수 검출)")
+    parser.add_argument("--requests", type=int, default=120_000, help="총 요청 수 (--duration 이 없을 때)")
+    parser.add_argument("--duration", type=float, default=0, help="실행 시간(초), 지정 시 --requests 무시")
+    parser.add_argument("--checkpoint", type=int, default=20_000, help="스냅숏 간격 (요청 수)")
+    parser.add_argument("--threads", type=int, default=4, help="동시 요청 스레드 수")
+    parser.add_argument("--upstream-ms", type=float, default=0.0, help="가짜 업스트림 평균 지연 (ms)")
+    parser.add_argument("--max-traced-kb", type=float, default=512.0, help="1만 요청당 허용 추적 메모리 증가 (KB)")
+    parser.add_argument("--max-rss-mb", type=float, default=4.0, help="1만 요청당 허용 RSS 증가 (MB)")
+    parser.add_argument("--top", type=int, default=15, help="출력할 증가 위치 수")
+    parser.add_argument("--frames", type=int, default=1, help="tracemalloc 저장 프레임 수")
+    parser.add_argument("--json", help="체크포인트 결과를 저장할 JSON 경로")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="hairgator-soak-")
+    prepare_env(tmp)
+    sys.path.insert(0, BASE_DIR)
+    import logging
+    import hairgator_fast_20param as server
+    from memwatch import rss_mb, take_snapshot, compare
+    # 로그 핸들러 출력은 끄되 logger.info 호출 비용(문자열 포맷)은 그대로 둠
+    logging.getLogger().handlers.clear()
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    provider = slow_stub_provider(args.upstream_ms)
+    server.answer_provider = provider
+    style_paths = [path for path in server.edge_resources.resources] or ["/recipes"]
+
+    tracemalloc.start(args.frames)
+    counter = {"sent": 0}
+    counter_lock = threading.Lock()
+    stop = threading.Event()
+    deadline = time.monotonic() + args.duration if args.duration else None
+    total = None if args.duration else args.requests
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        client = server.app.test_client()
+        while not stop.is_set():
+            with counter_lock:
+                if total is not None and counter["sent"] >= total:
+                    return
+                counter["sent"] += 1
+                n = counter["sent"]
+            request_mix(client, rng, n, style_paths)
+
+    print(f"🧪 헤어게이터 soak 테스트: 스레드 {args.threads}개, 업스트림 {args.upstream_ms:.0f}ms, "
+          f"{'%.0f초' % args.duration if args.duration else f'{args.requests:,} 요청'}")
+    print("=" * 70)
+    threads = [threading.Thread(target=worker, args=(seed,), daemon=True) for seed in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    checkpoints: List[Dict] = []
+    warm_snapshot = None
+    next_checkpoint = args.checkpoint
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.05)
+            if deadline and time.monotonic() >= deadline:
+                stop.set()
+            if counter["sent"] < next_checkpoint and any(thread.is_alive() for thread in threads):
+                continue
+            requests_done = counter["sent"]
+            snapshot = take_snapshot()
+            traced, _ = tracemalloc.get_traced_memory()
+            point = {"requests": requests_done, "seconds": round(time.perf_counter() - started, 1),
+                     "traced_mb": round(traced / (1024 * 1024), 3), "rss_mb": round(rss_mb() or 0.0, 2)}
+            checkpoints.append(point)
+            if warm_snapshot is None:
+                warm_snapshot = snapshot
+            print(f"📍 {requests_done:>9,} 요청  {point['seconds']:8.1f}s  "
+                  f"traced {point['traced_mb']:8.2f}MB  RSS {point['rss_mb']:8.1f}MB")
+            next_checkpoint = requests_done + args.checkpoint
+    except KeyboardInterrupt:
+        stop.set()
+        print("⏹️ 중단됨, 지금까지 결과로 판정")
+
+    final_snapshot = take_snapshot()
+    measured = checkpoints[1:]
+    traced_slope = slope_per_10k([(p["requests"], p["traced_mb"] * 1024) for p in measured])
+    rss_slope = slope_per_10k([(p["requests"], p["rss_mb"]) for p in measured])
+    diff = compare(warm_snapshot, final_snapshot, limit=args.top) if warm_snapshot else {"top": []}
+
+    print("=" * 70)
+    print(f"📈 워밍업 이후 1만 요청당: traced {traced_slope:+.1f}KB (한도 {args.max_traced_kb:.0f}KB), "
+          f"RSS {rss_slope:+.2f}MB (한도 {args.max_rss_mb:.1f}MB)")
+    print("🔍 증가 상위 할당 위치 (워밍업 → 종료):")
+    for stat in diff["top"]:
+        print(f"   {stat['size_diff_kb']:+10.1f}KB {stat['count_diff']:+8d}개  {stat['site']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"checkpoints": checkpoints, "traced_kb_per_10k": traced_slope,
+                       "rss_mb_per_10k": rss_slope, "top": diff["top"]}, f, ensure_ascii=False, indent=1)
+
+    # 폴백 답변만 돌았다면 실제 경로(제공자 → 저장소 쓰기)를 검사하지 않은 것
+    live = server.answer_store.snapshot()["writes"] if server.answer_store else 0
+    print(f"🔌 가짜 업스트림 호출 {provider.calls:,}회, 저장소 쓰기 {live:,}건")
+    if not provider.calls or not live:
+        print("❌ 실시간 답변이 한 건도 없음 (제공자 호출 실패로 폴백 답변만 측정)")
+        return 1
+
+    if len(measured) < 2:
+        print("⚠️ 워밍업 이후 체크포인트가 2개 미만이라 판정 생략 (--requests/--duration 을 늘리세요)")
+        return 0
+    failures = []
+    if traced_slope > args.max_traced_kb:
+        failures.append(f"추적 메모리 1만 요청당 {traced_slope:+.1f}KB > {args.max_traced_kb:.0f}KB")
+    if rss_slope > args.max_rss_mb:
+        failures.append(f"RSS 1만 요청당 {rss_slope:+.2f}MB > {args.max_rss_mb:.1f}MB")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("🎉 메모리 증가가 한도 이내입니다")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+suggest.py
+입력 중 자동완성 (/suggest) 접두사 색인
+
+정렬된 키 배열 + 이진 탐색으로 접두사 범위를 찾습니다.
+키는 자모 분해 형태라서 한글 조합 중인 입력("앳" = ㅇㅐㅅ)도 "애쉬"(ㅇㅐㅅㅟ)의
+접두사로 잡히고, 띄어쓰기는 무시됩니다. 제안마다 문구 시작과 각 단어 시작을 키로 등록해
+"브라" 로도 "애쉬 브라운 레시피" 를 찾습니다.
+
+제안 ID 는 종류와 원본으로 만들어 워커 간에 동일합니다 (예: "style:FAL3004").
+"""
+
+import re
+import heapq
+from bisect import bisect_left
+from functools import lru_cache
+
+from hangul import to_jamo
+
+SUGGEST_LIMIT = 8
+# 종류별 기본 가중치 (자주 묻는 질문 > 레시피 > 키워드 > 스타일)
+KIND_WEIGHTS = {'question': 100.0, 'recipe': 50.0, 'keyword': 30.0, 'style': 20.0}
+# 문구 첫머리 일치 가산 (단어 중간 시작보다 우선)
+HEAD_BONUS = 2.0
+
+_EMOJI_PREFIX_RE = re.compile(r'^[^\w]+')
+
+
+def recipe_title(recipe):
+    """'🎨 애쉬 브라운 레시피: 6/1 + ...' → '애쉬 브라운 레시피'"""
+    return _EMOJI_PREFIX_RE.sub('', recipe.split(':', 1)[0]).strip()
+
+
+class Suggestion:
+    __slots__ = ('id', 'text', 'kind', 'category', 'ref', 'weight')
+
+    def __init__(self, id, text, kind, category=None, ref=None, weight=None):
+        self.id = id
+        self.text = text
+        self.kind = kind
+        self.category = category
+        self.ref = ref
+        self.weight = KIND_WEIGHTS.get(kind, 1.0) if weight is None else weight
+
+    def to_dict(self):
+        return {'id': self.id, 'text': self.text, 'kind': self.kind, 'category': self.category}
+
+
+class PrefixIndex:
+    """정렬된 (자모 키, 제안 번호) 배열 기반 접두사 색인"""
+
+    def __init__(self, suggestions=(), limit=SUGGEST_LIMIT):
+        self.limit = limit
+        self.suggestions = []
+        self.by_id = {}
+        pairs = []
+        for suggestion in suggestions:
+            if suggestion.id in self.by_id:
+                continue
+            number = len(self.suggestions)
+            self.suggestions.append(suggestion)
+            self.by_id[suggestion.id] = suggestion
+            words = suggestion.text.split()
+            for start in range(len(words)):
+                key = to_jamo(' '.join(words[start:]))
+                if key:
+                    pairs.append((key, number, start == 0))
+        pairs.sort()
+        self.keys = [key for key, _, _ in pairs]
+        self.postings = [(number, head) for _, number, head in pairs]
+        self.search = lru_cache(maxsize=4096)(self._search)
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def get(self, suggestion_id):
+        return self.by_id.get(suggestion_id)
+
+    def _search(self, query):
+        prefix = to_jamo(query)
+        if not prefix:
+            return ()
+        scores = {}
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            number, head = self.postings[position]
+            suggestion = self.suggestions[number]
+            score = suggestion.weight * (HEAD_BONUS if head else 1.0) - len(suggestion.text) * 0.01
+            if score > scores.get(number, float('-inf')):
+                scores[number] = score
+            position += 1
+        best = heapq.nlargest(self.limit, scores.items(), key=lambda item: item[1])
+        return tuple(self.suggestions[number] for number, _ in best)
+
+
+def build_suggestions(hair_recipes, category_keywords, styles, precomputed_table=None):
+    """레시피, 카테고리 키워드, 스타일 메뉴, 사전 답변 질문으로 제안 목록 구성"""
+    suggestions = []
+    if precomputed_table is not None:
+        for category, questions in precomputed_table.entries.items():
+            for key, entry in questions.items():
+                suggestions.append(Suggestion(
+                    f"question:{category}:{key}", entry.get('question') or key, 'question', category, key,
+                    weight=KIND_WEIGHTS['question'] + entry.get('count', 0)))
+
+    for category, data in hair_recipes.items():
+        for number, recipe in enumerate(data['recipes']):
+            suggestions.append(Suggestion(f"recipe:{category}:{number}", recipe_title(recipe),
+                                          'recipe', category, number))
+
+    for category, words in category_keywords:
+        for word in words:
+            suggestions.append(Suggestion(f"keyword:{word}", f"{word} 레시피", 'keyword', category, word))
+
+    for style in styles:
+        suggestions.append(Suggestion(f"style:{style.model_no}", f"{style.model_no} {style.name}",
+                                      'style', None, style.model_no))
+    return suggestions
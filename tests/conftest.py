@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""저장소 루트 모듈 (hangul, precompute, ...) 을 테스트에서 바로 import"""
+
+import os
+import sys
+import contextlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    """업스트림/백그라운드 스레드 없이 임시 디렉터리에서 부팅한 서버 모듈 (세션당 한 번)"""
+    tmp = tmp_path_factory.mktemp('server')
+    os.environ.update({
+        'OPENAI_API_KEY': '',
+        'ANTHROPIC_API_KEY': '',
+        'OPENAI_FORCE_UPGRADE': 'false',
+        'UPSTREAM_PROBE_INTERVAL': '0',
+        'JOB_WORKERS': '0',
+        'CATALOG_POLL_SECONDS': '0',
+        'LEDGER_ROLLUP_SECONDS': '0',
+        'ANSWER_STORE_PATH': str(tmp / 'answers.db'),
+        'LEDGER_DIR': str(tmp / 'ledger'),
+        'JOB_DB_PATH': str(tmp / 'jobs.db'),
+        'QUERY_LOG_PATH': str(tmp / 'queries.jsonl'),
+        'EDGE_STATE_PATH': str(tmp / 'edge-state.json'),
+        'CATALOG_JOURNAL_PATH': str(tmp / 'catalog-journal.jsonl'),
+        'PRECOMPUTED_DIR': str(tmp / 'precomputed'),
+    })
+    with contextlib.redirect_stdout(sys.stderr):
+        import hairgator_fast_20param
+    return hairgator_fast_20param
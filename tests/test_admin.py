@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""관리자 엔드포인트 인증 테스트"""
+
+import pytest
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', 's3cret-token')
+    return server.app.test_client()
+
+
+def test_header_token_is_accepted(client):
+    response = client.get('/admin/catalog', headers={'X-Admin-Token': 's3cret-token'})
+    assert response.status_code == 200
+    assert 'pid' in response.get_json()
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Admin-Token': 'wrong'}, {'X-Admin-Token': 's3cret'},
+                                     {'X-Admin-Token': 's3cret-tokenx'}])
+def test_missing_or_wrong_token_is_rejected(client, headers):
+    assert client.get('/admin/catalog', headers=headers).status_code == 403
+
+
+def test_query_string_token_is_ignored(client):
+    assert client.get('/admin/catalog', query_string={'token': 's3cret-token'}).status_code == 403
+
+
+def test_admin_disabled_without_configured_token(server, monkeypatch):
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', '')
+    client = server.app.test_client()
+    assert client.get('/admin/catalog', headers={'X-Admin-Token': ''}).status_code == 403
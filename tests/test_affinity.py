@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""HashRing: 결정적 배정과 노드 증감 시 재배정 비율"""
+
+from affinity import HashRing, node_points, POINTS_PER_NODE
+
+NODES = [f"hairgator-app-{i}:8000" for i in range(1, 5)]
+KEYS = [f"conversation-{i}" for i in range(4000)]
+
+
+def owners(ring):
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_owner_is_deterministic_and_order_independent():
+    assert owners(HashRing(NODES)) == owners(HashRing(list(reversed(NODES))))
+    assert len(node_points(NODES[0])) == POINTS_PER_NODE
+    assert HashRing().owner('x') is None
+
+
+def test_adding_node_moves_only_keys_to_new_node():
+    before = owners(HashRing(NODES))
+    after = owners(HashRing(NODES + ['hairgator-app-5:8000']))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 'hairgator-app-5:8000' for key in moved)
+    # 기대값 1/5, 점 160개 분산 오차 허용
+    assert 0.10 < len(moved) / len(KEYS) < 0.30
+
+
+def test_removing_node_moves_only_its_keys():
+    before = owners(HashRing(NODES))
+    after = owners(HashRing(NODES[1:]))
+    for key in KEYS:
+        if before[key] != NODES[0]:
+            assert after[key] == before[key]
+        else:
+            assert after[key] != NODES[0]
+
+
+def test_load_is_roughly_balanced():
+    counts = {}
+    for node in owners(HashRing(NODES)).values():
+        counts[node] = counts.get(node, 0) + 1
+    assert set(counts) == set(NODES)
+    assert max(counts.values()) < 2 * min(counts.values())
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""answer_schema 파싱/잘린 JSON 복원"""
+
+import pytest
+
+from answer_schema import Answer, parse_answer, close_json, MAX_ITEMS
+
+FULL = '{"t":"애쉬 브라운","s":["6/1 + 6%","30분 방치"],"r":["1:1"],"m":["30분"],"c":[],"p":["뿌리 먼저"]}'
+
+
+def test_parse_full_answer_with_prose_and_code_fence():
+    answer = parse_answer("답변입니다:\n```json\n" + FULL + "\n```\n감사합니다")
+    assert answer.title == '애쉬 브라운'
+    assert answer.steps == ('6/1 + 6%', '30분 방치')
+    assert answer.ratios == ('1:1',) and answer.cautions == ()
+
+
+def test_long_keys_and_scalar_items():
+    answer = parse_answer('{"title":"펌","steps":"한 단계","tips":[" 공백  정리 ", "", null]}')
+    assert answer.steps == ('한 단계',)
+    assert answer.tips == ('공백 정리',)
+
+
+def test_truncated_inside_string_drops_partial_item():
+    answer = parse_answer('{"t":"애쉬","s":["6/1 + 6%","30분 방')
+    assert answer.steps == ('6/1 + 6%',)
+
+
+def test_truncated_after_key_keeps_completed_fields():
+    answer = parse_answer('{"t":"애쉬","s":["도포"],"r":["1:1"],"m":')
+    assert answer.steps == ('도포',) and answer.ratios == ('1:1',) and answer.times == ()
+
+
+def test_every_prefix_of_valid_answer_parses_or_raises_value_error():
+    for end in range(1, len(FULL) + 1):
+        try:
+            answer = parse_answer(FULL[:end])
+        except ValueError:
+            continue
+        assert set(answer.steps) <= {'6/1 + 6%', '30분 방치'}
+
+
+def test_close_json():
+    assert close_json('{"a":[1,2') == {'a': [1, 2]}
+    # 이스케이프된 따옴표는 문자열 끝이 아님, 미완성 문자열 항목은 버림
+    assert close_json('{"a":"x\\"y","b":[1') == {'a': 'x"y', 'b': [1]}
+    assert close_json('{"a":"x\\"y') == {}
+    assert close_json('{"a":[{"b":1},') == {'a': [{'b': 1}]}
+    assert close_json('}}}') is None
+
+
+def test_rejects_non_json_and_empty():
+    with pytest.raises(ValueError):
+        parse_answer('그냥 문장입니다')
+    with pytest.raises(ValueError):
+        parse_answer('{"t":"제목만"}')
+
+
+def test_item_limit_and_round_trip():
+    answer = parse_answer('{"s":[' + ','.join(f'"{i}단계"' for i in range(20)) + ']}')
+    assert len(answer.steps) == MAX_ITEMS
+    assert Answer.load(answer.dumps()).to_dict() == answer.to_dict()
+    assert Answer.load('<b>예전 HTML</b>').html == '<b>예전 HTML</b>'
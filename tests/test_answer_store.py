@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""answer_store 만료/압축/재시작/다른 프로세스 읽기 테스트"""
+
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+from answer_store import AnswerStore, answer_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'answers.db')
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_put_get_and_key():
+    assert answer_key('gpt', '컬러링', '애쉬') == answer_key('gpt', '컬러링', '애쉬')
+    assert answer_key('gpt', '컬러링', '애쉬') != answer_key('gpt', '펌', '애쉬')
+
+
+def test_expired_answer_is_hidden_then_swept_without_writes(path):
+    store = AnswerStore(path, sweep_interval=0.2)
+    store.put('old', 'a', ttl_seconds=0.05)
+    store.put('new', 'b')
+    assert store.flush()
+    time.sleep(0.1)
+    assert store.get('old') is None
+    assert store.get('new') == 'b'
+    # 이후 쓰기가 없어도 writer 가 주기적으로 만료 행을 지움
+    assert wait_for(lambda: store.snapshot()['expired'] == 1)
+    assert store.count() == 1
+    stats = store.snapshot()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['writes'] == 2
+    store.close()
+
+
+def test_compaction_drops_oldest_first(path):
+    store = AnswerStore(path, max_bytes=10 ** 9)
+    for i in range(200):
+        store.put(f'k{i:03d}', 'x' * 2000)
+        if i % 50 == 49:
+            assert store.flush()
+    assert store.count() == 200
+
+    store.max_bytes = store.size_bytes() // 2
+    assert store.compact()
+    remaining = store.count()
+    assert 0 < remaining < 200
+    assert store.size_bytes() <= store.max_bytes
+    # 가장 오래된 답변부터 삭제
+    assert store.get('k000') is None
+    assert store.get('k199') == 'x' * 2000
+    assert store.snapshot()['compactions'] == 1
+    store.close()
+
+
+def test_answers_survive_reopen(path):
+    store = AnswerStore(path)
+    store.put(answer_key('gpt', '펌', '볼륨 펌'), '{"t":"볼륨 펌"}')
+    store.close()
+
+    reopened = AnswerStore(path)
+    assert reopened.get(answer_key('gpt', '펌', '볼륨 펌')) == '{"t":"볼륨 펌"}'
+    assert reopened.count() == 1
+    reopened.close()
+
+
+def test_second_process_reads_and_writes(path):
+    store = AnswerStore(path)
+    store.put('from-parent', 'parent')
+    assert store.flush()
+
+    script = (
+        "import sys; from answer_store import AnswerStore\n"
+        "store = AnswerStore(sys.argv[1])\n"
+        "print(store.get('from-parent'))\n"
+        "store.put('from-child', 'child'); store.close()\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script, path], cwd=ROOT, capture_output=True, text=True,
+                            timeout=30, check=True)
+    assert result.stdout.strip() == 'parent'
+    # 다른 워커가 쓴 답변을 재시작 없이 읽음 (WAL)
+    assert store.get('from-child') == 'child'
+    store.close()
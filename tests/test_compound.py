@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""복합 질문: 카테고리 분리, 병렬 답변, 하위 답변 실패 처리"""
+
+import time
+import threading
+
+import pytest
+
+from answer_schema import Answer
+
+
+@pytest.mark.parametrize('message, categories', [
+    ("탈색 후 볼륨 펌", ('컬러링', '펌')),
+    ("탈 색 후 볼륨펌", ('컬러링', '펌')),
+    ("애쉬 브라운 염색하고 트리트먼트", ('컬러링', '트리트먼트')),
+    ("컬러 펌 드라이 케어", ('컬러링', '펌', '스타일링')),   # 최대 COMPOUND_MAX_CATEGORIES 개
+    ("볼륨 펌 시간", ('펌',)),
+    ("에쉬 톤 펌", ('펌',)),                                 # 오타 허용 일치는 복합 판정에 쓰지 않음
+])
+def test_split_categories(server, message, categories):
+    assert tuple(server.classify_categories(message)) == categories
+
+
+@pytest.fixture
+def slow_parts(server, monkeypatch):
+    """카테고리마다 0.2초 걸리는 하위 답변 (실패시킬 카테고리 지정 가능)"""
+    state = {'fail': set(), 'threads': set(), 'lock': threading.Lock()}
+
+    def answer_category(message, category, raise_errors=False):
+        with state['lock']:
+            state['threads'].add(threading.current_thread().name)
+        time.sleep(0.2)
+        if category in state['fail']:
+            raise server.UpstreamError(f"{category} 업스트림 503")
+        return Answer(title=f"{category} 답변", steps=[f"{category} 단계"]), 'live'
+
+    monkeypatch.setattr(server, 'answer_category', answer_category)
+    return state
+
+
+def test_compound_answers_run_in_parallel(server, slow_parts):
+    started = time.perf_counter()
+    payload = server.answer_chat("컬러 펌 드라이 케어")
+    elapsed = time.perf_counter() - started
+
+    assert payload['source'] == 'compound'
+    assert payload['categories'] == ['컬러링', '펌', '스타일링']
+    assert [part['title'] for part in payload['answer']['parts']] == ['컬러링 답변', '펌 답변', '스타일링 답변']
+    assert [part['source'] for part in payload['parts']] == ['live'] * 3
+    assert len(slow_parts['threads']) == 3
+    assert elapsed < 0.5   # 순차면 0.6초 이상
+
+
+def test_failed_part_falls_back_alone(server, slow_parts):
+    slow_parts['fail'].add('펌')
+    payload = server.answer_chat("탈색 후 볼륨 펌")
+
+    assert [part['source'] for part in payload['parts']] == ['live', 'fallback']
+    colour, perm = payload['answer']['parts']
+    assert colour['title'] == '컬러링 답변'
+    assert perm['title'] == 'H 펌 전문 레시피' and '펌 업스트림 503' in perm['note']
+
+
+def test_failed_part_raises_for_jobs(server, slow_parts):
+    # 백그라운드 작업은 폴백을 완료로 저장하지 않고 재시도
+    slow_parts['fail'].add('펌')
+    with pytest.raises(server.UpstreamError):
+        server.answer_chat("탈색 후 볼륨 펌", raise_errors=True)
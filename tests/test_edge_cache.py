@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""edge_cache 변경 감지/퍼지 테스트"""
+
+import time
+
+import pytest
+
+from edge_cache import EdgePurger, EdgeResources
+
+
+def resources(recipe):
+    edge = EdgeResources()
+    edge.add('/recipes', {'펌': [recipe]}, ['recipes'], 1)
+    edge.add('/styles/FAL3004', {'model_no': 'FAL3004'}, ['styles', 'style/FAL3004'], 1)
+    return edge
+
+
+class RecordingPurger(EdgePurger):
+    def __init__(self, state_path):
+        super().__init__(purge_url='http://nginx/purge', state_path=state_path)
+        self.calls = []
+
+    def purge(self, paths, keys):
+        self.calls.append((sorted(paths), sorted(keys)))
+
+
+def test_only_changed_paths_purged_once_across_workers(tmp_path):
+    state = str(tmp_path / 'edge-state.json')
+    first, second = RecordingPurger(state), RecordingPurger(state)
+    # 처음 부팅: 이전 상태가 없으니 퍼지할 것도 없음
+    assert first.sync(resources('A'), background=False) == 0
+
+    assert first.sync(resources('B'), background=False) == 1
+    # 다른 워커가 따라잡아 같은 내용을 게시: 상태가 같으므로 다시 퍼지하지 않음
+    assert second.sync(resources('B'), background=False) == 0
+    assert first.calls == [(['/recipes'], ['recipes'])]
+    assert second.calls == []
+
+
+def test_settle_purge_repeats_after_workers_converge(tmp_path):
+    purger = RecordingPurger(str(tmp_path / 'edge-state.json'))
+    purger.sync(resources('A'), background=False)
+    purger.calls.clear()
+
+    purger.sync(resources('B'), background=False, settle_seconds=0.05, generation='g1')
+    # 같은 세대는 한 번만 예약
+    purger.sync(resources('B'), background=False, settle_seconds=0.05, generation='g1')
+    assert purger.snapshot()['settling'] == ['g1']
+    deadline = time.time() + 2
+    while purger.stats['settle_purges'] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert purger.calls == [(['/recipes'], ['recipes'])] * 2
+    assert purger.snapshot()['settling'] == []
+
+
+def test_etag_matches_between_304_and_compressed_200():
+    pytest.importorskip('flask')
+    from flask import Flask, Response, request
+    from response_encoding import ResponseCompressor
+
+    app = Flask(__name__)
+    edge = EdgeResources()
+    edge.add('/styles', [{'model_no': f'FAL{i:04d}', 'name': '레이어드 컷' * 4} for i in range(50)], ['styles'], 1)
+    compressor = ResponseCompressor()
+
+    with app.test_request_context('/styles', headers={'Accept-Encoding': 'gzip'}):
+        plain = edge.respond('/styles', request, Response)
+        etag = plain.headers['ETag']
+        compressed = compressor.process(edge.respond('/styles', request, Response), request.accept_encodings)
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert compressed.headers['ETag'] == etag
+
+    with app.test_request_context('/styles', headers={'If-None-Match': etag}):
+        revalidated = edge.respond('/styles', request, Response)
+        assert revalidated.status_code == 304 and revalidated.headers['ETag'] == etag
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""hangul.JamoIndex 카테고리 분류 회귀 테스트"""
+
+import pytest
+
+from hangul import JamoIndex, compact, decompose, max_edits, span_distance
+
+# hairgator_fast_20param.CATEGORY_KEYWORDS 와 동일
+CATEGORY_KEYWORDS = [
+    ("컬러링", ['컬러', '염색', '애쉬', '브라운', '블론드', '토닝', '탈색']),
+    ("펌", ['펌', '파마', '볼륨', '웨이브', '컬']),
+    ("트리트먼트", ['트리트먼트', '케어', '손상', '영양', '수분']),
+    ("스타일링", ['스타일링', '드라이', '세팅', '매직'])
+]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return JamoIndex((word, category) for category, words in CATEGORY_KEYWORDS for word in words)
+
+
+@pytest.mark.parametrize('message, category', [
+    ("애쉬 브라운 레시피", "컬러링"),
+    ("애쉬브라운 톤", "컬러링"),
+    ("트리트 먼트 순서", "트리트먼트"),
+    ("드라이 세팅 팁", "스타일링"),
+    ("탈 색 후 관리", "컬러링"),
+])
+def test_spacing_insensitive_exact(index, message, category):
+    assert index.classify(message) == category
+
+
+@pytest.mark.parametrize('message, category', [
+    ("브라온 톤 비율", "컬러링"),       # ㅜ/ㅗ
+    ("블룬드 만들기", "컬러링"),        # ㅗ/ㅜ
+    ("트리트면트 순서", "트리트먼트"),  # ㅓ/ㅕ
+    ("에쉬 톤", "컬러링"),              # ㅔ/ㅐ (두 음절 키워드도 오타 허용)
+    ("애시 톤", "컬러링"),              # ㅣ/ㅟ
+    ("에쉬 톤다운", "컬러링"),
+    ("볼룸 살리기", "펌"),              # ㅜ/ㅠ
+    ("트리트먼투", "트리트먼트"),       # ㅜ/ㅡ
+    ("트리먼트", "트리트먼트"),         # 빠진 음절 (초성 + 중성 삭제)
+    ("스타일닝", "스타일링"),           # 자음 치환 (네 음절 이상)
+    ("웨이베 느낌", None),               # ㅡ/ㅔ 는 비슷한 모음이 아니라 비용 2 > 세 음절 한도 1
+])
+def test_typos(index, message, category):
+    assert index.classify(message) == category
+
+
+@pytest.mark.parametrize('message', [
+    "굿모닝",                 # 토닝
+    "날씨가 영향을 줄까요",   # 영양
+    "매진됐나요",             # 매직
+    "드라마 보셨어요",        # 파마, 드라이
+    "케이크 맛집",            # 케어 (ㅣ/ㅓ 는 비슷한 모음 아님)
+    "손실 줄이기",            # 손상
+    "오늘 예약 몇 시예요",
+])
+def test_ordinary_words_stay_general(index, message):
+    assert index.classify(message) is None
+
+
+def test_keyword_limits():
+    assert max_edits(1) == 0
+    assert max_edits(2) == max_edits(3) == 1
+    assert max_edits(4) == max_edits(8) == 2
+
+
+def test_jamo_edit_costs():
+    def distance(pattern, text, limit=4):
+        return span_distance(decompose(pattern), decompose(text), limit)
+
+    assert distance("애쉬", "에쉬") == 1          # 비슷한 모음
+    assert distance("케어", "케이") == 2          # 다른 모음
+    assert distance("토닝", "모닝") == 2          # 초성
+    assert distance("매직", "매진") == 2          # 받침 치환
+    assert distance("매직", "매지") == 2          # 받침 삭제
+    assert distance("트리트먼트", "트리먼트") == 2  # 음절 하나 삭제
+    assert distance("애쉬", "굿애쉬요") == 0      # 음절 경계 구간
+    assert distance("토닝", "굿모닝", limit=1) == 2  # 한도 초과는 limit + 1
+
+
+def test_span_starts_on_syllable_boundary():
+    # "모닝" 의 "ㅗ닝" 처럼 음절 중간에서 시작하는 구간은 보지 않음 (초성 하나 삭제로 토닝과 일치하지 않도록)
+    assert span_distance(decompose("토닝"), decompose("굿모닝"), 1) == 2
+
+
+def test_repeated_syllables_still_match():
+    # 같은 음절이 반복되는 키워드도 구간 검증으로 찾음 (중복 제거된 n-gram 개수로 거르지 않음)
+    index = JamoIndex([("너너너너", 'x')])
+    assert index.fuzzy("너너녀너 노래") == [(1, 0, 'x')]
+    assert index.classify("너너 너너") == 'x'
+
+
+def test_limit_zero_is_exact_only():
+    index = JamoIndex()
+    index.add("FAL3004", 'style', limit=0)
+    index.add("엘레강스 웨이브롱", 'name')
+    assert index.classify("fal 3004 레시피") == 'style'
+    assert index.classify("FAL3005") is None
+    assert index.classify("앨래강스웨이브롱") == 'name'
+    assert compact("엘레강스 웨이브롱!") == "엘레강스웨이브롱"
+
+
+def test_typo_far_into_long_message(index):
+    # 공유 n-gram 주변 창만 검증해도 긴 메시지 뒤쪽 오타를 찾음
+    message = "오늘 오신 손님이 지난번 시술이 마음에 드셨다고 하시는데 이번에는 " * 3 + "에쉬 톤으로"
+    assert index.classify(message) == "컬러링"
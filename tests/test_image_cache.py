@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""image_cache 다중 인덱스 해밍 검색/질문별 캐시 테스트"""
+
+import random
+
+import pytest
+
+from image_cache import HammingIndex, ImageResultCache, MAX_SUPPORTED_DISTANCE, hamming
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(7)
+    index = HammingIndex()
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    for value in values:
+        index.add(value, value)
+    for _ in range(300):
+        target = flip(rng.choice(values), rng.sample(range(64), rng.randint(0, MAX_SUPPORTED_DISTANCE)))
+        best = min(hamming(value, target) for value in values)
+        found = index.nearest(target, MAX_SUPPORTED_DISTANCE)
+        if best <= MAX_SUPPORTED_DISTANCE:
+            assert found is not None and found[1] == best
+        else:
+            assert found is None
+
+
+def test_distance_spread_over_all_chunks_is_found():
+    index = HammingIndex()
+    index.add(0, 'base')
+    # 조각마다 1비트씩 + 한 조각 2비트 = 5비트: 조각 하나는 1비트 이내
+    target = flip(0, [0, 1, 16, 32, 48])
+    assert index.nearest(target, 5) == (0, 5, 'base')
+    assert index.nearest(target, 4) is None
+
+
+def test_remove_and_limits():
+    index = HammingIndex()
+    index.add(5, 'a')
+    index.remove(5)
+    assert len(index) == 0 and index.nearest(5, 0) is None
+    with pytest.raises(ValueError):
+        index.nearest(5, MAX_SUPPORTED_DISTANCE + 1)
+
+
+def test_result_cache_is_keyed_by_question():
+    cache = ImageResultCache(max_distance=6)
+    cache.store(0b1011, "컷 분석", "이 스타일 커트 방법")
+    assert cache.lookup(flip(0b1011, [40]), "이 스타일 커트 방법") == ("컷 분석", 1)
+    assert cache.lookup(0b1011, "이 컬러 레시피") is None
+    cache.store(0b1011, "컬러 분석", "이 컬러 레시피")
+    assert cache.lookup(0b1011, "이 컬러 레시피") == ("컬러 분석", 0)
+    assert cache.snapshot()['questions'] == 2
+
+
+def test_result_cache_evicts_oldest():
+    cache = ImageResultCache(max_entries=2)
+    cache.store(1, 'a', 'q1')
+    cache.store(0x0F0F0F0F0F0F0F0F, 'b', 'q2')
+    cache.lookup(1, 'q1')
+    cache.store(0xF0F0F0F0F0F0F0F0, 'c', 'q2')
+    assert cache.lookup(1, 'q1') == ('a', 0)
+    assert cache.lookup(0x0F0F0F0F0F0F0F0F, 'q2') is None
+    assert len(cache) == 2
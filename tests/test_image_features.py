@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""image_features 로컬 매칭 기준 (같은 사진 변형본은 로컬, 무관한 사진은 비전 모델로)"""
+
+import io
+import os
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+from PIL import Image, ImageDraw, ImageEnhance
+
+import image_features
+from image_features import FeatureIndex, extract_features, load_index
+
+
+def style_photo(seed):
+    """단색 배경 + 머리(색/기장/폭/컬) + 얼굴 실루엣의 합성 스타일 사진"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (600, 800), tuple(rng.randrange(200, 256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    hair = tuple(rng.randrange(20, 160) for _ in range(3))
+    top, bottom = 80 + rng.randrange(80), 300 + rng.randrange(450)
+    draw.ellipse((150, top, 450, top + 300), fill=hair)
+    draw.rectangle((150 + rng.randrange(40), top + 150, 450 - rng.randrange(40), bottom), fill=hair)
+    draw.ellipse((220, top + 90, 380, top + 280), fill=(230, 190, 160))
+    for _ in range(rng.randrange(0, 60)):
+        x, y = rng.randrange(150, 450), rng.randrange(top, bottom)
+        draw.arc((x, y, x + 30, y + 30), 0, 180, fill=tuple(min(255, c + 60) for c in hair), width=3)
+    return image
+
+
+def resave(image, quality=70):
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=quality)
+    return Image.open(io.BytesIO(out.getvalue()))
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_match_requires_score_and_margin():
+    index = FeatureIndex(['FAL0001', 'FAL0001', 'FAL0002'], np.stack([unit(1, 0, 0), unit(0, 1, 0), unit(0, 0, 1)]))
+
+    # 스타일별 최고 점수로 비교 (같은 스타일의 두 번째 사진)
+    result = index.match(unit(0, 1, 0))
+    assert result == {'model_no': 'FAL0001', 'score': 1.0, 'margin': 1.0, 'confident': True}
+
+    # 점수는 높지만 2위와 차이가 작으면 애매 → 비전 모델
+    close = index.match(unit(1, 0, 0.99), min_score=0.5, min_margin=0.03)
+    assert close['model_no'] == 'FAL0001' and close['margin'] < 0.03 and close['confident'] is False
+    assert index.match(unit(1, 0, 0.9), min_score=0.5, min_margin=0.03)['confident'] is True
+
+    # 차이는 크지만 점수가 기준 미만
+    low = index.match(unit(1, 0.9, 0.2), min_score=0.93, min_margin=0.0)
+    assert low['score'] < 0.93 and low['confident'] is False
+
+
+def test_match_single_style_and_empty_index():
+    single = FeatureIndex(['FAL0001'], np.stack([unit(1, 0)]))
+    assert single.match(unit(1, 0))['margin'] == 1.0
+    assert FeatureIndex([], np.zeros((0, 2), dtype=np.float32)).match(unit(1, 0)) is None
+
+
+@pytest.fixture(scope='module')
+def catalog_index():
+    seeds = (0, 2, 3, 4)
+    return seeds, FeatureIndex([f'FAL{seed:04d}' for seed in seeds],
+                               np.stack([extract_features(style_photo(seed)) for seed in seeds]))
+
+
+@pytest.mark.parametrize('variant', [
+    lambda image: resave(image, 70),
+    lambda image: image.resize((300, 400)),
+    lambda image: image.crop((10, 10, 590, 790)),
+    lambda image: ImageEnhance.Brightness(image).enhance(1.1),
+])
+def test_variants_of_catalog_photo_match_locally(catalog_index, variant):
+    seeds, index = catalog_index
+    for seed in seeds:
+        result = index.match(extract_features(variant(style_photo(seed))))
+        assert result['model_no'] == f'FAL{seed:04d}' and result['confident']
+
+
+def unrelated_images():
+    rng = np.random.default_rng(0)
+    landscape = Image.new('RGB', (800, 600), (90, 160, 230))
+    ImageDraw.Draw(landscape).rectangle((0, 350, 800, 600), fill=(60, 140, 50))
+    document = Image.new('RGB', (600, 800), (250, 250, 250))
+    draw = ImageDraw.Draw(document)
+    for y in range(60, 760, 24):
+        draw.line((50, y, 550, y), fill=(30, 30, 30), width=2)
+    return {
+        'noise': Image.fromarray(rng.integers(0, 256, (800, 600, 3), dtype=np.uint8)),
+        'gradient': Image.linear_gradient('L').resize((600, 800)).convert('RGB'),
+        'landscape': landscape,
+        'document': document,
+        'blank': Image.new('RGB', (600, 800), (128, 128, 128)),
+    }
+
+
+@pytest.mark.parametrize('name', sorted(unrelated_images()))
+def test_unrelated_image_goes_to_vision_model(catalog_index, name):
+    _, index = catalog_index
+    result = index.match(extract_features(unrelated_images()[name]))
+    assert result['confident'] is False
+
+
+def test_load_index_reloads_on_change_and_rejects_old_version(tmp_path, monkeypatch):
+    path = str(tmp_path / 'features.npz')
+    assert load_index(path) is None
+
+    FeatureIndex(['FAL0001'], np.stack([unit(1, 0)])).save(path)
+    assert load_index(path).model_nos == ['FAL0001']
+
+    FeatureIndex(['FAL0001', 'FAL0002'], np.stack([unit(1, 0), unit(0, 1)])).save(path)
+    os.utime(path, (1, 1))
+    assert len(load_index(path)) == 2
+
+    monkeypatch.setattr(image_features, 'FEATURE_VERSION', 2)
+    os.utime(path, (2, 2))
+    assert load_index(path) is None
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""image_pipeline 디코딩/축소/크기 상한/시간 초과 테스트"""
+
+import io
+import base64
+from concurrent.futures import Future
+
+import pytest
+
+import image_pipeline
+from image_pipeline import (ImagePipeline, ImageTooLarge, decode_data_url, prepare_image, read_stream,
+                            target_size)
+
+
+def jpeg_bytes(size=(1600, 1200), mode='RGB', fmt='JPEG'):
+    Image = pytest.importorskip('PIL.Image')
+    out = io.BytesIO()
+    Image.new(mode, size, (200, 120, 80) if mode == 'RGB' else (200, 120, 80, 128)).save(out, format=fmt)
+    return out.getvalue()
+
+
+class Chunks(io.RawIOBase):
+    """작은 청크로만 읽히는 업로드 스트림 (읽은 바이트 수 기록)"""
+
+    def __init__(self, data, chunk=1000):
+        self.data, self.chunk, self.read_bytes = data, chunk, 0
+
+    def read(self, size=-1):
+        piece = self.data[self.read_bytes:self.read_bytes + min(size, self.chunk)]
+        self.read_bytes += len(piece)
+        return piece
+
+
+def test_decode_data_url_and_plain_base64():
+    raw = b'\x89PNG fake bytes'
+    encoded = base64.b64encode(raw).decode('ascii')
+    assert decode_data_url('data:image/png;base64,' + encoded) == raw
+    assert decode_data_url(encoded) == raw
+
+
+def test_decode_data_url_rejects_before_decoding():
+    encoded = base64.b64encode(b'x' * 4000).decode('ascii')
+    with pytest.raises(ImageTooLarge):
+        decode_data_url(encoded, max_bytes=1000)
+    # 패딩 때문에 인코딩 길이가 약간 커도 상한 안이면 통과
+    assert len(decode_data_url(base64.b64encode(b'x' * 1000).decode('ascii'), max_bytes=1000)) == 1000
+
+
+def test_read_stream_reads_chunks_and_stops_at_limit():
+    assert read_stream(Chunks(b'a' * 5000), max_bytes=5000, chunk_size=700) == b'a' * 5000
+
+    stream = Chunks(b'a' * 50_000)
+    with pytest.raises(ImageTooLarge):
+        read_stream(stream, max_bytes=5000, chunk_size=1000)
+    assert stream.read_bytes <= 6000
+
+
+def test_read_stream_rejects_declared_length_without_reading():
+    stream = Chunks(b'a' * 50_000)
+    with pytest.raises(ImageTooLarge):
+        read_stream(stream, max_bytes=5000, length=50_000)
+    assert stream.read_bytes == 0
+
+
+@pytest.mark.parametrize('size, expected', [
+    ((4000, 3000), (1024, 768)),      # 짧은 변 768
+    ((3000, 4000), (768, 1024)),
+    ((640, 480), (640, 480)),         # 확대하지 않음
+    ((10000, 1000), (2048, 205)),     # 긴 변 2048 먼저
+])
+def test_target_size(size, expected):
+    assert target_size(*size) == expected
+
+
+def test_prepare_image_decodes_and_resizes_jpeg():
+    data = jpeg_bytes((1600, 1200))
+    encoded, meta, timings = prepare_image(data, short_side=300, long_side=2048)
+    assert meta['original_format'] == 'JPEG'
+    assert meta['original_size'] == [1600, 1200]
+    assert meta['size'] == [400, 300]
+    assert meta['bytes'] == len(encoded) and encoded[:2] == b'\xff\xd8'
+    assert {'decode_ms', 'resize_ms', 'encode_ms'} <= set(timings)
+
+
+def test_prepare_image_converts_alpha_png():
+    encoded, meta, _ = prepare_image(jpeg_bytes((200, 100), mode='RGBA', fmt='PNG'))
+    assert meta['original_format'] == 'PNG'
+    assert meta['size'] == [200, 100]
+    assert encoded[:2] == b'\xff\xd8'
+
+
+def test_prepare_image_rejects_garbage():
+    pytest.importorskip('PIL')
+    with pytest.raises(OSError):
+        prepare_image(b'not an image at all')
+
+
+class StuckExecutor:
+    """제출한 작업이 끝나지 않는 풀 (포화 상태)"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+def test_timeout_is_builtin_timeout_and_cancels(monkeypatch):
+    monkeypatch.setattr(image_pipeline, 'PIL_AVAILABLE', True)
+    pipeline = ImagePipeline(workers=1)
+    pipeline._executor = StuckExecutor()
+    with pytest.raises(TimeoutError):
+        pipeline.process(b'data', timeout=0.01)
+    assert pipeline._executor.futures[0].cancelled()
+    snapshot = pipeline.snapshot()
+    assert snapshot['timeouts'] == 1 and snapshot['failed'] == 0
+    assert snapshot['queue_depth'] == 0
+
+
+def test_endpoint_maps_timeout_to_503_and_bad_image_to_400(server, monkeypatch):
+    client = server.app.test_client()
+    body = {'image_data': base64.b64encode(b'not an image').decode('ascii')}
+
+    def stuck(data, timeout=30.0):
+        raise TimeoutError("이미지 처리가 30초 안에 끝나지 않았습니다")
+
+    monkeypatch.setattr(server.image_pipeline, 'process', stuck)
+    response = client.post('/analyze-image', json=body)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(image_pipeline.IMAGE_RETRY_AFTER_SECONDS)
+
+    monkeypatch.undo()
+    if not image_pipeline.PIL_AVAILABLE:
+        pytest.skip('Pillow 미설치')
+    response = client.post('/analyze-image', json=body)
+    assert response.status_code == 400
+
+
+class FakeVisionPool:
+    """비전 모델 응답을 돌려주는 업스트림 풀 (마지막 프롬프트 기록)"""
+
+    def __init__(self, content):
+        self.content = content
+        self.prompt = None
+
+    def chat_completion(self, model, messages, **kwargs):
+        from types import SimpleNamespace
+        self.prompt = messages[1]['content'][0]['text']
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_image_answer_uses_typed_answer(server, monkeypatch):
+    if not image_pipeline.PIL_AVAILABLE:
+        pytest.skip('Pillow 미설치')
+    client = server.app.test_client()
+    body = {'image_data': base64.b64encode(jpeg_bytes((640, 480))).decode('ascii'), 'message': '이 컷 분석'}
+
+    pool = FakeVisionPool('{"t":"그래쥬에이션 보브","s":["컷 형태: Graduation"],"p":["45도 리프팅"]}')
+    monkeypatch.setattr(server, 'upstream_pool', pool)
+    monkeypatch.setattr(server.image_cache, 'lookup', lambda *args: None)
+    data = client.post('/analyze-image', json=body).get_json()
+    assert 'HTML 형식' not in pool.prompt and '"t":"제목"' in pool.prompt
+    assert data['source'] == 'live' and data['message_type'] == 'image_analysis'
+    assert data['answer']['title'] == '그래쥬에이션 보브'
+    assert data['answer']['tips'] == ['45도 리프팅']
+    assert '그래쥬에이션 보브' in data['response']
+
+    monkeypatch.setattr(server, 'upstream_pool', None)
+    data = client.post('/analyze-image', json=body).get_json()
+    assert data['source'] == 'fallback'
+    assert data['answer']['title'] == 'H 이미지 분석' and '640×480' in data['answer']['intro']
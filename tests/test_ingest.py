@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""ingest 스냅숏 게시/기록 재생/압축 테스트"""
+
+import pytest
+
+from ingest import CatalogSnapshot, CatalogState, net_changes, normalize_change
+
+HAIR_RECIPES = {
+    "컬러링": {"keywords": ["컬러", "염색"], "recipes": ["애쉬 브라운 6레벨"]},
+    "펌": {"keywords": ["펌", "웨이브"], "recipes": ["볼륨 매직 20분"]},
+}
+CATEGORY_KEYWORDS = [("컬러링", ["컬러", "염색"]), ("펌", ["펌", "웨이브"])]
+
+STYLE = {'model_no': 'FAL3004', 'intro': '엘레강스 웨이브롱!\n부드러운 웨이브', 'formula': 'DBS'}
+HEADSPA = {'kind': 'recipe', 'op': 'upsert',
+           'record': {'category': '헤드스파', 'keywords': ['헤드스파', '두피'], 'recipes': ['두피 스케일링 10분']}}
+
+
+def base_snapshot():
+    return CatalogSnapshot.build((), HAIR_RECIPES, CATEGORY_KEYWORDS)
+
+
+def new_state(path, compact_batches=50):
+    return CatalogState(base_snapshot(), journal_path=str(path), compact_batches=compact_batches)
+
+
+def test_apply_publishes_new_snapshot_and_keeps_pinned(tmp_path):
+    state = new_state(tmp_path / 'journal.jsonl')
+    published = []
+    state.subscribe(published.append)
+    with state.pin() as pinned:
+        snapshot = state.apply([HEADSPA, {'kind': 'style', 'op': 'upsert', 'record': STYLE}])
+        assert state.view() is pinned
+        assert pinned.classify_category("두피 관리") is None
+    assert published == [snapshot]
+    assert state.view().classify_category("두피 관리") == "헤드스파"
+    assert state.view().styles_by_model['FAL3004'].name == "엘레강스 웨이브롱"
+
+
+def test_invalid_change_leaves_state_unchanged(tmp_path):
+    state = new_state(tmp_path / 'journal.jsonl')
+    before = state.current
+    with pytest.raises(ValueError):
+        state.apply([{'kind': 'recipe', 'op': 'delete', 'key': '없는카테고리'}])
+    assert state.current is before
+    assert not (tmp_path / 'journal.jsonl').read_text()
+
+
+def test_second_worker_replays_journal(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    writer = new_state(path)
+    writer.apply([HEADSPA])
+    writer.apply([{'kind': 'style', 'op': 'upsert', 'record': STYLE}])
+    writer.apply([{'kind': 'recipe', 'op': 'delete', 'key': '펌'}])
+
+    reader = new_state(path)
+    assert reader.refresh() == writer.current.version
+    assert reader.current.generation == writer.current.generation
+    assert set(reader.current.recipes) == {"컬러링", "헤드스파"}
+
+
+def test_generation_tracks_content_not_version(tmp_path):
+    state = new_state(tmp_path / 'journal.jsonl')
+    base = state.current.generation
+    state.apply([HEADSPA])
+    assert state.current.generation != base
+    state.apply([{'kind': 'recipe', 'op': 'delete', 'key': '헤드스파'}])
+    assert state.current.generation == base
+
+
+def test_compaction_replaces_journal_and_other_workers_follow(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    writer = new_state(path, compact_batches=3)
+    follower = new_state(path, compact_batches=3)
+    writer.apply([HEADSPA])
+    assert follower.refresh() == writer.current.version
+    for formula in ('A', 'B', 'C'):
+        writer.apply([{'kind': 'style', 'op': 'upsert', 'record': dict(STYLE, formula=formula)}])
+
+    assert writer.stats['compactions'] == 1
+    assert len(path.read_text().splitlines()) == 1
+    assert follower.refresh() == writer.current.version
+    assert follower.current.generation == writer.current.generation
+    assert follower.current.styles_by_model['FAL3004'].formula == 'C'
+
+    # 압축 뒤에도 이어서 기록/재생
+    writer.apply([{'kind': 'recipe', 'op': 'delete', 'key': '컬러링'}])
+    fresh = new_state(path, compact_batches=3)
+    fresh.refresh()
+    assert fresh.current.generation == writer.current.generation
+    assert fresh.current.version == writer.current.version
+
+
+def test_net_changes_round_trip():
+    base = base_snapshot()
+    changed = base.with_changes([
+        ('recipe', 'upsert', '헤드스파', {'keywords': ('두피',), 'recipes': ('스케일링',)}),
+        ('recipe', 'delete', '펌', None),
+    ])
+    rebuilt = base.with_changes([normalize_change(change) for change in net_changes(base, changed)])
+    assert rebuilt.generation == changed.generation
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""intent 약한 라벨/통계 테스트"""
+
+import json
+
+import pytest
+
+import intent
+from hangul import JamoIndex
+
+CATEGORY_KEYWORDS = (("컬러링", ('컬러', '애쉬', '토닝', '탈색')), ("펌", ('펌', '볼륨')),
+                     ("트리트먼트", ('트리트먼트', '영양')))
+
+
+@pytest.fixture
+def category_index():
+    return JamoIndex((word, category) for category, words in CATEGORY_KEYWORDS for word in words)
+
+
+def write_log(path, records):
+    path.write_text('\n'.join(json.dumps(record, ensure_ascii=False) for record in records), encoding='utf-8')
+    return str(path)
+
+
+def test_log_labels_use_exact_keywords_only(tmp_path, category_index):
+    log = write_log(tmp_path / 'q.jsonl', [
+        {'ts': 0, 'message': "굿모닝", 'recipe_type': "컬러링"},                 # 예전 오타 허용 오탐
+        {'ts': 1, 'message': "머릿결 회복", 'recipe_type': "트리트먼트"},       # 분류기가 고른 라벨
+        {'ts': 2, 'message': "탈색 후 볼륨", 'recipe_type': "펌"},              # 복합
+        {'ts': 3, 'message': "트리트 먼트 순서", 'recipe_type': "트리트먼트"},
+    ])
+    examples = intent.log_examples([log], category_index, {"컬러링", "펌", "트리트먼트"})
+    assert examples == [("트리트 먼트 순서", "트리트먼트")]
+
+
+def test_rephrase_labels_previous_general_query(tmp_path, category_index):
+    log = write_log(tmp_path / 'q.jsonl', [
+        {'ts': 0, 'message': "밝은 톤으로 바꾸고 싶어요", 'recipe_type': "일반상담", 'conversation': 'a'},
+        {'ts': 30, 'message': "애쉬 컬러 레시피", 'recipe_type': "컬러링", 'conversation': 'a'},
+        {'ts': 40, 'message': "끝이 갈라져요", 'recipe_type': "일반상담", 'conversation': 'b'},
+        {'ts': 40 + intent.REPHRASE_SECONDS + 1, 'message': "영양 추천", 'recipe_type': "트리트먼트",
+         'conversation': 'b'},
+        {'ts': 500, 'message': "예약 되나요", 'recipe_type': "일반상담", 'conversation': 'c'},
+    ])
+    examples = intent.log_examples([log], category_index, {"컬러링", "펌", "트리트먼트"})
+    assert ("밝은 톤으로 바꾸고 싶어요", "컬러링") in examples
+    assert ("끝이 갈라져요", "일반상담") in examples
+    assert ("예약 되나요", "일반상담") in examples
+
+
+def test_mask_keywords_ignores_spacing():
+    assert intent.mask_keywords("트리트 먼트 순서, 애쉬컬러", CATEGORY_KEYWORDS) == "순서,"
+
+
+def test_classify_counts_repeated_queries():
+    pytest.importorskip('numpy')
+    model = intent.IntentModel.train(["웨이브 느낌 살리기", "굵은 웨이브", "안녕하세요", "예약 문의"],
+                                     ["펌", "펌", "일반상담", "일반상담"])
+    for _ in range(3):
+        model.classify("웨이브 느낌")
+    assert model.stats['classified'] == 3
+    assert model.stats['routed'] in (0, 3)
+    assert model._label.cache_info().hits == 2
+
+
+def test_batch_matches_single_prediction():
+    pytest.importorskip('numpy')
+    model = intent.IntentModel.train(["웨이브 느낌 살리기", "굵은 웨이브", "안녕하세요", "예약 문의"],
+                                     ["펌", "펌", "일반상담", "일반상담"])
+    texts = ["웨이브 느낌", "안녕하세요 예약", "굵게"]
+    batch = model.predict(texts, min_confidence=0.0)
+    single = [model.predict([text], min_confidence=0.0)[0] for text in texts]
+    assert [label for label, _ in batch] == [label for label, _ in single]
+    assert [round(p, 4) for _, p in batch] == [round(p, 4) for _, p in single]
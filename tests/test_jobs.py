@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""jobs 재시도/임대 복구 테스트 (워커 스레드 없이 직접 가져가 실행)"""
+
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, PermanentError
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'RETRY_BASE_SECONDS', 0.0)
+    return JobQueue(str(tmp_path / 'jobs.db'), workers=0, max_attempts=3, lease_seconds=0.2)
+
+
+def test_failures_retry_then_fail(queue):
+    calls = []
+
+    def flaky(payload, blob):
+        calls.append(payload)
+        raise RuntimeError("upstream 503")
+
+    queue.register('chat', flaky)
+    job_id = queue.submit('chat', {'message': 'x'})
+    for _ in range(3):
+        queue._run(queue._claim())
+    job = queue.get(job_id)
+    assert job['status'] == 'failed' and job['attempts'] == 3
+    assert len(calls) == 3
+    assert queue.stats['retried'] == 2
+
+
+def test_permanent_error_fails_immediately(queue):
+    def bad(payload, blob):
+        raise PermanentError("잘못된 이미지")
+
+    queue.register('image', bad)
+    job_id = queue.submit('image')
+    queue._run(queue._claim())
+    assert queue.get(job_id)['status'] == 'failed'
+    assert queue._claim() is None
+
+
+def test_live_lease_is_not_recovered(queue):
+    queue.register('image', lambda payload, blob: 'ok')
+    job_id = queue.submit('image')
+    row = queue._claim()
+    queue._running.add(row['id'])
+    # 임대 시간보다 오래 실행되어도 연장하는 동안은 다시 대기열로 가지 않음
+    for _ in range(3):
+        time.sleep(0.1)
+        queue._renew_leases()
+        queue._recover()
+    assert queue.get(job_id)['status'] == 'running'
+    assert queue.stats['recovered'] == 0
+
+
+def test_expired_lease_is_recovered_and_stale_result_ignored(queue):
+    queue.register('image', lambda payload, blob: 'ok')
+    job_id = queue.submit('image')
+    stale = queue._claim()
+    time.sleep(0.25)
+    queue._recover()
+    assert queue.get(job_id)['status'] == 'queued'
+
+    fresh = queue._claim()
+    # 죽은 줄 알았던 첫 시도가 뒤늦게 끝나도 두 번째 시도의 상태를 덮어쓰지 않음
+    queue._run(stale)
+    assert queue.get(job_id)['status'] == 'running'
+    queue._run(fresh)
+    job = queue.get(job_id)
+    assert job['status'] == 'done' and job['result'] == 'ok' and job['attempts'] == 2
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""ledger 기록 → 롤업 → 조회 왕복 (롤업 전/후 집계가 같아야 함)"""
+
+import os
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import ledger
+from ledger import Ledger
+
+BASE = 1_760_000_000.0  # 2025-10-09T08:53Z
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    clock = {'now': BASE}
+    monkeypatch.setattr(ledger.time, 'time', lambda: clock['now'])
+    book = Ledger(str(tmp_path / 'ledger'))
+    book.clock = clock
+    return book
+
+
+def record_sample(book):
+    rows = [(0, 'live', '염색', 'gpt-4o-mini', 'openai', 1.2, 100, 50, 0.0010),
+            (5, 'live', '염색', 'gpt-4o-mini', 'openai', 0.8, 120, 40, 0.0012),
+            (61, 'store', '펌', '', '', 0.01, 0, 0, 0.0),
+            (3600, 'live', '펌', 'claude', 'anthropic', 2.5, 90, 70, 0.0030)]
+    for offset, tier, category, model, provider, latency, prompt, completion, cost in rows:
+        book.clock['now'] = BASE + offset
+        book.record(tier, category, model, provider, latency_s=latency, prompt_tokens=prompt,
+                    completion_tokens=completion, cost_usd=cost)
+    book.clock['now'] = BASE + 7200
+
+
+def by_key(result):
+    return {row['key']: row for row in result['rows']}
+
+
+def test_query_same_before_and_after_rollup(book):
+    record_sample(book)
+    queries = {group: book.query(BASE - 60, BASE + 7200, group) for group in ('category', 'tier', 'hour')}
+
+    assert book.rollup() == 4
+    assert book.rollup() == 0
+    for group, before in queries.items():
+        after = book.query(BASE - 60, BASE + 7200, group)
+        assert after['rows'] == before['rows'], group
+
+    categories = by_key(queries['category'])
+    assert categories['염색']['count'] == 2 and categories['염색']['prompt_tokens'] == 220
+    assert categories['염색']['cost_usd'] == pytest.approx(0.0022)
+    assert categories['염색']['avg_latency_ms'] == pytest.approx(1000.0, abs=0.1)
+    assert categories['펌']['max_latency_ms'] == pytest.approx(2500.0, abs=0.1)
+    assert by_key(queries['tier'])['store']['count'] == 1
+
+
+def test_rollup_then_more_records_and_window(book):
+    record_sample(book)
+    book.rollup()
+    book.clock['now'] = BASE + 10
+    book.record('live', '염색', 'gpt-4o-mini', 'openai', latency_s=1.0, prompt_tokens=10)
+    # 롤업된 분 + 꼬리 레코드 합산, 구간 밖 레코드 제외
+    result = by_key(book.query(BASE - 60, BASE + 120, 'category'))
+    assert result['염색']['count'] == 3 and result['펌']['count'] == 1
+    assert '펌' in result and result['펌']['prompt_tokens'] == 0
+
+
+def test_unknown_group_rejected(book):
+    with pytest.raises(ValueError):
+        book.query(BASE, BASE + 60, 'nope')
+
+
+def brute_force(recorded, start, end):
+    totals = {}
+    for ts, category, prompt in recorded:
+        if start <= ts < end:
+            count, tokens = totals.get(category, (0, 0))
+            totals[category] = (count + 1, tokens + prompt)
+    return totals
+
+
+def test_day_and_hour_rollups_match_brute_force(book):
+    recorded = []
+    categories = ['염색', '펌', '커트']
+    for i in range(600):
+        ts = BASE + i * 431.0  # 약 3일, 분/시/일 경계를 고르게 지남
+        category = categories[i % 3]
+        book.clock['now'] = ts
+        book.record('live', category, 'gpt-4o-mini', 'openai', latency_s=0.5, prompt_tokens=i)
+        recorded.append((ts, category, i))
+    book.clock['now'] = BASE + 600 * 431.0 + 3600
+    book.rollup()
+    assert book.stats['hours_rows'] > 0 and book.stats['days_rows'] > 0
+
+    for start, end in [(BASE, BASE + 600 * 431.0), (BASE + 3 * 3600 + 17 * 60, BASE + 2 * 86400 + 5 * 60),
+                       (BASE + 86400 - 120, BASE + 86400 + 120)]:
+        # 분 경계에 맞춘 구간 (롤업 행은 분 단위)
+        start, end = start // 60 * 60, end // 60 * 60
+        result = book.query(start, end, 'category')
+        expected = brute_force(recorded, start, end)
+        assert {row['key']: (row['count'], row['prompt_tokens']) for row in result['rows']} == expected
+
+    full = book.query(BASE - 86400, BASE + 5 * 86400, 'category')
+    minute_rows = book._checkpoint('minutes', ledger._month(BASE))[0]
+    assert full['scanned_rows'] < minute_rows / 3
+    days = book.query(BASE - 86400, BASE + 5 * 86400, 'day')
+    assert sum(row['count'] for row in days['rows']) == 600
+
+
+def test_interrupted_rollup_write_is_not_double_counted(book, monkeypatch):
+    record_sample(book)
+    before = book.query(BASE - 60, BASE + 7200, 'category')['rows']
+
+    real_write = ledger.os.write
+
+    def torn_write(fd, data):
+        real_write(fd, data[:len(data) // 2 + 3])
+        raise OSError("crash")
+
+    monkeypatch.setattr(ledger.os, 'write', torn_write)
+    with pytest.raises(OSError):
+        book.rollup()
+    monkeypatch.setattr(ledger.os, 'write', real_write)
+
+    # 체크포인트 없는 잔여물은 읽지 않음 → 꼬리 레코드로만 집계
+    assert book.query(BASE - 60, BASE + 7200, 'category')['rows'] == before
+    assert book.rollup() == 4
+    assert book.query(BASE - 60, BASE + 7200, 'category')['rows'] == before
+    assert book.rollup() == 0
+
+
+def test_late_record_counted_once(book):
+    record_sample(book)
+    book.rollup()
+    # 이미 닫힌 분의 시각으로 늦게 도착한 레코드
+    book.clock['now'] = BASE + 30
+    book.record('live', '염색', 'gpt-4o-mini', 'openai', latency_s=1.0, prompt_tokens=7)
+    book.clock['now'] = BASE + 7300
+    window = (BASE - 60, BASE + 7300)
+    before = by_key(book.query(*window, 'category'))['염색']
+    assert book.rollup() == 1
+    after = by_key(book.query(*window, 'category'))['염색']
+    assert before['count'] == after['count'] == 3
+    assert after['prompt_tokens'] == 227
+
+
+def test_legacy_rollup_state_is_converted(book):
+    record_sample(book)
+    # 예전 형식: 체크포인트 행 없이 집계 행만, 처리 위치는 rollup-state.json
+    book.rollup()
+    month = ledger._month(BASE)
+    path = book._path('minutes', month)
+    rows, offset, _ = book._checkpoint('minutes', month)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(b''.join(data[i * ledger.MINUTE_SIZE:(i + 1) * ledger.MINUTE_SIZE]
+                         for i in range(rows) if data[i * ledger.MINUTE_SIZE + 14:i * ledger.MINUTE_SIZE + 16]
+                         != b'\xff\xff'))
+    for level in ('hours', 'days'):
+        if os.path.exists(book._path(level, month)):
+            os.remove(book._path(level, month))
+    with open(book.state_path, 'w') as f:
+        json.dump({f"calls-{month}.bin": offset}, f)
+
+    expected = book.query(BASE - 60, BASE + 7200, 'category')['rows']
+    book.clock['now'] = BASE + 7210
+    book.record('store', '펌')
+    book.clock['now'] = BASE + 9000
+    assert book.rollup() == 1
+    rows = by_key(book.query(BASE - 60, BASE + 7200, 'category'))
+    assert [rows[row['key']]['count'] for row in expected] == [row['count'] for row in expected]
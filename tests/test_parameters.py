@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""parameters 파라미터 조회/값 정규화/LLM 출력 검증 테스트"""
+
+from collections import namedtuple
+
+import pytest
+
+from parameters import MISSING, ParameterBase, parse_ground_truth, value_key
+
+Style = namedtuple('Style', 'model_no ground_truth')
+
+GROUND_TRUTH_A = """
+[Formula 1: 가이드 섹션]
+→ Section: Horizontal
+→ Celestial Axis: L2 (45°)
+→ Cut Form: O (One-length)
+→ Design Line: Stationary Design Line
+→ Over Director: None
+[Formula 2: 내부 섹션]
+-> Section: Diagonal Backward
+→ Cut Form: L (Layer)
+설명 줄은 무시
+"""
+
+GROUND_TRUTH_B = """
+[Formula 1]
+→ Section: Horizontal
+→ Celestial Axis: L2 (45°)
+→ Cut Form: O
+→ Design Line: Stationary
+[공통 스타일링 파라미터]
+→ Fringe Type: Side Bang
+→ Unknown Param: 무시됨
+"""
+
+
+@pytest.fixture(scope='module')
+def base():
+    return ParameterBase([Style('FAL0001', GROUND_TRUTH_A), Style('FAL0002', GROUND_TRUTH_B)])
+
+
+def test_parse_ground_truth():
+    formulas = parse_ground_truth(GROUND_TRUTH_A)
+    assert [title for title, _ in formulas] == ['Formula 1: 가이드 섹션', 'Formula 2: 내부 섹션']
+    assert formulas[0][1]['Over Direction'] == 'None'      # 시트 오타 교정
+    assert formulas[1][1] == {'Section': 'Diagonal Backward', 'Cut Form': 'L (Layer)'}
+    assert parse_ground_truth('') == [] and parse_ground_truth(None) == []
+
+
+@pytest.mark.parametrize('name, value, key', [
+    ('Cut Form', 'O (One-length)', 'o'),
+    ('Design Line', 'Stationary Design Line', 'stationary'),
+    ('Design Line', ' stationary ', 'stationary'),
+    ('Section', 'Diagonal  Backward', 'diagonalbackward'),
+])
+def test_value_key(name, value, key):
+    assert value_key(name, value) == key
+
+
+@pytest.mark.parametrize('term, key', [
+    ('celestial_axis', 'celestial_axis'),
+    ('Celestial Axis', 'celestial_axis'),
+    ('천체축', 'celestial_axis'),
+    ('천체축 각도', 'celestial_axis'),
+    ('오버디렉션', 'over_direction'),
+    ('오버 디렉션', 'over_direction'),
+    ('엘리베이숀', 'elevation'),        # 오타 허용 (비슷한 모음)
+    ('컷 폼', 'cut_form'),
+    ('앞머리 길이', 'fringe_length'),
+])
+def test_lookup(base, term, key):
+    assert base.get(term).key == key
+
+
+def test_lookup_unknown(base):
+    assert base.get('가위 브랜드') is None
+
+
+def test_mentioned_in_order(base):
+    mentioned = base.mentioned("리프팅이랑 섹션, 그리고 천체축 각도 차이")
+    assert [parameter.key for parameter in mentioned] == ['lifting', 'section', 'celestial_axis']
+
+
+def test_values_ranked_by_frequency_with_examples(base):
+    section = base.get('section')
+    assert section.values == ('Horizontal', 'Diagonal Backward')
+    assert section.counts == (2, 1)
+    assert section.examples == (('FAL0001', 'FAL0002'), ('FAL0001',))
+    # 같은 값의 다른 표기는 하나로, 가장 많이 쓰인 표기를 대표로
+    assert len(base.get('cut_form').values) == 2
+    assert len(base.get('design_line').values) == 1
+
+
+def test_style_sets(base):
+    first, second = base.style_sets['FAL0001']
+    assert first.title == 'Formula 1: 가이드 섹션'
+    assert first.to_dict()['cut_form'] == base.get('cut_form').values[0]
+    assert second.to_dict() == {'section': 'Diagonal Backward', 'cut_form': 'L (Layer)'}
+    assert len(base.style_sets['FAL0002']) == 2
+    assert base.snapshot()['styles'] == 2
+
+
+def test_from_values_normalizes_and_rejects(base):
+    parameters, rejected = base.from_values({
+        'section': 'horizontal',
+        'Cut Form': 'O',
+        '디자인 라인': 'Stationary Design Line',
+        'celestial_axis': 'L2→L6',     # 허용 값 조합이 아닌 새 값
+        'scissors': 'Sharp',
+    })
+    assert parameters.to_dict() == {'section': 'Horizontal', 'design_line': base.get('design_line').values[0],
+                                    'cut_form': base.get('cut_form').values[0]}
+    assert len(parameters) == 3
+    assert rejected == {'celestial_axis': 'L2→L6', 'scissors': 'Sharp'}
+    assert parameters.indexes[base.position['Elevation']] == MISSING
+
+
+def test_parse_json(base):
+    parameters, rejected = base.parse_json('{"parameters": {"section": "Horizontal", "lifting": ""}}')
+    assert parameters.to_dict() == {'section': 'Horizontal'} and rejected == {'lifting': ''}
+    with pytest.raises(ValueError):
+        base.parse_json('[1, 2]')
+    with pytest.raises(ValueError):
+        base.parse_json('섹션은 Horizontal')
+
+
+def test_schema_prompt(base):
+    prompt = base.schema_prompt(group='cut')
+    assert '"section": Horizontal | Diagonal Backward' in prompt
+    assert '"cut_form": O | L' in prompt
+    assert 'fringe_type' not in prompt
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""precompute: 로그 집계 → 재생 생성 → 게시/로드, 증분 갱신"""
+
+import os
+import json
+import time
+
+from precompute import (PrecomputedTable, QueryLogger, ReplayGenerator, load_current_table, mine_queries,
+                        normalize_question, publish_table, refresh_table)
+
+
+def write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def queries(ts, *pairs):
+    return [{'ts': ts + i, 'message': message, 'recipe_type': recipe_type}
+            for i, (message, recipe_type) in enumerate(pairs)]
+
+
+def test_normalize_question():
+    assert normalize_question('  애쉬 브라운,  레시피?! ') == '애쉬 브라운 레시피'
+
+
+def test_mine_counts_normalized_questions(tmp_path):
+    log = tmp_path / 'q.jsonl'
+    write_jsonl(log, queries(100, ('애쉬 브라운?', '염색'), ('애쉬  브라운', '염색'), ('매직 펌', '펌')))
+    with open(log, 'a', encoding='utf-8') as f:
+        f.write('깨진 줄\n')
+    counts, samples, mined_until = mine_queries([str(log), str(tmp_path / 'missing.jsonl')])
+    assert counts['염색']['애쉬 브라운'] == 2 and counts['펌']['매직 펌'] == 1
+    assert samples[('염색', '애쉬 브라운')] == '애쉬 브라운?'
+    assert mined_until == 102
+    assert mine_queries([str(log)], since=101)[0]['펌']['매직 펌'] == 1
+
+
+def test_query_log_rotates_and_keeps_backups(tmp_path):
+    path = str(tmp_path / 'logs' / 'q.jsonl')
+    # 줄당 약 105바이트: 세 번째 줄을 쓰면 회전
+    query_logger = QueryLogger(path, max_bytes=300, backups=2)
+    for i in range(20):
+        query_logger.log(f'애쉬 브라운 {i:02d}', '염색', conversation='c1')
+    query_logger.log('매직 펌', '펌')
+
+    assert query_logger.files() == [path + '.2', path + '.1', path]
+    assert not os.path.exists(path + '.3')
+    assert all(os.path.getsize(f) <= 400 for f in query_logger.files())
+    # 회전 파일까지 합쳐 최근 질의만 남고 오래된 질의는 상한 밖으로 밀려남
+    counts, _, _ = mine_queries(query_logger.files())
+    assert counts['염색']['애쉬 브라운 19'] == 1 and counts['펌']['매직 펌'] == 1
+    assert counts['염색']['애쉬 브라운 00'] == 0
+    assert sum(counts['염색'].values()) == 8
+
+
+def test_query_log_drops_rotated_files_past_retention(tmp_path):
+    path = str(tmp_path / 'q.jsonl')
+    # 줄당 약 75바이트: 두 번째 줄을 쓰면 회전
+    query_logger = QueryLogger(path, max_bytes=100, backups=3, retention_seconds=3600)
+    query_logger.log('매직 펌', '펌')
+    query_logger.log('볼륨 펌', '펌')
+    query_logger.log('디지털 펌', '펌')
+    assert query_logger.files() == [path + '.1', path]
+    old = time.time() - 7200
+    os.utime(path + '.1', (old, old))
+
+    query_logger.log('셋팅 펌', '펌')
+    # 방금 밀려난 파일만 남고 기간이 지난 파일(.1 → .2)은 삭제
+    assert query_logger.files() == [path + '.1']
+    assert mine_queries(query_logger.files())[0]['펌']['셋팅 펌'] == 1
+
+
+def test_replay_publish_load_and_incremental_refresh(tmp_path):
+    log = tmp_path / 'q.jsonl'
+    replay = tmp_path / 'answers.jsonl'
+    out = str(tmp_path / 'precomputed')
+    write_jsonl(log, queries(100, ('애쉬 브라운?', '염색'), ('애쉬 브라운', '염색'), ('매직 펌', '펌'),
+                             ('없는 답변', '펌')))
+    write_jsonl(replay, [
+        {'recipe_type': '염색', 'question': '애쉬 브라운', 'answer': {'v': 1, 'title': '애쉬'}},
+        {'recipe_type': '펌', 'question': '매직 펌!', 'answer': {'v': 1, 'title': '매직'}},
+    ])
+    generate = ReplayGenerator(str(replay))
+
+    table, stats = refresh_table(load_current_table(out), [str(log)], generate, top_n=5)
+    assert stats == {'reused': 0, 'generated': 2, 'failed': 1}
+    publish_table(table, out)
+
+    loaded = load_current_table(out)
+    assert loaded.version == 1 and len(loaded) == 2 and loaded.mined_until == 103
+    assert loaded.lookup('애쉬 브라운!!', '염색') == {'v': 1, 'title': '애쉬'}
+    assert loaded.lookup('애쉬 브라운', '펌') is None
+
+    # 새 로그만 집계, 기존 답변 재사용, 이전 빈도는 감쇠해 합산
+    calls = []
+
+    def counting(question, recipe_type):
+        calls.append(question)
+        return generate(question, recipe_type)
+
+    write_jsonl(log, queries(200, ('매직 펌', '펌')))
+    table, stats = refresh_table(loaded, [str(log)], counting, top_n=5)
+    # 생성 실패한 질문은 테이블에 남지 않으므로 다시 물을 때까지 재생성하지 않음
+    assert calls == []
+    assert stats == {'reused': 2, 'generated': 0, 'failed': 0}
+    assert table.entries['펌']['매직 펌']['count'] == 1 * 0.5 + 1
+    assert table.entries['염색']['애쉬 브라운']['count'] == 2 * 0.5
+    assert publish_table(table, out).endswith('answers-v0002.json')
+    assert load_current_table(out).version == 2
+
+
+def test_missing_table_is_empty(tmp_path):
+    table = load_current_table(str(tmp_path))
+    assert isinstance(table, PrecomputedTable) and len(table) == 0 and table.version == 0
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""헤지 취소: 진 쪽 응답을 닫아 조각을 기다리지 않고 끝나는지"""
+
+import time
+import threading
+
+from providers import Provider, HedgedCompleter, CancelToken, Usage
+
+
+class BlockingResponse:
+    """조각 사이에 오래 멈추는 응답 (close 하면 읽기가 오류로 끝남)"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+    def read(self, seconds):
+        if self.closed.wait(seconds):
+            raise ConnectionError("response closed")
+
+
+class FakeProvider(Provider):
+    def __init__(self, name, first_token_s, stall_s=0.0):
+        super().__init__(name, 1.0, 1.0)
+        self.name = name
+        self.first_token_s = first_token_s
+        self.stall_s = stall_s
+
+    def stream(self, system, prompt, max_tokens, temperature, cancel=None):
+        response = BlockingResponse()
+        if cancel is not None:
+            cancel.attach(response.close)
+        yield Usage(10, 0)
+        response.read(self.first_token_s)
+        yield "첫 조각 "
+        # 첫 조각 뒤 오래 멈춤: 취소가 다음 yield 까지 기다리면 stall_s 동안 붙잡힘
+        response.read(self.stall_s)
+        yield "끝"
+
+
+def test_cancel_token_closes_attached_and_late_attach():
+    token, closed = CancelToken(), []
+    token.attach(lambda: closed.append('a'))
+    token.set()
+    token.set()
+    token.attach(lambda: closed.append('b'))
+    assert closed == ['a', 'b']
+
+
+def test_cancel_interrupts_blocked_read():
+    provider = FakeProvider('slow', first_token_s=0.0, stall_s=5.0)
+    token = CancelToken()
+    threading.Timer(0.05, token.set).start()
+    started = time.perf_counter()
+    result = provider.complete('system', 'prompt', cancel_event=token)
+    assert time.perf_counter() - started < 1.0
+    assert result.cancelled and result.text == '첫 조각 '
+
+
+def test_hedge_loser_is_closed_promptly():
+    primary = FakeProvider('primary', first_token_s=5.0)
+    secondary = FakeProvider('secondary', first_token_s=0.0)
+    hedged = HedgedCompleter(primary, secondary, default_threshold=0.05)
+
+    result = hedged.complete('system', 'prompt')
+    assert result.provider is secondary and result.text == '첫 조각 끝'
+
+    # 첫 조각 전에 막힌 1차 호출도 5초를 기다리지 않고 닫혀서 비용 집계까지 끝남
+    deadline = time.time() + 1.0
+    while hedged.stats['extra_cost_usd'] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert hedged.stats['extra_cost_usd'] > 0
+    assert hedged.stats['secondary_wins'] == 1
+
+
+def test_hedge_timer_starts_when_primary_runs():
+    primary = FakeProvider('primary', first_token_s=0.1)
+    secondary = FakeProvider('secondary', first_token_s=0.0)
+    hedged = HedgedCompleter(primary, secondary, default_threshold=0.2, max_workers=2)
+    # 풀의 두 자리를 0.3초 동안 차지: 큐에서 기다린 시간으로 헤지하면 안 됨
+    for _ in range(2):
+        hedged._executor.submit(time.sleep, 0.3)
+
+    result = hedged.complete('system', 'prompt')
+    assert result.provider is primary
+    assert hedged.stats['hedged'] == 0
+
+
+def test_hedge_skipped_when_pool_is_saturated():
+    primary = FakeProvider('primary', first_token_s=0.2)
+    secondary = FakeProvider('secondary', first_token_s=0.0)
+    hedged = HedgedCompleter(primary, secondary, default_threshold=0.05, max_workers=1)
+
+    result = hedged.complete('system', 'prompt')
+    assert result.provider is primary
+    assert hedged.stats['hedge_skipped'] == 1 and hedged.stats['hedged'] == 0
+
+
+def test_streamed_tokens_and_result_come_from_one_provider():
+    # 1차가 먼저 토큰을 내지만 2차가 먼저 끝나는 경우: 스트림과 최종 텍스트가 섞이면 안 됨
+    primary = FakeProvider('primary', first_token_s=0.1, stall_s=0.3)
+    secondary = FakeProvider('secondary', first_token_s=0.15)
+    hedged = HedgedCompleter(primary, secondary, default_threshold=0.05)
+    streamed = []
+
+    result = hedged.complete('system', 'prompt', on_token=streamed.append)
+    assert result.provider is primary
+    assert ''.join(streamed) == result.text == '첫 조각 끝'
+    assert hedged.stats['hedged'] == 1 and hedged.stats['secondary_wins'] == 0
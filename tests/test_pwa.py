@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""오프라인 셸 서비스 워커 버전 테스트"""
+
+import re
+
+HEADSPA = {'kind': 'recipe', 'op': 'upsert',
+           'record': {'category': '헤드스파', 'keywords': ['헤드스파', '두피'], 'recipes': ['두피 스케일링 10분']}}
+
+
+def cache_name(client):
+    response = client.get('/sw.js')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    return re.search(r"const CACHE_NAME = '([^']+)'", response.get_data(as_text=True)).group(1)
+
+
+def test_catalog_ingest_changes_shell_cache_version(server):
+    client = server.app.test_client()
+    before = cache_name(client)
+    assert cache_name(client) == before
+
+    server.catalog.apply([HEADSPA])
+    try:
+        changed = cache_name(client)
+        assert changed != before
+        assert changed.startswith('hairgator-shell-')
+    finally:
+        server.catalog.apply([{'kind': 'recipe', 'op': 'delete', 'key': '헤드스파'}])
+    # 내용이 원래대로 돌아오면 버전도 원래대로 (워커/재시작과 무관)
+    assert cache_name(client) == before
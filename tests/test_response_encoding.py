@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""response_encoding 협상/압축 대상/약한 ETag/직렬화 폴백 테스트"""
+
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, request
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+import response_encoding
+from response_encoding import FastJSONProvider, ResponseCompressor, negotiate
+
+RESPONSE_MIN = response_encoding.RESPONSE_COMPRESS_MIN_BYTES
+BIG = RESPONSE_MIN * 4
+
+
+def accept(header):
+    return parse_accept_header(header, Accept)
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    # 협상만 검사 (brotli 모듈 설치 여부와 무관)
+    monkeypatch.setattr(response_encoding, 'available_encodings', lambda: ('br', 'gzip'))
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate, br', 'br'),            # q 같으면 br 우선
+    ('gzip;q=1.0, br;q=0.5', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),               # q=0 은 거부
+    ('br;q=0, gzip;q=0', None),
+    ('identity', None),
+    ('*', 'br'),
+    ('*;q=0.5, gzip;q=0.8', 'gzip'),
+])
+def test_negotiate_by_quality(with_brotli, header, expected):
+    assert negotiate(accept(header), BIG) == expected
+
+
+def test_negotiate_below_threshold_and_without_header(with_brotli):
+    assert negotiate(accept('gzip, br'), RESPONSE_MIN - 1) is None
+    assert negotiate(accept(''), BIG) is None
+    assert negotiate(None, BIG) is None
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    compressor = ResponseCompressor()
+    body = json.dumps({'recipe': '애쉬 브라운 ' * 200}, ensure_ascii=False)
+
+    @app.after_request
+    def compress(response):
+        return compressor.process(response, request.accept_encodings)
+
+    @app.route('/big')
+    def big():
+        return Response(body, mimetype='application/json', headers={'ETag': 'W/"abc123"'})
+
+    @app.route('/small')
+    def small():
+        return {'ok': True}
+
+    @app.route('/stream')
+    def stream():
+        return Response((piece for piece in [body, body]), mimetype='text/plain')
+
+    @app.route('/conditional')
+    def conditional():
+        if request.if_none_match.contains_weak('abc123'):
+            return Response(status=304, headers={'ETag': 'W/"abc123"'})
+        return big()
+
+    app.compressor = compressor
+    app.body = body
+    return app
+
+
+def test_compresses_large_json_with_weak_etag_and_vary(app):
+    response = app.test_client().get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data).decode('utf-8') == app.body
+    assert response.headers['ETag'] == 'W/"abc123"'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    # 같은 ETag 는 한 번만 압축
+    app.test_client().get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert app.compressor.snapshot()['static_hits'] == 1
+
+
+def test_small_streamed_and_not_modified_are_left_alone(app):
+    client = app.test_client()
+    small = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    assert small.data == b'{"ok":true}'
+
+    streamed = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in streamed.headers
+    assert streamed.data.decode('utf-8') == app.body * 2
+
+    # 압축된 응답의 약한 ETag 로 재검증하면 304, 304 는 압축하지 않음
+    first = client.get('/conditional', headers={'Accept-Encoding': 'gzip'})
+    revalidated = client.get('/conditional', headers={'Accept-Encoding': 'gzip',
+                                                      'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert 'Content-Encoding' not in revalidated.headers and revalidated.data == b''
+
+    stats = app.compressor.snapshot()
+    assert stats['compressed'] == 1 and stats['skipped_small'] == 1
+
+
+def test_edge_resource_revalidates_after_compression(server):
+    client = server.app.test_client()
+    path = max(server.edge_resources.resources, key=lambda p: len(server.edge_resources.resources[p].body))
+    if len(server.edge_resources.resources[path].body) < RESPONSE_MIN:
+        pytest.skip('압축 임계값 이상인 엣지 자원 없음')
+
+    first = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'].startswith('W/')
+    again = client.get(path, headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_json_provider_keeps_utf8_and_falls_back_for_big_ints(app):
+    provider = app.json
+    assert provider.dumps_bytes({'색상': '애쉬'}) == '{"색상":"애쉬"}'.encode('utf-8')
+    # orjson 은 64비트 초과 정수를 거부 → json 으로 다시 직렬화
+    assert json.loads(provider.dumps_bytes({'n': 2 ** 70})) == {'n': 2 ** 70}
+    assert provider.dumps({'n': -(2 ** 64)}) == '{"n":-18446744073709551616}'
+    assert provider.loads(provider.dumps({'키': [1, 2]})) == {'키': [1, 2]}
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""suggest 접두사 색인 (자모 접두사, 단어 시작, 가중치, 중복 제거)"""
+
+from suggest import PrefixIndex, Suggestion, build_suggestions, recipe_title
+
+
+class Style:
+    def __init__(self, model_no, name):
+        self.model_no = model_no
+        self.name = name
+
+
+def index(limit=8):
+    recipes = {'염색': {'recipes': ['🎨 애쉬 브라운 레시피: 6/1 + 6%', '🎨 애쉬 그레이 레시피: 7/11']},
+               '펌': {'recipes': ['🌀 매직 셋팅 레시피: 1제']}}
+    keywords = [('염색', ['애쉬', '브릿지']), ('펌', ['매직'])]
+    styles = [Style('FAL3004', '레이어드 애쉬')]
+    return PrefixIndex(build_suggestions(recipes, keywords, styles), limit=limit)
+
+
+def texts(results):
+    return [suggestion.text for suggestion in results]
+
+
+def test_recipe_title():
+    assert recipe_title('🎨 애쉬 브라운 레시피: 6/1 + 6%') == '애쉬 브라운 레시피'
+
+
+def test_partial_syllable_matches_jamo_prefix():
+    # "앳" = ㅇㅐㅅ 는 "애쉬"(ㅇㅐㅅㅟ) 조합 중 입력
+    assert '애쉬 브라운 레시피' in texts(index().search('앳'))
+    assert texts(index().search('애쉬')) == texts(index().search('앳'))
+
+
+def test_word_start_and_spacing():
+    assert texts(index().search('브라')) == ['애쉬 브라운 레시피']
+    assert '애쉬 브라운 레시피' in texts(index().search('애쉬브라'))
+
+
+def test_ranking_prefers_head_match_and_kind_weight():
+    results = index().search('애쉬')
+    # 레시피(50) 첫머리 > 키워드(30) 첫머리 > 스타일 단어 중간(20)
+    assert [s.kind for s in results] == ['recipe', 'recipe', 'keyword', 'style']
+    assert results[0].text == '애쉬 그레이 레시피'  # 같은 가중치면 짧은 문구
+
+
+def test_limit_dedup_and_lookup():
+    idx = index(limit=2)
+    assert len(idx.search('애')) == 2
+    assert idx.search('') == () and idx.search('없는말') == ()
+    duplicated = PrefixIndex([Suggestion('keyword:애쉬', '애쉬 레시피', 'keyword'),
+                              Suggestion('keyword:애쉬', '다른 문구', 'keyword')])
+    assert len(duplicated) == 1 and duplicated.get('keyword:애쉬').text == '애쉬 레시피'
+    assert index().get('style:FAL3004').text == 'FAL3004 레이어드 애쉬'
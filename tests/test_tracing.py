@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""tracing traceparent 파싱, 꼬리 샘플링 판단, 일괄 내보내기 테스트"""
+
+import os
+import json
+import time
+import queue
+import threading
+
+import pytest
+
+from tracing import BatchExporter, Tracer, parse_traceparent
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+SPAN_ID = '00f067aa0ba902b7'
+
+
+class RecordingExporter:
+    def __init__(self):
+        self.traces = []
+
+    def submit(self, spans):
+        self.traces.append(spans)
+
+    def snapshot(self):
+        return {}
+
+
+@pytest.mark.parametrize('header, expected', [
+    (f'00-{TRACE_ID}-{SPAN_ID}-01', (TRACE_ID, SPAN_ID, 1)),
+    (f' 00-{TRACE_ID.upper()}-{SPAN_ID}-00 ', (TRACE_ID, SPAN_ID, 0)),
+    (f'01-{TRACE_ID}-{SPAN_ID}-01-future', (TRACE_ID, SPAN_ID, 1)),  # 이후 버전은 뒤 필드 허용
+])
+def test_parse_valid_traceparent(header, expected):
+    assert parse_traceparent(header) == expected
+
+
+@pytest.mark.parametrize('header', [
+    None,
+    '',
+    f'ff-{TRACE_ID}-{SPAN_ID}-01',             # 무효 버전
+    f'0x-{TRACE_ID}-{SPAN_ID}-01',             # 16진수 아님
+    f'000-{TRACE_ID}-{SPAN_ID}-01',
+    f'00-{"0" * 32}-{SPAN_ID}-01',             # trace id 전부 0
+    f'00-{TRACE_ID}-{"0" * 16}-01',            # span id 전부 0
+    f'00-{TRACE_ID}-{SPAN_ID}',                # 필드 3개
+    f'00-{TRACE_ID}-{SPAN_ID}-01-extra',       # 버전 00 인데 필드 5개
+    f'00-{TRACE_ID}-{SPAN_ID}-011',            # flags 3자리
+    f'00-{TRACE_ID[:-1]}g-{SPAN_ID}-01',
+    f'00-{TRACE_ID}-{SPAN_ID[:-2]}_1-01',      # int(, 16) 은 받아들이는 밑줄
+])
+def test_parse_invalid_traceparent(header):
+    assert parse_traceparent(header) is None
+
+
+def run_trace(tracer, traceparent=None, seconds=0.0, error=False):
+    with tracer.start_trace('POST /chat', traceparent) as root:
+        with tracer.span('llm'):
+            time.sleep(seconds)
+        if error:
+            root.fail('upstream 503')
+    return root
+
+
+def test_tail_sampling_keeps_slow_and_failed_traces():
+    exporter = RecordingExporter()
+    tracer = Tracer(exporter, enabled=True, slow_ms=50, sample_rate=0)
+
+    run_trace(tracer)
+    run_trace(tracer, seconds=0.06)
+    run_trace(tracer, error=True)
+    with pytest.raises(ValueError):
+        with tracer.start_trace('POST /chat'):
+            raise ValueError('boom')
+
+    stats = tracer.snapshot()
+    assert stats['traces'] == 4
+    assert stats['kept'] == 3 and stats['kept_slow'] == 1 and stats['kept_error'] == 2
+    assert [len(spans) for spans in exporter.traces] == [2, 2, 1]
+    assert all(span.end_ns is not None for spans in exporter.traces for span in spans)
+
+
+def test_sampled_flag_is_propagated_but_tail_decision_is_local():
+    exporter = RecordingExporter()
+    tracer = Tracer(exporter, enabled=True, slow_ms=1e9, sample_rate=0)
+
+    root = run_trace(tracer, traceparent=f'00-{TRACE_ID}-{SPAN_ID}-01')
+    assert root.trace_id == TRACE_ID and root.parent_id == SPAN_ID
+    assert root.traceparent.endswith('-01')
+    # 상위에서 sampled 여도 빠르고 성공한 trace 는 보관하지 않음
+    assert exporter.traces == []
+
+    root = run_trace(tracer, traceparent=f'00-{TRACE_ID}-{SPAN_ID}-00')
+    assert root.traceparent.endswith('-00')
+
+    tracer.sample_rate = 1.0
+    run_trace(tracer)
+    assert len(exporter.traces) == 1
+
+
+def test_stats_are_consistent_across_threads():
+    tracer = Tracer(RecordingExporter(), enabled=True, slow_ms=0, sample_rate=0)
+
+    def worker():
+        for _ in range(500):
+            run_trace(tracer)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = tracer.snapshot()
+    assert stats['traces'] == stats['kept'] == stats['kept_slow'] == 4000
+
+
+class CollectingExporter(BatchExporter):
+    def __init__(self, **kwargs):
+        super().__init__(url='', path='', **kwargs)
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append(len(spans))
+        super().export(spans)
+
+
+def spans(n):
+    tracer = Tracer(RecordingExporter(), enabled=True, slow_ms=0)
+    with tracer.start_trace('root') as root:
+        for _ in range(n - 1):
+            with tracer.span('child'):
+                pass
+    return list(root.trace.spans)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_exporter_batches_by_size_then_by_time():
+    exporter = CollectingExporter(batch_size=3, flush_seconds=0.3)
+    exporter.submit(spans(7))
+    assert wait_for(lambda: sum(exporter.batches) == 7)
+    assert exporter.batches == [3, 3, 1]
+    stats = exporter.snapshot()
+    assert stats['queued_spans'] == stats['exported_spans'] == 7 and stats['batches'] == 3
+
+
+def test_exporter_drops_when_queue_is_full():
+    exporter = BatchExporter(url='', path='', max_queue=2)
+    # 워커 없이 큐만 둠 (내보내기가 밀린 상태)
+    exporter._pid, exporter._queue = os.getpid(), queue.Queue(maxsize=2)
+    exporter.submit(spans(5))
+    stats = exporter.snapshot()
+    assert stats['queued_spans'] == 2 and stats['dropped_spans'] == 3
+    assert stats['queue_depth'] == 2
+
+
+def test_exporter_writes_otlp_json_lines(tmp_path):
+    path = tmp_path / 'traces' / 'spans.jsonl'
+    exporter = BatchExporter(url='', path=str(path))
+    exporter.export(spans(2))
+    payload = json.loads(path.read_text(encoding='utf-8').splitlines()[0])
+    exported = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert [span['name'] for span in exported] == ['root', 'child']
+    assert exported[1]['parentSpanId'] == exported[0]['spanId']
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""upstream_pool 지연 EWMA 분리, 프로브 제외/복귀, 대기 요청 수"""
+
+import threading
+from types import SimpleNamespace
+
+from upstream_pool import Endpoint, UpstreamPool, EJECT_CONSECUTIVE_FAILURES
+
+
+class FakeRaw:
+    def __init__(self, value):
+        self.value = value
+        self.headers = {'x-ratelimit-remaining-requests': '100'}
+
+    def parse(self):
+        return self.value
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, probe_ok=True):
+        self.probe_ok = probe_ok
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            with_raw_response=SimpleNamespace(create=self._create)))
+        self.models = SimpleNamespace(with_raw_response=SimpleNamespace(list=self._list))
+
+    def _create(self, stream=False, **kwargs):
+        return FakeRaw(FakeStream(['a', 'b', 'c']) if stream else 'done')
+
+    def _list(self):
+        if not self.probe_ok:
+            raise RuntimeError("probe 503")
+        return FakeRaw([])
+
+
+def endpoint(name, probe_ok=True):
+    return Endpoint('http://stub', 'sk-test', name=name, client=FakeClient(probe_ok))
+
+
+def test_probe_does_not_touch_latency_ewma():
+    ep = endpoint('a')
+    pool = UpstreamPool([ep], probe_interval=0)
+    pool.probe()
+    assert ep.ewma_latency is None and ep.ewma_ttfb is None
+    assert ep.remaining_requests == 100
+
+
+def test_probe_failures_eject_and_probe_success_recovers():
+    ep = endpoint('a', probe_ok=False)
+    pool = UpstreamPool([ep], probe_interval=0)
+    for _ in range(EJECT_CONSECUTIVE_FAILURES):
+        pool.probe()
+    assert not ep.healthy and ep.ejections == 1
+    assert ep.ewma_error == 0.0
+
+    ep.client.probe_ok = True
+    pool.probe()
+    assert ep.healthy
+
+
+def test_stream_records_ttfb_and_full_latency_separately():
+    ep = endpoint('a')
+    pool = UpstreamPool([ep], probe_interval=0)
+    assert list(pool.stream_chat_completion(model='m', messages=[])) == ['a', 'b', 'c']
+    assert ep.ewma_ttfb is not None and ep.ewma_latency is not None
+    assert ep.ewma_ttfb <= ep.ewma_latency
+    assert ep.in_flight == 0
+
+    # 소비자가 중간에 닫으면 전체 지연은 기록하지 않음
+    ep2 = endpoint('b')
+    stream = UpstreamPool([ep2], probe_interval=0).stream_chat_completion(model='m', messages=[])
+    next(stream)
+    stream.close()
+    assert ep2.ewma_ttfb is not None and ep2.ewma_latency is None
+    assert ep2.in_flight == 0
+
+
+def test_choose_scores_streaming_by_ttfb():
+    fast_start, fast_finish = endpoint('fast-start'), endpoint('fast-finish')
+    fast_start.ewma_ttfb, fast_start.ewma_latency = 0.1, 3.0
+    fast_finish.ewma_ttfb, fast_finish.ewma_latency = 0.8, 1.0
+    pool = UpstreamPool([fast_start, fast_finish], probe_interval=0)
+    assert pool.choose(streaming=True) is fast_start
+    assert pool.choose() is fast_finish
+
+
+def test_in_flight_is_consistent_under_threads():
+    ep = endpoint('a')
+
+    def work():
+        for _ in range(2000):
+            ep.begin()
+            ep.end()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert ep.in_flight == 0 and ep.calls == 16000
+
+
+def test_cancelled_stream_is_not_an_endpoint_failure():
+    from providers import CancelToken
+
+    class ClosingStream(FakeStream):
+        def __iter__(self):
+            for chunk in self.chunks:
+                if self.closed:
+                    raise ConnectionError("stream closed")
+                yield chunk
+
+    ep = endpoint('a')
+    ep.client._create = lambda stream=False, **kwargs: FakeRaw(ClosingStream(['a', 'b']))
+    ep.client.chat.completions.with_raw_response.create = ep.client._create
+    token = CancelToken()
+    stream = UpstreamPool([ep], probe_interval=0).stream_chat_completion(cancel=token, model='m', messages=[])
+    assert next(stream) == 'a'
+    token.set()
+    try:
+        next(stream)
+    except ConnectionError:
+        pass
+    assert ep.consecutive_failures == 0 and ep.ewma_error == 0.0
+    assert ep.ewma_latency is None and ep.in_flight == 0
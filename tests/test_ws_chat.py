@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""ws_chat 느린 클라이언트 처리"""
+
+import threading
+
+from ws_chat import ChatChannel
+
+
+class StuckSocket:
+    """send 가 풀리지 않는 소켓 (읽지 않는 클라이언트)"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def send(self, data):
+        self.release.wait()
+
+
+def test_slow_consumer_does_not_raise_into_provider():
+    stats = {'slow_consumers': 0, 'frames_out': 0, 'bytes_out': 0}
+    ws = StuckSocket()
+    channel = ChatChannel(ws, None, stats, threading.Lock(), send_queue=2, send_timeout=0.05)
+    writer = threading.Thread(target=channel._writer, daemon=True)
+    writer.start()
+
+    outcome = {}
+
+    def handler(message, on_token=None, suggestion=None):
+        # 제공자 스트림: on_token 이 예외를 던지면 업스트림 실패로 처리됨
+        try:
+            for i in range(20):
+                on_token(f"조각{i} ")
+        except Exception as e:
+            outcome['raised'] = e
+        outcome['completed'] = True
+        return {'response': '완성된 답변'}
+
+    channel.handler = handler
+    channel.inflight = 1
+    channel._answer(1, '질문')
+
+    assert outcome == {'completed': True}
+    assert channel.closed.is_set()
+    assert stats['slow_consumers'] == 1
+    assert channel.inflight == 0
+
+    ws.release.set()
+    channel.outbox.put(None)
+    writer.join(timeout=1.0)
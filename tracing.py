@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+tracing.py
+분산 추적 (W3C traceparent) + 꼬리 기반 샘플링 + 일괄 내보내기
+
+- traceparent "00-<trace id 32>-<span id 16>-<flags 2>" 를 받아 같은 trace 로 이어가고,
+  업스트림(OpenAI/Anthropic) 요청에 자식 span 의 traceparent 를 실어 보냄
+- span 은 contextvars 로 현재 span 을 추적 (스레드 풀에 넘길 때는 bind() 로 컨텍스트 복사)
+- 꼬리 기반 샘플링: 루트 span 이 끝난 뒤 느리거나(TRACE_SLOW_MS) 실패한 trace 만 보관,
+  나머지는 TRACE_SAMPLE_RATE 비율만 (기본 0)
+- 내보내기: 큐에 넣기만 하고 (가득 차면 버림) 백그라운드 스레드가 모아서
+  OTLP/HTTP JSON 수집기(TRACE_EXPORT_URL) 또는 파일(TRACE_EXPORT_PATH, 줄마다 OTLP JSON)로 보냄
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'true').lower() == 'true'
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '2000'))
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_EXPORT_URL = os.getenv('TRACE_EXPORT_URL', '')
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'hairgator')
+TRACE_BATCH_SIZE = 512
+TRACE_FLUSH_SECONDS = 2.0
+TRACE_QUEUE_MAX = 10_000
+# trace 하나의 span 상한 (루프 안 span 폭주 방지)
+TRACE_MAX_SPANS = 256
+EXPORT_TIMEOUT = 5.0
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+
+_current = contextvars.ContextVar('hairgator_span', default=None)
+
+
+def _is_hex(value, length):
+    return len(value) == length and all(ch in '0123456789abcdef' for ch in value)
+
+
+def parse_traceparent(header):
+    """(trace_id, parent span_id, flags) 또는 None (형식 오류/전부 0 이면 새 trace)
+
+    버전 00 은 필드가 정확히 4개, 이후 버전은 뒤에 필드가 더 붙을 수 있음 (앞 4개만 읽음). 버전 ff 는 무효
+    """
+    parts = (header or '').strip().lower().split('-')
+    if len(parts) < 4 or not _is_hex(parts[0], 2) or parts[0] == 'ff':
+        return None
+    if parts[0] == '00' and len(parts) != 4:
+        return None
+    trace_id, span_id, flags = parts[1], parts[2], parts[3]
+    if not (_is_hex(trace_id, 32) and _is_hex(span_id, 16) and _is_hex(flags, 2)):
+        return None
+    if not int(trace_id, 16) or not int(span_id, 16):
+        return None
+    return trace_id, span_id, int(flags, 16)
+
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+class _Trace:
+    """진행 중인 trace 하나의 span 모음 (꼬리 샘플링 판단 단위)"""
+
+    __slots__ = ('spans', 'error', 'flags', 'lock')
+
+    def __init__(self, flags):
+        self.spans = []
+        self.error = False
+        self.flags = flags
+        self.lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ('trace', 'trace_id', 'span_id', 'parent_id', 'name', 'kind',
+                 'start_ns', 'end_ns', 'attributes', 'events', 'error')
+
+    def __init__(self, trace, trace_id, parent_id, name, kind=KIND_INTERNAL, attributes=None):
+        self.trace = trace
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.events = []
+        self.error = None
+        with trace.lock:
+            if len(trace.spans) < TRACE_MAX_SPANS:
+                trace.spans.append(self)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{self.trace.flags:02x}"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, name, **attributes):
+        self.events.append((time.time_ns(), name, attributes))
+
+    def fail(self, error):
+        """처리된 오류도 실패로 표시 (꼬리 샘플링에서 보관)"""
+        self.error = str(error)[:200]
+        self.trace.error = True
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    """추적 중이 아닐 때 (비용 없음)"""
+
+    traceparent = None
+    trace_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def event(self, name, **attributes):
+        pass
+
+    def fail(self, error):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Activation:
+    """span 을 현재 span 으로 두는 컨텍스트 (예외 시 실패 표시)"""
+
+    __slots__ = ('span', 'token', 'on_exit')
+
+    def __init__(self, span, on_exit=None):
+        self.span = span
+        self.token = None
+        self.on_exit = on_exit
+
+    def __enter__(self):
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.span.fail(f"{exc_type.__name__}: {exc}")
+        self.span.end()
+        _current.reset(self.token)
+        if self.on_exit:
+            self.on_exit(self.span)
+        return False
+
+
+class Tracer:
+    def __init__(self, exporter=None, enabled=TRACE_ENABLED, slow_ms=TRACE_SLOW_MS, sample_rate=TRACE_SAMPLE_RATE):
+        self.exporter = exporter
+        self.enabled = enabled and exporter is not None
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        # 요청 스레드마다 루트 span 이 끝날 때 갱신
+        self.stats = {'traces': 0, 'kept': 0, 'kept_slow': 0, 'kept_error': 0}
+        self._lock = threading.Lock()
+
+    def start_trace(self, name, traceparent=None, **attributes):
+        """요청 하나의 루트(서버) span. with 블록이 끝나면 보관 여부 판단 후 내보내기 큐로"""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parse_traceparent(traceparent)
+        trace_id, parent_id, flags = parent if parent else (_new_id(128), None, 1)
+        span = Span(_Trace(flags), trace_id, parent_id, name, KIND_SERVER, attributes)
+        return _Activation(span, self._finish)
+
+    def span(self, name, kind=KIND_INTERNAL, **attributes):
+        """현재 span 의 자식 (추적 중이 아니면 no-op)"""
+        parent = _current.get()
+        if parent is None:
+            return NOOP_SPAN
+        return _Activation(Span(parent.trace, parent.trace_id, parent.span_id, name, kind, attributes))
+
+    def start_span(self, name, kind=KIND_INTERNAL, **attributes):
+        """현재 span 의 자식이지만 현재 span 으로 두지 않음 (제너레이터 등, 호출자가 end())"""
+        parent = _current.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(parent.trace, parent.trace_id, parent.span_id, name, kind, attributes)
+
+    @staticmethod
+    def current():
+        return _current.get() or NOOP_SPAN
+
+    @staticmethod
+    def bind(fn):
+        """스레드 풀에 넘길 함수에 현재 컨텍스트(현재 span)를 묶음"""
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def _finish(self, root):
+        trace = root.trace
+        slow = root.duration_ms >= self.slow_ms
+        keep = slow or trace.error or bool(self.sample_rate and random.random() < self.sample_rate)
+        with self._lock:
+            self.stats['traces'] += 1
+            if keep:
+                self.stats['kept'] += 1
+                self.stats['kept_slow'] += slow
+                self.stats['kept_error'] += trace.error
+        if not keep:
+            return
+        with trace.lock:
+            spans = list(trace.spans)
+        for span in spans:
+            span.end()
+        self.exporter.submit(spans)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        report = dict(stats, enabled=self.enabled, slow_ms=self.slow_ms, sample_rate=self.sample_rate)
+        if self.exporter:
+            report['exporter'] = self.exporter.snapshot()
+        return report
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def otlp_span(span):
+    data = {
+        'traceId': span.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start_ns),
+        'endTimeUnixNano': str(span.end_ns or span.start_ns),
+        'attributes': [_attribute(key, value) for key, value in span.attributes.items() if value is not None],
+    }
+    if span.parent_id:
+        data['parentSpanId'] = span.parent_id
+    if span.events:
+        data['events'] = [{'timeUnixNano': str(ts), 'name': name,
+                           'attributes': [_attribute(key, value) for key, value in attributes.items()]}
+                          for ts, name, attributes in span.events]
+    if span.error:
+        data['status'] = {'code': STATUS_ERROR, 'message': span.error}
+    return data
+
+
+def otlp_payload(spans, service_name=TRACE_SERVICE_NAME):
+    """OTLP/HTTP JSON ExportTraceServiceRequest"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', service_name),
+                                    _attribute('process.pid', os.getpid())]},
+        'scopeSpans': [{'scope': {'name': 'hairgator.tracing'}, 'spans': [otlp_span(span) for span in spans]}]
+    }]}
+
+
+class BatchExporter:
+    """비차단 일괄 내보내기 (요청 스레드는 큐에 넣기만, 워커 fork 후 첫 사용 시 스레드 시작)"""
+
+    def __init__(self, url=TRACE_EXPORT_URL, path=TRACE_EXPORT_PATH, batch_size=TRACE_BATCH_SIZE,
+                 flush_seconds=TRACE_FLUSH_SECONDS, max_queue=TRACE_QUEUE_MAX):
+        self.url = url
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_queue = max_queue
+        self.stats = {'queued_spans': 0, 'exported_spans': 0, 'dropped_spans': 0, 'batches': 0, 'errors': 0}
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """수집기 URL 도 파일 경로도 없으면 None (추적 꺼짐)"""
+        if not TRACE_EXPORT_URL and not TRACE_EXPORT_PATH:
+            return None
+        return cls()
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, spans):
+        self._ensure_worker()
+        queued = 0
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+                queued += 1
+            except queue.Full:
+                break
+        self._count(queued_spans=queued, dropped_spans=len(spans) - queued)
+
+    def _count(self, **counts):
+        with self._stats_lock:
+            for name, n in counts.items():
+                self.stats[name] += n
+
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_seconds
+        while True:
+            try:
+                pending.append(self._queue.get(timeout=max(0.01, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self.export(pending)
+                pending = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_seconds
+
+    def export(self, spans):
+        body = json.dumps(otlp_payload(spans), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        try:
+            if self.url:
+                request = urllib.request.Request(self.url, data=body, method='POST',
+                                                 headers={'Content-Type': 'application/json'})
+                with urllib.request.urlopen(request, timeout=EXPORT_TIMEOUT) as response:
+                    response.read()
+            if self.path:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, 'ab') as f:
+                    f.write(body + b'\n')
+        except OSError as e:
+            self._count(errors=1)
+            logger.warning(f"trace 내보내기 실패 ({len(spans)} spans): {e}")
+            return
+        self._count(batches=1, exported_spans=len(spans))
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return dict(stats, url=bool(self.url), path=self.path or None,
+                    queue_depth=self._queue.qsize() if self._queue is not None else 0)
+
+
+tracer = Tracer(BatchExporter.from_env())
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+upstream_pool.py
+여러 OpenAI 호환 엔드포인트/API 키를 묶는 지연 시간 기반 업스트림 풀
+
+- 엔드포인트마다 별도 OpenAI 클라이언트 (= 별도 httpx 커넥션 풀)
+- 엔드포인트별 EWMA 지연(스트리밍 첫 청크 TTFB / 완료까지 전체 지연 따로), EWMA 오류율,
+  남은 요청 쿼터(x-ratelimit-remaining-requests) 추적
+- 호출 시 두 후보를 무작위로 뽑아 점수가 낮은 쪽 선택 (power-of-two-choices,
+  스트리밍 호출은 TTFB, 일반 호출은 전체 지연 기준)
+- 연속 실패/오류율이 높으면 일정 시간 자동 제외 (반복 시 제외 시간 2배)
+- 백그라운드 헬스 프로버는 제외/복귀 판단에만 사용 (프로브 지연은 실제 호출 지연과 달라 EWMA 에 넣지 않음)
+
+환경 변수:
+    OPENAI_ENDPOINTS="https://api.openai.com/v1|sk-...,https://proxy.example.com/v1|sk-..."
+    OPENAI_API_KEYS="sk-a,sk-b"   (기본 base URL에 키만 여러 개)
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+
+from tracing import tracer, KIND_CLIENT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', '30'))
+PROBE_INTERVAL = float(os.getenv('UPSTREAM_PROBE_INTERVAL', '30'))
+
+EWMA_ALPHA = 0.2
+EJECT_CONSECUTIVE_FAILURES = 3
+EJECT_ERROR_RATE = 0.5
+EJECT_MIN_SAMPLES = 5
+EJECT_BASE_SECONDS = 15.0
+EJECT_MAX_SECONDS = 300.0
+# 남은 쿼터가 이 값 미만이면 점수에 페널티
+LOW_QUOTA = 10
+
+
+class Endpoint:
+    """업스트림 엔드포인트 하나의 클라이언트와 상태"""
+
+    def __init__(self, base_url, api_key, name=None, timeout=UPSTREAM_TIMEOUT, client=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.name = name or f"{base_url}#{api_key[-4:] if api_key else '----'}"
+        self.client = client or self._build_client(timeout)
+
+        self.ewma_latency = None
+        self.ewma_ttfb = None
+        self.ewma_error = 0.0
+        self.remaining_requests = None
+        self.in_flight = 0
+        self.probe_failures = 0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _build_client(self, timeout):
+        import httpx
+        from openai import OpenAI
+
+        return OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0,
+            timeout=timeout,
+            http_client=httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        )
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.ejected_until
+
+    def score(self, streaming=False):
+        """낮을수록 좋음: 예상 지연 × (대기 요청 + 1) × 오류/쿼터 페널티
+
+        streaming: 첫 청크까지의 시간(TTFB)으로 비교 (없으면 기본값)
+        """
+        latency = self.ewma_ttfb if streaming else self.ewma_latency
+        if latency is None:
+            latency = 0.5
+        penalty = 1.0 + 4.0 * self.ewma_error
+        if self.remaining_requests is not None and self.remaining_requests < LOW_QUOTA:
+            penalty *= 4.0
+        return latency * (self.in_flight + 1) * penalty
+
+    def begin(self):
+        """호출 시작 (대기 요청 수는 여러 스레드가 동시에 바꾸므로 잠금 안에서)"""
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+
+    def end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_ttfb(self, ttfb, remaining=None):
+        """스트리밍 첫 청크까지의 시간"""
+        with self._lock:
+            self.ewma_ttfb = _ewma(self.ewma_ttfb, ttfb)
+            if remaining is not None:
+                self.remaining_requests = remaining
+
+    def record_success(self, latency, remaining=None):
+        """완료까지의 전체 지연 (일반 호출 응답 / 스트림 끝)"""
+        with self._lock:
+            self.samples += 1
+            self.consecutive_failures = 0
+            if self.healthy:
+                self.ejections = 0
+            self.ewma_latency = _ewma(self.ewma_latency, latency)
+            self.ewma_error = (1 - EWMA_ALPHA) * self.ewma_error
+            if remaining is not None:
+                self.remaining_requests = remaining
+
+    def record_failure(self, remaining=None):
+        with self._lock:
+            self.samples += 1
+            self.consecutive_failures += 1
+            self.ewma_error = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.ewma_error
+            if remaining is not None:
+                self.remaining_requests = remaining
+            if self.healthy and (self.consecutive_failures >= EJECT_CONSECUTIVE_FAILURES or (
+                    self.samples >= EJECT_MIN_SAMPLES and self.ewma_error > EJECT_ERROR_RATE)):
+                self._eject()
+
+    def record_probe(self, ok, remaining=None):
+        """헬스 프로브 결과: 제외/복귀 판단에만 사용 (지연·오류율 EWMA 는 실제 호출 기준)
+
+        - 연속 프로브 실패가 기준을 넘으면 제외
+        - 제외 중 프로브가 성공하면 만료를 기다리지 않고 바로 복귀 (재실패 시 제외 시간은 계속 2배)
+        """
+        with self._lock:
+            if remaining is not None:
+                self.remaining_requests = remaining
+            if ok:
+                self.probe_failures = 0
+                if not self.healthy:
+                    self.ejected_until = 0.0
+                    self.consecutive_failures = 0
+                    logger.info(f"업스트림 복귀 (프로브 성공): {self.name}")
+                return
+            self.probe_failures += 1
+            if self.healthy and self.probe_failures >= EJECT_CONSECUTIVE_FAILURES:
+                self._eject()
+
+    def _eject(self):
+        duration = min(EJECT_MAX_SECONDS, EJECT_BASE_SECONDS * (2 ** self.ejections))
+        self.ejections += 1
+        self.ejected_until = time.monotonic() + duration
+        logger.warning(f"업스트림 제외 ({duration:.0f}초): {self.name}")
+
+    def snapshot(self):
+        return {
+            'name': self.name,
+            'healthy': self.healthy,
+            'ewma_latency_ms': round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            'ewma_ttfb_ms': round(self.ewma_ttfb * 1000, 1) if self.ewma_ttfb is not None else None,
+            'error_rate': round(self.ewma_error, 3),
+            'remaining_requests': self.remaining_requests,
+            'in_flight': self.in_flight,
+            'calls': self.calls,
+            'ejections': self.ejections
+        }
+
+
+def _ewma(current, sample):
+    return sample if current is None else EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * current
+
+
+def _with_traceparent(kwargs, span):
+    """추적 중이면 시도별 span 의 traceparent 를 요청 헤더에 추가"""
+    if not span.traceparent:
+        return kwargs
+    return dict(kwargs, extra_headers=dict(kwargs.get('extra_headers') or {}, traceparent=span.traceparent))
+
+
+def _remaining_from_headers(headers):
+    value = headers.get('x-ratelimit-remaining-requests') if headers else None
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class UpstreamPool:
+    def __init__(self, endpoints, probe_interval=PROBE_INTERVAL):
+        if not endpoints:
+            raise ValueError("업스트림 엔드포인트가 없습니다")
+        self.endpoints = endpoints
+        self.probe_interval = probe_interval
+        self._prober = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, default_api_key=None):
+        """환경 변수에서 엔드포인트 목록 구성 (없으면 None)"""
+        specs = []
+        for item in os.getenv('OPENAI_ENDPOINTS', '').split(','):
+            item = item.strip()
+            if not item:
+                continue
+            base_url, _, api_key = item.partition('|')
+            specs.append((base_url.strip(), api_key.strip() or default_api_key))
+
+        keys = [k.strip() for k in os.getenv('OPENAI_API_KEYS', '').split(',') if k.strip()]
+        if not keys and not specs and default_api_key:
+            keys = [default_api_key]
+        specs.extend((DEFAULT_BASE_URL, key) for key in keys)
+
+        endpoints = []
+        for base_url, api_key in specs:
+            if not api_key:
+                logger.warning(f"API 키 없는 엔드포인트 무시: {base_url}")
+                continue
+            try:
+                endpoints.append(Endpoint(base_url, api_key))
+            except Exception as e:
+                logger.error(f"엔드포인트 초기화 실패 ({base_url}): {e}")
+
+        return cls(endpoints) if endpoints else None
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def choose(self, exclude=(), streaming=False):
+        """power-of-two-choices 로 엔드포인트 선택"""
+        candidates = [ep for ep in self.endpoints if ep.healthy and ep not in exclude]
+        if not candidates:
+            # 모두 제외 상태면 가장 먼저 복귀할 엔드포인트라도 사용
+            candidates = sorted(
+                (ep for ep in self.endpoints if ep not in exclude),
+                key=lambda ep: ep.ejected_until
+            )[:1]
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = random.sample(candidates, 2)
+        return a if a.score(streaming) <= b.score(streaming) else b
+
+    def chat_completion(self, attempts=2, **kwargs):
+        """선택된 엔드포인트로 chat.completions 호출, 실패 시 다른 엔드포인트로 재시도"""
+        tried = []
+        last_error = None
+
+        for _ in range(min(attempts, len(self.endpoints))):
+            endpoint = self.choose(exclude=tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+
+            endpoint.begin()
+            started = time.perf_counter()
+            span = tracer.start_span('upstream attempt', KIND_CLIENT, endpoint=endpoint.name, attempt=len(tried))
+            try:
+                raw = endpoint.client.chat.completions.with_raw_response.create(**_with_traceparent(kwargs, span))
+                completion = raw.parse()
+            except Exception as e:
+                headers = getattr(getattr(e, 'response', None), 'headers', None)
+                endpoint.record_failure(_remaining_from_headers(headers))
+                logger.warning(f"업스트림 호출 실패 ({endpoint.name}): {e}")
+                span.fail(e)
+                last_error = e
+                continue
+            finally:
+                endpoint.end()
+                span.end()
+
+            endpoint.record_success(time.perf_counter() - started, _remaining_from_headers(raw.headers))
+            return completion
+
+        raise last_error or RuntimeError("사용 가능한 업스트림이 없습니다")
+
+    def stream_chat_completion(self, attempts=2, cancel=None, **kwargs):
+        """스트리밍 호출 (청크 yield), 첫 청크 전 실패만 다른 엔드포인트로 재시도
+
+        첫 청크까지의 시간은 TTFB, 스트림 끝까지의 시간은 전체 지연으로 따로 기록
+        (소비자가 중간에 닫으면 전체 지연은 기록하지 않음)
+        cancel: attach(close) 가 있는 취소 토큰 (providers.CancelToken) — 연 스트림을 등록해
+        취소 시 바로 닫히게 하고, 취소로 끊긴 스트림은 엔드포인트 실패로 기록하지 않음
+        """
+        tried = []
+        last_error = None
+
+        for _ in range(min(attempts, len(self.endpoints))):
+            if cancel is not None and cancel.is_set():
+                return
+            endpoint = self.choose(exclude=tried, streaming=True)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+
+            endpoint.begin()
+            started = time.perf_counter()
+            first_chunk = True
+            span = tracer.start_span('upstream attempt', KIND_CLIENT, endpoint=endpoint.name, attempt=len(tried),
+                                     stream=True)
+            try:
+                raw = endpoint.client.chat.completions.with_raw_response.create(stream=True,
+                                                                                 **_with_traceparent(kwargs, span))
+                remaining = _remaining_from_headers(raw.headers)
+                stream = raw.parse()
+                if cancel is not None:
+                    cancel.attach(stream.close)
+                try:
+                    for chunk in stream:
+                        if first_chunk:
+                            endpoint.record_ttfb(time.perf_counter() - started, remaining)
+                            span.set(first_chunk_ms=round((time.perf_counter() - started) * 1000, 1))
+                            first_chunk = False
+                        yield chunk
+                finally:
+                    stream.close()
+                if cancel is None or not cancel.is_set():
+                    endpoint.record_success(time.perf_counter() - started)
+                return
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                if cancel is not None and cancel.is_set():
+                    span.set(cancelled=True)
+                    raise
+                headers = getattr(getattr(e, 'response', None), 'headers', None)
+                endpoint.record_failure(_remaining_from_headers(headers))
+                logger.warning(f"업스트림 스트림 실패 ({endpoint.name}): {e}")
+                span.fail(e)
+                if not first_chunk:
+                    raise
+                last_error = e
+            finally:
+                endpoint.end()
+                span.end()
+
+        raise last_error or RuntimeError("사용 가능한 업스트림이 없습니다")
+
+    def probe(self):
+        """모든 엔드포인트에 가벼운 요청(models.list)을 보내 제외/복귀 상태 갱신"""
+        for endpoint in self.endpoints:
+            try:
+                raw = endpoint.client.models.with_raw_response.list()
+                endpoint.record_probe(True, _remaining_from_headers(raw.headers))
+            except Exception as e:
+                headers = getattr(getattr(e, 'response', None), 'headers', None)
+                endpoint.record_probe(False, _remaining_from_headers(headers))
+
+    def start_prober(self):
+        if self._prober or self.probe_interval <= 0:
+            return
+        self._prober = threading.Thread(target=self._probe_loop, name='upstream-prober', daemon=True)
+        self._prober.start()
+
+    def stop_prober(self):
+        self._stop.set()
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception as e:
+                logger.error(f"업스트림 헬스 프로브 오류: {e}")
+
+    def snapshot(self):
+        return [ep.snapshot() for ep in self.endpoints]
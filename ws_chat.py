@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+ws_chat.py
+WebSocket 채팅 채널 (flask-sock)
+
+연결 하나로 질문, 스트리밍 토큰, 서버 ping 을 주고받아
+메시지마다 HTTP 헤더/JSON 봉투/TLS 재연결 비용을 내지 않습니다.
+
+프레임 (JSON 텍스트):
+    클라이언트 → {"type": "chat", "id": 1, "message": "...", "suggestion": "..."(선택)}
+                 / {"type": "ping"} / {"type": "pong"}
+    서버 → {"type": "token", "id": 1, "text": "..."}  (모델 출력 JSON 조각, answer_schema 참고)
+           {"type": "done", "id": 1, "answer": {...}, "response": "...", "recipe_type": "...", "source": "..."}
+           {"type": "error", "id": 1, "error": "..."} / {"type": "ping", "ts": ...} / {"type": "pong"}
+
+- 워커당 동시 소켓 상한 초과 시 1013(Try Again Later)으로 닫고, 페이지는 HTTP 로 폴백
+- 송신은 소켓별 전용 스레드 + 길이 제한 큐: 느린 클라이언트가 큐를 채우면 생산자가
+  기다리고(백프레셔), 제한 시간을 넘기면 연결을 끊어 워커 스레드를 돌려받음
+- 소켓별 처리 중 질문 수 제한 (초과 시 busy 오류 프레임)
+
+gunicorn 사용 시 gthread 워커(--threads)가 필요합니다 (sync 워커는 소켓마다 워커 하나를 점유).
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    from flask_sock import Sock
+    SOCK_AVAILABLE = True
+except ImportError:
+    SOCK_AVAILABLE = False
+
+WS_MAX_SOCKETS = int(os.getenv('WS_MAX_SOCKETS', '200'))
+WS_PING_SECONDS = float(os.getenv('WS_PING_SECONDS', '20'))
+WS_SEND_QUEUE = int(os.getenv('WS_SEND_QUEUE', '256'))
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '5'))
+WS_MAX_INFLIGHT = int(os.getenv('WS_MAX_INFLIGHT', '2'))
+WS_MAX_MESSAGE_CHARS = 2000
+
+# RFC 6455 닫기 코드
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class SlowConsumer(Exception):
+    """송신 큐가 제한 시간 동안 비워지지 않음"""
+
+
+class ChatChannel:
+    """소켓 하나의 수신 루프와 송신 스레드"""
+
+    def __init__(self, ws, handler, stats, lock, ping_seconds=WS_PING_SECONDS,
+                 send_queue=WS_SEND_QUEUE, send_timeout=WS_SEND_TIMEOUT, max_inflight=WS_MAX_INFLIGHT):
+        self.ws = ws
+        self.handler = handler
+        self.stats = stats
+        self._stats_lock = lock
+        self.ping_seconds = ping_seconds
+        self.send_timeout = send_timeout
+        self.max_inflight = max_inflight
+        self.outbox = queue.Queue(maxsize=send_queue)
+        self.inflight = 0
+        self.closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def send(self, frame):
+        """송신 큐에 프레임 추가 (가득 차면 send_timeout 까지 대기)"""
+        if self.closed.is_set():
+            return
+        try:
+            self.outbox.put(json.dumps(frame, ensure_ascii=False), timeout=self.send_timeout)
+        except queue.Full:
+            self._count('slow_consumers')
+            self.closed.set()
+            raise SlowConsumer()
+
+    def _writer(self):
+        while True:
+            data = self.outbox.get()
+            if data is None:
+                return
+            try:
+                self.ws.send(data)
+            except Exception:
+                self.closed.set()
+                return
+            self._count('frames_out')
+            self._count('bytes_out', len(data.encode('utf-8')))
+
+    def _answer(self, request_id, message, suggestion=None):
+        def on_token(text):
+            # 제공자 스트림 안에서 예외를 던지면 업스트림 실패/폴백 답변으로 기록되므로
+            # 느린 클라이언트는 연결만 닫고(closed) 이후 조각은 조용히 버림
+            try:
+                self.send({'type': 'token', 'id': request_id, 'text': text})
+            except SlowConsumer:
+                logger.warning("WebSocket 송신 지연으로 연결 종료 (답변 생성은 계속)")
+
+        try:
+            result = self.handler(message, on_token=on_token, suggestion=suggestion)
+            self.send(dict(result, type='done', id=request_id))
+        except SlowConsumer:
+            logger.warning("WebSocket 송신 지연으로 연결 종료")
+        except Exception as e:
+            logger.error(f"WebSocket 채팅 처리 오류: {e}")
+            try:
+                self.send({'type': 'error', 'id': request_id, 'error': str(e)})
+            except SlowConsumer:
+                pass
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def _dispatch(self, raw):
+        self._count('frames_in')
+        self._count('bytes_in', len(raw.encode('utf-8')) if isinstance(raw, str) else len(raw))
+        try:
+            frame = json.loads(raw)
+        except ValueError:
+            self.send({'type': 'error', 'error': '잘못된 프레임입니다.'})
+            return
+
+        kind = frame.get('type')
+        if kind == 'ping':
+            self.send({'type': 'pong', 'ts': time.time()})
+        elif kind == 'chat':
+            request_id = frame.get('id')
+            message = (frame.get('message') or '').strip()[:WS_MAX_MESSAGE_CHARS]
+            if not message:
+                self.send({'type': 'error', 'id': request_id, 'error': '메시지가 비어있습니다.'})
+                return
+            with self._lock:
+                busy = self.inflight >= self.max_inflight
+                if not busy:
+                    self.inflight += 1
+            if busy:
+                self._count('busy')
+                self.send({'type': 'error', 'id': request_id, 'error': 'busy'})
+                return
+            self._count('messages')
+            threading.Thread(target=self._answer, args=(request_id, message, frame.get('suggestion')),
+                             name='ws-answer', daemon=True).start()
+
+    def run(self):
+        writer = threading.Thread(target=self._writer, name='ws-writer', daemon=True)
+        writer.start()
+        try:
+            while not self.closed.is_set():
+                raw = self.ws.receive(timeout=self.ping_seconds)
+                if raw is None:
+                    # 유휴 연결 유지 (프록시/모바일 NAT 타임아웃 방지)
+                    self.send({'type': 'ping', 'ts': time.time()})
+                    continue
+                self._dispatch(raw)
+        except SlowConsumer:
+            logger.warning("WebSocket 송신 지연으로 연결 종료")
+        except Exception:
+            # 클라이언트 종료 (ConnectionClosed 등)
+            pass
+        finally:
+            self.closed.set()
+            try:
+                self.outbox.put_nowait(None)
+            except queue.Full:
+                pass
+            writer.join(timeout=1.0)
+
+
+class ChatSocketServer:
+    """워커당 WebSocket 연결 관리 (동시 소켓 상한, 통계)"""
+
+    def __init__(self, handler, max_sockets=WS_MAX_SOCKETS, **channel_options):
+        self.handler = handler
+        self.max_sockets = max_sockets
+        self.channel_options = channel_options
+        self.enabled = False
+        self._slots = threading.BoundedSemaphore(max_sockets)
+        self._lock = threading.Lock()
+        self.stats = {'open': 0, 'accepted': 0, 'rejected': 0, 'messages': 0, 'busy': 0,
+                      'frames_in': 0, 'frames_out': 0, 'bytes_in': 0, 'bytes_out': 0, 'slow_consumers': 0}
+
+    def register(self, app, path='/ws/chat'):
+        """flask-sock 이 있으면 라우트 등록 (없으면 False)"""
+        if not SOCK_AVAILABLE:
+            return False
+        sock = Sock(app)
+
+        @sock.route(path)
+        def chat_socket(ws):
+            self.serve(ws)
+
+        self.enabled = True
+        return True
+
+    def serve(self, ws):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['rejected'] += 1
+            ws.close(reason=CLOSE_TRY_AGAIN_LATER, message='too many sockets')
+            return
+
+        # 토큰 프레임이 작아서 Nagle 지연(~40ms)에 걸리지 않도록
+        try:
+            ws.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (AttributeError, OSError):
+            pass
+
+        with self._lock:
+            self.stats['accepted'] += 1
+            self.stats['open'] += 1
+        try:
+            ChatChannel(ws, self.handler, self.stats, self._lock, **self.channel_options).run()
+        finally:
+            with self._lock:
+                self.stats['open'] -= 1
+            self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, enabled=self.enabled, max_sockets=self.max_sockets)